@@ -2,9 +2,7 @@
 
 # Standard library
 import asyncio
-import io
-import zipfile
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
 # Local application
 from api.auth.auth_utils import get_authenticated_user
@@ -14,6 +12,7 @@ from api.status_updates import app_connection_manager, close_connection
 # Third-party
 from common.logger.app_logger import AppLogger
 from common.services.batch_service import BatchService
+from common.storage.zip_stream import zip_stream
 
 from fastapi import (
     APIRouter,
@@ -25,7 +24,7 @@ from fastapi import (
     WebSocket,
     WebSocketDisconnect,
 )
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
@@ -128,7 +127,7 @@ async def start_processing(request: Request):
     description="Download all files associated with an upload ID as a ZIP archive",
     response_description="ZIP file containing all processed files",
 )
-async def download_files(batch_id: str):
+async def download_files(request: Request, batch_id: str):
     """
     Download files as ZIP.
     ---
@@ -149,6 +148,10 @@ async def download_files(batch_id: str):
         schema:
           type: string
           format: binary
+      304:
+        description: The stored archive matches the If-None-Match header
+      401:
+        description: User not authenticated
       404:
         description: Batch not found or error creating ZIP file
         schema:
@@ -158,56 +161,64 @@ async def download_files(batch_id: str):
               type: string
               example: Batch not found
     """
-    # call batch_service get_batch_for_zip to get all files for batch_id
     batch_service = BatchService()
     await batch_service.initialize_database()
-    set_span_attributes(batch_id=batch_id)
+    authenticated_user = get_authenticated_user(request)
+    user_id = authenticated_user.user_principal_id
+    set_span_attributes(batch_id=batch_id, user_id=user_id)
+    if not user_id:
+        track_event_if_configured(
+            "UserIdNotFound", {"status_code": 400, "detail": "no user", "batch_id": batch_id}
+        )
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    headers = {"Content-Disposition": "attachment; filename=tsql_relts.zip"}
 
-    file_data = await batch_service.get_batch_for_zip(batch_id)
-    if not file_data:
+    # Only the user's own batches, whether stored or streamed
+    batch = await batch_service.get_batch(batch_id, user_id)
+    files_meta = batch["files"] if batch else None
+    if not files_meta:
         track_event_if_configured("DownloadBatchNotFound", {"batch_id": batch_id})
         raise HTTPException(status_code=404, detail="Batch not found")
 
-    # Create an in-memory bytes buffer for the zip file
-    zip_stream = io.BytesIO()
-    try:
-        # Create a new zip file in memory
-        with zipfile.ZipFile(
-            zip_stream, mode="w", compression=zipfile.ZIP_DEFLATED
-        ) as zf:
-            for file_name, content in file_data:
-                # Make sure the file has content
-                if not content:
-                    continue
-                # Ensure the file name ends with '.sql'
-                if not file_name.endswith(".sql"):
-                    file_name += ".sql"
-                # Ensure the file name is safe for zip
-                file_name = file_name.replace("/", "_").replace("\\", "_")
-                # Write the file into the zip archive with its content
-                zf.writestr(file_name, content)
-        # Reset the stream's position to the beginning
-        zip_stream.seek(0)
-        zip_data = zip_stream.getvalue()
-        # Get the size of the zip file for the Content-Length header
-        zip_size = len(zip_data)
-        # Prepare headers for file download
-        headers = {
-            "Content-Disposition": "attachment; filename=tsql_relts.zip",
-            "Content-Length": str(zip_size),
-        }
+    # A finished batch is served from its stored archive. Without one, it is
+    # built in the background while this download streams the files
+    stored = await batch_service.find_result_archive(batch_id, user_id)
+    if stored is None:
+        batch_service.build_result_archive_later(
+            batch_id, user_id, batch=batch["batch"], files_meta=files_meta
+        )
+    else:
+        etag = f'"{stored["sha256"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        track_event_if_configured("DownloadZipStored", {"batch_id": batch_id})
+        return StreamingResponse(
+            batch_service.stream_result_archive(stored["path"]),
+            media_type="application/zip",
+            headers={**headers, "ETag": etag},
+        )
 
-        # Return the zip file as a streaming response
+    async def archive() -> AsyncIterator[bytes]:
+        # Entries are written as their downloads complete; once the response has
+        # started, a failure can only end it early
+        entries = (
+            (file_name, content)
+            async for _, file_name, content in batch_service.iter_translated_files(files_meta)
+        )
+        try:
+            async for chunk in zip_stream(entries):
+                yield chunk
+        except Exception as e:
+            logger.error("Error streaming ZIP file", error=str(e), batch_id=batch_id)
+            track_event_if_configured("DownloadZipFailed", {"batch_id": batch_id, "error": str(e)})
+            record_exception_to_trace(e)
+            raise
         track_event_if_configured(
-            "DownloadZipSuccess", {"batch_id": batch_id, "file_count": len(file_data)}
+            "DownloadZipSuccess", {"batch_id": batch_id, "file_count": len(files_meta)}
         )
-        return Response(zip_data, media_type="application/zip", headers=headers)
-    except Exception as e:
-        track_event_if_configured("DownloadZipFailed", {"batch_id": batch_id, "error": str(e)})
-        record_exception_to_trace(e)
-        raise HTTPException(
-            status_code=404, detail=f"Error creating ZIP file: {str(e)}"
-        ) from e
+
+    # Without a Content-Length the archive is sent with chunked transfer encoding
+    return StreamingResponse(archive(), media_type="application/zip", headers=headers)
 
 
 @router.websocket("/socket/{batch_id}")
@@ -292,7 +303,12 @@ async def batch_status_updates(
 
 
 @router.get("/batch-story/{batch_id}")
-async def get_batch_status(request: Request, batch_id: str):
+async def get_batch_status(
+    request: Request,
+    batch_id: str,
+    page_size: Optional[int] = None,
+    continuation_token: Optional[str] = None,
+):
     """
     Retrieve batch history and file statuses.
     ---
@@ -306,6 +322,20 @@ async def get_batch_status(request: Request, batch_id: str):
           type: string
           format: uuid
         description: Unique identifier for the batch
+      - in: query
+        name: page_size
+        required: false
+        schema:
+          type: integer
+          minimum: 1
+          maximum: 100
+        description: Number of files per page. Returns one page and a continuation_token.
+      - in: query
+        name: continuation_token
+        required: false
+        schema:
+          type: string
+        description: Opaque token of the next page, from the previous page's response.
     responses:
       200:
         description: Batch history retrieved successfully
@@ -375,8 +405,12 @@ async def get_batch_status(request: Request, batch_id: str):
                         type: string
                         format: date-time
                         description: Timestamp of last file status update
+                continuation_token:
+                  type: string
+                  nullable: true
+                  description: Token of the next page of files, only when paging
       400:
-        description: Invalid batch_id format
+        description: Invalid batch_id format or continuation token
       401:
         description: User authentication failed
       404:
@@ -403,7 +437,12 @@ async def get_batch_status(request: Request, batch_id: str):
             raise HTTPException(status_code=400, detail="Invalid batch_id format")
 
         # Fetch batch details
-        batch_data = await batch_service.get_batch(batch_id, user_id)
+        try:
+            batch_data = await batch_service.get_batch(
+                batch_id, user_id, page_size=page_size, continuation_token=continuation_token
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
         if not batch_data:
             track_event_if_configured(
                 "BatchNotFound", {"batch_id": batch_id, "user_id": user_id}
@@ -427,8 +466,36 @@ async def get_batch_status(request: Request, batch_id: str):
 
 
 @router.get("/batch-summary/{batch_id}")
-async def get_batch_summary(request: Request, batch_id: str):
-    """Retrieve batch summary for a given batch ID."""
+async def get_batch_summary(request: Request, batch_id: str, include_logs: bool = False):
+    """
+    Retrieve batch summary for a given batch ID.
+    ---
+    tags:
+      - Batch Status
+    parameters:
+      - in: path
+        name: batch_id
+        required: true
+        schema:
+          type: string
+      - in: query
+        name: include_logs
+        required: false
+        schema:
+          type: boolean
+        description: >
+          Also return the logs and translated content of every file. Without it the
+          summary is read from the batch record and the batch's summary document,
+          which holds a status row per file; the logs of a file are available from
+          /file/{file_id}.
+    responses:
+      200:
+        description: >
+          The batch, a status row per file, and the file counts by status and result
+          with the processing timings.
+      404:
+        description: Batch not found
+    """
     try:
         batch_service = BatchService()
         await batch_service.initialize_database()
@@ -443,7 +510,9 @@ async def get_batch_summary(request: Request, batch_id: str):
             raise HTTPException(status_code=401, detail="User not authenticated")
 
         # Retrieve batch summary
-        batch_summary = await batch_service.get_batch_summary(batch_id, user_id)
+        batch_summary = await batch_service.get_batch_summary(
+            batch_id, user_id, include_logs=include_logs
+        )
         if not batch_summary:
             track_event_if_configured(
                 "BatchSummaryNotFound", {"batch_id": batch_id, "user_id": user_id}
@@ -547,6 +616,8 @@ async def upload_file(
         description: Invalid file type or missing authentication
       401:
         description: User not authenticated
+      413:
+        description: File larger than the maximum upload size
       500:
         description: Internal server error during processing
     """
@@ -585,8 +656,282 @@ async def upload_file(
         raise HTTPException(status_code=500, detail="Internal server error") from e
 
 
+@router.post("/upload-files")
+async def upload_files(
+    request: Request, files: List[UploadFile] = File(...), batch_id: str = Form(...)
+):
+    """
+    Upload many files, or ZIP archives of files, for conversion at once.
+    ---
+    tags:
+      - File Conversion
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: files
+        type: array
+        items:
+          type: file
+        required: true
+        description: The files to upload; the files inside ZIP archives are uploaded one by one.
+      - in: formData
+        name: batch_id
+        type: string
+        format: uuid
+        required: true
+        description: The batch ID to associate the files with.
+    responses:
+      200:
+        description: Files uploaded
+        schema:
+          type: object
+          properties:
+            batch:
+              type: object
+              description: The batch, with its updated file count
+            files:
+              type: array
+              description: The file records added, as returned by /upload
+            failed:
+              type: array
+              items:
+                type: string
+              description: Names of the files that could not be uploaded
+      400:
+        description: Invalid batch ID, no files, too many files or an invalid archive
+      401:
+        description: User not authenticated
+      413:
+        description: A file larger than the maximum upload size
+      500:
+        description: Internal server error during processing
+    """
+    try:
+        batch_service = BatchService()
+        await batch_service.initialize_database()
+        # Authenticate user
+        authenticated_user = get_authenticated_user(request)
+        user_id = authenticated_user.user_principal_id
+
+        set_span_attributes(batch_id=batch_id, user_id=user_id)
+        if not user_id:
+            track_event_if_configured(
+                "UserIdNotFound", {"status_code": 400, "detail": "no user", "batch_id": batch_id}
+            )
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+        logger.info("Bulk upload request received", batch_id=batch_id, count=len(files))
+        if not batch_service.is_valid_uuid(batch_id):
+            track_event_if_configured("InvalidBatchId", {"batch_id": batch_id, "user_id": user_id})
+            raise HTTPException(status_code=400, detail="Invalid batch_id format")
+
+        upload_result = await batch_service.upload_files_to_batch(batch_id, user_id, files)
+        track_event_if_configured(
+            "FilesUploaded",
+            {
+                "batch_id": batch_id,
+                "user_id": user_id,
+                "file_count": len(upload_result["files"]),
+                "failed_count": len(upload_result["failed"]),
+            },
+        )
+        return upload_result
+
+    except HTTPException as e:
+        record_exception_to_trace(e)
+        raise e
+    except Exception as e:
+        record_exception_to_trace(e)
+        raise HTTPException(status_code=500, detail="Internal server error") from e
+
+
+@router.post("/upload-urls")
+async def create_upload_urls(request: Request):
+    """
+    Issue URLs to upload files straight to blob storage, bypassing the API.
+    ---
+    tags:
+      - File Conversion
+    parameters:
+      - in: body
+        name: upload_request
+        schema:
+          type: object
+          properties:
+            batch_id:
+              type: string
+              format: uuid
+            file_names:
+              type: array
+              items:
+                type: string
+    responses:
+      200:
+        description: >
+          One upload URL per file. Each URL takes a PUT of the file as a block blob
+          (header x-ms-blob-type: BlockBlob) until expires_at, and can create the
+          blob once but not replace it; the uploads are then added to the batch
+          with /upload-complete. The deployed storage account allows these PUTs
+          from the frontend's origin by CORS; with private networking it is only
+          reachable from inside the virtual network.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              file_id:
+                type: string
+                format: uuid
+              file_name:
+                type: string
+              upload_url:
+                type: string
+              expires_at:
+                type: string
+                format: date-time
+      400:
+        description: Invalid batch ID, no files or too many files
+      401:
+        description: User not authenticated
+      501:
+        description: The storage does not take direct uploads
+      500:
+        description: Internal server error
+    """
+    try:
+        batch_service = BatchService()
+        await batch_service.initialize_database()
+        authenticated_user = get_authenticated_user(request)
+        user_id = authenticated_user.user_principal_id
+        payload = await request.json()
+        batch_id = payload.get("batch_id")
+
+        set_span_attributes(batch_id=batch_id, user_id=user_id)
+        if not user_id:
+            track_event_if_configured(
+                "UserIdNotFound", {"status_code": 400, "detail": "no user", "batch_id": batch_id}
+            )
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+        if not batch_id or not batch_service.is_valid_uuid(batch_id):
+            track_event_if_configured("InvalidBatchId", {"batch_id": batch_id, "user_id": user_id})
+            raise HTTPException(status_code=400, detail="Invalid batch_id format")
+        file_names = payload.get("file_names")
+        if not isinstance(file_names, list) or not all(isinstance(name, str) and name for name in file_names):
+            raise HTTPException(status_code=400, detail="file_names must be a list of file names")
+
+        uploads = await batch_service.create_upload_urls(batch_id, user_id, file_names)
+        track_event_if_configured(
+            "UploadUrlsIssued", {"batch_id": batch_id, "user_id": user_id, "file_count": len(uploads)}
+        )
+        return uploads
+
+    except HTTPException as e:
+        record_exception_to_trace(e)
+        raise e
+    except Exception as e:
+        record_exception_to_trace(e)
+        raise HTTPException(status_code=500, detail="Internal server error") from e
+
+
+@router.post("/upload-complete")
+async def complete_uploads(request: Request):
+    """
+    Add files uploaded with URLs from /upload-urls to their batch.
+    ---
+    tags:
+      - File Conversion
+    parameters:
+      - in: body
+        name: completed_uploads
+        schema:
+          type: object
+          properties:
+            batch_id:
+              type: string
+              format: uuid
+            files:
+              type: array
+              items:
+                type: object
+                properties:
+                  file_id:
+                    type: string
+                    format: uuid
+                  file_name:
+                    type: string
+    responses:
+      200:
+        description: >
+          Files added, as returned by /upload-files. Files that were not uploaded,
+          or are larger than the maximum upload size, are listed as failed.
+      400:
+        description: Invalid batch ID or files
+      401:
+        description: User not authenticated
+      404:
+        description: Batch not found
+      500:
+        description: Internal server error
+    """
+    try:
+        batch_service = BatchService()
+        await batch_service.initialize_database()
+        authenticated_user = get_authenticated_user(request)
+        user_id = authenticated_user.user_principal_id
+        payload = await request.json()
+        batch_id = payload.get("batch_id")
+
+        set_span_attributes(batch_id=batch_id, user_id=user_id)
+        if not user_id:
+            track_event_if_configured(
+                "UserIdNotFound", {"status_code": 400, "detail": "no user", "batch_id": batch_id}
+            )
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+        if not batch_id or not batch_service.is_valid_uuid(batch_id):
+            track_event_if_configured("InvalidBatchId", {"batch_id": batch_id, "user_id": user_id})
+            raise HTTPException(status_code=400, detail="Invalid batch_id format")
+        files = payload.get("files")
+        if not isinstance(files, list) or not all(
+            isinstance(file, dict)
+            and batch_service.is_valid_uuid(str(file.get("file_id")))
+            and isinstance(file.get("file_name"), str)
+            for file in files
+        ):
+            raise HTTPException(status_code=400, detail="files must be a list of file_id and file_name")
+
+        upload_result = await batch_service.complete_uploads(batch_id, user_id, files)
+        if upload_result is None:
+            track_event_if_configured("BatchNotFound", {"batch_id": batch_id, "user_id": user_id})
+            raise HTTPException(status_code=404, detail="Batch not found")
+        track_event_if_configured(
+            "FilesUploaded",
+            {
+                "batch_id": batch_id,
+                "user_id": user_id,
+                "file_count": len(upload_result["files"]),
+                "failed_count": len(upload_result["failed"]),
+            },
+        )
+        return upload_result
+
+    except HTTPException as e:
+        record_exception_to_trace(e)
+        raise e
+    except Exception as e:
+        record_exception_to_trace(e)
+        raise HTTPException(status_code=500, detail="Internal server error") from e
+
+
 @router.get("/file/{file_id}")
-async def get_file_details(request: Request, file_id: str):
+async def get_file_details(
+    request: Request,
+    file_id: str,
+    page_size: Optional[int] = None,
+    continuation_token: Optional[str] = None,
+):
     """
     Retrieve file details and processing logs.
     ---
@@ -600,6 +945,20 @@ async def get_file_details(request: Request, file_id: str):
           type: string
           format: uuid
         description: Unique identifier for the file.
+      - in: query
+        name: page_size
+        required: false
+        schema:
+          type: integer
+          minimum: 1
+          maximum: 100
+        description: Number of logs per page. Returns one page and a continuation_token.
+      - in: query
+        name: continuation_token
+        required: false
+        schema:
+          type: string
+        description: Opaque token of the next page, from the previous page's response.
     responses:
       200:
         description: File details retrieved successfully.
@@ -665,8 +1024,12 @@ async def get_file_details(request: Request, file_id: str):
                         type: string
                         format: date-time
                         description: Timestamp of the log entry.
+                continuation_token:
+                  type: string
+                  nullable: true
+                  description: Token of the next page of logs, only when paging.
       400:
-        description: Invalid file_id format.
+        description: Invalid file_id format or continuation token.
       401:
         description: User authentication failed.
       404:
@@ -693,7 +1056,12 @@ async def get_file_details(request: Request, file_id: str):
             raise HTTPException(status_code=400, detail="Invalid file_id format")
 
         # Fetch file details
-        file_data = await batch_service.get_file_report(file_id)
+        try:
+            file_data = await batch_service.get_file_report(
+                file_id, page_size=page_size, continuation_token=continuation_token
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
         if not file_data:
             track_event_if_configured("FileNotFound", {"file_id": file_id, "user_id": user_id})
             raise HTTPException(status_code=404, detail="File not found")
@@ -895,7 +1263,13 @@ async def delete_all_details(request: Request):
 
 
 @router.get("/batch-history")
-async def list_batch_history(request: Request, offset: int = 0, limit: Optional[int] = None):
+async def list_batch_history(
+    request: Request,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    page_size: Optional[int] = None,
+    continuation_token: Optional[str] = None,
+):
     """
     Retrieve batch processing history for the authenticated user.
     ---
@@ -914,9 +1288,25 @@ async def list_batch_history(request: Request, offset: int = 0, limit: Optional[
         schema:
           type: integer
         description: Number of batch history records to fetch.
+      - in: query
+        name: page_size
+        required: false
+        schema:
+          type: integer
+          minimum: 1
+          maximum: 100
+        description: Number of batches per page. Returns one page and a continuation_token.
+      - in: query
+        name: continuation_token
+        required: false
+        schema:
+          type: string
+        description: Opaque token of the next page, from the previous page's response.
     responses:
       200:
-        description: Successfully retrieved batch history.
+        description: >
+          Successfully retrieved batch history. With page_size or continuation_token
+          the response is an object with the batches and a continuation_token.
         content:
           application/json:
             schema:
@@ -961,6 +1351,18 @@ async def list_batch_history(request: Request, offset: int = 0, limit: Optional[
             )
             raise HTTPException(status_code=401, detail="User not authenticated")
 
+        if page_size is not None or continuation_token is not None:
+            try:
+                page = await batch_service.get_batch_history_page(
+                    user_id, page_size=page_size, continuation_token=continuation_token
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e)) from e
+            track_event_if_configured(
+                "BatchHistoryRetrieved", {"user_id": user_id, "count": len(page["batches"])}
+            )
+            return page
+
         # Retrieve batch history
         batch_history = await batch_service.get_batch_history(
             user_id, limit=limit, offset=offset
@@ -8,7 +8,10 @@ from api.api_routes import router as backend_router
 from azure.monitor.opentelemetry import configure_azure_monitor
 
 from common.config.config import app_config
+from common.database.database_factory import DatabaseFactory
 from common.logger.app_logger import AppLogger
+from common.services.batch_service import BatchService
+from common.storage.blob_factory import BlobStorageFactory
 from common.telemetry import patch_instrumentors
 
 from dotenv import load_dotenv
@@ -25,6 +28,7 @@ from semantic_kernel.agents.azure_ai.azure_ai_agent import AzureAIAgent  # pylin
 from sql_agents.agent_manager import clear_sql_agents, set_sql_agents
 from sql_agents.agents.agent_config import AgentBaseConfig
 from sql_agents.helpers.agents_manager import SqlAgents
+from sql_agents.helpers.chat_completions import close_chat_clients
 
 import uvicorn
 # from agent_services.agents_routes import router as agents_router
@@ -86,11 +90,14 @@ async def lifespan(app: FastAPI):
         agent_config = AgentBaseConfig(
             project_client=azure_client,
             sql_from="informix",  # Default source dialect
-            sql_to="tsql"         # Default target dialect
+            sql_to="tsql",        # Default target dialect
+            credential=creds,
         )
 
         # Create SQL agents
         sql_agents = await SqlAgents.create(agent_config)
+        # Pre-create conversation threads off the critical path of the first files
+        await sql_agents.start_thread_pool()
 
         # Set the global agents instance
         set_sql_agents(sql_agents)
@@ -100,6 +107,14 @@ async def lifespan(app: FastAPI):
         logger.error("Failed to initialize SQL agents")
         # Don't raise the exception to allow the app to start even if agents fail
 
+    try:
+        # Finish deleting the soft deleted batches a previous run did not get to
+        batch_service = BatchService()
+        await batch_service.initialize_database()
+        await batch_service.resume_deletes()
+    except Exception:  # noqa: BLE001
+        logger.error("Failed to resume deleting soft deleted batches")
+
     yield  # Application runs here
 
     # Shutdown
@@ -115,9 +130,27 @@ async def lifespan(app: FastAPI):
         if azure_client:
             await azure_client.close()
 
+        await close_chat_clients()
+
     except Exception:  # noqa: BLE001
         logger.error("Error during agent cleanup")
 
+    # Kept apart from the agent cleanup, so buffered logs are written even if it fails
+    try:
+        try:
+            # Stop building result archives and finish deleting soft deleted batches
+            await BatchService.cancel_archive_builds()
+            await BatchService.wait_for_deletes()
+        finally:
+            try:
+                # Write out file logs still buffered
+                await DatabaseFactory.close_log_buffer()
+            finally:
+                await BlobStorageFactory.close_storage()
+
+    except Exception:  # noqa: BLE001
+        logger.error("Error during storage cleanup")
+
 
 def create_app() -> FastAPI:
     """Create and return the FastAPI application instance."""
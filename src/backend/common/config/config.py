@@ -32,9 +32,21 @@ class Config:
         self.cosmosdb_batch_container = os.getenv("COSMOSDB_BATCH_CONTAINER")
         self.cosmosdb_file_container = os.getenv("COSMOSDB_FILE_CONTAINER")
         self.cosmosdb_log_container = os.getenv("COSMOSDB_LOG_CONTAINER")
+        # Partitioning of the file and log containers: by_id or by_parent
+        self.cosmosdb_layout = os.getenv("COSMOSDB_LAYOUT", "by_id")
+        # Database implementation: cosmosdb, or sqlite for local runs and load tests
+        self.database_backend = os.getenv("DATABASE_BACKEND", "cosmosdb")
+        self.sqlite_database_path = os.getenv("SQLITE_DATABASE_PATH", "cmsa.db")
 
         self.azure_blob_container_name = os.getenv("AZURE_BLOB_CONTAINER_NAME")
         self.azure_blob_account_name = os.getenv("AZURE_BLOB_ACCOUNT_NAME")
+        # Blob service URL, for other clouds and emulators; the public cloud URL of the account if unset
+        self.azure_blob_endpoint = os.getenv("AZURE_BLOB_ENDPOINT") or None
+        # Shared key of the account, for emulators such as Azurite; Entra ID is used if unset
+        self.azure_blob_account_key = os.getenv("AZURE_BLOB_ACCOUNT_KEY") or None
+        # Blob storage implementation: azure, or local for local runs and load tests
+        self.storage_backend = os.getenv("STORAGE_BACKEND", "azure")
+        self.local_storage_path = os.getenv("LOCAL_STORAGE_PATH", "blobs")
 
         self.azure_service_bus_namespace = os.getenv("AZURE_SERVICE_BUS_NAMESPACE")
         self.azure_queue_name = os.getenv("AZURE_QUEUE_NAME")
@@ -1,20 +1,30 @@
 import asyncio
-from datetime import datetime, timezone
-from typing import Dict, List, Optional
+import base64
+import json
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 from uuid import UUID, uuid4
 
+from azure.core import MatchConditions
 from azure.cosmos.aio import CosmosClient
 from azure.cosmos.aio._database import DatabaseProxy
 from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
     CosmosResourceExistsError,
     CosmosResourceNotFoundError,
 )
 
-from common.database.database_base import DatabaseBase
+from common.database.database_base import DatabaseBase, FileLogWriteError
+from common.database.document_cache import DocumentCache
 from common.logger.app_logger import AppLogger
 from common.models.api import (
     AgentType,
     BatchRecord,
+    BatchSummaryView,
     FileLog,
     FileRecord,
     LogType,
@@ -23,8 +33,38 @@ from common.models.api import (
 
 from semantic_kernel.contents import AuthorRole
 
+# Document fields that can be projected, kept to plain names as they are put in the query
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Cosmos DB system properties, set by the service on every write
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+class CosmosLayout(Enum):
+    """How the file and log containers are partitioned."""
+
+    # Files by file_id and logs by log_id, one logical partition per document
+    BY_ID = "by_id"
+    # Files by batch_id and logs by file_id, matching how they are read
+    BY_PARENT = "by_parent"
+
 
 class CosmosDBClient(DatabaseBase):
+    # File ids whose batch id is remembered, to address files in the by_parent layout
+    FILE_PARTITION_CACHE_SIZE = 10000
+    # Cosmos DB transactional batches are limited to 100 operations
+    MAX_BATCH_OPERATIONS = 100
+    # Concurrent requests used to write a batch of logs spanning several partitions
+    MAX_CONCURRENT_WRITES = 10
+    # Concurrent requests used to delete the logs and records of files
+    MAX_CONCURRENT_DELETES = 20
+    # Largest page returned by the paginated queries
+    MAX_PAGE_SIZE = 100
+    # Attempts of a conditional replace on a document other writers keep changing
+    MAX_CONFLICT_RETRIES = 5
+    # File ids matched by one query over the logs of many files
+    MAX_QUERY_FILE_IDS = 100
+
     def __init__(
         self,
         endpoint: str,
@@ -33,6 +73,7 @@ class CosmosDBClient(DatabaseBase):
         batch_container: str,
         file_container: str,
         log_container: str,
+        layout: str = CosmosLayout.BY_ID.value,
     ):
         self.endpoint = endpoint
         self.credential = credential
@@ -45,6 +86,84 @@ class CosmosDBClient(DatabaseBase):
         self.batch_container = None
         self.file_container = None
         self.log_container = None
+        self.layout = CosmosLayout(layout)
+        by_parent = self.layout == CosmosLayout.BY_PARENT
+        # Fields the file and log containers are partitioned on
+        self.file_partition_key = "batch_id" if by_parent else "file_id"
+        self.log_partition_key = "file_id" if by_parent else "log_id"
+        self._file_batches: OrderedDict[str, str] = OrderedDict()
+        # Recently read and written batch and file documents
+        self.batch_cache = DocumentCache("batch")
+        self.file_cache = DocumentCache("file")
+        self.summary_cache = DocumentCache("summary")
+        # Shared by all deletions, so bulk deletes of many files stay bounded
+        self._delete_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_DELETES)
+
+    def _remember_file(self, file: Dict) -> None:
+        """Remember the batch of a file, so it can be addressed in its partition."""
+        if self.layout != CosmosLayout.BY_PARENT or not file or not file.get("batch_id"):
+            return
+        self._file_batches[str(file["file_id"])] = str(file["batch_id"])
+        self._file_batches.move_to_end(str(file["file_id"]))
+        while len(self._file_batches) > self.FILE_PARTITION_CACHE_SIZE:
+            self._file_batches.popitem(last=False)
+
+    async def _file_partition(self, file_id: str) -> Optional[str]:
+        """Get the partition key value of a file document."""
+        file_id = str(file_id)
+        if self.layout == CosmosLayout.BY_ID:
+            return file_id
+        if file_id not in self._file_batches:
+            await self.get_file(file_id)
+        return self._file_batches.get(file_id)
+
+    def _log_partition(self, file_id: str) -> Dict:
+        """Partition arguments for querying the logs of a file."""
+        if self.layout == CosmosLayout.BY_PARENT:
+            return {"partition_key": str(file_id)}
+        return {}
+
+    async def _cached(
+        self, cache: DocumentCache, container, key: str, partition_key: Optional[str]
+    ) -> Tuple[Optional[Dict], bool]:
+        """Get a document from a cache, revalidating it by ETag once stale.
+
+        Returns:
+            The document or None, and whether the cache answered for it.
+        """
+        document, fresh = cache.get(key)
+        if document is None or fresh:
+            return document, document is not None
+        if not document.get("_etag") or partition_key is None:
+            cache.invalidate(key)
+            return None, False
+        try:
+            # Returns no body when the document still has the cached ETag
+            current = await container.read_item(
+                item=key,
+                partition_key=partition_key,
+                etag=document["_etag"],
+                match_condition=MatchConditions.IfModified,
+            )
+        except CosmosResourceNotFoundError:
+            cache.invalidate(key)
+            return None, True
+        if isinstance(current, dict) and current:
+            cache.put(key, current)
+            return dict(current), True
+        cache.touch(key)
+        return document, True
+
+    @staticmethod
+    def _projection(fields: Optional[Sequence[str]], *required: str) -> str:
+        """SELECT list reading only the given fields, plus those the client relies on."""
+        if not fields:
+            return "*"
+        names = list(dict.fromkeys([*fields, *required]))
+        for name in names:
+            if not _FIELD_NAME.match(name):
+                raise ValueError(f"Invalid field name: {name}")
+        return ", ".join(f"c.{name}" for name in names)
 
     async def initialize_cosmos(self):
         try:
@@ -84,7 +203,8 @@ class CosmosDBClient(DatabaseBase):
                 status=ProcessStatus.READY_TO_PROCESS,
             )
             try:
-                await self.batch_container.create_item(body=batch.dict())
+                created = await self.batch_container.create_item(body=batch.dict())
+                self.batch_cache.put(str(batch_id), created)
                 return batch
             except CosmosResourceExistsError:
                 self.logger.info("Batch already exists, reading existing record", batch_id=str(batch_id))
@@ -133,26 +253,256 @@ class CosmosDBClient(DatabaseBase):
                 created_at=datetime.now(timezone.utc),
                 updated_at=datetime.now(timezone.utc),
             )
-            await self.file_container.create_item(body=file_record.dict())
-            return file_record
+            body = file_record.dict()
+            created = await self.file_container.create_item(body=body)
+            self.file_cache.put(str(file_id), created)
+            self._remember_file(body)
         except Exception as e:
             self.logger.error("Failed to add file", error=str(e))
             raise
+        await self._summarize(batch_id, [body])
+        return file_record
+
+    async def add_files(
+        self, batch_id: UUID, files: List[Tuple[UUID, str, str]]
+    ) -> List[FileRecord]:
+        """Add files, as one transactional batch per partition where possible.
+
+        Records are upserted, so adding the same files again after a partial
+        failure is harmless.
+        """
+        now = datetime.now(timezone.utc)
+        # Each file a microsecond apart, in the order given, so that pages of the
+        # batch's files ordered by created_at have no ties to carry over
+        file_records = [
+            FileRecord(
+                file_id=file_id,
+                batch_id=batch_id,
+                original_name=file_name,
+                blob_path=storage_path,
+                translated_path="",
+                status=ProcessStatus.READY_TO_PROCESS,
+                error_count=0,
+                syntax_count=0,
+                created_at=now + timedelta(microseconds=index),
+                updated_at=now,
+            )
+            for index, (file_id, file_name, storage_path) in enumerate(files)
+        ]
+        partitions: Dict[str, List[Dict]] = {}
+        for file_record in file_records:
+            body = file_record.dict()
+            partitions.setdefault(body[self.file_partition_key], []).append(body)
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_WRITES)
+
+        async def write(partition_key: str, bodies: List[Dict]) -> None:
+            async with semaphore:
+                if len(bodies) == 1:
+                    created = await self.file_container.upsert_item(body=bodies[0])
+                    self.file_cache.put(bodies[0]["file_id"], created)
+                    return
+                for start in range(0, len(bodies), self.MAX_BATCH_OPERATIONS):
+                    await self.file_container.execute_item_batch(
+                        batch_operations=[
+                            ("upsert", (body,))
+                            for body in bodies[start:start + self.MAX_BATCH_OPERATIONS]
+                        ],
+                        partition_key=partition_key,
+                    )
+
+        try:
+            await asyncio.gather(
+                *(write(key, bodies) for key, bodies in partitions.items())
+            )
+        except Exception as e:
+            self.logger.error("Failed to add files", count=len(files), error=str(e))
+            raise
+        bodies = [file_record.dict() for file_record in file_records]
+        for body in bodies:
+            self._remember_file(body)
+        await self._summarize(batch_id, bodies)
+        return file_records
+
+    async def _replace(
+        self,
+        cache: DocumentCache,
+        container,
+        key: str,
+        partition_key: str,
+        body: Dict,
+        etag: Optional[str] = None,
+        loaded: Optional[Dict] = None,
+    ) -> Dict:
+        """Replace a document, only if it is unchanged since it was read.
+
+        Without an ETag the document is replaced unconditionally. When another
+        writer changed it in between, the fields this update changes (those that
+        differ from the loaded fields) are applied to the current document and
+        the replace is tried again.
+        """
+        if not etag:
+            updated = await container.replace_item(item=key, body=body)
+            cache.put(key, updated)
+            return updated
+
+        changes = {k: v for k, v in body.items() if loaded is None or loaded.get(k) != v}
+        for attempt in range(1, self.MAX_CONFLICT_RETRIES + 1):
+            try:
+                updated = await container.replace_item(
+                    item=key,
+                    body=body,
+                    etag=etag,
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                cache.put(key, updated)
+                return updated
+            except CosmosAccessConditionFailedError:
+                cache.invalidate(key)
+                if attempt == self.MAX_CONFLICT_RETRIES:
+                    raise
+                self.logger.info(
+                    "Document changed during update, retrying", id=key, attempt=attempt
+                )
+                current = await container.read_item(item=key, partition_key=partition_key)
+                body = {k: v for k, v in current.items() if k not in SYSTEM_PROPERTIES}
+                body.update(changes)
+                etag = current.get("_etag")
+
+    @staticmethod
+    def _reloaded(record, updated) -> None:
+        """Point a record at the document version it was just written as."""
+        if isinstance(updated, dict):
+            record.etag = updated.get("_etag")
+            record.loaded = record.dict()
+
+    @staticmethod
+    def _patch_operations(
+        fields: Optional[Dict] = None, increments: Optional[Dict] = None
+    ) -> List[Dict]:
+        operations = [
+            {"op": "set", "path": f"/{name}", "value": value}
+            for name, value in (fields or {}).items()
+        ]
+        operations += [
+            {"op": "incr", "path": f"/{name}", "value": value}
+            for name, value in (increments or {}).items()
+            if value
+        ]
+        return operations
+
+    async def _patch(
+        self,
+        cache: DocumentCache,
+        container,
+        key: str,
+        partition_key: str,
+        operations: List[Dict],
+        etag: Optional[str] = None,
+    ) -> Dict:
+        """Apply patch operations to a document, if-match on the ETag when given."""
+        conditions = {}
+        if etag:
+            conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+        try:
+            patched = await container.patch_item(
+                item=key,
+                partition_key=partition_key,
+                patch_operations=operations,
+                **conditions,
+            )
+        except Exception:
+            cache.invalidate(key)
+            raise
+        cache.put(key, patched)
+        return patched
+
+    async def patch_batch(
+        self, batch_id: str, fields: Dict, etag: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Set fields of a batch in a single partial update.
+
+        Returns:
+            The updated batch document, or None if the batch does not exist.
+            With an ETag, raises CosmosAccessConditionFailedError if the batch
+            changed since that version.
+        """
+        batch_id = str(batch_id)
+        try:
+            return await self._patch(
+                self.batch_cache,
+                self.batch_container,
+                batch_id,
+                batch_id,
+                self._patch_operations(fields),
+                etag,
+            )
+        except CosmosResourceNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error("Failed to patch batch", batch_id=batch_id, error=str(e))
+            raise
+
+    async def patch_file(
+        self,
+        file_id: str,
+        fields: Optional[Dict] = None,
+        increments: Optional[Dict] = None,
+        etag: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Set and increment fields of a file in a single partial update.
+
+        Returns:
+            The updated file document, or None if the file does not exist.
+            With an ETag, raises CosmosAccessConditionFailedError if the file
+            changed since that version.
+        """
+        file_id = str(file_id)
+        try:
+            partition_key = await self._file_partition(file_id)
+            if partition_key is None:
+                return None
+            patched = await self._patch(
+                self.file_cache,
+                self.file_container,
+                file_id,
+                partition_key,
+                self._patch_operations(fields, increments),
+                etag,
+            )
+        except CosmosResourceNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error("Failed to patch file", file_id=file_id, error=str(e))
+            raise
+        await self._summarize_files([patched])
+        return patched
 
     async def update_file(self, file_record: FileRecord) -> FileRecord:
         try:
-            await self.file_container.replace_item(
-                item=str(file_record.file_id), body=file_record.dict()
+            updated = await self._replace(
+                self.file_cache,
+                self.file_container,
+                str(file_record.file_id),
+                str(getattr(file_record, self.file_partition_key)),
+                file_record.dict(),
+                file_record.etag,
+                file_record.loaded,
             )
-            return file_record
+            self._reloaded(file_record, updated)
         except Exception as e:
             self.logger.error("Failed to update file", error=str(e))
             raise
+        await self._summarize_files([updated])
+        return file_record
 
     async def update_batch(self, batch_record: BatchRecord) -> BatchRecord:
         """
         Asynchronously updates a batch record in the database.
 
+        A record read from the database is only written over the version it was
+        read from; concurrent changes to other fields are kept.
+
         Args:
             batch_record (BatchRecord): The batch record to be updated.
 
@@ -163,9 +513,16 @@ class CosmosDBClient(DatabaseBase):
             Exception: If the update operation fails.
         """
         try:
-            await self.batch_container.replace_item(
-                item=str(batch_record.batch_id), body=batch_record.dict()
+            updated = await self._replace(
+                self.batch_cache,
+                self.batch_container,
+                str(batch_record.batch_id),
+                str(batch_record.batch_id),
+                batch_record.dict(),
+                batch_record.etag,
+                batch_record.loaded,
             )
+            self._reloaded(batch_record, updated)
             return batch_record
         except Exception as e:
             self.logger.error("Failed to update batch", error=str(e))
@@ -173,8 +530,17 @@ class CosmosDBClient(DatabaseBase):
 
     async def get_batch(self, user_id: str, batch_id: str) -> Optional[Dict]:
         try:
+            batch, cached = await self._cached(
+                self.batch_cache, self.batch_container, str(batch_id), str(batch_id)
+            )
+            if cached:
+                # A batch soft deleted by expire_batch is no longer shown
+                if batch and batch.get("user_id") == user_id and "deleted_at" not in batch:
+                    return batch
+                return None
             query = (
-                "SELECT * FROM c WHERE c.batch_id = @batch_id and c.user_id = @user_id"
+                "SELECT * FROM c WHERE c.batch_id = @batch_id and c.user_id = @user_id "
+                "and NOT IS_DEFINED(c.deleted_at)"
             )
             params = [
                 {"name": "@batch_id", "value": batch_id},
@@ -186,39 +552,81 @@ class CosmosDBClient(DatabaseBase):
             ):
                 batch = item
 
+            self.batch_cache.put(str(batch_id), batch)
             return batch
         except Exception as e:
             self.logger.error("Failed to get batch", error=str(e))
             raise
 
-    async def get_file(self, file_id: str) -> Optional[Dict]:
+    async def get_file(
+        self, file_id: str, fields: Optional[Sequence[str]] = None
+    ) -> Optional[Dict]:
         try:
-            query = "SELECT * FROM c WHERE c.file_id = @file_id "
+            file_entry, cached = await self._cached(
+                self.file_cache,
+                self.file_container,
+                str(file_id),
+                str(file_id)
+                if self.layout == CosmosLayout.BY_ID
+                else self._file_batches.get(str(file_id)),
+            )
+            if cached:
+                if file_entry and fields:
+                    file_entry = {
+                        name: file_entry.get(name)
+                        for name in (*fields, "file_id", "batch_id")
+                    }
+                return file_entry
+
+            select = self._projection(fields, "file_id", "batch_id")
+            query = f"SELECT {select} FROM c WHERE c.file_id = @file_id "
             params = [{"name": "@file_id", "value": file_id}]
+            if self.layout == CosmosLayout.BY_ID:
+                partition = {"partition_key": file_id}
+            elif str(file_id) in self._file_batches:
+                partition = {"partition_key": self._file_batches[str(file_id)]}
+            else:
+                # Unknown batch, look the file up across partitions
+                partition = {}
             file_entry = None
             async for item in self.file_container.query_items(
-                query=query, parameters=params, partition_key=file_id
+                query=query, parameters=params, **partition
             ):
                 file_entry = item
+            self._remember_file(file_entry)
+            if not fields:
+                self.file_cache.put(str(file_id), file_entry)
             return file_entry
         except Exception as e:
             self.logger.error("Failed to get file", error=str(e))
             raise
 
-    async def get_batch_files(self, batch_id: str) -> List[Dict]:
+    async def get_batch_files(
+        self, batch_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
         try:
+            select = self._projection(fields, "file_id", "batch_id")
             query = (
-                "SELECT * FROM c WHERE c.batch_id = @batch_id ORDER BY c.created_at ASC"
+                f"SELECT {select} FROM c WHERE c.batch_id = @batch_id ORDER BY c.created_at ASC"
             )
             params = [
                 {"name": "@batch_id", "value": batch_id},
             ]
+            # Files of a batch share a partition in the by_parent layout
+            partition = (
+                {"partition_key": batch_id}
+                if self.layout == CosmosLayout.BY_PARENT
+                else {}
+            )
             files = []  # Store all files
             async for item in self.file_container.query_items(
-                query=query, parameters=params
+                query=query, parameters=params, **partition
             ):
 
                 files.append(item)  # Append each file to the list
+                self._remember_file(item)
+                if not fields:
+                    self.file_cache.put(item["file_id"], item)
 
             return files
         except Exception as e:
@@ -228,8 +636,14 @@ class CosmosDBClient(DatabaseBase):
     async def get_batch_from_id(self, batch_id: str) -> Dict:
         """Retrieve a batch from the database using the batch ID."""
         try:
-            query = "SELECT * FROM c WHERE c.batch_id = @batch_id"
-            params = [{"name": "@batch_id", "value": batch_id}]
+            batch, cached = await self._cached(
+                self.batch_cache, self.batch_container, str(batch_id), str(batch_id)
+            )
+            if cached:
+                return batch
+            # By id, as the summary of the batch shares its partition
+            query = "SELECT * FROM c WHERE c.id = @batch_id"
+            params = [{"name": "@batch_id", "value": str(batch_id)}]
 
             batch = None  # Store the batch
             async for item in self.batch_container.query_items(
@@ -237,15 +651,145 @@ class CosmosDBClient(DatabaseBase):
             ):
                 batch = item  # Assign the batch to the variable
 
+            self.batch_cache.put(str(batch_id), batch)
             return batch  # Return the batch
         except Exception as e:
             self.logger.error("Failed to get batch from ID", error=str(e))
             raise
 
-    async def get_user_batches(self, user_id: str) -> Dict:
+    async def _read_summary(self, batch_id: str) -> Optional[Dict]:
+        """Point read the summary document of a batch; None if it does not exist."""
+        key = BatchSummaryView.document_id(batch_id)
+        summary, cached = await self._cached(
+            self.summary_cache, self.batch_container, key, batch_id
+        )
+        if cached:
+            return summary
+        try:
+            summary = await self.batch_container.read_item(item=key, partition_key=batch_id)
+        except CosmosResourceNotFoundError:
+            return None
+        self.summary_cache.put(key, summary)
+        return summary
+
+    async def _build_summary(self, batch_id: str) -> Optional[Dict]:
+        """Create the summary document of a batch from its files.
+
+        Returns:
+            The summary, or None if the batch does not exist. Raises
+            CosmosResourceExistsError if another writer created it first.
+        """
+        if not await self.get_batch_from_id(batch_id):
+            return None
+        files = await self.get_batch_files(batch_id, fields=BatchSummaryView.FIELDS)
+        created = await self.batch_container.create_item(
+            body=BatchSummaryView.apply(None, batch_id, files)
+        )
+        self.summary_cache.put(BatchSummaryView.document_id(batch_id), created)
+        return created
+
+    async def _summarize(
+        self, batch_id: str, files: Sequence[Dict] = (), removed: Sequence[str] = ()
+    ) -> None:
+        """Apply changed and removed files to the summary document of their batch.
+
+        The summary is replaced only if unchanged since it was read, and applied
+        again to the current version on a conflict; a missing summary is built
+        from the batch's files, which already hold the change. A failure is
+        logged rather than raised, as the files are already written, and the
+        summary is dropped so that the next read rebuilds it.
+        """
+        batch_id = str(batch_id)
+        key = BatchSummaryView.document_id(batch_id)
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            for attempt in range(1, self.MAX_CONFLICT_RETRIES + 1):
+                summary = await self._read_summary(batch_id)
+                try:
+                    if summary is None:
+                        await self._build_summary(batch_id)
+                        return
+                    body = {k: v for k, v in summary.items() if k not in SYSTEM_PROPERTIES}
+                    updated = await self.batch_container.replace_item(
+                        item=key,
+                        body=BatchSummaryView.apply(body, batch_id, files, removed, now),
+                        etag=summary.get("_etag"),
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+                    self.summary_cache.put(key, updated)
+                    return
+                except (
+                    CosmosAccessConditionFailedError,
+                    CosmosResourceExistsError,
+                    CosmosResourceNotFoundError,
+                ):
+                    self.summary_cache.invalidate(key)
+                    if attempt == self.MAX_CONFLICT_RETRIES:
+                        raise
+                    self.logger.info(
+                        "Batch summary changed during update, retrying",
+                        batch_id=batch_id,
+                        attempt=attempt,
+                    )
+        except Exception as e:
+            self.logger.warning(
+                "Failed to update batch summary, dropping it", batch_id=batch_id, error=str(e)
+            )
+            try:
+                await self._delete_summary(batch_id)
+            except Exception as e:
+                self.logger.error(
+                    "Failed to drop batch summary", batch_id=batch_id, error=str(e)
+                )
+
+    async def _summarize_files(self, files: Iterable[Optional[Dict]]) -> None:
+        """Apply changed file documents to the summaries of their batches."""
+        batches: Dict[str, List[Dict]] = {}
+        for file in files:
+            if isinstance(file, dict) and file.get("batch_id"):
+                batches.setdefault(str(file["batch_id"]), []).append(file)
+        for batch_id, changed in batches.items():
+            await self._summarize(batch_id, changed)
+
+    async def _delete_summary(self, batch_id: str) -> None:
+        key = BatchSummaryView.document_id(batch_id)
+        self.summary_cache.invalidate(key)
+        try:
+            await self.batch_container.delete_item(key, partition_key=str(batch_id))
+        except CosmosResourceNotFoundError:
+            pass
+
+    async def get_batch_summary(self, batch_id: str) -> Optional[Dict]:
+        """Retrieve the summary document of a batch with a point read.
+
+        A summary missing, for a batch created before summaries were kept or
+        dropped after a failed update, is built from the batch's files.
+
+        Returns:
+            The summary, or None if the batch does not exist.
+        """
+        batch_id = str(batch_id)
+        try:
+            summary = await self._read_summary(batch_id)
+            if summary is None:
+                try:
+                    summary = await self._build_summary(batch_id)
+                except CosmosResourceExistsError:
+                    summary = await self._read_summary(batch_id)
+            return summary
+        except Exception as e:
+            self.logger.error("Failed to get batch summary", batch_id=batch_id, error=str(e))
+            raise
+
+    async def get_user_batches(
+        self, user_id: str, fields: Optional[Sequence[str]] = None
+    ) -> Dict:
         """Retrieve all batches for a given user."""
         try:
-            query = "SELECT * FROM c WHERE c.user_id = @user_id"
+            query = (
+                f"SELECT {self._projection(fields)} FROM c "
+                "WHERE c.user_id = @user_id and NOT IS_DEFINED(c.deleted_at)"
+            )
             params = [{"name": "@user_id", "value": user_id}]
 
             batches = []  # Store all batches
@@ -259,17 +803,20 @@ class CosmosDBClient(DatabaseBase):
             self.logger.error("Failed to get user batches", error=str(e))
             raise
 
-    async def get_file_logs(self, file_id: str) -> List[Dict]:
-        """Retrieve all logs for a given file."""
+    async def get_file_logs(
+        self, file_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        """Retrieve all logs for a given file, or the given fields of each."""
         try:
             query = (
-                "SELECT * FROM c WHERE c.file_id = @file_id ORDER BY c.timestamp DESC"
+                f"SELECT {self._projection(fields)} FROM c "
+                "WHERE c.file_id = @file_id ORDER BY c.timestamp DESC"
             )
             params = [{"name": "@file_id", "value": file_id}]
 
             logs = []  # Store all logs
             async for item in self.log_container.query_items(
-                query=query, parameters=params
+                query=query, parameters=params, **self._log_partition(file_id)
             ):
                 logs.append(item)  # Append each log entry to the list
 
@@ -278,6 +825,68 @@ class CosmosDBClient(DatabaseBase):
             self.logger.error("Failed to get file logs", error=str(e))
             raise
 
+    async def get_files_logs(
+        self, file_ids: Sequence[str], fields: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Retrieve the logs of many files, newest first, grouped by file id.
+
+        Each query matches up to MAX_QUERY_FILE_IDS files, and the queries run
+        concurrently, rather than one query per file.
+        """
+        file_ids = list(dict.fromkeys(str(file_id) for file_id in file_ids))
+        query = (
+            f"SELECT {self._projection(fields, 'file_id')} FROM c "
+            "WHERE ARRAY_CONTAINS(@file_ids, c.file_id) ORDER BY c.timestamp DESC"
+        )
+
+        async def read(chunk: List[str]) -> List[Dict]:
+            return [
+                item
+                async for item in self.log_container.query_items(
+                    query=query, parameters=[{"name": "@file_ids", "value": chunk}]
+                )
+            ]
+
+        try:
+            chunks = await asyncio.gather(
+                *(
+                    read(file_ids[start:start + self.MAX_QUERY_FILE_IDS])
+                    for start in range(0, len(file_ids), self.MAX_QUERY_FILE_IDS)
+                )
+            )
+        except Exception as e:
+            self.logger.error("Failed to get logs of files", count=len(file_ids), error=str(e))
+            raise
+        logs: Dict[str, List[Dict]] = {file_id: [] for file_id in file_ids}
+        for items in chunks:
+            for item in items:
+                logs[item["file_id"]].append(item)
+        return logs
+
+    async def get_final_candidate(self, file_id: str) -> Optional[Dict]:
+        """Read the candidate, or its reference, of the newest successful agents log of a file."""
+        query = (
+            "SELECT TOP 1 c.last_candidate, c.candidate_hash FROM c "
+            "WHERE c.file_id = @file_id AND c.log_type = @log_type "
+            "AND c.agent_type = @agent_type "
+            "AND (c.last_candidate != '' OR IS_STRING(c.candidate_hash)) "
+            "ORDER BY c.timestamp DESC"
+        )
+        params = [
+            {"name": "@file_id", "value": file_id},
+            {"name": "@log_type", "value": LogType.SUCCESS.value},
+            {"name": "@agent_type", "value": AgentType.ALL.value},
+        ]
+        try:
+            async for candidate in self.log_container.query_items(
+                query=query, parameters=params, **self._log_partition(file_id)
+            ):
+                return candidate
+            return None
+        except Exception as e:
+            self.logger.error("Failed to get final candidate", file_id=file_id, error=str(e))
+            raise
+
     async def delete_all(self, user_id: str) -> None:
         try:
             await self.batch_container.delete_item(user_id, partition_key=user_id)
@@ -287,17 +896,63 @@ class CosmosDBClient(DatabaseBase):
             self.logger.error("Failed to delete all user data", error=str(e))
             raise
 
+    async def _delete_items(self, container, items: Iterable[Tuple[str, str]]) -> None:
+        """Delete documents given as (id, partition key) pairs.
+
+        Documents sharing a partition are deleted in transactional batches, the
+        others one request each, with at most MAX_CONCURRENT_DELETES requests in
+        flight. Documents already gone are skipped.
+        """
+        semaphore = self._delete_semaphore
+        partitions: Dict[str, List[str]] = {}
+        for item_id, partition_key in items:
+            partitions.setdefault(partition_key, []).append(item_id)
+
+        async def delete_one(item_id: str, partition_key: str) -> None:
+            try:
+                await container.delete_item(item_id, partition_key=partition_key)
+            except CosmosResourceNotFoundError:
+                pass
+
+        async def delete_chunk(partition_key: str, item_ids: List[str]) -> None:
+            async with semaphore:
+                if len(item_ids) == 1:
+                    await delete_one(item_ids[0], partition_key)
+                    return
+                try:
+                    await container.execute_item_batch(
+                        batch_operations=[("delete", (item_id,)) for item_id in item_ids],
+                        partition_key=partition_key,
+                    )
+                    return
+                except CosmosBatchOperationError:
+                    # A batch fails as a whole when one of its documents is gone
+                    pass
+            for item_id in item_ids:
+                async with semaphore:
+                    await delete_one(item_id, partition_key)
+
+        await asyncio.gather(
+            *(
+                delete_chunk(partition_key, item_ids[start:start + self.MAX_BATCH_OPERATIONS])
+                for partition_key, item_ids in partitions.items()
+                for start in range(0, len(item_ids), self.MAX_BATCH_OPERATIONS)
+            )
+        )
+
     async def delete_logs(self, file_id: str) -> None:
         try:
             query = "SELECT c.id FROM c WHERE c.file_id = @file_id"
             params = [{"name": "@file_id", "value": file_id}]
-            async for item in self.log_container.query_items(
-                query=query, parameters=params
-            ):
-                # Use the item's id as well as the file_id as partition key for deletion.
-                await self.log_container.delete_item(
-                    item["id"], partition_key=item["id"]
+            # Logs are partitioned by their own id, or by file_id in the by_parent layout
+            by_parent = self.layout == CosmosLayout.BY_PARENT
+            items = [
+                (item["id"], str(file_id) if by_parent else item["id"])
+                async for item in self.log_container.query_items(
+                    query=query, parameters=params, **self._log_partition(file_id)
                 )
+            ]
+            await self._delete_items(self.log_container, items)
         except Exception as e:
             self.logger.error("Failed to delete all user data", error=str(e))
             raise
@@ -306,7 +961,9 @@ class CosmosDBClient(DatabaseBase):
         try:
             # Deleting the batch from the batch container
             try:
+                self.batch_cache.invalidate(batch_id)
                 await self.batch_container.delete_item(batch_id, partition_key=batch_id)
+                await self._delete_summary(batch_id)
             except Exception as e:
                 self.logger.error(
                     f"Failed to delete batch with ID: {batch_id}", error=str(e)
@@ -318,19 +975,115 @@ class CosmosDBClient(DatabaseBase):
             raise
 
     async def delete_file(self, user_id: str, file_id: str) -> None:
-        """Delete all log entries and the file associated with the given file_id."""
+        """Delete all log entries and the file associated with the given file_id.
+
+        The file's row is removed from the summary of its batch. The bulk
+        delete_files leaves the summary alone, as it deletes the files of a
+        batch that is deleted with its summary.
+        """
+        file = await self.get_file(file_id, fields=("batch_id",))
+        await self.delete_files(user_id, [file_id])
+        if file:
+            await self._summarize(file["batch_id"], removed=[str(file_id)])
+
+    async def delete_files(
+        self,
+        user_id: str,
+        file_ids: Iterable[str],
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        """Delete the logs and records of many files with bounded concurrency.
+
+        Args:
+            user_id: The user the files belong to.
+            file_ids: The files to delete.
+            progress: Called with the number of files whose logs are deleted so
+                far and the total, as each file completes.
+        """
+        file_ids = [str(file_id) for file_id in file_ids]
+        done = 0
+        # Bounds the files looked up and queried for logs at the same time; the
+        # deletes themselves share _delete_semaphore
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_DELETES)
         try:
-            await self.delete_logs(file_id)
-            # Now delete the file entry
-            await self.file_container.delete_item(file_id, partition_key=file_id)
-            # self.logger.info(f"Successfully deleted file with ID {file_id}")
+
+            async def delete_file_logs(file_id: str) -> Optional[str]:
+                nonlocal done
+                async with semaphore:
+                    partition_key = await self._file_partition(file_id)
+                    await self.delete_logs(file_id)
+                done += 1
+                if progress:
+                    progress(done, len(file_ids))
+                return partition_key
+
+            partition_keys = await asyncio.gather(
+                *(delete_file_logs(file_id) for file_id in file_ids)
+            )
+            # Files of a batch share a partition in the by_parent layout
+            await self._delete_items(
+                self.file_container,
+                [
+                    (file_id, partition_key)
+                    for file_id, partition_key in zip(file_ids, partition_keys)
+                    if partition_key is not None
+                ],
+            )
+            for file_id in file_ids:
+                self._file_batches.pop(file_id, None)
+                self.file_cache.invalidate(file_id)
 
         except Exception as e:
             self.logger.error(
-                f"Failed to delete file and logs for file_id {file_id}: {str(e)}"
+                f"Failed to delete file and logs for file_id {', '.join(file_ids)}: {str(e)}"
             )
             raise
 
+    async def expire_batch(self, user_id: str, batch_id: str, ttl: int) -> None:
+        """Set a time to live on a batch record so Cosmos DB removes it.
+
+        The record is removed once the TTL elapses, if time to live is enabled
+        on the batch container; Cosmos DB reclaims it in the background. The
+        record is marked deleted_at, which hides it from the user's batches and
+        history at once, and lets get_deleted_batches find it until then.
+        """
+        try:
+            self.batch_cache.invalidate(batch_id)
+            await self.batch_container.patch_item(
+                item=str(batch_id),
+                partition_key=str(batch_id),
+                patch_operations=[
+                    {"op": "set", "path": "/ttl", "value": ttl},
+                    {"op": "set", "path": "/deleted_at", "value": datetime.utcnow().isoformat()},
+                ],
+            )
+        except Exception as e:
+            self.logger.error("Failed to expire batch", batch_id=batch_id, error=str(e))
+            raise
+        key = BatchSummaryView.document_id(batch_id)
+        self.summary_cache.invalidate(key)
+        try:
+            await self.batch_container.patch_item(
+                item=key,
+                partition_key=str(batch_id),
+                patch_operations=[{"op": "set", "path": "/ttl", "value": ttl}],
+            )
+        except CosmosResourceNotFoundError:
+            pass
+
+    async def get_deleted_batches(self) -> List[Dict]:
+        """Batches marked deleted by expire_batch that have not expired yet."""
+        try:
+            return [
+                batch
+                async for batch in self.batch_container.query_items(
+                    query="SELECT * FROM c WHERE IS_DEFINED(c.deleted_at)"
+                )
+            ]
+        except Exception as e:
+            self.logger.error("Failed to get deleted batches", error=str(e))
+            raise
+
     async def add_file_log(
         self,
         file_id: UUID,
@@ -339,6 +1092,7 @@ class CosmosDBClient(DatabaseBase):
         log_type: LogType,
         agent_type: AgentType,
         author_role: AuthorRole,
+        candidate_hash: Optional[str] = None,
     ) -> None:
         """Log a file status update."""
         try:
@@ -352,17 +1106,156 @@ class CosmosDBClient(DatabaseBase):
                 last_candidate=last_candidate,
                 author_role=author_role,
                 timestamp=datetime.now(timezone.utc),
+                candidate_hash=candidate_hash,
             )
             await self.log_container.create_item(body=log_entry.dict())
         except Exception as e:
             self.logger.error("Failed to log file status", error=str(e))
             raise
+        await self._increment_file_counts(self._count_increments([log_entry]))
+
+    async def add_file_logs(self, logs: List[FileLog]) -> None:
+        """Write log entries, as one transactional batch per partition where possible.
+
+        Entries are upserted, so writing them again after a failure is harmless.
+        The file counters are incremented only for the entries written, and if
+        some were not, FileLogWriteError gives them for a retry.
+        """
+        partitions: Dict[str, List[Tuple[FileLog, Dict]]] = {}
+        for log in logs:
+            body = log.dict()
+            partitions.setdefault(body[self.log_partition_key], []).append((log, body))
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_WRITES)
+        written: List[FileLog] = []
+        errors: List[Exception] = []
+
+        async def write(partition_key: str, entries: List[Tuple[FileLog, Dict]]) -> None:
+            async with semaphore:
+                try:
+                    if len(entries) == 1:
+                        await self.log_container.upsert_item(body=entries[0][1])
+                        written.append(entries[0][0])
+                        return
+                    for start in range(0, len(entries), self.MAX_BATCH_OPERATIONS):
+                        chunk = entries[start:start + self.MAX_BATCH_OPERATIONS]
+                        await self.log_container.execute_item_batch(
+                            batch_operations=[("upsert", (body,)) for _, body in chunk],
+                            partition_key=partition_key,
+                        )
+                        written.extend(log for log, _ in chunk)
+                except Exception as e:
+                    errors.append(e)
+
+        await asyncio.gather(
+            *(write(key, entries) for key, entries in partitions.items())
+        )
+        await self._increment_file_counts(self._count_increments(written))
+        if errors:
+            self.logger.error(
+                "Failed to write file logs", count=len(logs) - len(written), error=str(errors[0])
+            )
+            written_ids = {id(log) for log in written}
+            raise FileLogWriteError(
+                [log for log in logs if id(log) not in written_ids], errors[0]
+            ) from errors[0]
+
+    @staticmethod
+    def _count_increments(logs: List[FileLog]) -> Dict[str, Tuple[int, int]]:
+        """Sum the error and warning entries per file."""
+        increments: Dict[str, Tuple[int, int]] = {}
+        for log in logs:
+            if log.log_type not in (LogType.ERROR, LogType.WARNING):
+                continue
+            errors, warnings = increments.get(str(log.file_id), (0, 0))
+            if log.log_type == LogType.ERROR:
+                errors += 1
+            else:
+                warnings += 1
+            increments[str(log.file_id)] = (errors, warnings)
+        return increments
+
+    async def _increment_file_counts(self, increments: Dict[str, Tuple[int, int]]) -> None:
+        """Add to the error_count and syntax_count of files with a partial update.
+
+        A failed increment is logged rather than raised, as the log entries are
+        already written; the counters can be repaired with reconcile_counts.
+        """
+        patched: List[Dict] = []
+
+        async def increment(file_id: str, errors: int, warnings: int) -> None:
+            increments = {"error_count": errors, "syntax_count": warnings}
+            try:
+                partition_key = await self._file_partition(file_id)
+                if partition_key is None:
+                    raise CosmosResourceNotFoundError(message=f"File {file_id} not found")
+                file = await self._patch(
+                    self.file_cache,
+                    self.file_container,
+                    file_id,
+                    partition_key,
+                    self._patch_operations(increments=increments),
+                )
+                patched.append(file)
+            except CosmosResourceNotFoundError:
+                self.file_cache.invalidate(file_id)
+                self.logger.info("File not found for count update", file_id=file_id)
+            except Exception as e:
+                self.file_cache.invalidate(file_id)
+                self.logger.error("Failed to update file counts", file_id=file_id, error=str(e))
+
+        await asyncio.gather(
+            *(increment(file_id, *counts) for file_id, counts in increments.items())
+        )
+        await self._summarize_files(patched)
+
+    async def get_file_log_counts(self, file_id: str) -> Tuple[int, int]:
+        """Count the error and warning log entries of a file on the server."""
+        query = (
+            "SELECT VALUE COUNT(1) FROM c "
+            "WHERE c.file_id = @file_id AND c.log_type = @log_type"
+        )
+        counts = []
+        for log_type in (LogType.ERROR, LogType.WARNING):
+            params = [
+                {"name": "@file_id", "value": file_id},
+                {"name": "@log_type", "value": log_type.value},
+            ]
+            count = 0
+            async for value in self.log_container.query_items(
+                query=query, parameters=params, **self._log_partition(file_id)
+            ):
+                count += value
+            counts.append(count)
+        return counts[0], counts[1]
+
+    async def set_file_counts(self, file_id: str, error_count: int, syntax_count: int) -> None:
+        """Overwrite the error_count and syntax_count of a file."""
+        try:
+            self.file_cache.invalidate(file_id)
+            file = await self._patch(
+                self.file_cache,
+                self.file_container,
+                file_id,
+                await self._file_partition(file_id),
+                self._patch_operations(
+                    {"error_count": error_count, "syntax_count": syntax_count}
+                ),
+            )
+        except Exception as e:
+            self.logger.error("Failed to set file counts", file_id=file_id, error=str(e))
+            raise
+        await self._summarize_files([file])
 
     async def update_batch_entry(
         self, batch_id: str, user_id: str, status: ProcessStatus, file_count: int,
         existing_batch: Optional[Dict] = None
     ):
-        """Update batch status. If existing_batch is provided, skip the re-fetch."""
+        """Update batch status and file count with a partial update.
+
+        The batch is read first to check it belongs to the user, unless
+        existing_batch is provided.
+        """
         try:
             batch = existing_batch
             if batch is None:
@@ -370,22 +1263,24 @@ class CosmosDBClient(DatabaseBase):
             if not batch:
                 raise ValueError("Batch not found")
 
-            if isinstance(status, ProcessStatus):
-                batch["status"] = status.value
-            else:
-                batch["status"] = status
-
-            batch["updated_at"] = datetime.utcnow().isoformat()
-            batch["file_count"] = file_count
-
-            await self.batch_container.replace_item(item=batch_id, body=batch)
+            fields = {
+                "status": status.value if isinstance(status, ProcessStatus) else status,
+                "updated_at": datetime.utcnow().isoformat(),
+                "file_count": file_count,
+            }
+            updated = await self.patch_batch(batch_id, fields)
+            if updated is None:
+                raise ValueError("Batch not found")
 
-            return batch
+            return updated
         except Exception as e:
             self.logger.error("Failed to update batch entry", error=str(e))
             raise
 
     async def close(self) -> None:
+        self.batch_cache.log_stats()
+        self.file_cache.log_stats()
+        self.summary_cache.log_stats()
         if self.client:
             self.client.close()
             self.logger.info("Closed Cosmos DB connection")
@@ -399,6 +1294,7 @@ class CosmosDBClient(DatabaseBase):
         limit: Optional[int] = None,
         sort_order: str = "DESC",
         offset: int = 0,
+        fields: Optional[Sequence[str]] = None,
     ) -> List[Dict]:
         try:
             offset = int(offset)  # Ensure offset is an integer
@@ -407,9 +1303,10 @@ class CosmosDBClient(DatabaseBase):
 
         # Base query to fetch batch history for the user
         query = f"""
-            SELECT * FROM c
+            SELECT {self._projection(fields)} FROM c
             WHERE c.user_id = @user_id
             and c.status != 'ready_to_process'
+            and NOT IS_DEFINED(c.deleted_at)
             ORDER BY c.updated_at {sort_order}
         """
 
@@ -431,3 +1328,139 @@ class CosmosDBClient(DatabaseBase):
             batches.append(batch)
 
         return batches
+
+    @staticmethod
+    def _encode_cursor(boundary, seen: List[str]) -> str:
+        data = json.dumps({"b": boundary, "s": seen}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(continuation_token: str) -> Tuple[str, List[str]]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(continuation_token.encode()))
+            return data["b"], list(data["s"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid continuation token.")
+
+    async def _query_page(
+        self,
+        container,
+        where: str,
+        params: List[Dict],
+        order_by: str,
+        descending: bool,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        required: Sequence[str] = (),
+        **kwargs,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Read one page of a query ordered by a single field.
+
+        Pages are addressed by the order value of the last item returned and the
+        ids returned with that value, so each page reads from the index where the
+        previous one stopped instead of skipping rows, within one partition or
+        across partitions alike.
+
+        Returns:
+            The items of the page, and the token of the next page or None.
+        """
+        if not 1 <= page_size <= self.MAX_PAGE_SIZE:
+            raise ValueError(f"Page size must be between 1 and {self.MAX_PAGE_SIZE}.")
+
+        params = list(params)
+        seen: List[str] = []
+        if continuation_token:
+            boundary, seen = self._decode_cursor(continuation_token)
+            where += f" AND c.{order_by} {'<=' if descending else '>='} @boundary"
+            params.append({"name": "@boundary", "value": boundary})
+        # One extra item tells whether another page follows
+        params.append({"name": "@top", "value": page_size + len(seen) + 1})
+        select = self._projection(fields, "id", order_by, *required)
+        query = (
+            f"SELECT TOP @top {select} FROM c WHERE {where} "
+            f"ORDER BY c.{order_by} {'DESC' if descending else 'ASC'}"
+        )
+
+        items = []
+        async for item in container.query_items(query=query, parameters=params, **kwargs):
+            if item["id"] not in seen:
+                items.append(item)
+        page = items[:page_size]
+        if len(items) <= page_size:
+            return page, None
+
+        last = page[-1][order_by]
+        # Items sharing the last order value are returned again by the next query
+        if not continuation_token or last != boundary:
+            seen = []
+        seen += [item["id"] for item in page if item[order_by] == last]
+        return page, self._encode_cursor(last, seen)
+
+    async def get_batch_history_page(
+        self,
+        user_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        sort_order: str = "DESC",
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the batch history of a user."""
+        return await self._query_page(
+            self.batch_container,
+            "c.user_id = @user_id and c.status != 'ready_to_process' "
+            "and NOT IS_DEFINED(c.deleted_at)",
+            [{"name": "@user_id", "value": user_id}],
+            "updated_at",
+            sort_order == "DESC",
+            page_size,
+            continuation_token,
+            fields,
+        )
+
+    async def get_batch_files_page(
+        self,
+        batch_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the files of a batch, oldest first."""
+        partition = (
+            {"partition_key": batch_id} if self.layout == CosmosLayout.BY_PARENT else {}
+        )
+        files, token = await self._query_page(
+            self.file_container,
+            "c.batch_id = @batch_id",
+            [{"name": "@batch_id", "value": batch_id}],
+            "created_at",
+            False,
+            page_size,
+            continuation_token,
+            fields,
+            required=("file_id", "batch_id"),
+            **partition,
+        )
+        for file in files:
+            self._remember_file(file)
+        return files, token
+
+    async def get_file_logs_page(
+        self,
+        file_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the logs of a file, newest first."""
+        return await self._query_page(
+            self.log_container,
+            "c.file_id = @file_id",
+            [{"name": "@file_id", "value": file_id}],
+            "timestamp",
+            True,
+            page_size,
+            continuation_token,
+            fields,
+            **self._log_partition(file_id),
+        )
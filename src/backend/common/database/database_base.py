@@ -2,15 +2,27 @@
 
 import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from common.models.api import BatchRecord, FileRecord, LogType
+from common.models.api import BatchRecord, FileLog, FileRecord, LogType
 
 from semantic_kernel.contents import AuthorRole
 
 from sql_agents.helpers.models import AgentType
 
 
+class FileLogWriteError(Exception):
+    """Only some of the entries given to add_file_logs were written."""
+
+    def __init__(self, unwritten: List[FileLog], error: Exception):
+        super().__init__(unwritten, error)
+        self.unwritten = unwritten
+        self.error = error
+
+    def __str__(self) -> str:
+        return str(self.error)
+
+
 class DatabaseBase(ABC):
     """Abstract base class for database operations."""
 
@@ -29,23 +41,44 @@ class DatabaseBase(ABC):
         """Retrieve all logs for a file"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def get_files_logs(
+        self, file_ids: Sequence[str], fields: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Retrieve the logs of many files, newest first, grouped by file id"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def get_final_candidate(self, file_id: str) -> Optional[Dict]:
+        """Retrieve the last_candidate and candidate_hash of the final successful log of a file"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def get_batch_from_id(self, batch_id: str) -> Dict:
         """Retrieve all logs for a file"""
         pass  # pragma: no cover
 
     @abstractmethod
-    async def get_batch_files(self, batch_id: str) -> List[Dict]:
+    async def get_batch_files(
+        self, batch_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
         """Retrieve all files for a batch"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def get_batch_summary(self, batch_id: str) -> Optional[Dict]:
+        """Retrieve the summary document of a batch, or None if the batch does not exist"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def delete_file_logs(self, file_id: str) -> None:
         """Delete all logs for a file"""
         pass  # pragma: no cover
 
     @abstractmethod
-    async def get_user_batches(self, user_id: str) -> Dict:
+    async def get_user_batches(
+        self, user_id: str, fields: Optional[Sequence[str]] = None
+    ) -> Dict:
         """Retrieve all batches for a user"""
         pass  # pragma: no cover
 
@@ -56,6 +89,13 @@ class DatabaseBase(ABC):
         """Add a file entry to the database"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def add_files(
+        self, batch_id: uuid.UUID, files: List[Tuple[uuid.UUID, str, str]]
+    ) -> List[FileRecord]:
+        """Add file entries, given as (file_id, file_name, storage_path), in as few writes as possible"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def get_batch(self, user_id: str, batch_id: str) -> Optional[Dict]:
         """Retrieve a batch and its associated files"""
@@ -75,10 +115,26 @@ class DatabaseBase(ABC):
         log_type: LogType,
         agent_type: AgentType,
         author_role: AuthorRole,
+        candidate_hash: Optional[str] = None,
     ) -> None:
         """Log a file status update"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def add_file_logs(self, logs: List[FileLog]) -> None:
+        """Write a batch of file log entries, raising FileLogWriteError with those not written"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def get_file_log_counts(self, file_id: str) -> Tuple[int, int]:
+        """Count the error and warning logs of a file"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def set_file_counts(self, file_id: str, error_count: int, syntax_count: int) -> None:
+        """Overwrite the error and warning counters of a file"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def update_file(self, file_record: FileRecord) -> None:
         """Update file record"""
@@ -89,6 +145,24 @@ class DatabaseBase(ABC):
         """Update a batch record"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def patch_batch(
+        self, batch_id: str, fields: Dict, etag: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Set fields of a batch, if unchanged since the given ETag"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def patch_file(
+        self,
+        file_id: str,
+        fields: Optional[Dict] = None,
+        increments: Optional[Dict] = None,
+        etag: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Set and increment fields of a file, if unchanged since the given ETag"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def delete_all(self, user_id: str) -> None:
         """Delete all batches, files, and logs for a user"""
@@ -104,11 +178,47 @@ class DatabaseBase(ABC):
         """Delete a file and its logs, and update batch file count"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def delete_files(self, user_id: str, file_ids: List[str], progress=None) -> None:
+        """Delete many files and their logs"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def expire_batch(self, user_id: str, batch_id: str, ttl: int) -> None:
+        """Set a time to live on a batch so the database removes it"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def get_deleted_batches(self) -> List[Dict]:
+        """Retrieve the batches marked deleted by expire_batch that still exist"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def get_batch_history(self, user_id: str, batch_id: str) -> List[Dict]:
         """Retrieve all logs for a batch"""
         pass  # pragma: no cover
 
+    @abstractmethod
+    async def get_batch_history_page(
+        self, user_id: str, page_size: int, continuation_token: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve a page of a user's batch history and the token of the next page"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def get_batch_files_page(
+        self, batch_id: str, page_size: int, continuation_token: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve a page of the files of a batch and the token of the next page"""
+        pass  # pragma: no cover
+
+    @abstractmethod
+    async def get_file_logs_page(
+        self, file_id: str, page_size: int, continuation_token: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve a page of the logs of a file and the token of the next page"""
+        pass  # pragma: no cover
+
     @abstractmethod
     async def close(self) -> None:
         """Close database connection"""
@@ -4,11 +4,14 @@ from typing import Optional
 from common.config.config import Config
 from common.database.cosmosdb import CosmosDBClient
 from common.database.database_base import DatabaseBase
+from common.database.log_buffer import FileLogBuffer
+from common.database.sqlitedb import SQLiteDBClient
 from common.logger.app_logger import AppLogger
 
 
 class DatabaseFactory:
     _instance: Optional[DatabaseBase] = None
+    _log_buffer: Optional[FileLogBuffer] = None
     _lock: Optional[asyncio.Lock] = None
     _logger = AppLogger("DatabaseFactory")
 
@@ -30,6 +33,12 @@ class DatabaseFactory:
 
             config = Config()  # Create an instance of Config
 
+            if config.database_backend == "sqlite":
+                sqlite_client = SQLiteDBClient(config.sqlite_database_path)
+                await sqlite_client.initialize_cosmos()
+                DatabaseFactory._instance = sqlite_client
+                return sqlite_client
+
             cosmos_db_client = CosmosDBClient(
                 endpoint=config.cosmosdb_endpoint,
                 credential=config.get_azure_credentials(),
@@ -37,6 +46,7 @@ class DatabaseFactory:
                 batch_container=config.cosmosdb_batch_container,
                 file_container=config.cosmosdb_file_container,
                 log_container=config.cosmosdb_log_container,
+                layout=config.cosmosdb_layout,
             )
 
             await cosmos_db_client.initialize_cosmos()
@@ -44,6 +54,22 @@ class DatabaseFactory:
             DatabaseFactory._instance = cosmos_db_client
             return cosmos_db_client
 
+    @staticmethod
+    def get_log_buffer(database: DatabaseBase) -> FileLogBuffer:
+        """Get the log buffer shared by every user of the database."""
+        buffer = DatabaseFactory._log_buffer
+        if buffer is None or buffer.database is not database:
+            buffer = FileLogBuffer(database)
+            DatabaseFactory._log_buffer = buffer
+        return buffer
+
+    @staticmethod
+    async def close_log_buffer() -> None:
+        """Write out any buffered logs, on shutdown."""
+        if DatabaseFactory._log_buffer is not None:
+            await DatabaseFactory._log_buffer.close()
+            DatabaseFactory._log_buffer = None
+
 
 # Local testing of config and code
 # Note that you have to assign yourself data plane access to Cosmos in script for this to work locally.  See
@@ -0,0 +1,111 @@
+"""In-process cache of batch and file documents.
+
+Conversions read the same batch and file documents many times. The Cosmos DB
+client keeps recently read and written documents here, and serves them without
+a request while they are fresh. Once an entry is older than the time to live it
+is revalidated with a conditional read on its ETag, which returns no body when
+the document has not changed.
+
+Writes made through this client update its cache, but a change made by another
+instance is not seen until the entry goes stale: reads may be up to the time to
+live out of date. Keep the TTL short, or set it to 0 to revalidate every read.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from common.logger.app_logger import AppLogger
+
+# Documents kept per cache, 0 disables caching
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "1000"))
+# Seconds a cached document is served without revalidation, 0 revalidates every read
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", "2"))
+# Lookups between statistics messages
+STATS_INTERVAL = 1000
+
+
+class DocumentCache:
+    """LRU cache of documents by id, with a time to live and hit counters."""
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int = DOCUMENT_CACHE_SIZE,
+        ttl: float = DOCUMENT_CACHE_TTL,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.logger = AppLogger("DocumentCache")
+        # id -> (document, time it was stored or last validated)
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: str) -> Tuple[Optional[Dict], bool]:
+        """Look a document up.
+
+        Returns:
+            A copy of the cached document or None, and whether it is still fresh.
+            A stale document should be revalidated before use.
+        """
+        key = str(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count("misses")
+            return None, False
+        document, stored_at = entry
+        self._entries.move_to_end(key)
+        fresh = time.monotonic() - stored_at < self.ttl
+        self._count("hits" if fresh else "revalidations")
+        return dict(document), fresh
+
+    def put(self, key: str, document: Optional[Dict]) -> None:
+        """Store a document as read or written, replacing any older copy."""
+        if not self.enabled or not isinstance(document, dict):
+            return
+        key = str(key)
+        self._entries[key] = (dict(document), time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def touch(self, key: str) -> None:
+        """Mark a cached document as validated now."""
+        key = str(key)
+        if key in self._entries:
+            self._entries[key] = (self._entries[key][0], time.monotonic())
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(str(key), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters describing the cache."""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+        }
+
+    def _count(self, counter: str) -> None:
+        setattr(self, counter, getattr(self, counter) + 1)
+        if (self.hits + self.misses + self.revalidations) % STATS_INTERVAL == 0:
+            self.log_stats()
+
+    def log_stats(self) -> None:
+        self.logger.info("Document cache statistics", cache=self.name, **self.stats)
@@ -0,0 +1,246 @@
+"""Write-behind buffer for file logs.
+
+Agents produce a log entry per message, and awaiting a database insert for each
+one puts dozens of round trips on the critical path of every file. The buffer
+accepts entries without touching the database and writes them per file in
+batches, when a file has ``LOG_BUFFER_MAX_BATCH`` entries pending or every
+``LOG_BUFFER_FLUSH_INTERVAL`` seconds. Callers flush a file explicitly before
+reading its logs back and when it completes, and the buffer is flushed on shutdown.
+Once ``LOG_BUFFER_MAX_PENDING`` entries are waiting across all files, adding an
+entry waits for a flush, which bounds memory when the database falls behind.
+That flush is of the caller's own file first, and of every file only if the
+buffer is still full, so a file waits on the others only when it must. Entries
+of a file that fail to be written ``LOG_BUFFER_MAX_RETRIES`` times in a row are
+dropped and logged as dead letters, so a file the database keeps rejecting does
+not hold the buffer.
+With a candidate store set, large candidates are stored when their entries are
+written rather than when they are added, and the entries keep only the hash.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, TYPE_CHECKING
+from uuid import UUID, uuid4
+
+from common.database.database_base import DatabaseBase, FileLogWriteError
+from common.logger.app_logger import AppLogger
+from common.models.api import AgentType, FileLog, LogType
+
+from semantic_kernel.contents import AuthorRole
+
+if TYPE_CHECKING:
+    from common.storage.candidate_store import CandidateStore
+
+# Cosmos DB transactional batches are limited to 100 operations
+LOG_BUFFER_MAX_BATCH = int(os.getenv("LOG_BUFFER_MAX_BATCH", "100"))
+LOG_BUFFER_FLUSH_INTERVAL = float(os.getenv("LOG_BUFFER_FLUSH_INTERVAL", "1.0"))
+LOG_BUFFER_MAX_PENDING = int(os.getenv("LOG_BUFFER_MAX_PENDING", "1000"))
+LOG_BUFFER_MAX_RETRIES = int(os.getenv("LOG_BUFFER_MAX_RETRIES", "10"))
+
+
+class FileLogBuffer:
+    """Buffers file log entries and writes them to the database in batches."""
+
+    def __init__(
+        self,
+        database: DatabaseBase,
+        max_batch_size: int = LOG_BUFFER_MAX_BATCH,
+        flush_interval: float = LOG_BUFFER_FLUSH_INTERVAL,
+        max_pending: int = LOG_BUFFER_MAX_PENDING,
+        max_retries: int = LOG_BUFFER_MAX_RETRIES,
+    ):
+        self.database = database
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        # Set by the callers that log large candidates, see _store_candidates
+        self.candidate_store: Optional["CandidateStore"] = None
+        self.logger = AppLogger("FileLogBuffer")
+        self._pending: Dict[str, List[FileLog]] = {}
+        self._pending_count = 0
+        self._dropped_count = 0
+        # Consecutive failed writes per file
+        self._failures: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._timer: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        """Number of entries not yet written to the database."""
+        return self._pending_count
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of entries dropped after repeated write failures."""
+        return self._dropped_count
+
+    async def add(
+        self,
+        file_id: str,
+        description: str,
+        last_candidate: str,
+        log_type: LogType,
+        agent_type: AgentType,
+        author_role: AuthorRole,
+        candidate_hash: Optional[str] = None,
+    ) -> None:
+        """Queue a log entry, waiting only when the buffer is full.
+
+        A full buffer flushes the entries of this file first, then those of every
+        file if the buffer is still full; a failure to write them is logged and
+        the entries stay queued for a retry.
+        """
+        if self._pending_count >= self.max_pending:
+            self.logger.warning(
+                "Log buffer full, flushing", file_id=str(file_id), pending=self._pending_count
+            )
+            try:
+                if self._pending.get(str(file_id)):
+                    await self.flush(file_id)
+                if self._pending_count >= self.max_pending:
+                    await self.flush_all()
+            except Exception:  # noqa: BLE001
+                # Logged by _write; the entries stay queued or were dead lettered
+                pass
+
+        entries = self._pending.setdefault(str(file_id), [])
+        entries.append(
+            FileLog(
+                log_id=uuid4(),
+                file_id=UUID(str(file_id)),
+                description=description,
+                last_candidate=last_candidate,
+                log_type=log_type,
+                agent_type=agent_type,
+                author_role=author_role,
+                timestamp=datetime.now(timezone.utc),
+                candidate_hash=candidate_hash,
+            )
+        )
+        self._pending_count += 1
+
+        if len(entries) >= self.max_batch_size:
+            self._flush_in_background(str(file_id))
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def flush(self, file_id: str) -> None:
+        """Write every entry queued for the file, including ones being written."""
+        file_id = str(file_id)
+        lock = self._locks.setdefault(file_id, asyncio.Lock())
+        self._lock_users[file_id] = self._lock_users.get(file_id, 0) + 1
+        try:
+            async with lock:
+                while self._pending.get(file_id):
+                    entries = self._pending[file_id]
+                    self._pending[file_id] = entries[self.max_batch_size:]
+                    await self._write(file_id, entries[: self.max_batch_size])
+                self._pending.pop(file_id, None)
+        finally:
+            self._lock_users[file_id] -= 1
+            if not self._lock_users[file_id]:
+                del self._lock_users[file_id]
+                del self._locks[file_id]
+
+    async def flush_all(self) -> None:
+        """Write every queued entry."""
+        results = await asyncio.gather(
+            *(self.flush(file_id) for file_id in list(self._pending)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def _write(self, file_id: str, entries: List[FileLog]) -> None:
+        self._pending_count -= len(entries)
+        try:
+            await self._store_candidates(entries)
+            await self.database.add_file_logs(entries)
+        except Exception as e:
+            if isinstance(e, FileLogWriteError):
+                entries = e.unwritten
+            failures = self._failures.get(file_id, 0) + 1
+            if failures >= self.max_retries:
+                self._dead_letter(file_id, entries, e)
+            else:
+                # Keep the entries not written, ahead of any added since, for the next flush
+                self._failures[file_id] = failures
+                self._pending[file_id] = entries + self._pending.get(file_id, [])
+                self._pending_count += len(entries)
+                self.logger.error(
+                    "Failed to write file logs", file_id=file_id, attempt=failures, error=str(e)
+                )
+            raise
+        self._failures.pop(file_id, None)
+
+    async def _store_candidates(self, entries: List[FileLog]) -> None:
+        """Replace the large candidates of entries by their hash in the candidate store.
+
+        A candidate the store does not take stays in its entry.
+        """
+        if self.candidate_store is None:
+            return
+        for entry in entries:
+            if not entry.last_candidate or entry.candidate_hash:
+                continue
+            candidate_hash = await self.candidate_store.put(str(entry.file_id), entry.last_candidate)
+            if candidate_hash:
+                entry.candidate_hash = candidate_hash
+                entry.last_candidate = ""
+
+    def _dead_letter(self, file_id: str, entries: List[FileLog], error: Exception) -> None:
+        """Drop entries that could not be written, logging them in their place."""
+        self._failures.pop(file_id, None)
+        self._dropped_count += len(entries)
+        self.logger.error(
+            "Dropped file logs after repeated write failures",
+            file_id=file_id,
+            count=len(entries),
+            attempts=self.max_retries,
+            error=str(error),
+        )
+        for entry in entries:
+            self.logger.error(
+                "Dead letter file log",
+                file_id=file_id,
+                log_id=str(entry.log_id),
+                log_type=entry.log_type.value,
+                timestamp=entry.timestamp.isoformat(),
+                description=entry.description,
+            )
+
+    def _flush_in_background(self, file_id: str) -> None:
+        task = asyncio.create_task(self.flush(file_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error("Background log flush failed", error=str(task.exception()))
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_all()
+            except Exception as e:
+                self.logger.error("Periodic log flush failed", error=str(e))
+
+    async def close(self) -> None:
+        """Stop the periodic flush and write everything still queued."""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush_all()
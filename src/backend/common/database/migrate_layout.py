@@ -0,0 +1,337 @@
+"""Copy the file and log containers into the by_parent partition layout.
+
+The partition key of a container cannot be changed, so moving to the by_parent
+layout (files by batch_id, logs by file_id) means copying into new containers.
+The copy runs while the application keeps writing to the old containers: every
+pass copies the documents changed since the previous pass, by their ``_ts``
+timestamp, until a pass finds nothing new. A document is only written when its
+target copy is missing or not newer than the source, so a run never overwrites
+what the application has written to the new containers since it switched.
+
+Verification then compares the document counts and ids of each source and
+target container both ways, and reports the ids missing from the target and
+those only in the target.
+
+    python -m common.database.migrate_layout <file_container> <log_container> [--create] [--prune] [--verify-only]
+
+The by_parent containers, cmsafilebybatch and cmsalogbyfile, are deployed by
+infra/modules/cosmosDb.bicep next to the by_id ones, with the partition keys and
+composite indexes of TARGET_CONTAINERS. ``--create`` creates them instead, for
+accounts deployed otherwise, which needs control plane rights on the account.
+
+A copy pass does not see deletes, so ``--prune`` deletes the target documents
+whose ids are no longer in the source. Prune only while the application still
+uses the old containers, as it would delete the documents the application writes
+to the new ones. To migrate a deployment:
+
+1. Run the tool with ``--prune`` until verification passes.
+2. Set AZURE_ENV_COSMOSDB_LAYOUT=by_parent and run ``azd provision``. The app
+   then uses the new containers, with COSMOSDB_LAYOUT=by_parent.
+3. Run the tool once more, without ``--prune``, to copy the writes made before
+   the app restarted. Documents the app has updated in the new containers since
+   are newer than their source and kept. Verification now lists the documents
+   the app has created since as only in the target.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.cosmos import PartitionKey
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from common.config.config import Config
+from common.database.cosmosdb import CosmosDBClient, CosmosLayout, SYSTEM_PROPERTIES
+from common.logger.app_logger import AppLogger
+
+logger = AppLogger("MigrateLayout")
+
+# Documents upserted at the same time
+MAX_CONCURRENT_WRITES = 20
+# Documents between progress messages
+PROGRESS_INTERVAL = 1000
+# Copy passes before giving up on catching up with a busy source
+MAX_PASSES = 10
+# Ids listed per container when verification finds missing or extra documents
+MAX_REPORTED_IDS = 20
+
+# Partition key path and composite indexes of each container in the by_parent
+# layout, as deployed by infra/modules/cosmosDb.bicep
+TARGET_CONTAINERS = {
+    "file": (
+        "/batch_id",
+        {
+            "compositeIndexes": [
+                [
+                    {"path": "/batch_id", "order": "ascending"},
+                    {"path": "/created_at", "order": "ascending"},
+                ]
+            ]
+        },
+    ),
+    "log": (
+        "/file_id",
+        {
+            "compositeIndexes": [
+                [
+                    {"path": "/file_id", "order": "ascending"},
+                    {"path": "/timestamp", "order": "descending"},
+                ]
+            ]
+        },
+    ),
+}
+
+
+async def create_target_container(database: Any, name: str, kind: str) -> Any:
+    """Create a container with the by_parent partition key and indexes of its kind."""
+    path, indexes = TARGET_CONTAINERS[kind]
+    indexing_policy = {"indexingMode": "consistent", "automatic": True, **indexes}
+    return await database.create_container_if_not_exists(
+        id=name, partition_key=PartitionKey(path=path), indexing_policy=indexing_policy
+    )
+
+
+async def copy_document(target: Any, document: Dict, field: str) -> bool:
+    """Write a source document to the target unless the target copy is newer.
+
+    The target copy is replaced only if it is unchanged since it was read, and
+    created only if it still does not exist, so a concurrent write by the
+    application always wins.
+
+    Returns:
+        Whether the document was written.
+    """
+    body = {k: v for k, v in document.items() if k not in SYSTEM_PROPERTIES}
+    try:
+        current = await target.read_item(body["id"], partition_key=body.get(field))
+    except CosmosResourceNotFoundError:
+        current = None
+    try:
+        if current is None:
+            await target.create_item(body=body)
+        elif current.get("_ts", 0) > document.get("_ts", 0):
+            return False
+        else:
+            await target.replace_item(
+                item=body["id"],
+                body=body,
+                etag=current.get("_etag"),
+                match_condition=MatchConditions.IfNotModified,
+            )
+    except (CosmosAccessConditionFailedError, CosmosResourceExistsError):
+        return False
+    return True
+
+
+async def copy_changes(
+    source: Any, target: Any, kind: str, since: int = 0
+) -> Tuple[int, int]:
+    """Copy the source documents changed at or after the given timestamp.
+
+    Returns:
+        The number of documents written and the newest timestamp seen.
+    """
+    query = "SELECT * FROM c WHERE c._ts >= @since"
+    params = [{"name": "@since", "value": since}]
+    field = TARGET_CONTAINERS[kind][0].lstrip("/")
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_WRITES)
+    copied = 0
+    newest = since
+
+    async def copy(document: Dict) -> None:
+        nonlocal copied
+        try:
+            written = await copy_document(target, document, field)
+        finally:
+            semaphore.release()
+        if not written:
+            return
+        copied += 1
+        if copied % PROGRESS_INTERVAL == 0:
+            logger.info("Copy progress", container=target.id, copied=copied)
+
+    tasks = []
+    async for document in source.query_items(query=query, parameters=params):
+        newest = max(newest, document.get("_ts", 0))
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(copy(document)))
+    await asyncio.gather(*tasks)
+    return copied, newest
+
+
+async def copy_container(
+    source: Any, target: Any, kind: str, max_passes: int = MAX_PASSES
+) -> int:
+    """Copy a container, repeating until a pass finds no new changes."""
+    since = 0
+    total = 0
+    for attempt in range(1, max_passes + 1):
+        copied, newest = await copy_changes(source, target, kind, since)
+        total += copied
+        logger.info(
+            "Copy pass complete",
+            container=target.id,
+            copy_pass=attempt,
+            copied=copied,
+            since=since,
+        )
+        # Each pass copies again the documents of the newest second, as _ts only has
+        # one second resolution, so the source is caught up when that is all it finds
+        if newest == since:
+            break
+        since = newest
+    else:
+        logger.warning("Copy did not catch up with the source", container=target.id)
+    return total
+
+
+async def _ids(container: Any) -> List[str]:
+    return [
+        document_id
+        async for document_id in container.query_items(query="SELECT VALUE c.id FROM c")
+    ]
+
+
+async def verify_container(source: Any, target: Any) -> Dict:
+    """Compare the document counts and ids of the source and target containers.
+
+    The result counts the source ids missing from the target and the target ids
+    not in the source; it passes when both are none and the counts are equal.
+    """
+    source_ids, target_ids = await asyncio.gather(_ids(source), _ids(target))
+    missing = sorted(set(source_ids) - set(target_ids))
+    extra = sorted(set(target_ids) - set(source_ids))
+    result = {
+        "container": target.id,
+        "source": len(source_ids),
+        "target": len(target_ids),
+        "missing": len(missing),
+        "missing_ids": missing[:MAX_REPORTED_IDS],
+        "extra": len(extra),
+        "extra_ids": extra[:MAX_REPORTED_IDS],
+    }
+    result["passed"] = not missing and not extra and len(source_ids) == len(target_ids)
+    if result["passed"]:
+        logger.info("Verification passed", **result)
+    else:
+        logger.warning("Verification found differences", **result)
+    return result
+
+
+async def prune_container(source: Any, target: Any, kind: str) -> int:
+    """Delete the target documents whose ids are no longer in the source.
+
+    The target is listed before the source, so a document copied in between is
+    still in the source listing and kept.
+
+    Returns:
+        The number of documents deleted.
+    """
+    field = TARGET_CONTAINERS[kind][0].lstrip("/")
+    targets = [
+        (document["id"], document.get(field))
+        async for document in target.query_items(query=f"SELECT c.id, c.{field} FROM c")
+    ]
+    source_ids = set(await _ids(source))
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_WRITES)
+
+    async def delete(document_id: str, partition_key: Any) -> None:
+        async with semaphore:
+            try:
+                await target.delete_item(document_id, partition_key=partition_key)
+            except CosmosResourceNotFoundError:
+                pass
+
+    deleted = [item for item in targets if item[0] not in source_ids]
+    await asyncio.gather(*(delete(*item) for item in deleted))
+    if deleted:
+        logger.info("Deleted documents gone from the source", container=target.id, deleted=len(deleted))
+    return len(deleted)
+
+
+async def migrate_layout(
+    database: CosmosDBClient,
+    file_container: str,
+    log_container: str,
+    create: bool = False,
+    verify_only: bool = False,
+    prune: bool = False,
+) -> List[Dict]:
+    """Copy the file and log containers into by_parent containers and verify them.
+
+    Args:
+        database: A client initialized on the by_id containers.
+        file_container: Name of the target file container.
+        log_container: Name of the target log container.
+        create: Create the target containers if they do not exist.
+        verify_only: Only compare the source and target containers.
+        prune: After copying, delete the target documents deleted from the source.
+
+    Returns:
+        The verification result of each container.
+    """
+    if database.layout != CosmosLayout.BY_ID:
+        raise ValueError("The source containers must use the by_id layout")
+
+    cosmos = database.client.get_database_client(database.database_name)
+    pairs = []
+    for kind, source, name in (
+        ("file", database.file_container, file_container),
+        ("log", database.log_container, log_container),
+    ):
+        if create:
+            target = await create_target_container(cosmos, name, kind)
+        else:
+            target = cosmos.get_container_client(name)
+        pairs.append((kind, source, target))
+
+    if not verify_only:
+        for kind, source, target in pairs:
+            copied = await copy_container(source, target, kind)
+            logger.info("Container copied", container=target.id, copied=copied)
+            if prune:
+                await prune_container(source, target, kind)
+
+    return [await verify_container(source, target) for _, source, target in pairs]
+
+
+async def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    names = [arg for arg in argv if not arg.startswith("--")]
+    if len(names) != 2:
+        raise SystemExit(__doc__)
+
+    config = Config()
+    database = CosmosDBClient(
+        endpoint=config.cosmosdb_endpoint,
+        credential=config.get_azure_credentials(),
+        database_name=config.cosmosdb_database,
+        batch_container=config.cosmosdb_batch_container,
+        file_container=config.cosmosdb_file_container,
+        log_container=config.cosmosdb_log_container,
+        layout=CosmosLayout.BY_ID.value,
+    )
+    await database.initialize_cosmos()
+    try:
+        results = await migrate_layout(
+            database,
+            names[0],
+            names[1],
+            create="--create" in argv,
+            verify_only="--verify-only" in argv,
+            prune="--prune" in argv,
+        )
+    finally:
+        await database.close()
+    if not all(result["passed"] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Reconcile the error and warning counters of file records with their logs.
+
+File records keep ``error_count`` and ``syntax_count`` up to date as logs are
+written. Records created before the counters were maintained incrementally, or
+whose increment failed, can be repaired by recounting their logs on the server:
+
+    python -m common.database.reconcile_counts [--dry-run] [batch_id ...]
+"""
+
+import asyncio
+import sys
+from typing import Dict, Iterable, Optional
+
+from common.database.cosmosdb import CosmosDBClient
+from common.database.database_factory import DatabaseFactory
+from common.logger.app_logger import AppLogger
+
+logger = AppLogger("ReconcileCounts")
+
+# Files recounted at the same time
+MAX_CONCURRENT_FILES = 10
+# Files between progress messages
+PROGRESS_INTERVAL = 100
+
+
+async def reconcile_counts(
+    database: CosmosDBClient,
+    batch_ids: Optional[Iterable[str]] = None,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Recount the logs of every file, or of the files in the given batches.
+
+    Args:
+        database: The Cosmos DB client.
+        batch_ids: Optional batches to limit the reconciliation to.
+        dry_run: Report mismatches without fixing them.
+
+    Returns:
+        The number of files checked and the number found out of date.
+    """
+    query = "SELECT c.file_id, c.error_count, c.syntax_count FROM c"
+    parameter_sets = [[]]
+    if batch_ids:
+        query += " WHERE c.batch_id = @batch_id"
+        parameter_sets = [
+            [{"name": "@batch_id", "value": str(batch_id)}] for batch_id in batch_ids
+        ]
+
+    stats = {"checked": 0, "mismatched": 0}
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+
+    async def reconcile(file: Dict) -> None:
+        async with semaphore:
+            file_id = file["file_id"]
+            error_count, syntax_count = await database.get_file_log_counts(file_id)
+            if (error_count, syntax_count) != (
+                file.get("error_count"),
+                file.get("syntax_count"),
+            ):
+                stats["mismatched"] += 1
+                logger.info(
+                    "File counts out of date",
+                    file_id=file_id,
+                    stored=[file.get("error_count"), file.get("syntax_count")],
+                    counted=[error_count, syntax_count],
+                )
+                if not dry_run:
+                    await database.set_file_counts(file_id, error_count, syntax_count)
+            stats["checked"] += 1
+            if stats["checked"] % PROGRESS_INTERVAL == 0:
+                logger.info("Reconciliation progress", **stats)
+
+    tasks = []
+    for parameters in parameter_sets:
+        async for file in database.file_container.query_items(
+            query=query, parameters=parameters
+        ):
+            tasks.append(asyncio.create_task(reconcile(file)))
+    await asyncio.gather(*tasks)
+
+    logger.info("Reconciliation complete", dry_run=dry_run, **stats)
+    return stats
+
+
+async def main(argv):
+    dry_run = "--dry-run" in argv
+    batch_ids = [arg for arg in argv if arg != "--dry-run"]
+    database = await DatabaseFactory.get_database()
+    try:
+        await reconcile_counts(database, batch_ids, dry_run=dry_run)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
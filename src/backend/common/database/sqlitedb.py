@@ -0,0 +1,881 @@
+"""SQLite implementation of the database, for local runs and load tests.
+
+Batches, files, logs and batch summaries are kept as the same JSON documents
+the Cosmos DB client stores, one table each, with the fields they are looked up and ordered
+by copied into indexed columns. Every statement runs on a single worker thread,
+so each operation is one transaction and read-modify-write updates such as
+patches and counter increments are atomic. Select it with DATABASE_BACKEND=sqlite;
+SQLITE_DATABASE_PATH names the database file, or ``:memory:``.
+"""
+
+import asyncio
+import base64
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceNotFoundError,
+)
+
+from common.database.cosmosdb import SYSTEM_PROPERTIES
+from common.database.database_base import DatabaseBase
+from common.logger.app_logger import AppLogger
+from common.models.api import (
+    AgentType,
+    BatchRecord,
+    BatchSummaryView,
+    FileLog,
+    FileRecord,
+    LogType,
+    ProcessStatus,
+)
+
+from semantic_kernel.contents import AuthorRole
+
+# Indexed columns of each table, copied from the document fields of the same name
+_COLUMNS = {
+    "batches": ("user_id", "status", "created_at", "updated_at"),
+    "files": ("batch_id", "created_at"),
+    "logs": ("file_id", "timestamp", "log_type", "agent_type"),
+    "summaries": ("batch_id",),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    expires_at REAL,
+    etag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_batches_user_updated ON batches (user_id, updated_at, id);
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    created_at TEXT,
+    etag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_files_batch_created ON files (batch_id, created_at, id);
+CREATE TABLE IF NOT EXISTS logs (
+    id TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    timestamp TEXT,
+    log_type TEXT,
+    agent_type TEXT,
+    etag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_logs_file_timestamp ON logs (file_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS ix_logs_file_type ON logs (file_id, log_type);
+CREATE TABLE IF NOT EXISTS summaries (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+# Batches that have not expired, see expire_batch
+_LIVE = "(expires_at IS NULL OR expires_at > ?)"
+# Batches shown to their user: not expired nor soft deleted
+_VISIBLE = f"{_LIVE} AND json_extract(data, '$.deleted_at') IS NULL"
+
+
+class SQLiteDBClient(DatabaseBase):
+    # Largest page returned by the paginated queries, as for Cosmos DB
+    MAX_PAGE_SIZE = 100
+    # Files deleted per statement by delete_files
+    DELETE_CHUNK_SIZE = 500
+    # Files whose logs are read per statement by get_files_logs
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = AppLogger("SQLiteDB")
+        self.connection: Optional[sqlite3.Connection] = None
+        # One thread serializes every statement on the connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    async def _run(self, work: Callable, *args):
+        """Run a function on the database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(work, *args))
+
+    async def _transaction(self, work: Callable[[sqlite3.Connection], object]):
+        """Run a function with the connection inside one write transaction."""
+
+        def run():
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self.connection)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            return result
+
+        return await self._run(run)
+
+    async def _query(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        return await self._run(lambda: self.connection.execute(sql, params).fetchall())
+
+    async def initialize_cosmos(self) -> None:
+        """Open the database and create the tables and indexes if needed."""
+
+        def connect():
+            connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            return connection
+
+        try:
+            self.connection = await self._run(connect)
+            self.logger.info("Opened SQLite database", path=self.path)
+        except Exception as e:
+            self.logger.error("Failed to open SQLite database", error=str(e))
+            raise
+
+    @staticmethod
+    def _document(row: sqlite3.Row) -> Dict:
+        document = json.loads(row["data"])
+        document["_etag"] = row["etag"]
+        document["_ts"] = row["ts"]
+        return document
+
+    @staticmethod
+    def _project(
+        document: Optional[Dict], fields: Optional[Sequence[str]], *required: str
+    ) -> Optional[Dict]:
+        """Keep the given fields of a document, like a Cosmos DB projection."""
+        if document is None or not fields:
+            return document
+        names = dict.fromkeys((*required, *fields))
+        return {name: document[name] for name in names if name in document}
+
+    @staticmethod
+    def _store(
+        connection: sqlite3.Connection, table: str, document: Dict, replace: bool = True
+    ) -> Dict:
+        """Write a document, giving it a new ETag and timestamp."""
+        body = {k: v for k, v in document.items() if k not in SYSTEM_PROPERTIES}
+        columns = ["id", *_COLUMNS[table], "etag", "ts", "data"]
+        etag = uuid4().hex
+        ts = int(time.time())
+        values = [body["id"], *(body.get(name) for name in _COLUMNS[table])]
+        values += [etag, ts, json.dumps(body)]
+        if table == "batches":
+            # Time to live counts from the last write, as in Cosmos DB
+            columns.append("expires_at")
+            values.append(time.time() + body["ttl"] if body.get("ttl") else None)
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        connection.execute(
+            f"{verb} INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            values,
+        )
+        return {**body, "_etag": etag, "_ts": ts}
+
+    @classmethod
+    def _modify(
+        cls,
+        connection: sqlite3.Connection,
+        table: str,
+        key: str,
+        change: Callable[[Dict], Dict],
+        etag: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Change a document in place; None if it does not exist.
+
+        With an ETag, raises CosmosAccessConditionFailedError if the document
+        changed since that version; the Cosmos DB exceptions are raised so that
+        callers handle both databases alike.
+        """
+        row = connection.execute(f"SELECT * FROM {table} WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        document = cls._document(row)
+        if etag and document["_etag"] != etag:
+            raise CosmosAccessConditionFailedError(message=f"Document {key} was modified")
+        return cls._store(connection, table, change(document))
+
+    @staticmethod
+    def _merge(document: Dict, body: Dict, etag: Optional[str], loaded: Optional[Dict]) -> Dict:
+        """The body to write over a document, keeping changes made by other writers.
+
+        When the document is no longer the version the body was read from, only
+        the fields the caller changed are applied to it.
+        """
+        if not etag or document["_etag"] == etag or loaded is None:
+            return body
+        changes = {k: v for k, v in body.items() if loaded.get(k) != v}
+        return {**document, **changes}
+
+    @classmethod
+    def _increment_counts(cls, connection: sqlite3.Connection, logs: List[FileLog]) -> None:
+        """Add the error and warning entries of logs to their files' counters."""
+        increments: Dict[str, Dict[str, int]] = {}
+        for log in logs:
+            if log.log_type not in (LogType.ERROR, LogType.WARNING):
+                continue
+            field = "error_count" if log.log_type == LogType.ERROR else "syntax_count"
+            counts = increments.setdefault(str(log.file_id), {})
+            counts[field] = counts.get(field, 0) + 1
+
+        def add(counts: Dict[str, int], file: Dict) -> Dict:
+            return {**file, **{k: file.get(k, 0) + v for k, v in counts.items()}}
+
+        files = [
+            cls._modify(connection, "files", file_id, partial(add, counts))
+            for file_id, counts in increments.items()
+        ]
+        cls._summarize_files(connection, files)
+
+    @classmethod
+    def _summarize(
+        cls,
+        connection: sqlite3.Connection,
+        batch_id: str,
+        files: Sequence[Dict] = (),
+        removed: Sequence[str] = (),
+    ) -> Optional[Dict]:
+        """Apply changed and removed files to the summary of their batch, in the
+        transaction that changed them.
+
+        A missing summary is built from the batch's files, unless the batch does
+        not exist. Returns the summary, or None.
+        """
+        batch_id = str(batch_id)
+        row = connection.execute(
+            "SELECT * FROM summaries WHERE id = ?", (BatchSummaryView.document_id(batch_id),)
+        ).fetchone()
+        if row is not None:
+            summary = BatchSummaryView.apply(
+                cls._document(row),
+                batch_id,
+                files,
+                removed,
+                datetime.now(timezone.utc).isoformat(),
+            )
+        elif connection.execute("SELECT 1 FROM batches WHERE id = ?", (batch_id,)).fetchone():
+            rows = connection.execute(
+                "SELECT * FROM files WHERE batch_id = ? ORDER BY created_at, id", (batch_id,)
+            ).fetchall()
+            summary = BatchSummaryView.apply(None, batch_id, [cls._document(r) for r in rows])
+        else:
+            return None
+        return cls._store(connection, "summaries", summary)
+
+    @classmethod
+    def _summarize_files(
+        cls, connection: sqlite3.Connection, files: Iterable[Optional[Dict]]
+    ) -> None:
+        """Apply changed file documents to the summaries of their batches."""
+        batches: Dict[str, List[Dict]] = {}
+        for file in files:
+            if file:
+                batches.setdefault(str(file["batch_id"]), []).append(file)
+        for batch_id, changed in batches.items():
+            cls._summarize(connection, batch_id, changed)
+
+    async def create_batch(self, user_id: str, batch_id: UUID) -> BatchRecord:
+        batch = BatchRecord(
+            batch_id=batch_id,
+            user_id=user_id,
+            file_count=0,
+            created_at=datetime.now(timezone.utc),
+            updated_at=datetime.now(timezone.utc),
+            status=ProcessStatus.READY_TO_PROCESS,
+        )
+        try:
+            await self._transaction(
+                lambda connection: self._store(connection, "batches", batch.dict(), replace=False)
+            )
+            return batch
+        except sqlite3.IntegrityError:
+            self.logger.info("Batch already exists, reading existing record", batch_id=str(batch_id))
+            existing = await self.get_batch_from_id(str(batch_id))
+            if existing is None or existing.get("user_id") != user_id:
+                self.logger.error("Batch belongs to a different user", batch_id=str(batch_id))
+                raise PermissionError("Batch not found")
+            return BatchRecord.fromdb(existing)
+        except Exception as e:
+            self.logger.error("Failed to create batch", error=str(e))
+            raise
+
+    async def add_file(
+        self, batch_id: UUID, file_id: UUID, file_name: str, storage_path: str
+    ) -> FileRecord:
+        try:
+            file_record = FileRecord(
+                file_id=file_id,
+                batch_id=batch_id,
+                original_name=file_name,
+                blob_path=storage_path,
+                translated_path="",
+                status=ProcessStatus.READY_TO_PROCESS,
+                error_count=0,
+                syntax_count=0,
+                created_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+            )
+
+            def insert(connection):
+                file = self._store(connection, "files", file_record.dict(), replace=False)
+                self._summarize(connection, str(batch_id), [file])
+
+            await self._transaction(insert)
+            return file_record
+        except Exception as e:
+            self.logger.error("Failed to add file", error=str(e))
+            raise
+
+    async def add_files(
+        self, batch_id: UUID, files: List[Tuple[UUID, str, str]]
+    ) -> List[FileRecord]:
+        now = datetime.now(timezone.utc)
+        # Each file a microsecond apart, in the order given, so that pages of the
+        # batch's files ordered by created_at have no ties to carry over
+        file_records = [
+            FileRecord(
+                file_id=file_id,
+                batch_id=batch_id,
+                original_name=file_name,
+                blob_path=storage_path,
+                translated_path="",
+                status=ProcessStatus.READY_TO_PROCESS,
+                error_count=0,
+                syntax_count=0,
+                created_at=now + timedelta(microseconds=index),
+                updated_at=now,
+            )
+            for index, (file_id, file_name, storage_path) in enumerate(files)
+        ]
+
+        def insert(connection):
+            stored = [
+                self._store(connection, "files", file_record.dict(), replace=False)
+                for file_record in file_records
+            ]
+            self._summarize(connection, str(batch_id), stored)
+
+        try:
+            await self._transaction(insert)
+            return file_records
+        except Exception as e:
+            self.logger.error("Failed to add files", count=len(files), error=str(e))
+            raise
+
+    async def _update_record(self, table: str, key: str, record) -> None:
+        """Write a record, over the version it was read from when it has an ETag."""
+        body = record.dict()
+
+        def update(connection):
+            updated = self._modify(
+                connection,
+                table,
+                key,
+                lambda document: self._merge(document, body, record.etag, record.loaded),
+            )
+            if updated is None:
+                raise CosmosResourceNotFoundError(message=f"Document {key} not found")
+            if table == "files":
+                self._summarize_files(connection, [updated])
+            return updated
+
+        updated = await self._transaction(update)
+        record.etag = updated["_etag"]
+        record.loaded = record.dict()
+
+    async def update_file(self, file_record: FileRecord) -> FileRecord:
+        try:
+            await self._update_record("files", str(file_record.file_id), file_record)
+            return file_record
+        except Exception as e:
+            self.logger.error("Failed to update file", error=str(e))
+            raise
+
+    async def update_batch(self, batch_record: BatchRecord) -> BatchRecord:
+        try:
+            await self._update_record("batches", str(batch_record.batch_id), batch_record)
+            return batch_record
+        except Exception as e:
+            self.logger.error("Failed to update batch", error=str(e))
+            raise
+
+    async def patch_batch(
+        self, batch_id: str, fields: Dict, etag: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Set fields of a batch in one transaction; None if it does not exist."""
+        try:
+            return await self._transaction(
+                lambda connection: self._modify(
+                    connection,
+                    "batches",
+                    str(batch_id),
+                    lambda batch: {**batch, **fields},
+                    etag,
+                )
+            )
+        except Exception as e:
+            self.logger.error("Failed to patch batch", batch_id=str(batch_id), error=str(e))
+            raise
+
+    async def patch_file(
+        self,
+        file_id: str,
+        fields: Optional[Dict] = None,
+        increments: Optional[Dict] = None,
+        etag: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Set and increment fields of a file in one transaction; None if it does not exist."""
+
+        def change(file: Dict) -> Dict:
+            file = {**file, **(fields or {})}
+            for name, value in (increments or {}).items():
+                file[name] = file.get(name, 0) + value
+            return file
+
+        def patch(connection):
+            file = self._modify(connection, "files", str(file_id), change, etag)
+            self._summarize_files(connection, [file])
+            return file
+
+        try:
+            return await self._transaction(patch)
+        except Exception as e:
+            self.logger.error("Failed to patch file", file_id=str(file_id), error=str(e))
+            raise
+
+    async def update_batch_entry(
+        self, batch_id: str, user_id: str, status: ProcessStatus, file_count: int,
+        existing_batch: Optional[Dict] = None
+    ):
+        """Update batch status and file count, checking the batch belongs to the user."""
+        batch = existing_batch
+        if batch is None:
+            batch = await self.get_batch(user_id, batch_id)
+        if not batch:
+            raise ValueError("Batch not found")
+        updated = await self.patch_batch(
+            batch_id,
+            {
+                "status": status.value if isinstance(status, ProcessStatus) else status,
+                "updated_at": datetime.utcnow().isoformat(),
+                "file_count": file_count,
+            },
+        )
+        if updated is None:
+            raise ValueError("Batch not found")
+        return updated
+
+    async def get_batch(self, user_id: str, batch_id: str) -> Optional[Dict]:
+        rows = await self._query(
+            f"SELECT * FROM batches WHERE id = ? AND user_id = ? AND {_VISIBLE}",
+            (str(batch_id), user_id, time.time()),
+        )
+        return self._document(rows[0]) if rows else None
+
+    async def get_batch_from_id(self, batch_id: str) -> Dict:
+        rows = await self._query(
+            f"SELECT * FROM batches WHERE id = ? AND {_LIVE}", (str(batch_id), time.time())
+        )
+        return self._document(rows[0]) if rows else None
+
+    async def get_batch_summary(self, batch_id: str) -> Optional[Dict]:
+        """Retrieve the summary of a batch, building it if missing; None if the batch does not exist."""
+        rows = await self._query(
+            "SELECT * FROM summaries WHERE id = ?", (BatchSummaryView.document_id(batch_id),)
+        )
+        if rows:
+            return self._document(rows[0])
+        return await self._transaction(
+            lambda connection: self._summarize(connection, str(batch_id))
+        )
+
+    async def get_file(
+        self, file_id: str, fields: Optional[Sequence[str]] = None
+    ) -> Optional[Dict]:
+        rows = await self._query("SELECT * FROM files WHERE id = ?", (str(file_id),))
+        file = self._document(rows[0]) if rows else None
+        return self._project(file, fields, "file_id", "batch_id")
+
+    async def get_batch_files(
+        self, batch_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        rows = await self._query(
+            "SELECT * FROM files WHERE batch_id = ? ORDER BY created_at, id", (str(batch_id),)
+        )
+        return [
+            self._project(self._document(row), fields, "file_id", "batch_id") for row in rows
+        ]
+
+    async def get_user_batches(
+        self, user_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        rows = await self._query(
+            f"SELECT * FROM batches WHERE user_id = ? AND {_VISIBLE}", (user_id, time.time())
+        )
+        return [self._project(self._document(row), fields) for row in rows]
+
+    async def get_file_logs(
+        self, file_id: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        rows = await self._query(
+            "SELECT * FROM logs WHERE file_id = ? ORDER BY timestamp DESC, id DESC",
+            (str(file_id),),
+        )
+        return [self._project(self._document(row), fields) for row in rows]
+
+    async def get_files_logs(
+        self, file_ids: Sequence[str], fields: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[Dict]]:
+        file_ids = list(dict.fromkeys(str(file_id) for file_id in file_ids))
+        logs: Dict[str, List[Dict]] = {file_id: [] for file_id in file_ids}
+        for start in range(0, len(file_ids), self.QUERY_CHUNK_SIZE):
+            chunk = file_ids[start:start + self.QUERY_CHUNK_SIZE]
+            rows = await self._query(
+                f"SELECT * FROM logs WHERE file_id IN ({', '.join('?' for _ in chunk)}) "
+                "ORDER BY timestamp DESC, id DESC",
+                chunk,
+            )
+            for row in rows:
+                log = self._document(row)
+                logs[log["file_id"]].append(self._project(log, fields, "file_id"))
+        return logs
+
+    async def get_final_candidate(self, file_id: str) -> Optional[Dict]:
+        rows = await self._query(
+            "SELECT * FROM logs "
+            "WHERE file_id = ? AND log_type = ? AND agent_type = ? "
+            "AND (json_extract(data, '$.last_candidate') != '' "
+            "OR json_extract(data, '$.candidate_hash') IS NOT NULL) "
+            "ORDER BY timestamp DESC LIMIT 1",
+            (str(file_id), LogType.SUCCESS.value, AgentType.ALL.value),
+        )
+        if not rows:
+            return None
+        return self._project(self._document(rows[0]), ("last_candidate", "candidate_hash"))
+
+    async def add_file_log(
+        self,
+        file_id: UUID,
+        description: str,
+        last_candidate: str,
+        log_type: LogType,
+        agent_type: AgentType,
+        author_role: AuthorRole,
+        candidate_hash: Optional[str] = None,
+    ) -> None:
+        """Log a file status update."""
+        await self.add_file_logs(
+            [
+                FileLog(
+                    log_id=uuid4(),
+                    file_id=file_id,
+                    description=description,
+                    log_type=log_type,
+                    agent_type=agent_type,
+                    last_candidate=last_candidate,
+                    author_role=author_role,
+                    timestamp=datetime.now(timezone.utc),
+                    candidate_hash=candidate_hash,
+                )
+            ]
+        )
+
+    async def add_file_logs(self, logs: List[FileLog]) -> None:
+        """Write log entries and update their files' counters in one transaction."""
+
+        def write(connection):
+            for log in logs:
+                self._store(connection, "logs", log.dict(), replace=False)
+            self._increment_counts(connection, logs)
+
+        try:
+            await self._transaction(write)
+        except Exception as e:
+            self.logger.error("Failed to write file logs", count=len(logs), error=str(e))
+            raise
+
+    async def get_file_log_counts(self, file_id: str) -> Tuple[int, int]:
+        rows = await self._query(
+            "SELECT log_type, COUNT(*) AS count FROM logs "
+            "WHERE file_id = ? AND log_type IN (?, ?) GROUP BY log_type",
+            (str(file_id), LogType.ERROR.value, LogType.WARNING.value),
+        )
+        counts = {row["log_type"]: row["count"] for row in rows}
+        return counts.get(LogType.ERROR.value, 0), counts.get(LogType.WARNING.value, 0)
+
+    async def set_file_counts(self, file_id: str, error_count: int, syntax_count: int) -> None:
+        await self.patch_file(
+            file_id, fields={"error_count": error_count, "syntax_count": syntax_count}
+        )
+
+    async def delete_all(self, user_id: str) -> None:
+        """Delete the batches of a user with their files and logs."""
+        batches = "SELECT id FROM batches WHERE user_id = ?"
+        files = f"SELECT id FROM files WHERE batch_id IN ({batches})"
+
+        def delete(connection):
+            connection.execute(f"DELETE FROM logs WHERE file_id IN ({files})", (user_id,))
+            connection.execute(f"DELETE FROM files WHERE id IN ({files})", (user_id,))
+            connection.execute(
+                f"DELETE FROM summaries WHERE batch_id IN ({batches})", (user_id,)
+            )
+            connection.execute("DELETE FROM batches WHERE user_id = ?", (user_id,))
+
+        try:
+            await self._transaction(delete)
+        except Exception as e:
+            self.logger.error("Failed to delete all user data", error=str(e))
+            raise
+
+    async def delete_logs(self, file_id: str) -> None:
+        await self._transaction(
+            lambda connection: connection.execute(
+                "DELETE FROM logs WHERE file_id = ?", (str(file_id),)
+            )
+        )
+
+    async def delete_file_logs(self, file_id: str) -> None:
+        await self.delete_logs(file_id)
+
+    async def delete_batch(self, user_id: str, batch_id: str) -> None:
+
+        def delete(connection):
+            connection.execute("DELETE FROM batches WHERE id = ?", (str(batch_id),))
+            connection.execute("DELETE FROM summaries WHERE batch_id = ?", (str(batch_id),))
+
+        try:
+            await self._transaction(delete)
+        except Exception as e:
+            self.logger.error(f"Failed to delete batch with ID: {batch_id}", error=str(e))
+            raise
+
+    async def delete_file(self, user_id: str, file_id: str) -> None:
+        """Delete all log entries and the file associated with the given file_id.
+
+        The file's row is removed from the summary of its batch, as by
+        delete_files.
+        """
+        await self.delete_files(user_id, [file_id])
+
+    async def delete_files(
+        self,
+        user_id: str,
+        file_ids: Iterable[str],
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        """Delete the logs and records of many files, a chunk per transaction.
+
+        Their rows are removed from the summaries of their batches.
+
+        Args:
+            user_id: The user the files belong to.
+            file_ids: The files to delete.
+            progress: Called with the number of files deleted so far and the
+                total, after each chunk.
+        """
+        file_ids = [str(file_id) for file_id in file_ids]
+
+        def delete(chunk: List[str], connection) -> None:
+            placeholders = ", ".join("?" for _ in chunk)
+            batches: Dict[str, List[str]] = {}
+            for row in connection.execute(
+                f"SELECT id, batch_id FROM files WHERE id IN ({placeholders})", chunk
+            ):
+                batches.setdefault(row["batch_id"], []).append(row["id"])
+            connection.execute(f"DELETE FROM logs WHERE file_id IN ({placeholders})", chunk)
+            connection.execute(f"DELETE FROM files WHERE id IN ({placeholders})", chunk)
+            for batch_id, removed in batches.items():
+                self._summarize(connection, batch_id, removed=removed)
+
+        try:
+            for start in range(0, len(file_ids), self.DELETE_CHUNK_SIZE):
+                chunk = file_ids[start:start + self.DELETE_CHUNK_SIZE]
+                await self._transaction(partial(delete, chunk))
+                if progress:
+                    progress(start + len(chunk), len(file_ids))
+        except Exception as e:
+            self.logger.error(
+                f"Failed to delete file and logs for file_id {', '.join(file_ids)}: {str(e)}"
+            )
+            raise
+
+    async def expire_batch(self, user_id: str, batch_id: str, ttl: int) -> None:
+        """Set a time to live on a batch, hiding it from its user until it elapses."""
+        await self.patch_batch(
+            batch_id, {"ttl": ttl, "deleted_at": datetime.utcnow().isoformat()}
+        )
+
+    async def get_deleted_batches(self) -> List[Dict]:
+        """Batches marked deleted by expire_batch that have not expired yet."""
+        rows = await self._query(
+            f"SELECT * FROM batches WHERE json_extract(data, '$.deleted_at') IS NOT NULL AND {_LIVE}",
+            [time.time()],
+        )
+        return [self._document(row) for row in rows]
+
+    async def get_batch_history(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        sort_order: str = "DESC",
+        offset: int = 0,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict]:
+        try:
+            offset = int(offset)
+        except ValueError:
+            raise ValueError("Offset must be an integer.")
+        direction = "DESC" if sort_order == "DESC" else "ASC"
+        sql = (
+            f"SELECT * FROM batches WHERE user_id = ? AND status != ? AND {_VISIBLE} "
+            f"ORDER BY updated_at {direction}"
+        )
+        params = [user_id, ProcessStatus.READY_TO_PROCESS.value, time.time()]
+        if limit is not None:
+            try:
+                params += [int(limit), offset]
+            except ValueError:
+                raise ValueError("Limit must be an integer.")
+            sql += " LIMIT ? OFFSET ?"
+        rows = await self._query(sql, params)
+        return [self._project(self._document(row), fields) for row in rows]
+
+    @staticmethod
+    def _encode_cursor(boundary, last_id: str) -> str:
+        data = json.dumps({"b": boundary, "i": last_id}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(continuation_token: str) -> Tuple[str, str]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(continuation_token.encode()))
+            return data["b"], str(data["i"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid continuation token.")
+
+    async def _query_page(
+        self,
+        table: str,
+        where: str,
+        params: List,
+        order_by: str,
+        descending: bool,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        required: Sequence[str] = (),
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Read one page ordered by an indexed column, then by id.
+
+        The token holds the order value and id of the last item returned, so
+        each page continues from the index where the previous one stopped.
+        """
+        if not 1 <= page_size <= self.MAX_PAGE_SIZE:
+            raise ValueError(f"Page size must be between 1 and {self.MAX_PAGE_SIZE}.")
+
+        params = list(params)
+        if continuation_token:
+            boundary, last_id = self._decode_cursor(continuation_token)
+            where += f" AND ({order_by}, id) {'<' if descending else '>'} (?, ?)"
+            params += [boundary, last_id]
+        direction = "DESC" if descending else "ASC"
+        rows = await self._query(
+            f"SELECT * FROM {table} WHERE {where} "
+            f"ORDER BY {order_by} {direction}, id {direction} LIMIT ?",
+            # One extra row tells whether another page follows
+            [*params, page_size + 1],
+        )
+        documents = [self._document(row) for row in rows]
+        page = documents[:page_size]
+        token = None
+        if len(documents) > page_size:
+            token = self._encode_cursor(page[-1][order_by], page[-1]["id"])
+        return [self._project(item, fields, "id", order_by, *required) for item in page], token
+
+    async def get_batch_history_page(
+        self,
+        user_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        sort_order: str = "DESC",
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the batch history of a user."""
+        return await self._query_page(
+            "batches",
+            f"user_id = ? AND status != ? AND {_VISIBLE}",
+            [user_id, ProcessStatus.READY_TO_PROCESS.value, time.time()],
+            "updated_at",
+            sort_order == "DESC",
+            page_size,
+            continuation_token,
+            fields,
+        )
+
+    async def get_batch_files_page(
+        self,
+        batch_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the files of a batch, oldest first."""
+        return await self._query_page(
+            "files",
+            "batch_id = ?",
+            [str(batch_id)],
+            "created_at",
+            False,
+            page_size,
+            continuation_token,
+            fields,
+            required=("file_id", "batch_id"),
+        )
+
+    async def get_file_logs_page(
+        self,
+        file_id: str,
+        page_size: int,
+        continuation_token: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of the logs of a file, newest first."""
+        return await self._query_page(
+            "logs",
+            "file_id = ?",
+            [str(file_id)],
+            "timestamp",
+            True,
+            page_size,
+            continuation_token,
+            fields,
+        )
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self._run(self.connection.close)
+            self.connection = None
+            self.logger.info("Closed SQLite database", path=self.path)
+        self._executor.shutdown(wait=False)
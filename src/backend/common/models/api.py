@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence
 from uuid import UUID
 
 from semantic_kernel.contents import AuthorRole
@@ -113,6 +113,7 @@ class FileLog:
         agent_type: AgentType,
         author_role: AuthorRole,
         timestamp: datetime,
+        candidate_hash: Optional[str] = None,
     ):
         self.log_id = log_id
         self.file_id = file_id
@@ -122,6 +123,8 @@ class FileLog:
         self.agent_type = agent_type
         self.author_role = author_role
         self.timestamp = timestamp
+        # Reference to the candidate in the candidate store, instead of last_candidate
+        self.candidate_hash = candidate_hash
 
     @staticmethod
     def fromdb(data: Dict) -> FileLog:
@@ -139,6 +142,7 @@ class FileLog:
                 else AuthorRole("assistant")
             ),
             timestamp=datetime.fromisoformat(data["timestamp"]),
+            candidate_hash=data.get("candidate_hash"),
         )
 
     def dict(self) -> Dict:
@@ -153,6 +157,7 @@ class FileLog:
             "agent_type": self.agent_type.value,
             "author_role": self.author_role.value,
             "timestamp": self.timestamp.isoformat(),
+            "candidate_hash": self.candidate_hash,
         }
 
 
@@ -182,11 +187,15 @@ class FileRecord:
         self.syntax_count = syntax_count
         self.created_at = created_at
         self.updated_at = updated_at
+        # ETag and fields of the document the record was read from, so an update
+        # can be made conditional and re-applied after a concurrent change
+        self.etag = None
+        self.loaded = None
 
     @staticmethod
     def fromdb(data: Dict) -> FileRecord:
         """Convert str to UUID after fetching from the database."""
-        return FileRecord(
+        record = FileRecord(
             file_id=UUID(data["file_id"]),  # Convert str → UUID
             batch_id=UUID(data["batch_id"]),  # Convert str → UUID
             original_name=data["original_name"],
@@ -201,6 +210,9 @@ class FileRecord:
             created_at=datetime.fromisoformat(data["created_at"]),
             updated_at=datetime.fromisoformat(data["updated_at"]),
         )
+        record.etag = data.get("_etag")
+        record.loaded = record.dict()
+        return record
 
     def dict(self) -> Dict:
         """Convert UUID to str before inserting into the database."""
@@ -324,6 +336,9 @@ class BatchRecord:
         self.status = status
         self.from_language = from_language
         self.to_language = to_language
+        # ETag and fields of the document the record was read from, as for FileRecord
+        self.etag = None
+        self.loaded = None
 
     @staticmethod
     def fromdb(data: Dict) -> BatchRecord:
@@ -341,7 +356,7 @@ class BatchRecord:
         else:
             to_lang = TranslateType.TSQL
 
-        return BatchRecord(
+        record = BatchRecord(
             batch_id=UUID(data["batch_id"]),  # Convert str → UUID
             user_id=data["user_id"],
             file_count=data["file_count"],
@@ -351,6 +366,9 @@ class BatchRecord:
             from_language=from_lang,
             to_language=to_lang,
         )
+        record.etag = data.get("_etag")
+        record.loaded = record.dict()
+        return record
 
     def dict(self) -> Dict:
         """Convert UUID to str before inserting into the database."""
@@ -391,3 +409,190 @@ class FileReport:
         self.file_content = file_content
         self.translated_content = translated_content
         self.log_reports = log_reports
+
+
+class FileCountsView:
+    """Error and warning counters of a file, read without the rest of the record."""
+
+    FIELDS = ("file_id", "error_count", "syntax_count")
+
+    def __init__(self, file_id: UUID, error_count: int, syntax_count: int):
+        self.file_id = file_id
+        self.error_count = error_count
+        self.syntax_count = syntax_count
+
+    @staticmethod
+    def fromdb(data: Dict) -> FileCountsView:
+        return FileCountsView(
+            file_id=UUID(data["file_id"]),
+            error_count=data.get("error_count") or 0,
+            syntax_count=data.get("syntax_count") or 0,
+        )
+
+    def dict(self) -> Dict:
+        return {
+            "file_id": str(self.file_id),
+            "error_count": self.error_count,
+            "syntax_count": self.syntax_count,
+        }
+
+
+class FileStatusView:
+    """Fields of a file record shown in status lists, without the path of its upload."""
+
+    FIELDS = (
+        "file_id",
+        "batch_id",
+        "original_name",
+        "translated_path",
+        "status",
+        "file_result",
+        "error_count",
+        "syntax_count",
+        "created_at",
+        "updated_at",
+    )
+
+
+class LogEntryView:
+    """Fields of a file log entry shown in log lists, without its candidate script."""
+
+    FIELDS = (
+        "log_id",
+        "file_id",
+        "description",
+        "log_type",
+        "agent_type",
+        "author_role",
+        "timestamp",
+    )
+
+
+class BatchHistoryView:
+    """Fields of a batch record listed in the batch history."""
+
+    FIELDS = ("batch_id", "user_id", "file_count", "created_at", "updated_at", "status")
+
+
+class BatchSummaryView:
+    """The summary document of a batch: a headline row per file, with their counts
+    and timings, kept up to date as the files change so it is read in one request.
+
+    The rows are keyed by file id and hold the FileStatusView fields of each
+    file, plus when it started and finished processing.
+    """
+
+    # Fields of a file copied into its row
+    FIELDS = FileStatusView.FIELDS
+
+    @staticmethod
+    def document_id(batch_id) -> str:
+        """Id of the summary document, stored beside the batch record in its partition."""
+        return f"{batch_id}:summary"
+
+    @classmethod
+    def row(cls, file: Dict, previous: Optional[Dict] = None, now: Optional[str] = None) -> Dict:
+        """The row of a file, timing it from the change to in process until it ends.
+
+        Without a time, such as when a summary is rebuilt, the file's
+        updated_at stands in for it.
+        """
+        row = {name: file.get(name) for name in cls.FIELDS}
+        row["file_id"] = str(row["file_id"])
+        now = now or file.get("updated_at")
+        previous = previous or {}
+        started_at = previous.get("started_at")
+        completed_at = previous.get("completed_at")
+        status = row.get("status")
+        if status == ProcessStatus.IN_PROGRESS.value:
+            if previous.get("status") != status:
+                started_at, completed_at = now, None
+        elif status in (ProcessStatus.COMPLETED.value, ProcessStatus.FAILED.value):
+            completed_at = completed_at or now
+        else:
+            started_at = completed_at = None
+        row["started_at"] = started_at
+        row["completed_at"] = completed_at
+        return row
+
+    @classmethod
+    def apply(
+        cls,
+        summary: Optional[Dict],
+        batch_id,
+        files: Sequence[Dict] = (),
+        removed: Sequence[str] = (),
+        now: Optional[str] = None,
+    ) -> Dict:
+        """The summary with the rows of changed files replaced and removed files dropped."""
+        rows = dict((summary or {}).get("files") or {})
+        for file in files:
+            file_id = str(file["file_id"])
+            rows[file_id] = cls.row(file, rows.get(file_id), now)
+        for file_id in removed:
+            rows.pop(str(file_id), None)
+        values = list(rows.values())
+        return {
+            **(summary or {}),
+            "id": cls.document_id(batch_id),
+            "batch_id": str(batch_id),
+            "files": rows,
+            "counts": cls.counts(values),
+            "timings": cls.timings(values),
+        }
+
+    @staticmethod
+    def rows(summary: Optional[Dict]) -> List[Dict]:
+        """The rows of a summary, oldest file first."""
+        rows = ((summary or {}).get("files") or {}).values()
+        return sorted((dict(row) for row in rows), key=lambda row: row.get("created_at") or "")
+
+    @staticmethod
+    def timings(rows: List[Dict]) -> Dict:
+        """When the first file started and the last one ended, and the average file time.
+
+        The batch has no completion time while any of its files is pending.
+        """
+
+        def parse(value: str) -> datetime:
+            # Some records are written with naive UTC times
+            parsed = datetime.fromisoformat(value)
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+        durations = [
+            (parse(row["completed_at"]) - parse(row["started_at"])).total_seconds()
+            for row in rows
+            if row.get("started_at") and row.get("completed_at")
+        ]
+        pending = (ProcessStatus.READY_TO_PROCESS.value, ProcessStatus.IN_PROGRESS.value)
+        done = rows and not any(row.get("status") in pending for row in rows)
+        return {
+            "started_at": min((row["started_at"] for row in rows if row.get("started_at")), default=None),
+            "completed_at": (
+                max((row.get("completed_at") or "" for row in rows), default=None) or None
+                if done
+                else None
+            ),
+            "average_file_seconds": (
+                round(sum(durations) / len(durations), 3) if durations else None
+            ),
+        }
+
+    @staticmethod
+    def counts(rows: List[Dict]) -> Dict:
+        """Count the files by status and by result, and total their log counts."""
+        by_status: Dict[str, int] = {}
+        by_result: Dict[str, int] = {}
+        for row in rows:
+            status = row.get("status")
+            by_status[status] = by_status.get(status, 0) + 1
+            if row.get("file_result"):
+                by_result[row["file_result"]] = by_result.get(row["file_result"], 0) + 1
+        return {
+            "file_count": len(rows),
+            "status": by_status,
+            "file_result": by_result,
+            "error_count": sum(row.get("error_count") or 0 for row in rows),
+            "syntax_count": sum(row.get("syntax_count") or 0 for row in rows),
+            "updated_at": max((row.get("updated_at") or "" for row in rows), default=None),
+        }
@@ -1,43 +1,124 @@
+import asyncio
+import mimetypes
+import os
+import posixpath
 import re
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import zipfile
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from uuid import UUID, uuid4
 
 from common.database.database_factory import DatabaseFactory
 from common.logger.app_logger import AppLogger
 from common.models.api import (
     AgentType,
+    BatchHistoryView,
     BatchRecord,
+    BatchSummaryView,
+    FileCountsView,
+    FileLog,
     FileRecord,
     FileResult,
+    LogEntryView,
     LogType,
     ProcessStatus,
 )
 from common.storage.blob_factory import BlobStorageFactory
+from common.storage.candidate_store import CANDIDATE_STORE_MIN_SIZE, CandidateStore
+from common.storage.result_archive import ResultArchive
+from common.storage.zip_stream import zip_stream
 
 from fastapi import HTTPException, UploadFile
 
 from semantic_kernel.contents import AuthorRole
 
+# Blobs deleted at the same time when deleting a batch or a user's data
+MAX_CONCURRENT_BLOB_DELETES = int(os.getenv("MAX_CONCURRENT_BLOB_DELETES", "20"))
+# Batches whose files are listed or record deleted at the same time when deleting a user's data
+MAX_CONCURRENT_BATCH_DELETES = int(os.getenv("MAX_CONCURRENT_BATCH_DELETES", "20"))
+# Translated blobs downloaded at the same time for a batch summary or download
+MAX_CONCURRENT_BLOB_READS = int(os.getenv("MAX_CONCURRENT_BLOB_READS", "20"))
+# Files between progress messages while deleting
+DELETE_PROGRESS_INTERVAL = 100
+# Page size of the paginated reads when the caller gives a token but no size
+DEFAULT_PAGE_SIZE = 20
+# Seconds before Cosmos DB removes a soft deleted batch record; 0 deletes it in the request
+SOFT_DELETE_TTL = int(os.getenv("SOFT_DELETE_TTL", "0"))
+# Largest file accepted by an upload, in bytes
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(200 * 1024 * 1024)))
+# Bytes read from an uploaded file at a time while it is sent to storage
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Blobs uploaded at the same time by a bulk upload
+MAX_CONCURRENT_BLOB_WRITES = int(os.getenv("MAX_CONCURRENT_BLOB_WRITES", "20"))
+# Files accepted by one bulk upload, counting the files inside archives
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "1000"))
+# Seconds an upload URL for a direct upload to storage stays valid
+UPLOAD_URL_TTL = int(os.getenv("UPLOAD_URL_TTL", "900"))
+
 
 class BatchService:
+    # Background deletions of soft deleted batches, kept referenced until done
+    _pending_deletes: Set[asyncio.Task] = set()
+    # Result archives being built in the background, by batch id
+    _archive_builds: Dict[str, asyncio.Task] = {}
+    # Candidate store shared by every service, so stored candidates are known to all
+    _candidate_store: Optional[CandidateStore] = None
+
     def __init__(self):
         self.logger = AppLogger("BatchService")
         self.database = None
+        self.log_buffer = None
 
     async def initialize_database(self):
         """Ensure the database is initialized before using it."""
         # Initialize database connection
         self.database = await DatabaseFactory.get_database()
+        self.log_buffer = DatabaseFactory.get_log_buffer(self.database)
 
-    async def get_batch(self, batch_id: UUID, user_id: str) -> Optional[Dict]:
-        """Retrieve batch details including files."""
+    async def get_candidate_store(self) -> CandidateStore:
+        """Get the candidate store for the current storage and database."""
+        storage = await BlobStorageFactory.get_storage()
+        store = BatchService._candidate_store
+        if store is None or store.storage is not storage or store.database is not self.database:
+            store = CandidateStore(storage, self.database)
+            BatchService._candidate_store = store
+        return store
+
+    async def get_final_candidate(self, file_id: str) -> str:
+        """The candidate of the final successful log of a file, read from the store if referenced."""
+        entry = await self.database.get_final_candidate(file_id)
+        if not entry:
+            return ""
+        if entry.get("candidate_hash"):
+            store = await self.get_candidate_store()
+            return await store.get(file_id, entry["candidate_hash"])
+        return entry.get("last_candidate") or ""
+
+    @staticmethod
+    def is_paged(page_size: Optional[int], continuation_token: Optional[str]) -> bool:
+        """Whether a request asks for one page rather than the full list."""
+        return page_size is not None or continuation_token is not None
+
+    async def get_batch(
+        self,
+        batch_id: UUID,
+        user_id: str,
+        page_size: Optional[int] = None,
+        continuation_token: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Retrieve batch details including files, or one page of its files."""
         batch = await self.database.get_batch(user_id, batch_id)
         if not batch:
             return None
-        files = await self.database.get_batch_files(batch_id)
+        if not self.is_paged(page_size, continuation_token):
+            files = await self.database.get_batch_files(batch_id)
+            return {"batch": batch, "files": files}
 
-        return {"batch": batch, "files": files}
+        files, next_token = await self.database.get_batch_files_page(
+            batch_id, page_size or DEFAULT_PAGE_SIZE, continuation_token
+        )
+        return {"batch": batch, "files": files, "continuation_token": next_token}
 
     async def get_file(self, file_id: str) -> Optional[Dict]:
         """Retrieve file details."""
@@ -47,14 +128,30 @@ class BatchService:
 
         return {"file": file}
 
-    async def get_file_report(self, file_id: str) -> Optional[Dict]:
-        """Retrieve file logs."""
+    async def get_file_report(
+        self,
+        file_id: str,
+        page_size: Optional[int] = None,
+        continuation_token: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Retrieve file logs, all of them or one page."""
         file = await self.database.get_file(file_id)
         file_record = FileRecord.fromdb(file)
         batch = await self.database.get_batch_from_id(str(file_record.batch_id))
         batch_record = BatchRecord.fromdb(batch)
 
-        logs = await self.database.get_file_logs(file_id)
+        await self.flush_file_logs(file_id)
+        paged = self.is_paged(page_size, continuation_token)
+        next_token = None
+        if paged:
+            logs, next_token = await self.database.get_file_logs_page(
+                file_id,
+                page_size or DEFAULT_PAGE_SIZE,
+                continuation_token,
+                fields=LogEntryView.FIELDS,
+            )
+        else:
+            logs = await self.database.get_file_logs(file_id, fields=LogEntryView.FIELDS)
         file_content = ""
         translated_content = ""
         try:
@@ -62,23 +159,22 @@ class BatchService:
             if file_record.translated_path not in ["", None]:
                 translated_content = await storage.get_file(file_record.translated_path)
             else:
-                # If translated_path is empty, try to get translated content from logs
-                # Look for the final success log with the translated result
-                if logs:
-                    for log in logs:
-                        if (log.get("log_type") == "success" and log.get("agent_type") == "agents" and log.get("last_candidate")):
-                            translated_content = log["last_candidate"]
-                            break
+                # If translated_path is empty, try to get translated content from the
+                # final success log, the only one whose candidate is read
+                translated_content = await self.get_final_candidate(file_id)
         except IOError as e:
             self.logger.error(f"Error downloading file content: {str(e)}")
 
-        return {
+        report = {
             "file": file_record.dict(),
             "batch": batch_record.dict(),
             "logs": logs,
             "file_content": file_content,
             "translated_content": translated_content,
         }
+        if paged:
+            report["continuation_token"] = next_token
+        return report
 
     async def get_file_translated(self, file: dict):
         """Retrieve file logs."""
@@ -88,80 +184,260 @@ class BatchService:
             if file["translated_path"] not in ["", None]:
                 translated_content = await storage.get_file(file["translated_path"])
             else:
-                # If translated_path is empty, try to get translated content from logs
-                # Look for the final success log with the translated result
-                if "logs" in file and file["logs"]:
-                    for log in file["logs"]:
-                        if (log.get("log_type") == "success" and log.get("agent_type") == "agents" and log.get("last_candidate")):
-                            translated_content = log["last_candidate"]
-                            break
+                # If translated_path is empty, try to get translated content from the
+                # final success log with the translated result
+                translated_content = await self.get_final_candidate(file["file_id"])
         except IOError as e:
             self.logger.error(f"Error downloading file content: {str(e)}")
 
         return translated_content
 
-    async def get_batch_for_zip(self, batch_id: str) -> List[Tuple[str, str]]:
-        """Retrieve batch details including files in a single zip archive."""
-        files = []
-        try:
-            files_meta = await self.database.get_batch_files(batch_id)
+    async def get_batch_files_for_zip(self, batch_id: str) -> List[Dict]:
+        """The files of a batch, with the fields needed to read their results."""
+        return await self.database.get_batch_files(
+            batch_id, fields=("original_name", "translated_path")
+        )
 
-            # Process each file to retrieve its logs
-            for file_meta in files_meta:
-                try:
-                    file_content = await self.get_file_translated(file_meta)
+    async def iter_translated_files(
+        self, files_meta: List[Dict], ordered: bool = False
+    ) -> AsyncIterator[Tuple[int, str, str]]:
+        """Download the translated content of files concurrently, yielding each as it completes.
 
-                    files.append(
-                        ("rslt_" + file_meta.get("original_name"), file_content)
-                    )
+        At most MAX_CONCURRENT_BLOB_READS files are downloading or waiting to
+        be consumed, so a slow consumer holds back further downloads. Yields
+        the index of the file in files_meta, its result name and its content;
+        files that fail are logged and skipped. When ordered, files are yielded
+        in the order of files_meta instead, while the next ones download.
+        """
 
-                except Exception as e:
-                    self.logger.error(
-                        f"Error processing file {file_meta.get('original_name')}: {str(e)}"
-                    )
-            return files
+        async def download(index: int, file_meta: Dict) -> Optional[Tuple[int, str, str]]:
+            try:
+                file_content = await self.get_file_translated(file_meta)
+                return index, "rslt_" + file_meta.get("original_name"), file_content
+            except Exception as e:
+                self.logger.error(
+                    f"Error processing file {file_meta.get('original_name')}: {str(e)}"
+                )
+                return None
+
+        remaining = iter(enumerate(files_meta))
+        pending: Set[asyncio.Task] = set()
+        # The downloads in the order of files_meta, when ordered
+        in_order: Deque[asyncio.Task] = deque()
+
+        def start_next() -> None:
+            entry = next(remaining, None)
+            if entry is not None:
+                task = asyncio.create_task(download(*entry))
+                pending.add(task)
+                if ordered:
+                    in_order.append(task)
+
+        for _ in range(MAX_CONCURRENT_BLOB_READS):
+            start_next()
+        try:
+            while pending:
+                if ordered:
+                    done = [in_order.popleft()]
+                    await asyncio.wait(done)
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    result = task.result()
+                    if result is not None:
+                        yield result
+                    start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_batch_for_zip(self, batch_id: str) -> List[Tuple[str, str]]:
+        """Retrieve the result name and translated content of each file of a batch."""
+        try:
+            files_meta = await self.get_batch_files_for_zip(batch_id)
+            return [
+                (name, content)
+                async for _, name, content in self.iter_translated_files(files_meta, ordered=True)
+            ]
         except Exception as e:
             self.logger.error(f"Error retrieving batch information for zip: {str(e)}")
             raise  # Re-raise for caller handling
 
-    async def get_batch_summary(self, batch_id: str, user_id: str) -> Optional[Dict]:
-        """Retrieve file logs."""
-        try:
-            try:
-                batch = await self.database.get_batch(user_id, batch_id)
-            except Exception as e:
-                self.logger.error(f"Error retrieving batch information: {str(e)}")
+    async def get_result_archive(self) -> ResultArchive:
+        """Get the result archives kept in the current storage."""
+        return ResultArchive(await BlobStorageFactory.get_storage())
+
+    async def _batch_owner(self, batch_id: str, user_id: Optional[str]) -> Optional[Dict]:
+        """The batch, if it exists and belongs to the user, or to anyone without one."""
+        if user_id is None:
+            return await self.database.get_batch_from_id(batch_id)
+        return await self.database.get_batch(user_id, batch_id)
+
+    async def find_result_archive(self, batch_id: str, user_id: str) -> Optional[Dict]:
+        """The path and SHA-256 of a batch's stored result archive, read from storage alone."""
+        archive = await self.get_result_archive()
+        return await archive.find(user_id, batch_id)
+
+    async def build_result_archive(
+        self,
+        batch_id: str,
+        user_id: Optional[str] = None,
+        batch: Optional[Dict] = None,
+        files_meta: Optional[List[Dict]] = None,
+    ) -> Optional[Dict]:
+        """Build and store the result archive of a finished batch.
+
+        The archive is uploaded as it is written, with the translated files in
+        the order of the batch's files, so only the files being downloaded are
+        held in memory. A caller that has read the batch and its files already
+        can pass them.
+
+        Returns:
+            The path and SHA-256 of the archive, or None if the batch does not
+            exist, is not the user's, has no files or is still being processed.
+        """
+        if batch is None:
+            batch = await self._batch_owner(batch_id, user_id)
+        if not batch or batch.get("status") not in (
+            ProcessStatus.COMPLETED.value,
+            ProcessStatus.FAILED.value,
+        ):
+            return None
+        if files_meta is None:
+            files_meta = await self.get_batch_files_for_zip(batch_id)
+        if not files_meta:
+            return None
+
+        entries = (
+            (name, content)
+            async for _, name, content in self.iter_translated_files(files_meta, ordered=True)
+        )
+        archive = await self.get_result_archive()
+        stored = await archive.store(batch["user_id"], str(batch_id), zip_stream(entries))
+        # The batch changed while the archive was built, as when it is processed
+        # again; its files may have too
+        current = await self.database.get_batch_from_id(batch_id)
+        if not current or current.get("_etag") != batch.get("_etag"):
+            await archive.invalidate(batch["user_id"], str(batch_id))
+            return None
+        self.logger.info("Result archive stored", batch_id=batch_id, size=stored["size"])
+        return stored
+
+    def build_result_archive_later(
+        self,
+        batch_id: str,
+        user_id: Optional[str] = None,
+        batch: Optional[Dict] = None,
+        files_meta: Optional[List[Dict]] = None,
+    ) -> None:
+        """Build and store the result archive of a batch in the background.
+
+        One build runs per batch at a time. A download that finds no stored
+        archive streams the files meanwhile instead of waiting for the build.
+        """
+        batch_id = str(batch_id)
+        if batch_id in BatchService._archive_builds:
+            return
+
+        async def build() -> None:
             try:
-                batch_record = BatchRecord.fromdb(batch)
+                await self.build_result_archive(
+                    batch_id, user_id, batch=batch, files_meta=files_meta
+                )
             except Exception as e:
-                self.logger.error(f"Error converting batch record: {str(e)}")
-            files = await self.database.get_batch_files(batch_id)
+                self.logger.error("Failed to build result archive", batch_id=batch_id, error=str(e))
+
+        task = asyncio.create_task(build())
+        BatchService._archive_builds[batch_id] = task
+        task.add_done_callback(lambda _: BatchService._archive_builds.pop(batch_id, None))
+
+    @classmethod
+    async def cancel_archive_builds(cls) -> None:
+        """Stop the background builds of result archives; the next download starts them again."""
+        tasks = list(cls._archive_builds.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def invalidate_result_archive(
+        self, batch_id: str, user_id: Optional[str] = None
+    ) -> None:
+        """Delete the stored result archive of a batch whose results change."""
+        if user_id is None:
+            batch = await self.database.get_batch_from_id(batch_id)
+            if not batch:
+                return
+            user_id = batch["user_id"]
+        archive = await self.get_result_archive()
+        await archive.invalidate(user_id, str(batch_id))
+
+    async def stream_result_archive(self, blob_path: str) -> AsyncIterator[bytes]:
+        """Stream a stored result archive from storage."""
+        archive = await self.get_result_archive()
+        async for chunk in archive.stream(blob_path):
+            yield chunk
+
+    async def _add_file_details(self, files: List[Dict]) -> None:
+        """Add the logs and translated content of each file to its summary row.
+
+        The logs of all the files are read together, and the translated content
+        is downloaded concurrently, MAX_CONCURRENT_BLOB_READS files at a time.
+        """
+        try:
+            logs = await self.database.get_files_logs(
+                [file["file_id"] for file in files], fields=LogEntryView.FIELDS
+            )
+        except Exception as e:
+            self.logger.error(f"Error retrieving logs of batch files: {str(e)}")
+            logs = {}  # Set empty logs on error
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_BLOB_READS)
 
-            # Process each file to retrieve its logs
-            for file in files:
+        async def translated(file: Dict) -> str:
+            async with semaphore:
                 try:
-                    logs = await self.database.get_file_logs(file["file_id"])
-                    file["logs"] = logs
-                    # Try to get translated content for all files, but prioritize completed files
-                    try:
-                        translated_content = await self.get_file_translated(file)
-                        file["translated_content"] = translated_content
-                    except Exception as e:
-                        self.logger.error(
-                            f"Error retrieving translated content for file {file['file_id']}: {str(e)}"
-                        )
-                        # Ensure translated_content field exists even if empty
-                        file["translated_content"] = ""
+                    return await self.get_file_translated(file)
                 except Exception as e:
                     self.logger.error(
-                        f"Error retrieving logs for file {file['file_id']}: {str(e)}"
+                        f"Error retrieving translated content for file {file['file_id']}: {str(e)}"
                     )
-                    file["logs"] = []  # Set empty logs on error
-                    file["translated_content"] = ""  # Ensure field exists
+                    # Ensure translated_content field exists even if empty
+                    return ""
+
+        contents = await asyncio.gather(*(translated(file) for file in files))
+        for file, translated_content in zip(files, contents):
+            file["logs"] = logs.get(str(file["file_id"]), [])
+            file["translated_content"] = translated_content
+
+    async def get_batch_summary(
+        self, batch_id: str, user_id: str, include_logs: bool = False
+    ) -> Optional[Dict]:
+        """Retrieve the summary of a batch: its record, a status row per file and their counts.
+
+        The rows, counts and timings come from the batch's summary document,
+        which the database keeps up to date as files change, so the summary
+        takes a point read beside the batch record rather than a query over the
+        files. The logs and translated content of the files are fetched only
+        with include_logs.
+        """
+        try:
+            batch, summary = await asyncio.gather(
+                self.database.get_batch(user_id, batch_id),
+                self.database.get_batch_summary(batch_id),
+            )
+            if not batch:
+                return None
+            batch_record = BatchRecord.fromdb(batch)
+            # Deleted between the two reads
+            summary = summary or BatchSummaryView.apply(None, batch_id)
+            files = BatchSummaryView.rows(summary)
+            if include_logs:
+                await self._add_file_details(files)
 
             return {
                 "files": files,
                 "batch": batch_record.dict(),
+                "summary": {**summary["counts"], "timings": summary["timings"]},
             }
         except Exception as e:
             self.logger.error(f"Error retrieving batch information: {str(e)}")
@@ -201,6 +477,11 @@ class BatchService:
 
             if file_record.translated_path:
                 await storage.delete_file(file_record.translated_path)
+            store = await self.get_candidate_store()
+            candidates = await store.list_paths(f"{user_id}/{batch_id}/{file_id}/")
+            await self._delete_blobs(
+                storage, set(candidates) - {file_record.translated_path}
+            )
 
             # Delete file entry from database
             await self.database.delete_file(user_id, file_id)
@@ -209,18 +490,21 @@ class BatchService:
             batch = await self.database.get_batch(user_id, batch_id)
             if batch is not None:
                 try:
-                    batch_record = BatchRecord.fromdb(batch)
-                except Exception as e:
-                    self.logger.error(f"Error converting batch record: {str(e)}")
-                try:
-                    files = await self.database.get_batch_files(batch_id)
+                    files = await self.database.get_batch_files(
+                        batch_id, fields=("file_id",)
+                    )
                     if not files:
                         self.logger.error(f"Error fetching files for batch {batch_id}")
-                    batch_record.file_count = len(files)
-                    batch_record.updated_at = datetime.utcnow().isoformat()
-                    await self.database.update_batch(batch_record)
+                    await self.database.patch_batch(
+                        batch_id,
+                        {
+                            "file_count": len(files),
+                            "updated_at": datetime.utcnow().isoformat(),
+                        },
+                    )
                 except Exception as e:
                     self.logger.error(f"Error updating batch file count: {str(e)}")
+            await self.invalidate_result_archive(batch_id, user_id)
             self.logger.info(
                 f"Successfully deleted file {file_id} from batch {batch_id}"
             )
@@ -233,9 +517,9 @@ class BatchService:
         """Delete all batches, files, and logs for a user."""
         return await self.database.delete_all(user_id)
 
-    async def get_all_batches(self, user_id: str):
-        """Retrieve all batches for a user."""
-        return await self.database.get_user_batches(user_id)
+    async def get_all_batches(self, user_id: str, fields: Optional[Sequence[str]] = None):
+        """Retrieve all batches for a user, optionally only the given fields."""
+        return await self.database.get_user_batches(user_id, fields=fields)
 
     def is_valid_uuid(self, value: str) -> bool:
         """Validate if a given string is a valid UUID."""
@@ -256,6 +540,25 @@ class BatchService:
         # self.logger.info(f"Generated file path: {file_path}")
         return file_path
 
+    @staticmethod
+    def _check_upload_size(file: UploadFile, size: Optional[int]) -> None:
+        if size is not None and size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File {file.filename} exceeds the maximum size of {MAX_UPLOAD_SIZE} bytes",
+            )
+
+    async def _upload_chunks(self, file: UploadFile) -> AsyncIterator[bytes]:
+        """Read an uploaded file in chunks, stopping once it exceeds the maximum size."""
+        size = 0
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            size += len(chunk)
+            self._check_upload_size(file, size)
+            yield chunk
+
     async def upload_file_to_batch(self, batch_id: str, user_id: str, file: UploadFile):
         """Upload a file, create entries in the database, and log the process."""
         try:
@@ -263,6 +566,7 @@ class BatchService:
             storage = await BlobStorageFactory.get_storage()
             if not storage:
                 raise RuntimeError("Storage service not initialized")
+            self._check_upload_size(file, file.size)
 
             # Try to fetch the batch; if it doesn't exist, create a new one
             batch = await self.database.get_batch(user_id, batch_id)
@@ -276,14 +580,13 @@ class BatchService:
                 batch_id, user_id, file_id, file.filename
             )
 
-            # Upload file to blob storage
-            file_content = await file.read()
-
+            # Stream the file to blob storage, without holding all of it in memory
             await storage.upload_file(
-                file_content=file_content,
+                file_content=self._upload_chunks(file),
                 blob_path=blob_path,
                 content_type=file.content_type,
                 metadata={"batch_id": batch_id, "user_id": user_id, "file_id": file_id},
+                length=file.size,
             )
             self.logger.info("File uploaded to blob storage", filename=file.filename, batch_id=batch_id)
 
@@ -302,7 +605,7 @@ class BatchService:
             )
             if isinstance(batch, dict):
                 # Update batch file count
-                files = await self.database.get_batch_files(batch_id)
+                files = await self.database.get_batch_files(batch_id, fields=("file_id",))
                 batch["file_count"] = len(files)
                 batch = await self.database.update_batch_entry(
                     batch_id,
@@ -316,7 +619,7 @@ class BatchService:
 
             elif isinstance(batch, BatchRecord):
                 # Update batch file count
-                files = await self.database.get_batch_files(batch_id)
+                files = await self.database.get_batch_files(batch_id, fields=("file_id",))
                 batch.file_count = len(files)
                 batch.updated_at = datetime.utcnow().isoformat()
                 await self.database.update_batch_entry(
@@ -335,8 +638,317 @@ class BatchService:
             self.logger.error("Error uploading file", error=str(e))
             raise RuntimeError("File upload failed") from e
 
-    async def delete_batch_and_files(self, batch_id: str, user_id: str):
-        """Delete a file from storage, remove its database entry, logs, and update the batch count."""
+    @staticmethod
+    async def _archive_chunks(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> AsyncIterator[bytes]:
+        """Read a file of an uploaded ZIP archive in chunks, off the event loop."""
+        with archive.open(info) as entry:
+            while True:
+                chunk = await asyncio.to_thread(entry.read, UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _upload_sources(
+        self, files: List[UploadFile], archives: List[zipfile.ZipFile]
+    ) -> List[Tuple[str, Optional[int], Callable[[], AsyncIterator[bytes]]]]:
+        """The files to upload, as (name, size, chunks), with ZIP archives expanded.
+
+        Archives opened are added to archives, for the caller to close.
+        """
+        sources = []
+        for file in files:
+            if not (file.filename or "").lower().endswith(".zip"):
+                self._check_upload_size(file, file.size)
+                sources.append((file.filename, file.size, lambda file=file: self._upload_chunks(file)))
+                continue
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile as e:
+                raise HTTPException(status_code=400, detail=f"File {file.filename} is not a valid ZIP archive") from e
+            archives.append(archive)
+            for info in archive.infolist():
+                name = posixpath.basename(info.filename)
+                # Folders, and the metadata some archivers add, are not files to convert
+                if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                if info.file_size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File {info.filename} exceeds the maximum size of {MAX_UPLOAD_SIZE} bytes",
+                    )
+                sources.append(
+                    (name, info.file_size, lambda archive=archive, info=info: self._archive_chunks(archive, info))
+                )
+        return sources
+
+    async def upload_files_to_batch(
+        self, batch_id: str, user_id: str, files: List[UploadFile]
+    ) -> Dict:
+        """Upload many files, or ZIP archives of files, to a batch at once.
+
+        Blobs are uploaded concurrently, then the file records and their upload
+        logs are written in bulk and the batch's file count is updated once.
+        Files whose upload failed are left out and returned by name.
+        """
+        storage = await BlobStorageFactory.get_storage()
+        if not storage:
+            raise RuntimeError("Storage service not initialized")
+        archives: List[zipfile.ZipFile] = []
+        try:
+            sources = self._upload_sources(files, archives)
+            if not sources:
+                raise HTTPException(status_code=400, detail="No files to upload")
+            if len(sources) > MAX_UPLOAD_FILES:
+                raise HTTPException(
+                    status_code=400, detail=f"At most {MAX_UPLOAD_FILES} files can be uploaded at once"
+                )
+
+            batch = await self.database.get_batch(user_id, batch_id)
+            if not batch:
+                batch = (await self.database.create_batch(user_id, UUID(batch_id))).dict()
+
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_BLOB_WRITES)
+
+            async def upload(name: str, size: Optional[int], chunks) -> Optional[Tuple[UUID, str, str]]:
+                file_id = uuid4()
+                blob_path = self.generate_file_path(batch_id, user_id, str(file_id), name)
+                async with semaphore:
+                    try:
+                        await storage.upload_file(
+                            file_content=chunks(),
+                            blob_path=blob_path,
+                            content_type=mimetypes.guess_type(name)[0],
+                            metadata={"batch_id": batch_id, "user_id": user_id, "file_id": str(file_id)},
+                            length=size,
+                        )
+                    except Exception as e:
+                        self.logger.error("Error uploading file", filename=name, batch_id=batch_id, error=str(e))
+                        return None
+                return file_id, name, blob_path
+
+            uploaded = await asyncio.gather(*(upload(*source) for source in sources))
+        finally:
+            for archive in archives:
+                archive.close()
+
+        failed = [source[0] for source, result in zip(sources, uploaded) if result is None]
+        uploaded = [result for result in uploaded if result is not None]
+        batch, files_added = await self._register_files(batch_id, user_id, batch, uploaded)
+        self.logger.info(
+            "Files uploaded to batch", batch_id=batch_id, uploaded=len(files_added), failed=len(failed)
+        )
+        return {"batch": batch, "files": files_added, "failed": failed}
+
+    async def _register_files(
+        self, batch_id: str, user_id: str, batch: Dict, uploaded: List[Tuple[UUID, str, str]]
+    ) -> Tuple[Dict, List[Dict]]:
+        """Add the records of uploaded files, given as (file_id, file_name, blob_path), in bulk.
+
+        Returns:
+            The batch, with its file count updated once, and the files added.
+        """
+        file_records = await self.database.add_files(UUID(batch_id), uploaded) if uploaded else []
+        files_added = [file_record.dict() for file_record in file_records]
+        now = datetime.now(timezone.utc)
+        await self.database.add_file_logs(
+            [
+                FileLog(
+                    log_id=uuid4(),
+                    file_id=file_record.file_id,
+                    description="File uploaded successfully",
+                    last_candidate="",
+                    log_type=LogType.SUCCESS,
+                    agent_type=AgentType.HUMAN,
+                    author_role=AuthorRole.USER,
+                    timestamp=now,
+                )
+                for file_record in file_records
+            ]
+        )
+        # Counted once for all the files
+        files = await self.database.get_batch_files(batch_id, fields=("file_id",))
+        batch = await self.database.update_batch_entry(
+            batch_id, user_id, ProcessStatus.READY_TO_PROCESS, len(files), existing_batch=batch
+        )
+        return batch, files_added
+
+    async def create_upload_urls(
+        self, batch_id: str, user_id: str, file_names: List[str]
+    ) -> List[Dict]:
+        """Issue URLs for a client to upload files straight to storage.
+
+        Each URL can only write the blob of one new file of the user's batch,
+        user_id/batch_id/file_id/file_name, and expires after UPLOAD_URL_TTL
+        seconds. The files are added to the batch by complete_uploads once
+        the client has uploaded them.
+        """
+        if not file_names:
+            raise HTTPException(status_code=400, detail="No files to upload")
+        if len(file_names) > MAX_UPLOAD_FILES:
+            raise HTTPException(
+                status_code=400, detail=f"At most {MAX_UPLOAD_FILES} files can be uploaded at once"
+            )
+        storage = await BlobStorageFactory.get_storage()
+        if not await self.database.get_batch(user_id, batch_id):
+            await self.database.create_batch(user_id, UUID(batch_id))
+
+        expires_at = (datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_URL_TTL)).isoformat()
+        uploads = []
+        for file_name in file_names:
+            file_id = str(uuid4())
+            blob_path = self.generate_file_path(batch_id, user_id, file_id, file_name)
+            upload_url = await storage.get_upload_url(blob_path, UPLOAD_URL_TTL)
+            if upload_url is None:
+                raise HTTPException(status_code=501, detail="The storage does not take direct uploads")
+            uploads.append(
+                {
+                    "file_id": file_id,
+                    "file_name": file_name,
+                    "upload_url": upload_url,
+                    "expires_at": expires_at,
+                }
+            )
+        self.logger.info("Upload URLs issued", batch_id=batch_id, count=len(uploads))
+        return uploads
+
+    async def complete_uploads(
+        self, batch_id: str, user_id: str, uploads: List[Dict]
+    ) -> Optional[Dict]:
+        """Add files that a client uploaded with URLs from create_upload_urls to the batch.
+
+        Each file is given by the file_id and file_name its URL was issued for.
+        The blob path follows from them and the user, so only the user's own
+        uploads can be added. Files already added are skipped, and a file_id
+        given more than once is added once, with its first file_name. Files
+        with no blob, larger than the maximum upload size, or whose file_id is
+        a file of another batch, are returned as failed. Their blobs are
+        deleted, as are those uploaded under the file_id with another name, so
+        no blob is left under the batch without a file record.
+
+        Returns:
+            As upload_files_to_batch, or None if the batch does not exist.
+        """
+        batch = await self.database.get_batch(user_id, batch_id)
+        if not batch:
+            return None
+        unique: Dict[str, Dict] = {}
+        for upload in uploads:
+            unique.setdefault(str(UUID(str(upload["file_id"]))), upload)
+        uploads = list(unique.values())
+        storage = await BlobStorageFactory.get_storage()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_BLOB_READS)
+
+        async def check(upload: Dict):
+            file_id = str(UUID(str(upload["file_id"])))
+            file_name = upload["file_name"]
+            blob_path = self.generate_file_path(batch_id, user_id, file_id, file_name)
+            async with semaphore:
+                file = await self.database.get_file(file_id, fields=("batch_id",))
+                if file and str(file["batch_id"]) == str(batch_id):
+                    return False
+                blobs = await storage.list_files(f"{user_id}/{batch_id}/{file_id}/")
+            blob = next((blob for blob in blobs if blob["name"] == blob_path), None)
+            if file:
+                self.logger.error("Upload of a file of another batch", batch_id=batch_id, file_id=file_id)
+                blob = None
+            elif blob is not None and (blob.get("size") or 0) > MAX_UPLOAD_SIZE:
+                self.logger.error("Uploaded file too large", batch_id=batch_id, file_id=file_id)
+                blob = None
+            rejected = [item["name"] for item in blobs if item is not blob]
+            if rejected:
+                await self._delete_blobs(storage, rejected)
+            if blob is None:
+                return None
+            return UUID(file_id), file_name, blob_path
+
+        results = await asyncio.gather(*(check(upload) for upload in uploads))
+        failed = [upload["file_name"] for upload, result in zip(uploads, results) if result is None]
+        uploaded = [result for result in results if result]
+        batch, files_added = await self._register_files(batch_id, user_id, batch, uploaded)
+        self.logger.info(
+            "Direct uploads added to batch", batch_id=batch_id, uploaded=len(files_added), failed=len(failed)
+        )
+        return {"batch": batch, "files": files_added, "failed": failed}
+
+    async def _delete_blobs(self, storage, blob_paths: Iterable[str]) -> int:
+        """Delete blobs in bulk, returning how many failed."""
+        failed = await storage.delete_files(
+            [path for path in blob_paths if path], MAX_CONCURRENT_BLOB_DELETES
+        )
+        for blob_path in failed:
+            self.logger.error(f"Failed to delete file from storage: {blob_path}")
+        return len(failed)
+
+    def _log_delete_progress(self, done: int, total: int) -> None:
+        if done % DELETE_PROGRESS_INTERVAL == 0 or done == total:
+            self.logger.info("Delete progress", deleted=done, total=total)
+
+    async def _purge_batch(self, batch_id: str, user_id: str, files: List[Dict]) -> None:
+        """Delete every blob of a batch, the logs and records of its files, then the batch.
+
+        The blobs are listed under user_id/batch_id/ rather than taken from the
+        file records, so uploads never added to the batch are deleted too.
+        """
+        storage = await BlobStorageFactory.get_storage()
+        if not storage:
+            raise RuntimeError("Storage service not initialized")
+        blobs = await storage.list_files(f"{user_id}/{batch_id}/")
+        failed = await self._delete_blobs(storage, [blob["name"] for blob in blobs])
+        await self.database.delete_files(
+            user_id, [str(file["file_id"]) for file in files], progress=self._log_delete_progress
+        )
+        if failed:
+            self.logger.error("Some files were not deleted from storage", failed=failed)
+        await self.invalidate_result_archive(batch_id, user_id)
+        await self.database.delete_batch(user_id, batch_id)
+        self.logger.info("Batch and all files deleted successfully", batch_id=batch_id)
+
+    def _purge_batch_later(self, batch_id: str, user_id: str, files: List[Dict]) -> None:
+        async def purge() -> None:
+            try:
+                await self._purge_batch(batch_id, user_id, files)
+            except Exception as e:
+                self.logger.error(
+                    "Failed to delete soft deleted batch", batch_id=batch_id, error=str(e)
+                )
+
+        task = asyncio.create_task(purge())
+        self._pending_deletes.add(task)
+        task.add_done_callback(self._pending_deletes.discard)
+
+    async def resume_deletes(self) -> int:
+        """Restart the background deletion of the soft deleted batches still stored.
+
+        The deletions run in this process only, so those a restart interrupted are
+        found again from the batches marked by expire_batch, as long as their time
+        to live has not elapsed. Returns the number of batches scheduled.
+        """
+        batches = await self.database.get_deleted_batches()
+        for batch in batches:
+            batch_id = str(batch["batch_id"])
+            files = await self.database.get_batch_files(batch_id)
+            self._purge_batch_later(batch_id, batch["user_id"], files)
+        if batches:
+            self.logger.info("Resumed deleting soft deleted batches", count=len(batches))
+        return len(batches)
+
+    @classmethod
+    async def wait_for_deletes(cls) -> None:
+        """Wait for the background deletions of soft deleted batches."""
+        if cls._pending_deletes:
+            await asyncio.gather(*list(cls._pending_deletes), return_exceptions=True)
+
+    async def delete_batch_and_files(
+        self, batch_id: str, user_id: str, soft_delete_ttl: Optional[int] = None
+    ):
+        """Delete a batch with its files in storage, their database entries and logs.
+
+        With a soft delete TTL the batch record is given that time to live, which
+        hides it once Cosmos DB expires it, and the files are deleted in the
+        background so the request returns immediately. A batch already soft
+        deleted is not found again, so its deletion is not scheduled twice.
+        """
+        soft_delete_ttl = SOFT_DELETE_TTL if soft_delete_ttl is None else soft_delete_ttl
         try:
             # Ensure storage is available
             storage = await BlobStorageFactory.get_storage()
@@ -345,36 +957,19 @@ class BatchService:
 
             batch = await self.database.get_batch(user_id, batch_id)
             self.logger.info(f"Batch for delete: {batch}")
-            if not batch:
+            if not batch or batch.get("deleted_at"):
                 return {"message": "Batch not found"}
 
+            # A batch with no files may still hold uploads never added to it
             files = await self.database.get_batch_files(batch_id)
-            if not files:
-                raise ValueError("No files found in the batch")
-            for file in files:
-                file_record = FileRecord.fromdb(file)
-                blob_path = file_record.blob_path
-
-                deleted = await storage.delete_file(blob_path)
 
-                if not deleted:
-                    self.logger.error(
-                        f"Failed to delete file from storage: {blob_path}"
-                    )
-
-                if file_record.translated_path:
-                    delete_translate = await storage.delete_file(
-                        file_record.translated_path
-                    )
-                    if not delete_translate:
-                        self.logger.error(
-                            f"Failed to delete translated file from storage: {file_record.translated_path}"
-                        )
+            if soft_delete_ttl > 0:
+                await self.database.expire_batch(user_id, batch_id, soft_delete_ttl)
+                self._purge_batch_later(batch_id, user_id, files)
+                self.logger.info("Batch scheduled for deletion", batch_id=batch_id)
+                return {"message": "Files scheduled for deletion"}
 
-                # Delete file and log entry from database
-                await self.database.delete_file(user_id, str(file_record.file_id))
-            await self.database.delete_batch(user_id, batch_id)
-            self.logger.info("Batch and all files deleted successfully", batch_id=batch_id)
+            await self._purge_batch(batch_id, user_id, files)
             return {"message": "Files deleted successfully"}
 
         except (RuntimeError, ValueError, IOError) as e:
@@ -389,21 +984,28 @@ class BatchService:
         error_count: int,
         syntax_count: int,
     ):
-        """Update file entry in the database."""
-        file = await self.database.get_file(file_id)
+        """Update file entry in the database.
+
+        The status is set and the counts are added in a single partial update,
+        so concurrent updates of the counters are not lost.
+        """
+        file = await self.database.patch_file(
+            file_id,
+            fields={
+                "status": status.value,
+                "file_result": file_result.value if file_result else None,
+                "updated_at": datetime.utcnow().isoformat(),
+            },
+            increments={"error_count": error_count, "syntax_count": syntax_count},
+        )
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
-        file_record = FileRecord.fromdb(file)
-        file_record.status = status
-        file_record.file_result = file_result
-        file_record.error_count += error_count
-        file_record.syntax_count += syntax_count
-        file_record.updated_at = datetime.utcnow()
-        await self.database.update_file(file_record)
-        return file_record
+        return FileRecord.fromdb(file)
 
     async def update_file_record(self, file_record: FileRecord):
         """Update file entry in the database."""
+        # Apply the counter increments of buffered logs before replacing the record
+        await self.flush_file_logs(str(file_record.file_id))
         await self.database.update_file(file_record)
 
     async def create_file_log(
@@ -415,7 +1017,31 @@ class BatchService:
         agent_type: AgentType,
         author_role: AuthorRole,
     ):
-        """Create a new file log entry in the database."""
+        """Create a new file log entry, buffered when a log buffer is available.
+
+        A candidate of at least CANDIDATE_STORE_MIN_SIZE characters is kept once
+        in the candidate store and the entry holds its hash. Buffered entries
+        store their candidate when the buffer writes them, off the caller's path.
+        """
+        large = last_candidate and len(last_candidate) >= CANDIDATE_STORE_MIN_SIZE
+        if self.log_buffer is not None:
+            if large:
+                self.log_buffer.candidate_store = await self.get_candidate_store()
+            await self.log_buffer.add(
+                file_id,
+                description,
+                last_candidate,
+                log_type,
+                agent_type,
+                author_role,
+            )
+            return
+        candidate_hash = None
+        if large:
+            store = await self.get_candidate_store()
+            candidate_hash = await store.put(file_id, last_candidate)
+            if candidate_hash:
+                last_candidate = ""
         await self.database.add_file_log(
             UUID(file_id),
             description,
@@ -423,17 +1049,27 @@ class BatchService:
             log_type,
             agent_type,
             author_role,
+            candidate_hash=candidate_hash,
         )
 
+    async def flush_file_logs(self, file_id: str):
+        """Write out the buffered log entries of a file."""
+        if self.log_buffer is not None:
+            await self.log_buffer.flush(file_id)
+
+    async def flush_logs(self):
+        """Write out all buffered log entries."""
+        if self.log_buffer is not None:
+            await self.log_buffer.flush_all()
+
     async def update_batch(self, batch_id: str, status: ProcessStatus):
-        """Update batch status to completed."""
-        batch = await self.database.get_batch_from_id(batch_id)
+        """Update batch status with a partial update, without reading the batch."""
+        batch = await self.database.patch_batch(
+            batch_id,
+            {"status": status.value, "updated_at": datetime.utcnow().isoformat()},
+        )
         if not batch:
             raise HTTPException(status_code=404, detail="Batch not found")
-        batch_record = BatchRecord.fromdb(batch)
-        batch_record.status = status
-        batch_record.updated_at = datetime.utcnow()
-        await self.database.update_batch(batch_record)
         self.logger.info("Batch status updated", batch_id=batch_id, status=status.value)
 
     async def create_candidate(self, file_id: str, candidate: str):
@@ -447,26 +1083,13 @@ class BatchService:
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
         file_record = FileRecord.fromdb(file)
-        batch_id = str(file_record.batch_id)
-        batch = await self.database.get_batch_from_id(batch_id)
-        batch_record = BatchRecord.fromdb(batch)
-        user_id = batch_record.user_id
-        # Generate a clean file path
-        blob_path = self.generate_file_path(
-            str(batch_id), user_id, file_id, f"candidate_{file_record.original_name}"
-        )
-
-        # Upload file to blob storage
-        file_content = candidate
-        try:
-            await storage.upload_file(
-                file_content=file_content,
-                blob_path=blob_path,
-                content_type="text/plain",
-                metadata={"batch_id": batch_id, "user_id": user_id, "file_id": file_id},
-            )
-        except Exception as e:
-            self.logger.error(f"Error uploading file content: {str(e)}")
+        # The final candidate is usually stored already, referenced by the success
+        # log, and the translated file points at that same blob
+        store = await self.get_candidate_store()
+        candidate_hash = await store.put(file_id, candidate, force=True)
+        blob_path = await store.path(file_id, candidate_hash) if candidate_hash else ""
+        if not blob_path:
+            self.logger.error("Error uploading file content", file_id=file_id)
         file_record.translated_path = blob_path
         file_record.status = ProcessStatus.COMPLETED
         file_record.updated_at = datetime.utcnow()
@@ -496,6 +1119,7 @@ class BatchService:
                 error_count, syntax_count = await self.get_file_counts(
                     str(file_record.file_id)
                 )
+                # Mirror the increment the error log below applies to the stored counter
                 file_record.error_count = error_count + 1
                 file_record.syntax_count = syntax_count
                 try:
@@ -531,71 +1155,76 @@ class BatchService:
         await self.update_file_record(file_record)
 
     async def get_file_counts(self, file_id: str):
-        file_logs = await self.database.get_file_logs(file_id)
-        if not file_logs:
+        """Get the error and warning counters kept on the file record."""
+        await self.flush_file_logs(file_id)
+        file = await self.database.get_file(file_id, fields=FileCountsView.FIELDS)
+        if not file:
             return 0, 0
-        error_count = (
-            sum(1 for log in file_logs if log["log_type"] == LogType.ERROR.value)
-            if file_logs
-            else 0
-        )
-        syntax_count = (  # Count syntax errors
-            sum(1 for log in file_logs if log["log_type"] == LogType.WARNING.value)
-            if file_logs
-            else 0
-        )
-        return error_count, syntax_count
+        counts = FileCountsView.fromdb(file)
+        return counts.error_count, counts.syntax_count
 
     async def get_batch_from_id(self, batch_id: str):
         """Retrieve a batch record from the database."""
         return await self.database.get_batch_from_id(batch_id)
 
     async def delete_all_from_storage_cosmos(self, user_id: str):
-        """Delete a all files from storage, remove its database entry, logs."""
+        """Delete all files of a user from storage, remove their database entries, logs.
+
+        Only the blobs under the user's folder, ``user_id/``, are listed, and they
+        are deleted in bulk. The files and logs to delete in the database are
+        found from the user's batches, so the time taken depends on the user's
+        own data rather than everything in the container.
+        """
         try:
             # Ensure storage is available
             storage = await BlobStorageFactory.get_storage()
             if not storage:
                 raise RuntimeError("Storage service not initialized")
 
-            # List all the storage files
-            liststoragefiles = await storage.list_files()
-            for storage_file in liststoragefiles:
-                blob_path = storage_file["name"]
-
-                deleted = await storage.delete_file(blob_path)
-
-                if not deleted:
-                    raise RuntimeError("Failed to delete file from storage")
+            # Uploads, candidates, translations and result archives of the user
+            blobs = await storage.list_files(f"{user_id}/")
+            failed = await storage.delete_files(
+                [blob["name"] for blob in blobs], MAX_CONCURRENT_BLOB_DELETES
+            )
+            if failed:
+                self.logger.error("Some files were not deleted from storage", failed=len(failed))
+                raise RuntimeError("Failed to delete file from storage")
 
-                # Get the file id
-                file_id = blob_path.split("/")[2]
-                # Fetch file entry
-                file_entry = await self.database.get_file(file_id)
-                if not file_entry:
-                    self.logger.info(f"File not found: {file_id}")
-                else:
-                    if file_entry["translated_path"]:
-                        await storage.delete_file(file_entry["translated_path"])
+            # Delete file and log entries of every batch from database
+            batches = await self.get_all_batches(user_id, fields=("batch_id",))
+            batch_ids = [str(batch["batch_id"]) for batch in batches]
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCH_DELETES)
 
-                    # Delete file and log entry from database
-                    await self.database.delete_file(user_id, file_id)
+            async def list_files(batch_id: str) -> List[Dict]:
+                async with semaphore:
+                    return await self.database.get_batch_files(batch_id, fields=("file_id",))
 
-            # Get all batches
-            alluserbatches = await self.get_all_batches(user_id)
-            try:
-                for userbatch in alluserbatches:
-                    batch_id = userbatch["batch_id"]
+            async def delete_batch(batch_id: str) -> None:
+                async with semaphore:
                     await self.database.delete_batch(user_id, batch_id)
 
-                return {"message": "All user data deleted successfully"}
+            batch_files = await asyncio.gather(*(list_files(batch_id) for batch_id in batch_ids))
+            await self.database.delete_files(
+                user_id,
+                [str(file["file_id"]) for files in batch_files for file in files],
+                progress=self._log_delete_progress,
+            )
 
-            except Exception as e:
-                self.logger.error(
-                    f"Error occurred while deleting the batch with ID: {batch_id}",
-                    error=str(e),
-                )
-                raise RuntimeError("Delete batch operation failed") from e
+            results = await asyncio.gather(
+                *(delete_batch(batch_id) for batch_id in batch_ids),
+                return_exceptions=True,
+            )
+            for batch_id, result in zip(batch_ids, results):
+                if isinstance(result, Exception):
+                    self.logger.error(
+                        f"Error occurred while deleting the batch with ID: {batch_id}",
+                        error=str(result),
+                    )
+                    raise RuntimeError("Delete batch operation failed") from result
+            self.logger.info(
+                "All user data deleted", blobs=len(blobs), batches=len(batch_ids)
+            )
+            return {"message": "All user data deleted successfully"}
 
         except (RuntimeError, ValueError, IOError) as e:
             self.logger.error(
@@ -614,7 +1243,7 @@ class BatchService:
 
             # Fetch batch history from CosmosDBClient
             batch_history = await self.database.get_batch_history(
-                user_id, limit=limit, offset=offset
+                user_id, limit=limit, offset=offset, fields=BatchHistoryView.FIELDS
             )
 
             if not batch_history:
@@ -625,3 +1254,21 @@ class BatchService:
         except (RuntimeError, ValueError, IOError) as e:
             self.logger.error(f"Failed to retrieve batch history: {str(e)}")
             raise RuntimeError("Error retrieving batch history") from e
+
+    async def get_batch_history_page(
+        self,
+        user_id: str,
+        page_size: Optional[int] = None,
+        continuation_token: Optional[str] = None,
+    ) -> Dict:
+        """Retrieve one page of the user's batch history and the next page's token."""
+        if not self.database:
+            await self.initialize_database()
+
+        batches, next_token = await self.database.get_batch_history_page(
+            user_id,
+            page_size or DEFAULT_PAGE_SIZE,
+            continuation_token,
+            fields=BatchHistoryView.FIELDS,
+        )
+        return {"batches": batches, "continuation_token": next_token}
@@ -1,26 +1,72 @@
-from typing import Any, BinaryIO, Dict, Optional
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, List, Optional, Union
 
-from azure.storage.blob import BlobServiceClient
+from azure.core.credentials_async import AsyncTokenCredential
+from azure.storage.blob import BlobSasPermissions, ContentSettings, UserDelegationKey, generate_blob_sas
+from azure.storage.blob.aio import BlobServiceClient
 
-from common.config.config import app_config
 from common.logger.app_logger import AppLogger
 from common.storage.blob_base import BlobStorageBase
 
-from helper.azure_credential_utils import get_azure_credential
+# Connections used at the same time to upload or download the ranges of one large blob
+AZURE_BLOB_MAX_CONCURRENCY = int(os.getenv("AZURE_BLOB_MAX_CONCURRENCY", "4"))
+# Larger uploads, or uploads of unknown size, are staged in blocks
+MAX_SINGLE_PUT_SIZE = 8 * 1024 * 1024
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+# Validity of the user delegation key that signs upload URLs, reused until it
+# would expire before a new URL
+DELEGATION_KEY_LIFETIME = timedelta(hours=6)
+# Allowance for clocks behind the storage service's, on the start of upload URLs
+CLOCK_SKEW = timedelta(minutes=5)
+# Most blobs the service deletes in one batch request
+DELETE_BATCH_SIZE = 256
 
 
 class AzureBlobStorage(BlobStorageBase):
-    def __init__(self, account_name: str, container_name: Optional[str] = None):
+    def __init__(
+        self,
+        account_name: str,
+        container_name: Optional[str] = None,
+        credential: Optional[AsyncTokenCredential] = None,
+        account_url: Optional[str] = None,
+        account_key: Optional[str] = None,
+    ):
+        """Connect to a container of a storage account.
+
+        Args:
+            account_name: The storage account.
+            container_name: The container the blob paths are in.
+            credential: Entra ID credential, used unless an account key is given.
+            account_url: The blob service URL, by default the account's in the
+                public cloud; set it for other clouds and for Azurite.
+            account_key: Shared key of the account, as Azurite needs; upload URLs
+                are then signed with it instead of a user delegation key.
+        """
         self.logger = AppLogger("AzureBlobStorage")
         try:
             self.account_name = account_name
             self.container_name = container_name
+            self.credential = credential
+            self.account_url = account_url or f"https://{self.account_name}.blob.core.windows.net/"
+            self.account_key = account_key
+            self._delegation_key: Optional[UserDelegationKey] = None
+            self._delegation_key_expiry: Optional[datetime] = None
+            self._delegation_key_lock = asyncio.Lock()
             self.service_client = None
             self.container_client = None
-            credential = get_azure_credential(app_config.azure_client_id)  # Using Entra Authentication
+            # One client for the process, so that every blob client shares its
+            # connection pool
             self.service_client = BlobServiceClient(
-                account_url=f"https://{self.account_name}.blob.core.windows.net/",
-                credential=credential,
+                account_url=self.account_url,
+                credential=(
+                    {"account_name": account_name, "account_key": account_key}
+                    if account_key
+                    else credential
+                ),
+                max_single_put_size=MAX_SINGLE_PUT_SIZE,
+                max_block_size=MAX_BLOCK_SIZE,
             )
 
             self.container_client = self.service_client.get_container_client(
@@ -38,10 +84,11 @@ class AzureBlobStorage(BlobStorageBase):
 
     async def upload_file(
         self,
-        file_content: BinaryIO,
+        file_content: Union[bytes, str, BinaryIO, AsyncIterable[bytes]],
         blob_path: str,
         content_type: Optional[str] = None,
         metadata: Optional[Dict[str, str]] = None,
+        length: Optional[int] = None,
     ) -> Dict[str, Any]:
         """Upload a file to Azure Blob Storage."""
         try:
@@ -50,40 +97,38 @@ class AzureBlobStorage(BlobStorageBase):
         except Exception as e:
             self.logger.error(".get_blob_client", error=str(e), blob_path=blob_path)
             raise
+        if isinstance(file_content, str):
+            file_content = file_content.encode("utf-8")
+        if length is None and isinstance(file_content, bytes):
+            length = len(file_content)
         try:
-            # Upload the file
-            blob_client.upload_blob(
+            # Upload the file; the response carries what the details need
+            response = await blob_client.upload_blob(
                 file_content,
-                content_type=content_type,
+                length=length,
+                content_settings=ContentSettings(content_type=content_type),
                 metadata=metadata,
                 overwrite=True,
+                max_concurrency=AZURE_BLOB_MAX_CONCURRENCY,
             )
         except Exception as e:
             self.logger.error("upload_blob", error=str(e), blob_path=blob_path)
             raise
-        try:
-
-            # Get blob properties
-            properties = blob_client.get_blob_properties()
-
-            return {
-                "path": blob_path,
-                "size": properties.size,
-                "content_type": properties.content_settings.content_type,
-                "created_at": properties.creation_time,
-                "url": blob_client.url,
-                "etag": properties.etag,
-            }
-        except Exception as e:
-            self.logger.error("get_blob_properties", error=str(e), blob_path=blob_path)
-            raise
+        return {
+            "path": blob_path,
+            "size": length,
+            "content_type": content_type,
+            "created_at": response.get("last_modified"),
+            "url": blob_client.url,
+            "etag": response.get("etag"),
+        }
 
     async def get_file(self, blob_path: str) -> BinaryIO:
         """Download a file from Azure Blob Storage."""
         try:
             blob_client = self.container_client.get_blob_client(blob_path)
-            download_stream = blob_client.download_blob()
-            file_bytes = download_stream.readall()
+            download = await blob_client.download_blob(max_concurrency=AZURE_BLOB_MAX_CONCURRENCY)
+            file_bytes = await download.readall()
             # using utf-8-sig to remove BOM - Byte Order Mark
             # this also screens out non text utf-8 files
 
@@ -95,11 +140,74 @@ class AzureBlobStorage(BlobStorageBase):
             )
             raise
 
+    async def stream_file(self, blob_path: str) -> AsyncIterator[bytes]:
+        """Download a file from Azure Blob Storage in chunks, as bytes."""
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            download = await blob_client.download_blob()
+        except Exception as e:
+            self.logger.error(
+                "Failed to download file", error=str(e), blob_path=blob_path
+            )
+            raise
+        async for chunk in download.chunks():
+            yield chunk
+
+    async def _get_delegation_key(self, valid_until: datetime) -> UserDelegationKey:
+        """A user delegation key valid until at least the given time."""
+        async with self._delegation_key_lock:
+            if self._delegation_key is None or self._delegation_key_expiry < valid_until:
+                now = datetime.now(timezone.utc)
+                expiry = max(now + DELEGATION_KEY_LIFETIME, valid_until)
+                self._delegation_key = await self.service_client.get_user_delegation_key(
+                    key_start_time=now - CLOCK_SKEW, key_expiry_time=expiry
+                )
+                self._delegation_key_expiry = expiry
+            return self._delegation_key
+
+    async def get_upload_url(self, blob_path: str, expires_in: int) -> Optional[str]:
+        """Create a SAS URL that can only create one blob.
+
+        Without write permission the URL cannot replace the blob once it
+        exists, so a file registered by complete_uploads keeps its content
+        while it is converted. It is signed with the account key when there is
+        one, and with a user delegation key otherwise.
+        """
+        try:
+            now = datetime.now(timezone.utc)
+            expiry = now + timedelta(seconds=expires_in)
+            if self.account_key:
+                signing_key = {"account_key": self.account_key}
+            else:
+                signing_key = {"user_delegation_key": await self._get_delegation_key(expiry)}
+            sas = generate_blob_sas(
+                account_name=self.account_name,
+                container_name=self.container_name,
+                blob_name=blob_path,
+                **signing_key,
+                permission=BlobSasPermissions(create=True),
+                start=now - CLOCK_SKEW,
+                expiry=expiry,
+            )
+            return f"{self.container_client.get_blob_client(blob_path).url}?{sas}"
+        except Exception as e:
+            self.logger.error("Failed to create upload URL", error=str(e), blob_path=blob_path)
+            raise
+
+    async def set_metadata(self, blob_path: str, metadata: Dict[str, str]) -> None:
+        """Replace the metadata of a blob in Azure Blob Storage."""
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            await blob_client.set_blob_metadata(metadata)
+        except Exception as e:
+            self.logger.error("Failed to set metadata", error=str(e), blob_path=blob_path)
+            raise
+
     async def delete_file(self, blob_path: str) -> bool:
         """Delete a file from Azure Blob Storage."""
         try:
             blob_client = self.container_client.get_blob_client(blob_path)
-            blob_client.delete_blob()
+            await blob_client.delete_blob()
             return True
 
         except Exception as e:
@@ -108,11 +216,54 @@ class AzureBlobStorage(BlobStorageBase):
             )
             return False
 
+    async def _delete_batch(self, blob_paths: List[str]) -> List[str]:
+        """Delete up to DELETE_BATCH_SIZE blobs in one request, returning those not deleted."""
+        # One response per blob, in request order
+        responses = [
+            response
+            async for response in await self.container_client.delete_blobs(
+                *blob_paths, raise_on_any_failure=False
+            )
+        ]
+        # Blobs already gone count as deleted
+        return [
+            blob_path
+            for blob_path, response in zip(blob_paths, responses)
+            if response.status_code not in (202, 404)
+        ]
+
+    async def delete_files(self, blob_paths: List[str], max_concurrency: int = 20) -> List[str]:
+        """Delete blobs in batch requests of DELETE_BATCH_SIZE, at most max_concurrency at once."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        failed: List[str] = []
+        unbatched: List[str] = []
+
+        async def delete(chunk: List[str]) -> None:
+            async with semaphore:
+                try:
+                    failed.extend(await self._delete_batch(chunk))
+                except Exception as e:
+                    # Batch requests are refused by some emulators and network rules
+                    self.logger.warning("Batch delete failed", error=str(e), blobs=len(chunk))
+                    unbatched.extend(chunk)
+
+        await asyncio.gather(
+            *(
+                delete(blob_paths[start:start + DELETE_BATCH_SIZE])
+                for start in range(0, len(blob_paths), DELETE_BATCH_SIZE)
+            )
+        )
+        for blob_path in failed:
+            self.logger.error("Failed to delete file", blob_path=blob_path)
+        if unbatched:
+            failed += await super().delete_files(unbatched, max_concurrency)
+        return failed
+
     async def list_files(self, prefix: Optional[str] = None) -> list[Dict[str, Any]]:
         """List files in Azure Blob Storage."""
         try:
             blobs = []
-            async for blob in self.container_client.list_blobs(name_starts_with=prefix):
+            async for blob in self.container_client.list_blobs(name_starts_with=prefix, include=["metadata"]):
                 blobs.append(
                     {
                         "name": blob.name,
@@ -131,5 +282,7 @@ class AzureBlobStorage(BlobStorageBase):
     async def close(self) -> None:
         """Close blob storage connections."""
         if self.service_client:
-            self.service_client.close()
+            await self.service_client.close()
             self.logger.info("Closed blob storage connection")
+        if self.credential:
+            await self.credential.close()
@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, BinaryIO, Dict, Optional
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, List, Optional, Union
 
 
 class BlobStorageBase(ABC):
@@ -8,19 +9,21 @@ class BlobStorageBase(ABC):
     @abstractmethod
     async def upload_file(
         self,
-        file_content: BinaryIO,
+        file_content: Union[bytes, str, BinaryIO, AsyncIterable[bytes]],
         blob_path: str,
         content_type: Optional[str] = None,
-        metadata: Optional[Dict[str, str]] = None
+        metadata: Optional[Dict[str, str]] = None,
+        length: Optional[int] = None,
     ) -> Dict[str, Any]:
         """
         Upload a file to blob storage.
 
         Args:
-            file_content: The file content to upload
+            file_content: The file content to upload, or its chunks
             blob_path: The path where to store the blob
             content_type: Optional content type of the file
             metadata: Optional metadata to store with the blob
+            length: Size of the content in bytes, if known
 
         Returns:
             Dict containing upload details (url, size, etc.)
@@ -40,6 +43,44 @@ class BlobStorageBase(ABC):
         """
         pass
 
+    @abstractmethod
+    def stream_file(self, blob_path: str) -> AsyncIterator[bytes]:
+        """
+        Retrieve a file from blob storage in chunks, as bytes.
+
+        Args:
+            blob_path: Path to the blob
+
+        Returns:
+            Async iterator over the chunks of the file
+        """
+        pass
+
+    @abstractmethod
+    async def get_upload_url(self, blob_path: str, expires_in: int) -> Optional[str]:
+        """
+        Create a URL that a client can upload one blob to directly.
+
+        Args:
+            blob_path: Path of the only blob the URL can write
+            expires_in: Seconds the URL stays valid
+
+        Returns:
+            The URL, or None if the storage takes no direct uploads
+        """
+        pass
+
+    @abstractmethod
+    async def set_metadata(self, blob_path: str, metadata: Dict[str, str]) -> None:
+        """
+        Replace the metadata of a blob.
+
+        Args:
+            blob_path: Path to the blob
+            metadata: The metadata the blob keeps
+        """
+        pass
+
     @abstractmethod
     async def delete_file(self, blob_path: str) -> bool:
         """
@@ -53,6 +94,29 @@ class BlobStorageBase(ABC):
         """
         pass
 
+    async def delete_files(self, blob_paths: List[str], max_concurrency: int = 20) -> List[str]:
+        """
+        Delete many files from blob storage.
+
+        Storages without a bulk delete delete the files one at a time, at most
+        max_concurrency at once.
+
+        Args:
+            blob_paths: Paths of the blobs to delete
+            max_concurrency: Deletes in flight at the same time
+
+        Returns:
+            The paths that were not deleted
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def delete(blob_path: str) -> bool:
+            async with semaphore:
+                return await self.delete_file(blob_path)
+
+        deleted = await asyncio.gather(*(delete(blob_path) for blob_path in blob_paths))
+        return [blob_path for blob_path, ok in zip(blob_paths, deleted) if not ok]
+
     @abstractmethod
     async def list_files(self, prefix: Optional[str] = None) -> list[Dict[str, Any]]:
         """
@@ -65,3 +129,8 @@ class BlobStorageBase(ABC):
             List of blob details
         """
         pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release the connections of the storage, on shutdown."""
+        pass
@@ -5,6 +5,9 @@ from common.config.config import Config  # Load config
 from common.logger.app_logger import AppLogger
 from common.storage.blob_azure import AzureBlobStorage
 from common.storage.blob_base import BlobStorageBase
+from common.storage.blob_local import LocalBlobStorage
+
+from helper.azure_credential_utils import get_azure_credential_async
 
 
 class BlobStorageFactory:
@@ -16,9 +19,21 @@ class BlobStorageFactory:
         if BlobStorageFactory._instance is None:
             config = Config()
 
+            if config.storage_backend == "local":
+                BlobStorageFactory._instance = LocalBlobStorage(config.local_storage_path)
+                BlobStorageFactory._logger.info(
+                    f"Initialized local blob storage: {config.local_storage_path}"
+                )
+                return BlobStorageFactory._instance
+
+            account_key = config.azure_blob_account_key
             BlobStorageFactory._instance = AzureBlobStorage(
                 account_name=config.azure_blob_account_name,
                 container_name=config.azure_blob_container_name,
+                # Using Entra Authentication, unless an emulator's account key is set
+                credential=None if account_key else await get_azure_credential_async(config.azure_client_id),
+                account_url=config.azure_blob_endpoint,
+                account_key=account_key,
             )
             BlobStorageFactory._logger.info(
                 f"Initialized Azure Blob Storage: {config.azure_blob_container_name}"
@@ -28,7 +43,9 @@ class BlobStorageFactory:
     @staticmethod
     async def close_storage() -> None:
         if BlobStorageFactory._instance:
+            instance = BlobStorageFactory._instance
             BlobStorageFactory._instance = None
+            await instance.close()
 
 
 # Local testing of config and code
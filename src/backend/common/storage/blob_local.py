@@ -0,0 +1,263 @@
+"""Local filesystem implementation of blob storage, for local runs and load tests.
+
+Blobs are files under ``root/blobs/`` at their blob path. The content type,
+metadata, ETag and creation time of each are kept in a JSON sidecar at the same
+path under ``root/meta/``. File I/O runs on a thread pool so that it does not
+block the event loop, and files of at least ``MMAP_THRESHOLD`` bytes are read
+through a memory map instead of being copied into a buffer first. Writes go to
+a temporary file that replaces the blob once complete, so readers never see a
+partial blob. Select it with STORAGE_BACKEND=local; LOCAL_STORAGE_PATH names
+the root folder.
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, List, Optional, Union
+from uuid import uuid4
+
+from common.logger.app_logger import AppLogger
+from common.storage.blob_base import BlobStorageBase
+
+# Files at least this large are read through a memory map
+MMAP_THRESHOLD = 1024 * 1024
+# Bytes read or written at a time when streaming
+CHUNK_SIZE = 4 * 1024 * 1024
+# Threads doing file I/O
+MAX_WORKERS = 8
+# Name of the temporary files that blobs are written to before they replace them
+TEMP_PREFIX = ".upload-"
+TEMP_SUFFIX = ".part"
+
+
+class LocalBlobStorage(BlobStorageBase):
+    """Blob storage kept in a folder of the local filesystem."""
+
+    def __init__(self, root: str):
+        self.logger = AppLogger("LocalBlobStorage")
+        self.root = Path(root).resolve()
+        self.blob_root = self.root / "blobs"
+        self.meta_root = self.root / "meta"
+        self.blob_root.mkdir(parents=True, exist_ok=True)
+        self.meta_root.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="blob-local")
+
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(function, *args, **kwargs)
+        )
+
+    def _paths(self, blob_path: str):
+        """The blob file and its sidecar, refusing paths outside the root."""
+        blob_file = (self.blob_root / blob_path).resolve()
+        if not blob_path or not blob_file.is_relative_to(self.blob_root) or blob_file == self.blob_root:
+            raise ValueError(f"Invalid blob path: {blob_path}")
+        relative = blob_file.relative_to(self.blob_root)
+        return blob_file, self.meta_root / relative.parent / f"{relative.name}.json"
+
+    @staticmethod
+    def _read_meta(meta_file: Path) -> Dict[str, Any]:
+        try:
+            return json.loads(meta_file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+
+    def _details(self, blob_path: str, blob_file: Path, meta: Dict[str, Any]) -> Dict[str, Any]:
+        created_at = meta.get("created_at")
+        return {
+            "name": blob_path,
+            "path": blob_path,
+            "size": blob_file.stat().st_size,
+            "content_type": meta.get("content_type"),
+            "created_at": datetime.fromisoformat(created_at) if created_at else None,
+            "metadata": meta.get("metadata") or {},
+            "url": blob_file.as_uri(),
+            "etag": meta.get("etag"),
+        }
+
+    @staticmethod
+    def _write_meta(meta_file: Path, meta: Dict[str, Any]) -> None:
+        meta_file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=meta_file.parent, delete=False, encoding="utf-8") as temp:
+            json.dump(meta, temp)
+        os.replace(temp.name, meta_file)
+
+    async def upload_file(
+        self,
+        file_content: Union[bytes, str, BinaryIO, AsyncIterable[bytes]],
+        blob_path: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        length: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Write a file under the root, replacing any blob at the path once complete."""
+        blob_file, meta_file = self._paths(blob_path)
+        if isinstance(file_content, str):
+            file_content = file_content.encode("utf-8")
+        await self._run(blob_file.parent.mkdir, parents=True, exist_ok=True)
+        temp = await self._run(
+            tempfile.NamedTemporaryFile,
+            "wb",
+            dir=blob_file.parent,
+            prefix=TEMP_PREFIX,
+            suffix=TEMP_SUFFIX,
+            delete=False,
+        )
+        try:
+            if isinstance(file_content, bytes):
+                await self._run(temp.write, file_content)
+            elif hasattr(file_content, "__aiter__"):
+                async for chunk in file_content:
+                    await self._run(temp.write, chunk)
+            else:
+                while chunk := await self._run(file_content.read, CHUNK_SIZE):
+                    await self._run(temp.write, chunk)
+            await self._run(temp.close)
+            meta = {
+                "content_type": content_type,
+                "metadata": metadata or {},
+                "etag": uuid4().hex,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            await self._run(self._write_meta, meta_file, meta)
+            await self._run(os.replace, temp.name, blob_file)
+        except Exception as e:
+            await self._run(temp.close)
+            await self._run(Path(temp.name).unlink, missing_ok=True)
+            self.logger.error("Failed to upload file", error=str(e), blob_path=blob_path)
+            raise
+        return await self._run(self._details, blob_path, blob_file, meta)
+
+    @staticmethod
+    def _read_text(blob_file: Path) -> str:
+        with open(blob_file, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                return file.read().decode("utf-8-sig")
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                # Decoded straight from the mapped pages, without a copy of the bytes
+                return str(view, "utf-8-sig")
+
+    async def get_file(self, blob_path: str) -> BinaryIO:
+        """Read a file under the root as text, as AzureBlobStorage does."""
+        try:
+            blob_file, _ = self._paths(blob_path)
+            return await self._run(self._read_text, blob_file)
+        except Exception as e:
+            self.logger.error("Failed to download file", error=str(e), blob_path=blob_path)
+            raise
+
+    @staticmethod
+    def _open_chunks(blob_file: Path):
+        """Open a file for chunked reads, memory mapped when large."""
+        file = open(blob_file, "rb")
+        size = os.fstat(file.fileno()).st_size
+        if size < MMAP_THRESHOLD or size == 0:
+            return file, None
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        file.close()
+        return None, mapped
+
+    async def stream_file(self, blob_path: str) -> AsyncIterator[bytes]:
+        """Read a file under the root in chunks, as bytes."""
+        try:
+            blob_file, _ = self._paths(blob_path)
+            file, mapped = await self._run(self._open_chunks, blob_file)
+        except Exception as e:
+            self.logger.error("Failed to download file", error=str(e), blob_path=blob_path)
+            raise
+        try:
+            if mapped is not None:
+                for start in range(0, len(mapped), CHUNK_SIZE):
+                    yield await self._run(mapped.__getitem__, slice(start, start + CHUNK_SIZE))
+                return
+            while chunk := await self._run(file.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            await self._run(file.close if mapped is None else mapped.close)
+
+    async def get_upload_url(self, blob_path: str, expires_in: int) -> Optional[str]:
+        """Files under the root are only written through the API.
+
+        Run Azurite with STORAGE_BACKEND=azure, AZURE_BLOB_ENDPOINT and
+        AZURE_BLOB_ACCOUNT_KEY to try direct uploads locally.
+        """
+        return None
+
+    def _set_meta(self, blob_path: str, metadata: Dict[str, str]) -> None:
+        blob_file, meta_file = self._paths(blob_path)
+        if not blob_file.is_file():
+            raise FileNotFoundError(blob_path)
+        meta = self._read_meta(meta_file)
+        # A new ETag, as Azure gives a blob whose metadata changes
+        self._write_meta(meta_file, {**meta, "metadata": metadata, "etag": uuid4().hex})
+
+    async def set_metadata(self, blob_path: str, metadata: Dict[str, str]) -> None:
+        """Replace the metadata kept in a file's sidecar."""
+        try:
+            await self._run(self._set_meta, blob_path, metadata)
+        except Exception as e:
+            self.logger.error("Failed to set metadata", error=str(e), blob_path=blob_path)
+            raise
+
+    def _delete(self, blob_path: str) -> None:
+        blob_file, meta_file = self._paths(blob_path)
+        blob_file.unlink()
+        meta_file.unlink(missing_ok=True)
+        # Remove the folders left empty, up to the root
+        for folder, top in ((blob_file.parent, self.blob_root), (meta_file.parent, self.meta_root)):
+            while folder != top:
+                try:
+                    folder.rmdir()
+                except OSError:
+                    break
+                folder = folder.parent
+
+    async def delete_file(self, blob_path: str) -> bool:
+        """Delete a file under the root."""
+        try:
+            await self._run(self._delete, blob_path)
+            return True
+        except Exception as e:
+            self.logger.error("Failed to delete file", error=str(e), blob_path=blob_path)
+            return False
+
+    def _list(self, prefix: str) -> List[Dict[str, Any]]:
+        # Only the folder holding the prefix is walked, as names are matched by prefix
+        folder = self.blob_root / prefix.rpartition("/")[0]
+        if not folder.resolve().is_relative_to(self.blob_root):
+            raise ValueError(f"Invalid prefix: {prefix}")
+        blobs = []
+        for directory, _, names in os.walk(folder):
+            for name in names:
+                blob_file = Path(directory) / name
+                blob_path = blob_file.relative_to(self.blob_root).as_posix()
+                if not blob_path.startswith(prefix) or (
+                    name.startswith(TEMP_PREFIX) and name.endswith(TEMP_SUFFIX)
+                ):
+                    continue
+                _, meta_file = self._paths(blob_path)
+                try:
+                    blobs.append(self._details(blob_path, blob_file, self._read_meta(meta_file)))
+                except FileNotFoundError:
+                    # Deleted while listed
+                    continue
+        return sorted(blobs, key=lambda blob: blob["name"])
+
+    async def list_files(self, prefix: Optional[str] = None) -> list[Dict[str, Any]]:
+        """List files under the root whose path starts with the prefix."""
+        try:
+            return await self._run(self._list, prefix or "")
+        except Exception as e:
+            self.logger.error("Failed to list files", error=str(e), prefix=prefix)
+            raise
+
+    async def close(self) -> None:
+        """Wait for file I/O in progress to finish."""
+        self._executor.shutdown(wait=True)
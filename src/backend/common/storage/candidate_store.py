@@ -0,0 +1,132 @@
+"""Content-addressed store of migration candidates.
+
+Agents log the current migration with every message, so a file converted over
+twenty turns stored twenty copies of the same script in its logs. The store
+keeps each distinct candidate of a file once, as a blob named by the SHA-256 of
+its text under the file's folder, ``user_id/batch_id/file_id/candidates/``, and
+logs hold only the hash. Readers resolve a hash when they need the script.
+Candidates shorter than ``CANDIDATE_STORE_MIN_SIZE`` characters stay in the log,
+where they cost less than a blob write.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from common.database.database_base import DatabaseBase
+from common.logger.app_logger import AppLogger
+from common.storage.blob_base import BlobStorageBase
+
+CANDIDATE_STORE_MIN_SIZE = int(os.getenv("CANDIDATE_STORE_MIN_SIZE", "256"))
+# Folder of a file's candidates, under the file's own folder
+CANDIDATES_FOLDER = "candidates"
+# Stored candidates and file folders remembered, to skip repeated writes and lookups
+KNOWN_CANDIDATES = 10000
+
+
+class CandidateStore:
+    """Stores candidates once per file and content hash."""
+
+    def __init__(
+        self,
+        storage: BlobStorageBase,
+        database: DatabaseBase,
+        min_size: int = CANDIDATE_STORE_MIN_SIZE,
+    ):
+        self.storage = storage
+        self.database = database
+        self.min_size = min_size
+        self.logger = AppLogger("CandidateStore")
+        # Blob paths written by this process
+        self._stored: "OrderedDict[str, None]" = OrderedDict()
+        # file_id -> (user_id, batch_id)
+        self._owners: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    @staticmethod
+    def candidate_hash(candidate: str) -> str:
+        return hashlib.sha256(candidate.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _remember(entries: OrderedDict, key: str, value=None) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > KNOWN_CANDIDATES:
+            entries.popitem(last=False)
+
+    async def _owner(self, file_id: str) -> Optional[Tuple[str, str]]:
+        """The user and batch of a file."""
+        owner = self._owners.get(file_id)
+        if owner is not None:
+            return owner
+        file = await self.database.get_file(file_id, fields=("batch_id",))
+        if not file:
+            return None
+        batch = await self.database.get_batch_from_id(file["batch_id"])
+        if not batch:
+            return None
+        owner = (batch["user_id"], str(file["batch_id"]))
+        self._remember(self._owners, file_id, owner)
+        return owner
+
+    async def path(self, file_id: str, candidate_hash: str) -> Optional[str]:
+        """The blob path of a file's candidate, or None if the file does not exist."""
+        owner = await self._owner(str(file_id))
+        if owner is None:
+            return None
+        user_id, batch_id = owner
+        return f"{user_id}/{batch_id}/{file_id}/{CANDIDATES_FOLDER}/{candidate_hash}.sql"
+
+    async def put(self, file_id: str, candidate: str, force: bool = False) -> Optional[str]:
+        """Store a candidate of a file, once per content.
+
+        Args:
+            file_id: The file the candidate is a migration of.
+            candidate: The migration text.
+            force: Store it even when shorter than the minimum size.
+
+        Returns:
+            The hash referencing the candidate, or None if it was not stored and
+            should be kept in the log.
+        """
+        if not candidate or (len(candidate) < self.min_size and not force):
+            return None
+        file_id = str(file_id)
+        candidate_hash = self.candidate_hash(candidate)
+        try:
+            blob_path = await self.path(file_id, candidate_hash)
+            if blob_path is None:
+                return None
+            if blob_path not in self._stored:
+                user_id, batch_id = self._owners[file_id]
+                await self.storage.upload_file(
+                    file_content=candidate,
+                    blob_path=blob_path,
+                    content_type="text/plain",
+                    metadata={"batch_id": batch_id, "user_id": user_id, "file_id": file_id},
+                )
+                self._remember(self._stored, blob_path)
+            return candidate_hash
+        except Exception as e:
+            self.logger.error("Failed to store candidate", file_id=file_id, error=str(e))
+            return None
+
+    async def get(self, file_id: str, candidate_hash: str) -> str:
+        """Read a stored candidate of a file."""
+        blob_path = await self.path(str(file_id), candidate_hash)
+        if blob_path is None:
+            return ""
+        return await self.storage.get_file(blob_path)
+
+    async def list_paths(self, prefix: str) -> List[str]:
+        """The candidate blobs under a user, batch or file folder."""
+        try:
+            blobs: List[Dict] = await self.storage.list_files(prefix)
+            return [
+                blob["name"]
+                for blob in blobs
+                if f"/{CANDIDATES_FOLDER}/" in blob["name"]
+            ]
+        except Exception as e:
+            self.logger.error("Failed to list candidates", prefix=prefix, error=str(e))
+            return []
@@ -0,0 +1,109 @@
+"""Result archives of batches, built once and kept in blob storage.
+
+The ZIP of a batch's translated files is built when the batch finishes, or in
+the background on the first download of a finished batch, which streams the
+files itself meanwhile, and stored under the batch's folder as
+``user_id/batch_id/results/<build id>.zip``. The archive is uploaded as it is
+written, and its SHA-256, computed on the way, is set in its metadata once the
+upload completes; an archive without it is incomplete and never served.
+Downloads find it by listing that folder and stream it from storage, without
+reading the database or compressing the files again. Deleting a file of the
+batch or processing it again deletes the archive.
+"""
+
+import hashlib
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+from uuid import uuid4
+
+from common.logger.app_logger import AppLogger
+from common.storage.blob_base import BlobStorageBase
+
+# Folder of a batch's result archive, under the batch's own folder
+RESULTS_FOLDER = "results"
+# Metadata key of the archive's SHA-256, set once it is completely stored
+SHA256_KEY = "sha256"
+
+
+class ResultArchive:
+    """Stores and finds the result archive of each batch."""
+
+    def __init__(self, storage: BlobStorageBase):
+        self.storage = storage
+        self.logger = AppLogger("ResultArchive")
+
+    @staticmethod
+    def folder(user_id: str, batch_id: str) -> str:
+        return f"{user_id}/{batch_id}/{RESULTS_FOLDER}/"
+
+    async def _list(self, user_id: str, batch_id: str) -> list:
+        return [
+            blob
+            for blob in await self.storage.list_files(self.folder(user_id, batch_id))
+            if blob["name"].endswith(".zip")
+        ]
+
+    async def find(self, user_id: str, batch_id: str) -> Optional[Dict[str, str]]:
+        """The path and SHA-256 of the batch's archive, or None if there is none."""
+        try:
+            blobs = [
+                blob
+                for blob in await self._list(user_id, batch_id)
+                if (blob.get("metadata") or {}).get(SHA256_KEY)
+            ]
+        except Exception as e:
+            self.logger.error("Failed to find result archive", batch_id=batch_id, error=str(e))
+            return None
+        if not blobs:
+            return None
+        # The newest, should a replaced archive not have been deleted yet
+        blob = max(blobs, key=lambda blob: str(blob.get("created_at") or ""))
+        return {"path": blob["name"], "sha256": blob["metadata"][SHA256_KEY]}
+
+    async def store(
+        self, user_id: str, batch_id: str, chunks: AsyncIterable[bytes]
+    ) -> Dict[str, Any]:
+        """Store the archive of a batch in place of any previous one, as it is written.
+
+        Returns:
+            The path, SHA-256 and size of the stored archive.
+        """
+        blob_path = f"{self.folder(user_id, batch_id)}{uuid4().hex}.zip"
+        metadata = {"batch_id": batch_id, "user_id": user_id}
+        digest = hashlib.sha256()
+        size = 0
+
+        async def hashed() -> AsyncIterator[bytes]:
+            nonlocal size
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                yield chunk
+
+        try:
+            await self.storage.upload_file(
+                file_content=hashed(),
+                blob_path=blob_path,
+                content_type="application/zip",
+                metadata=metadata,
+            )
+            await self.storage.set_metadata(
+                blob_path, {**metadata, SHA256_KEY: digest.hexdigest()}
+            )
+        except Exception:
+            # Whatever was stored is incomplete
+            await self.storage.delete_file(blob_path)
+            raise
+        await self.invalidate(user_id, batch_id, keep=blob_path)
+        return {"path": blob_path, "sha256": digest.hexdigest(), "size": size}
+
+    async def invalidate(self, user_id: str, batch_id: str, keep: Optional[str] = None) -> None:
+        """Delete the archive of a batch, except the one at keep."""
+        try:
+            for blob in await self._list(user_id, batch_id):
+                if blob["name"] != keep:
+                    await self.storage.delete_file(blob["name"])
+        except Exception as e:
+            self.logger.error("Failed to delete result archive", batch_id=batch_id, error=str(e))
+
+    def stream(self, blob_path: str) -> AsyncIterator[bytes]:
+        return self.storage.stream_file(blob_path)
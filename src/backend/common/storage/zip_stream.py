@@ -0,0 +1,76 @@
+"""ZIP archives streamed to the client as they are written.
+
+The archive is written to a buffer that cannot seek, so each entry is written
+with a data descriptor and never revisited, and the buffer is emptied after
+every chunk. The response starts with the first compressed bytes, and memory
+holds one entry's content and a chunk rather than the whole archive.
+"""
+
+import time
+import zipfile
+from typing import AsyncIterable, AsyncIterator, Tuple
+
+# Bytes of an entry compressed before the output is handed on
+CHUNK_SIZE = 64 * 1024
+
+
+class _ArchiveBuffer:
+    """Write-only file collecting the archive bytes until they are taken."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._data += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def entry_name(file_name: str) -> str:
+    """The name of a result file in the archive."""
+    # Ensure the file name ends with '.sql'
+    if not file_name.endswith(".sql"):
+        file_name += ".sql"
+    # Ensure the file name is safe for zip
+    return file_name.replace("/", "_").replace("\\", "_")
+
+
+async def zip_stream(entries: AsyncIterable[Tuple[str, str]]) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of the (file name, content) entries as it is written.
+
+    Entries are added in the order they arrive; those without content are
+    skipped.
+    """
+    buffer = _ArchiveBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for file_name, content in entries:
+            # Make sure the file has content
+            if not content:
+                continue
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            info = zipfile.ZipInfo(entry_name(file_name), date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(
+                info, mode="w", force_zip64=len(data) > zipfile.ZIP64_LIMIT
+            ) as entry:
+                for start in range(0, len(data), CHUNK_SIZE):
+                    entry.write(data[start:start + CHUNK_SIZE])
+                    chunk = buffer.take()
+                    if chunk:
+                        yield chunk
+            # The rest of the compressed data and the entry's data descriptor
+            yield buffer.take()
+    # The central directory, written when the archive is closed
+    yield buffer.take()
@@ -9,12 +9,15 @@ from azure.ai.agents.models import (
     ResponseFormatJsonSchemaType,
 )
 
+from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.agents.azure_ai.azure_ai_agent import AzureAIAgent
+from semantic_kernel.connectors.ai.open_ai import OpenAIChatPromptExecutionSettings
 from semantic_kernel.functions import KernelArguments
 
 from sql_agents.agents.agent_config import AgentBaseConfig
-from sql_agents.helpers.models import AgentType
-from sql_agents.helpers.utils import get_prompt
+from sql_agents.helpers.chat_completions import create_chat_service
+from sql_agents.helpers.models import AgentBackend, AgentType
+from sql_agents.helpers.prompt_registry import prompt_registry
 
 # Type variable for response models
 T = TypeVar("T")
@@ -31,19 +34,23 @@ class BaseSQLAgent(Generic[T], ABC):
         agent_type: AgentType,
         config: AgentBaseConfig,
         temperature: float = 0.0,
+        deployment: Optional[str] = None,
     ):
         """Initialize the base SQL agent.
 
         Args:
             agent_type: The type of agent to create.
             config: The dialect configuration for the agent.
-            deployment_name: The model deployment to use.
             temperature: The temperature parameter for the model.
+            deployment: Model deployment overriding the configured one for the agent type.
         """
         self.agent_type = agent_type
         self.config = config
         self.temperature = temperature
+        self.deployment = deployment
+        self.backend = config.agent_backend.get(agent_type, AgentBackend.AZURE_AI_AGENT)
         self.agent: AzureAIAgent = None
+        self.prompt_hash: Optional[str] = None
 
     @property
     @abstractmethod
@@ -97,16 +104,36 @@ class BaseSQLAgent(Generic[T], ABC):
     async def setup(self) -> AzureAIAgent:
         """Setup the agent with Azure AI."""
         _name = self.agent_type.value
-        _deployment_name = self.config.model_type.get(self.agent_type)
+        _deployment_name = self.deployment or self.config.model_type.get(
+            self.agent_type
+        )
 
         try:
-            template_content = get_prompt(_name)
+            template_content = prompt_registry.render(
+                _name, self.config.sql_from, self.config.sql_to, self.num_candidates
+            )
+            self.prompt_hash = prompt_registry.rendered_hash(
+                _name, self.config.sql_from, self.config.sql_to, self.num_candidates
+            )
         except FileNotFoundError as exc:
             logger.error("Prompt file for %s not found.", _name)
             raise ValueError(f"Prompt file for {_name} not found.") from exc
+        # The hash identifies the prompt version an agent ran with
+        logger.info(
+            "Setting up %s agent on %s with prompt %s",
+            _name,
+            _deployment_name,
+            self.prompt_hash,
+        )
 
         kernel_args = self.get_kernel_arguments()
 
+        if self.backend is AgentBackend.CHAT_COMPLETIONS:
+            self.agent = self._setup_chat_completion_agent(
+                _name, _deployment_name, template_content, kernel_args
+            )
+            return self.agent
+
         try:
             # Define an agent on the Azure AI agent service
             agent_definition = await self.config.ai_project_client.agents.create_agent(
@@ -141,6 +168,34 @@ class BaseSQLAgent(Generic[T], ABC):
 
         return self.agent
 
+    def _setup_chat_completion_agent(
+        self,
+        name: str,
+        deployment_name: str,
+        instructions: str,
+        kernel_args: KernelArguments,
+    ) -> ChatCompletionAgent:
+        """Setup the agent on a chat completions endpoint, with history kept locally."""
+        kernel_args.execution_settings = {
+            deployment_name: OpenAIChatPromptExecutionSettings(
+                service_id=deployment_name,
+                temperature=self.temperature,
+                response_format=self.response_object,
+            )
+        }
+        agent_kwargs = {
+            "service": create_chat_service(self.config, deployment_name),
+            "name": name,
+            "instructions": instructions,
+            "arguments": kernel_args,
+        }
+
+        # Add plugins if specified
+        if self.plugins:
+            agent_kwargs["plugins"] = self.plugins
+
+        return ChatCompletionAgent(**agent_kwargs)
+
     async def get_agent(self) -> AzureAIAgent:
         """Get the agent, setting it up if needed."""
         if self.agent is None:
@@ -13,18 +13,27 @@ settings.json file in the .vscode folder should include the following:
 import os
 
 from azure.ai.projects.aio import AIProjectClient
+from azure.core.credentials_async import AsyncTokenCredential
 
-from sql_agents.helpers.models import AgentType
+from sql_agents.helpers.models import AgentBackend, AgentType
 
 
 class AgentBaseConfig:
     """Agent model deployment names."""
 
-    def __init__(self, project_client: AIProjectClient, sql_from: str, sql_to: str):
+    def __init__(
+        self,
+        project_client: AIProjectClient,
+        sql_from: str,
+        sql_to: str,
+        credential: AsyncTokenCredential = None,
+    ):
 
         self.ai_project_client = project_client
         self.sql_from = sql_from
         self.sql_to = sql_to
+        # Used for Entra authentication against the chat completions endpoint
+        self.credential = credential
 
     model_type = {
         AgentType.MIGRATOR: os.getenv("MIGRATOR_AGENT_MODEL_DEPLOY"),
@@ -35,3 +44,32 @@ class AgentBaseConfig:
         AgentType.SELECTION: os.getenv("SELECTION_MODEL_DEPLOY"),
         AgentType.TERMINATION: os.getenv("TERMINATION_MODEL_DEPLOY"),
     }
+
+    # Optional cheaper deployments the model router can use for small, simple scripts
+    small_model_type = {
+        AgentType.MIGRATOR: os.getenv("MIGRATOR_AGENT_MODEL_DEPLOY_SMALL"),
+        AgentType.PICKER: os.getenv("PICKER_AGENT_MODEL_DEPLOY_SMALL"),
+        AgentType.FIXER: os.getenv("FIXER_AGENT_MODEL_DEPLOY_SMALL"),
+        AgentType.SEMANTIC_VERIFIER: os.getenv(
+            "SEMANTIC_VERIFIER_AGENT_MODEL_DEPLOY_SMALL"
+        ),
+        AgentType.SYNTAX_CHECKER: os.getenv("SYNTAX_CHECKER_AGENT_MODEL_DEPLOY_SMALL"),
+    }
+
+    # Service each agent runs on, see AgentBackend
+    agent_backend = {
+        AgentType.MIGRATOR: AgentBackend(os.getenv("MIGRATOR_AGENT_BACKEND", "")),
+        AgentType.PICKER: AgentBackend(os.getenv("PICKER_AGENT_BACKEND", "")),
+        AgentType.FIXER: AgentBackend(os.getenv("FIXER_AGENT_BACKEND", "")),
+        AgentType.SEMANTIC_VERIFIER: AgentBackend(
+            os.getenv("SEMANTIC_VERIFIER_AGENT_BACKEND", "")
+        ),
+        AgentType.SYNTAX_CHECKER: AgentBackend(
+            os.getenv("SYNTAX_CHECKER_AGENT_BACKEND", "")
+        ),
+    }
+
+    # OpenAI-compatible endpoint for agents on the chat completions backend,
+    # e.g. https://<resource>.openai.azure.com/openai/v1/ or a local stub
+    chat_completions_endpoint = os.getenv("CHAT_COMPLETIONS_ENDPOINT")
+    chat_completions_api_key = os.getenv("CHAT_COMPLETIONS_API_KEY")
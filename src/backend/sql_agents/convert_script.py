@@ -27,7 +27,9 @@ from sql_agents.agents.semantic_verifier.response import SemanticVerifierRespons
 from sql_agents.agents.syntax_checker.response import SyntaxCheckerResponse
 from sql_agents.helpers.agents_manager import SqlAgents
 from sql_agents.helpers.comms_manager import CommsManager
+from sql_agents.helpers.model_router import RoutingSession, model_router
 from sql_agents.helpers.models import AgentType
+from sql_agents.helpers.transcript import open_transcript
 
 logger = AppLogger("ConvertScript")
 
@@ -42,12 +44,22 @@ async def convert_script(
     """Use the team of agents to migrate a sql script."""
     logger.info("Starting migration", file_id=str(file.file_id), batch_id=str(file.batch_id))
 
+    # Choose model deployments per agent turn for this file
+    routing = model_router.start_session(source_script)
+    # Record the agent messages, or replay recorded ones, when transcripts are enabled
+    recorder, replay = open_transcript(source_script)
+
     # Setup the group chat for the agents
     comms_manager = CommsManager(
         sql_agents.idx_agents,
         max_retries=5,          # Retry up to 5 times for rate limits
         initial_delay=1.0,      # Start with 1 second delay
         backoff_factor=2.0,     # Double delay each retry
+        routed_agents=sql_agents.routed_agents,
+        routing=routing,
+        thread_pool=sql_agents.thread_pool,
+        recorder=recorder,
+        replay=replay,
     )
 
     try:
@@ -249,7 +261,17 @@ async def convert_script(
                         AgentType(response.name),
                         AuthorRole(response.role),
                     )
+                    await log_routing_decisions(
+                        routing, file, batch_service, current_migration
+                    )
             except Exception as e:
+                # A cheap model failing to produce a usable response is retried once on
+                # the default deployments before the file is failed
+                if routing.enabled and routing.escalate(f"agent failure: {e}"):
+                    logger.warning("Retrying file on default model deployments", file_id=str(file.file_id), error=str(e))
+                    await comms_manager.group_chat.reset()
+                    current_migration = "No migration"
+                    continue
                 logger.error("Error during comms_manager.async_invoke()", file_id=str(file.file_id), batch_id=str(file.batch_id), error=str(e))
                 # Log the error to the batch service for tracking
                 await batch_service.create_file_log(
@@ -302,6 +324,36 @@ async def convert_script(
             logger.debug("Thread cleanup completed", file_id=str(file.file_id))
         except Exception as cleanup_exc:
             logger.error("Error during thread cleanup", file_id=str(file.file_id), error=str(cleanup_exc))
+        # Write out the file's buffered logs before its results are read back
+        try:
+            await batch_service.flush_file_logs(str(file.file_id))
+        except Exception as flush_exc:
+            logger.error("Error writing file logs", file_id=str(file.file_id), error=str(flush_exc))
+        if recorder is not None:
+            try:
+                await recorder.save()
+            except Exception as record_exc:
+                logger.error("Error saving agent transcript", file_id=str(file.file_id), error=str(record_exc))
+
+
+async def log_routing_decisions(
+    routing: RoutingSession,
+    file: FileRecord,
+    batch_service: BatchService,
+    current_migration: str,
+) -> None:
+    """Record the model deployments chosen for the file's agents in its logs."""
+    if not routing.enabled:
+        return
+    for decision in routing.drain_decisions():
+        await batch_service.create_file_log(
+            str(file.file_id),
+            f"Model routing: {decision.agent_type.value} uses {decision.deployment} ({decision.reason})",
+            current_migration,
+            LogType.INFO,
+            decision.agent_type,
+            AuthorRole.ASSISTANT,
+        )
 
 
 async def validate_migration(
@@ -1,16 +1,20 @@
 """Module to manage the SQL agents for migration."""
 
 import logging
+from typing import Dict
 
+from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.agents.azure_ai.azure_ai_agent import AzureAIAgent  # pylint: disable=E0611
 
 from sql_agents.agents.agent_config import AgentBaseConfig
+from sql_agents.agents.agent_factory import SQLAgentFactory
 from sql_agents.agents.fixer.setup import setup_fixer_agent
 from sql_agents.agents.migrator.setup import setup_migrator_agent
 from sql_agents.agents.picker.setup import setup_picker_agent
 from sql_agents.agents.semantic_verifier.setup import setup_semantic_verifier_agent
 from sql_agents.agents.syntax_checker.setup import setup_syntax_checker_agent
 from sql_agents.helpers.models import AgentType
+from sql_agents.helpers.thread_pool import AgentThreadPool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -26,9 +30,13 @@ class SqlAgents:
     agent_syntax_checker: AzureAIAgent = None
     agent_semantic_verifier: AzureAIAgent = None
     agent_config: AgentBaseConfig = None
+    # Agents on alternative deployments, keyed by agent type and deployment name
+    routed_agents: Dict[AgentType, Dict[str, AzureAIAgent]] = None
+    # Pre-created threads for the Azure AI agents, started with start_thread_pool
+    thread_pool: AgentThreadPool = None
 
     def __init__(self):
-        pass
+        self.routed_agents = {}
 
     @classmethod
     async def create(cls, config: AgentBaseConfig):
@@ -43,12 +51,25 @@ class SqlAgents:
             self.agent_picker = await setup_picker_agent(config)
             self.agent_syntax_checker = await setup_syntax_checker_agent(config)
             self.agent_semantic_verifier = await setup_semantic_verifier_agent(config)
+            await self._setup_routed_agents(config)
         except ValueError as exc:
             logger.error("Error setting up agents.")
             raise exc
 
         return self
 
+    async def _setup_routed_agents(self, config: AgentBaseConfig):
+        """Create an agent per small deployment configured for model routing."""
+        for agent_type, deployment in config.small_model_type.items():
+            if not deployment or deployment == config.model_type.get(agent_type):
+                continue
+            self.routed_agents.setdefault(agent_type, {})[
+                deployment
+            ] = await SQLAgentFactory.create_agent(
+                agent_type, config, deployment=deployment
+            )
+            logger.info("Created %s agent on %s", agent_type.value, deployment)
+
     @property
     def agents(self):
         """Return a list of the agents."""
@@ -58,6 +79,10 @@ class SqlAgents:
             self.agent_syntax_checker,
             self.agent_fixer,
             self.agent_semantic_verifier,
+        ] + [
+            agent
+            for deployments in self.routed_agents.values()
+            for agent in deployments.values()
         ]
 
     @property
@@ -71,10 +96,24 @@ class SqlAgents:
             AgentType.SEMANTIC_VERIFIER: self.agent_semantic_verifier,
         }
 
+    async def start_thread_pool(self, **kwargs):
+        """Start pre-creating threads, if any agent runs on the Azure AI Agents service."""
+        if not any(isinstance(agent, AzureAIAgent) for agent in self.agents):
+            return
+        self.thread_pool = AgentThreadPool(self.agent_config.ai_project_client, **kwargs)
+        await self.thread_pool.start()
+        logger.info("Started thread pool of %d threads", self.thread_pool.size)
+
     async def delete_agents(self):
         """Cleans up the agents from Azure Foundry"""
+        if self.thread_pool is not None:
+            await self.thread_pool.close()
+            self.thread_pool = None
         try:
             for agent in self.agents:
+                # Chat completions agents have no remote definition to delete
+                if isinstance(agent, ChatCompletionAgent):
+                    continue
                 await self.agent_config.ai_project_client.agents.delete_agent(agent.id)
         except Exception as exc:
             logger.error("Error deleting agents: %s", exc)
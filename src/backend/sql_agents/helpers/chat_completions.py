@@ -0,0 +1,82 @@
+"""Chat completions service for agents on the AgentBackend.CHAT_COMPLETIONS backend.
+
+These agents call an OpenAI-compatible chat completions endpoint directly and keep
+the conversation history in process, instead of creating, polling and deleting
+threads and runs on the Foundry Agents service for every turn.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from openai import AsyncOpenAI
+
+from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
+
+from sql_agents.agents.agent_config import AgentBaseConfig
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Scope of the Entra token used when no API key is configured
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# One client, and so one connection pool, per endpoint
+_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def get_chat_client(
+    config: AgentBaseConfig, http_client: Optional[Any] = None
+) -> AsyncOpenAI:
+    """Get the shared OpenAI client for the configured chat completions endpoint.
+
+    Args:
+        config: Agent configuration holding the endpoint, API key and credential.
+        http_client: Optional HTTP client, e.g. one with a stub transport for tests.
+    """
+    endpoint = config.chat_completions_endpoint
+    if not endpoint:
+        raise ValueError(
+            "CHAT_COMPLETIONS_ENDPOINT must be set for agents on the chat completions backend."
+        )
+
+    client = _clients.get(endpoint)
+    if client is not None and http_client is None:
+        return client
+
+    api_key = config.chat_completions_api_key
+    if not api_key:
+        if config.credential is None:
+            raise ValueError(
+                "Either CHAT_COMPLETIONS_API_KEY or an Azure credential is required."
+            )
+        credential = config.credential
+
+        async def api_key() -> str:
+            token = await credential.get_token(COGNITIVE_SERVICES_SCOPE)
+            return token.token
+
+    client = AsyncOpenAI(base_url=endpoint, api_key=api_key, http_client=http_client)
+    if http_client is None:
+        _clients[endpoint] = client
+    logger.info("Created chat completions client for %s", endpoint)
+    return client
+
+
+def create_chat_service(
+    config: AgentBaseConfig,
+    deployment: str,
+    http_client: Optional[Any] = None,
+) -> OpenAIChatCompletion:
+    """Create the chat completions service for a model deployment."""
+    return OpenAIChatCompletion(
+        ai_model_id=deployment,
+        service_id=deployment,
+        async_client=get_chat_client(config, http_client),
+    )
+
+
+async def close_chat_clients() -> None:
+    """Close the shared chat completions clients."""
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
@@ -1,12 +1,13 @@
 """Manages all agent communication and chat strategies for the SQL agents."""
 
 import asyncio
-import copy
 import logging
 import re
-from typing import AsyncIterable, ClassVar
+import time
+from typing import Any, AsyncIterable, ClassVar, Dict, Optional
 
-from semantic_kernel.agents import AgentGroupChat  # pylint: disable=E0611
+from semantic_kernel.agents import AgentGroupChat, AzureAIAgent  # pylint: disable=E0611
+from semantic_kernel.agents.azure_ai.azure_ai_channel import AzureAIChannel
 from semantic_kernel.agents.strategies import (
     SequentialSelectionStrategy,
     TerminationStrategy,
@@ -15,7 +16,19 @@ from semantic_kernel.contents import ChatMessageContent
 from semantic_kernel.exceptions import AgentInvokeException
 
 from sql_agents.agents.migrator.response import MigratorResponse
+from sql_agents.helpers.model_router import RoutingSession
 from sql_agents.helpers.models import AgentType
+from sql_agents.helpers.thread_pool import AgentThreadPool
+from sql_agents.helpers.transcript import TranscriptRecorder, TranscriptReplayer
+
+
+def _agent_deployment(agent) -> Optional[str]:
+    """Get the model deployment an Azure AI or chat completions agent runs on."""
+    definition = getattr(agent, "definition", None)
+    if definition is not None:
+        return definition.model
+    service = getattr(agent, "service", None)
+    return getattr(service, "ai_model_id", None)
 
 
 class CommsManager:
@@ -29,12 +42,78 @@ class CommsManager:
 
     group_chat: AgentGroupChat = None
 
+    class PooledGroupChat(AgentGroupChat):
+        """A group chat that runs Azure AI agents on threads leased from a pool.
+
+        Overrides AgentChat internals (_get_or_create_channel, _get_agent_hash,
+        _synchronize_channel), so semantic-kernel is pinned in requirements.txt.
+        """
+
+        # Pool the Azure AI agent threads are leased from
+        thread_pool: Optional[Any] = None
+
+        async def _get_or_create_channel(self, agent):
+            """Get the agent's channel, opening new ones on a pooled thread."""
+            if self.thread_pool is None or not isinstance(agent, AzureAIAgent):
+                return await super()._get_or_create_channel(agent)
+            channel_key = self._get_agent_hash(agent)
+            channel = await self._synchronize_channel(channel_key)
+            if channel is None:
+                thread_id = await self.thread_pool.acquire()
+                channel = await agent.create_channel(thread_id=thread_id)
+                self.agent_channels[channel_key] = channel
+                if len(self.history.messages) > 0:
+                    await channel.receive(self.history.messages)
+            return channel
+
+        async def reset(self) -> None:
+            """Clear the chat, handing pooled threads back instead of deleting them inline."""
+            if self.thread_pool is None:
+                await super().reset()
+                return
+            self.set_activity_or_throw()
+            try:
+                others = []
+                for channel in self.agent_channels.values():
+                    if isinstance(channel, AzureAIChannel):
+                        self.thread_pool.release(channel.thread_id)
+                    else:
+                        others.append(channel.reset())
+                await asyncio.gather(*others)
+                self.agent_channels.clear()
+                self.channel_map.clear()
+                self.history.messages.clear()
+            finally:
+                self.clear_activity_signal()
+
     class SelectionStrategy(SequentialSelectionStrategy):
         """A strategy for determining which agent should take the next turn in the chat."""
 
-        # Select the next agent that should take the next turn in the chat
+        # Routing session choosing the model deployment of the selected agent
+        routing: Optional[Any] = None
+
         async def select_agent(self, agents, history):
             """Check which agent should take the next turn in the chat."""
+            agent = await self._select_agent_by_name(agents, history)
+            if agent is None or self.routing is None:
+                return agent
+            deployment = self.routing.select(AgentType(agent.name))
+            if deployment is None:
+                return agent
+            # Use the agent of the same type defined on the routed deployment
+            return next(
+                (
+                    candidate
+                    for candidate in agents
+                    if candidate.name == agent.name
+                    and _agent_deployment(candidate) == deployment
+                ),
+                agent,
+            )
+
+        # Select the next agent that should take the next turn in the chat
+        async def _select_agent_by_name(self, agents, history):
+            """Check which agent type should take the next turn in the chat."""
             match history[-1].name:
                 case AgentType.MIGRATOR.value:
                     # The Migrator should go first
@@ -124,6 +203,11 @@ class CommsManager:
         initial_delay: float = 1.0,
         backoff_factor: float = 2.0,
         simple_truncation: int = None,
+        routed_agents: Optional[Dict[AgentType, Dict[str, Any]]] = None,
+        routing: Optional[RoutingSession] = None,
+        thread_pool: Optional[AgentThreadPool] = None,
+        recorder: Optional[TranscriptRecorder] = None,
+        replay: Optional[TranscriptReplayer] = None,
     ):
         """Initialize the CommsManager and agent_chat with the given agents.
 
@@ -134,6 +218,11 @@ class CommsManager:
             initial_delay: Initial delay in seconds before first retry (default: 1.0)
             backoff_factor: Factor by which the delay increases with each retry (default: 2.0)
             simple_truncation: Optional truncation limit for chat history
+            routed_agents: Agents on alternative deployments, by agent type and deployment
+            routing: Optional routing session choosing the deployment per agent turn
+            thread_pool: Optional pool of pre-created threads for the Azure AI agents
+            recorder: Optional recorder of the agent messages and turn timings
+            replay: Optional recorded transcript played back instead of invoking the agents
         """
         # Store retry configuration
         self.max_retries = max_retries
@@ -141,20 +230,36 @@ class CommsManager:
         self.backoff_factor = backoff_factor
         self.exception_types = exception_types
         self.simple_truncation = simple_truncation
+        self.routing = routing if routing is not None and routing.enabled else None
+        self.recorder = recorder
+        self.replay = replay
+
+        # Default agents first, so selection by name picks them unless routed
+        agents = list(agent_dict.values())
+        terminating_agents = [
+            agent_dict[AgentType.MIGRATOR],
+            agent_dict[AgentType.SEMANTIC_VERIFIER],
+        ]
+        if self.routing is not None:
+            for agent_type, deployments in (routed_agents or {}).items():
+                agents.extend(deployments.values())
+                if agent_type in (AgentType.MIGRATOR, AgentType.SEMANTIC_VERIFIER):
+                    terminating_agents.extend(deployments.values())
+
+        selection_strategy = self.SelectionStrategy(agents=agents)
+        selection_strategy.routing = self.routing
 
         # Initialize the group chat (maintaining original functionality)
-        self.group_chat = AgentGroupChat(
-            agents=agent_dict.values(),
+        self.group_chat = self.PooledGroupChat(
+            agents=agents,
             termination_strategy=self.ApprovalTerminationStrategy(
-                agents=[
-                    agent_dict[AgentType.MIGRATOR],
-                    agent_dict[AgentType.SEMANTIC_VERIFIER],
-                ],
+                agents=terminating_agents,
                 maximum_iterations=10,
                 automatic_reset=True,
             ),
-            selection_strategy=self.SelectionStrategy(agents=agent_dict.values()),
+            selection_strategy=selection_strategy,
         )
+        self.group_chat.thread_pool = thread_pool
 
     async def invoke_async(self):
         """Invoke the group chat with the given agents (original method maintained for compatibility)."""
@@ -162,14 +267,23 @@ class CommsManager:
 
     async def async_invoke(self) -> AsyncIterable[ChatMessageContent]:
         """Invoke the group chat with retry logic and error handling."""
+        if self.replay is not None:
+            async for item in self.replay.replay(self.group_chat):
+                yield item
+            return
+
+        if self.recorder is not None:
+            self.recorder.start_invoke()
         attempt = 0
         current_delay = self.initial_delay
 
         while attempt < self.max_retries:
             try:
                 # Grab a snapshot of the history of the group chat
-                # Using "SHALLOW" copy to avoid getting a reference to the original list
-                history_snap = copy.copy(self.group_chat.history)
+                # Copying the message list too, which a shallow copy would share
+                history_snap = self.group_chat.history.model_copy(
+                    update={"messages": list(self.group_chat.history.messages)}
+                )
 
                 self.logger.debug(
                     "History before invoke: %s",
@@ -188,10 +302,19 @@ class CommsManager:
                     self.group_chat.history = history_snap[-self.simple_truncation :]
 
                 # Yield each item from the iterator
+                turn_started = time.monotonic()
                 async for item in async_iter:
+                    turn_seconds = time.monotonic() - turn_started
+                    if self.routing is not None:
+                        self.routing.record_turn(item.name, turn_seconds)
+                    if self.recorder is not None:
+                        self.recorder.record(item, turn_seconds)
                     yield item
+                    turn_started = time.monotonic()
 
                 # If we get here without exception, we're done
+                if self.recorder is not None:
+                    self.recorder.end_invoke(self.group_chat.is_complete)
                 break
 
             except AgentInvokeException as aie:
@@ -202,11 +325,17 @@ class CommsManager:
                         self.max_retries,
                         str(aie),
                     )
+                    if self.recorder is not None:
+                        self.recorder.end_invoke(False, aie)
                     # Re-raise the last exception if all retries failed
                     raise
 
                 # Return history state for retry
                 self.group_chat.history = history_snap
+                if self.recorder is not None:
+                    self.recorder.discard_attempt()
+                if self.routing is not None:
+                    self.routing.record_throttle()
 
                 try:
                     # Try to extract wait time from error message
@@ -247,6 +376,8 @@ class CommsManager:
                         self.max_retries,
                         str(e),
                     )
+                    if self.recorder is not None:
+                        self.recorder.end_invoke(False, e)
                     raise
 
                 self.logger.warning(
@@ -266,7 +397,8 @@ class CommsManager:
         try:
             if self.group_chat is not None:
                 self.logger.debug("Cleaning up AgentGroupChat resources...")
-                # Reset the group chat - this clears conversation state and deletes remote threads
+                # Reset the group chat - this clears conversation state and deletes remote
+                # threads, or hands them back to the thread pool to be deleted in the background
                 await self.group_chat.reset()
                 self.logger.debug("AgentGroupChat cleanup completed successfully")
 
@@ -0,0 +1,274 @@
+"""Cost and latency aware routing of agent turns to model deployments.
+
+Each agent has a default deployment (``<AGENT>_AGENT_MODEL_DEPLOY``) and can be
+given a cheaper one (``<AGENT>_AGENT_MODEL_DEPLOY_SMALL``). For every file a
+RoutingSession picks the deployment per agent turn from the size and complexity of
+the source script and from the recent latency and throttling seen per deployment.
+A session escalates an agent to its default deployment when the cheap model fails
+to produce a parsable response or keeps the fixer looping.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set
+
+from sql_agents.agents.agent_config import AgentBaseConfig
+from sql_agents.helpers.models import AgentType
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Scripts above either threshold always go to the default deployment
+MAX_SMALL_LINES = int(os.getenv("MODEL_ROUTING_MAX_LINES", "150"))
+MAX_SMALL_COMPLEXITY = int(os.getenv("MODEL_ROUTING_MAX_COMPLEXITY", "10"))
+# Average seconds per turn above which a small deployment is considered degraded
+LATENCY_BUDGET = float(os.getenv("MODEL_ROUTING_LATENCY_BUDGET", "30"))
+# A deployment throttled within this many seconds is avoided
+THROTTLE_WINDOW = float(os.getenv("MODEL_ROUTING_THROTTLE_WINDOW", "60"))
+# Fixer turns on the small deployment before fixer and syntax checker escalate
+FIXER_ESCALATION_TURNS = int(os.getenv("MODEL_ROUTING_FIXER_TURNS", "2"))
+
+# Constructs that make a script harder to migrate correctly
+_COMPLEXITY_PATTERN = re.compile(
+    r"\b(procedure|function|trigger|cursor|foreach|while|loop|case|join|union|"
+    r"exception|begin|with|merge|temp)\b",
+    re.IGNORECASE,
+)
+
+_LATENCY_SMOOTHING = 0.3
+
+
+def script_complexity(source_script: str) -> int:
+    """Count the constructs in a script that make it harder to migrate."""
+    return len(_COMPLEXITY_PATTERN.findall(source_script or ""))
+
+
+def script_lines(source_script: str) -> int:
+    """Count the non-empty lines of a script."""
+    return sum(1 for line in (source_script or "").splitlines() if line.strip())
+
+
+@dataclass
+class RoutingDecision:
+    """The deployment chosen for an agent and why."""
+
+    agent_type: AgentType
+    deployment: str
+    reason: str
+
+
+class DeploymentStats:
+    """Rolling latency and throttling observations for one deployment."""
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.throttled_at: Deque[float] = deque(maxlen=20)
+
+    def record_latency(self, seconds: float) -> None:
+        """Fold a turn latency into the exponentially weighted average."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = (
+                _LATENCY_SMOOTHING * seconds + (1 - _LATENCY_SMOOTHING) * self.latency
+            )
+
+    def record_throttle(self) -> None:
+        """Remember that the deployment was rate limited."""
+        self.throttled_at.append(time.monotonic())
+
+    def is_throttled(self, window: float) -> bool:
+        """Check whether the deployment was rate limited recently."""
+        return bool(self.throttled_at) and (
+            time.monotonic() - self.throttled_at[-1] < window
+        )
+
+
+class ModelRouter:
+    """Chooses a model deployment per agent turn and tracks deployment health."""
+
+    def __init__(
+        self,
+        model_type: Dict[AgentType, Optional[str]],
+        small_model_type: Dict[AgentType, Optional[str]],
+        max_small_lines: int = MAX_SMALL_LINES,
+        max_small_complexity: int = MAX_SMALL_COMPLEXITY,
+        latency_budget: float = LATENCY_BUDGET,
+        throttle_window: float = THROTTLE_WINDOW,
+    ):
+        """Initialize the router.
+
+        Args:
+            model_type: Default deployment per agent type.
+            small_model_type: Cheaper deployment per agent type, if any.
+            max_small_lines: Largest script, in lines, sent to a small deployment.
+            max_small_complexity: Highest complexity score sent to a small deployment.
+            latency_budget: Average turn latency above which a small deployment is skipped.
+            throttle_window: Seconds a throttled deployment is avoided for.
+        """
+        self.model_type = model_type
+        self.small_model_type = {
+            agent_type: deployment
+            for agent_type, deployment in small_model_type.items()
+            if deployment and deployment != model_type.get(agent_type)
+        }
+        self.max_small_lines = max_small_lines
+        self.max_small_complexity = max_small_complexity
+        self.latency_budget = latency_budget
+        self.throttle_window = throttle_window
+        self.stats: Dict[str, DeploymentStats] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Routing only has an effect when a small deployment is configured."""
+        return bool(self.small_model_type)
+
+    def _stats(self, deployment: str) -> DeploymentStats:
+        if deployment not in self.stats:
+            self.stats[deployment] = DeploymentStats()
+        return self.stats[deployment]
+
+    def record_latency(self, deployment: Optional[str], seconds: float) -> None:
+        """Record how long a turn on the deployment took."""
+        if deployment:
+            self._stats(deployment).record_latency(seconds)
+
+    def record_throttle(self, deployment: Optional[str]) -> None:
+        """Record that the deployment rejected a turn with a rate limit."""
+        if deployment:
+            self._stats(deployment).record_throttle()
+            logger.warning("Deployment %s throttled", deployment)
+
+    def is_degraded(self, deployment: str) -> Optional[str]:
+        """Return why the deployment should be avoided right now, if it should."""
+        stats = self.stats.get(deployment)
+        if stats is None:
+            return None
+        if stats.is_throttled(self.throttle_window):
+            return f"{deployment} throttled in the last {self.throttle_window:.0f}s"
+        if stats.latency is not None and stats.latency > self.latency_budget:
+            return f"{deployment} averaging {stats.latency:.1f}s per turn"
+        return None
+
+    def start_session(self, source_script: str) -> "RoutingSession":
+        """Start routing the turns for one file."""
+        return RoutingSession(self, source_script)
+
+
+class RoutingSession:
+    """Routing state for the conversion of a single file."""
+
+    def __init__(self, router: ModelRouter, source_script: str):
+        self.router = router
+        self.lines = script_lines(source_script)
+        self.complexity = script_complexity(source_script)
+        self.escalated: Dict[AgentType, str] = {}
+        self.current: Dict[AgentType, str] = {}
+        self.last_deployment: Optional[str] = None
+        self.fixer_turns = 0
+        self._pending: List[RoutingDecision] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any agent can be routed to a different deployment."""
+        return self.router.enabled
+
+    @property
+    def is_small_input(self) -> bool:
+        """Whether the source script is small and simple enough for a cheap model."""
+        return (
+            self.lines <= self.router.max_small_lines
+            and self.complexity <= self.router.max_small_complexity
+        )
+
+    def _choose(self, agent_type: AgentType) -> RoutingDecision:
+        default = self.router.model_type.get(agent_type)
+        small = self.router.small_model_type.get(agent_type)
+        if agent_type in self.escalated:
+            return RoutingDecision(agent_type, default, self.escalated[agent_type])
+        if not self.is_small_input:
+            return RoutingDecision(
+                agent_type,
+                default,
+                f"input too large ({self.lines} lines, complexity {self.complexity})",
+            )
+        degraded = self.router.is_degraded(small)
+        if degraded:
+            return RoutingDecision(agent_type, default, degraded)
+        return RoutingDecision(
+            agent_type,
+            small,
+            f"small input ({self.lines} lines, complexity {self.complexity})",
+        )
+
+    def select(self, agent_type: AgentType) -> Optional[str]:
+        """Choose the deployment for the next turn of the given agent.
+
+        Returns:
+            The deployment name, or None when the agent has no alternative deployment.
+        """
+        if agent_type not in self.router.small_model_type:
+            self.last_deployment = self.router.model_type.get(agent_type)
+            return None
+
+        decision = self._choose(agent_type)
+        if self.current.get(agent_type) != decision.deployment:
+            self.current[agent_type] = decision.deployment
+            self._pending.append(decision)
+            logger.info(
+                "Routing %s to %s: %s",
+                agent_type.value,
+                decision.deployment,
+                decision.reason,
+            )
+        self.last_deployment = decision.deployment
+        return decision.deployment
+
+    def escalate(self, reason: str, agent_types: Optional[Set[AgentType]] = None) -> bool:
+        """Send the given agents, or all routed agents, to their default deployment.
+
+        Returns:
+            True if any agent was on a small deployment and has been escalated.
+        """
+        targets = agent_types or set(self.router.small_model_type)
+        escalated = False
+        for agent_type in targets:
+            if agent_type in self.escalated or agent_type not in self.router.small_model_type:
+                continue
+            self.escalated[agent_type] = f"escalated: {reason}"
+            if self.current.get(agent_type) == self.router.small_model_type[agent_type]:
+                escalated = True
+        return escalated
+
+    def record_turn(self, agent_name: Optional[str], seconds: float) -> None:
+        """Record a completed agent turn against the deployment that served it."""
+        self.router.record_latency(self.last_deployment, seconds)
+        if agent_name != AgentType.FIXER.value:
+            return
+        self.fixer_turns += 1
+        small = self.router.small_model_type.get(AgentType.FIXER)
+        if (
+            self.fixer_turns >= FIXER_ESCALATION_TURNS
+            and small is not None
+            and self.current.get(AgentType.FIXER) == small
+        ):
+            self.escalate(
+                f"{self.fixer_turns} fixer turns on {small}",
+                {AgentType.FIXER, AgentType.SYNTAX_CHECKER},
+            )
+
+    def record_throttle(self) -> None:
+        """Record that the last selected deployment was rate limited."""
+        self.router.record_throttle(self.last_deployment)
+
+    def drain_decisions(self) -> List[RoutingDecision]:
+        """Return the routing decisions made since the last call."""
+        decisions, self._pending = self._pending, []
+        return decisions
+
+
+model_router = ModelRouter(AgentBaseConfig.model_type, AgentBaseConfig.small_model_type)
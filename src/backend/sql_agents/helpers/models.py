@@ -27,3 +27,21 @@ class AgentType(Enum):
     @classmethod
     def _missing_(cls, value):
         return cls.ALL
+
+
+class AgentBackend(Enum):
+    """Services an agent can run on."""
+
+    AZURE_AI_AGENT = "azure_ai_agent"  # Foundry Agents service with remote threads
+    CHAT_COMPLETIONS = "chat_completions"  # Stateless chat completions, local history
+
+    @classmethod
+    def _missing_(cls, value):
+        """Match case-insensitively; an unset (empty) setting selects the Agents service."""
+        if not isinstance(value, str):
+            return None
+        value = value.strip().lower()
+        if not value:
+            return cls.AZURE_AI_AGENT
+        # None for other values, so the lookup raises ValueError
+        return next((member for member in cls if member.value == value), None)
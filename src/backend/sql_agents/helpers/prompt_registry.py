@@ -0,0 +1,202 @@
+"""Registry of the agent prompt templates.
+
+All ``prompt.txt`` files under ``sql_agents/agents`` are loaded and validated once,
+at import, relative to this package rather than the current working directory.
+Rendered prompts are memoized per agent and dialect pair, and every template exposes
+a content hash that can be used for cache keys and agent-reuse decisions.
+Set ``PROMPT_HOT_RELOAD=true`` during development to pick up edited prompt files
+without restarting the app.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+PROMPT_DIR = Path(__file__).resolve().parent.parent / "agents"
+PROMPT_FILE_NAME = "prompt.txt"
+
+# Template variables the agents supply through their kernel arguments
+KNOWN_VARIABLES: FrozenSet[str] = frozenset({"source", "target", "numCandidates"})
+
+# Dialect pairs rendered eagerly at load time (source, target)
+DIALECT_PAIRS: Tuple[Tuple[str, str], ...] = (("informix", "tsql"),)
+
+# Candidate count used when pre-rendering templates that reference numCandidates
+DEFAULT_NUM_CANDIDATES = 3
+
+_TEMPLATE_VARIABLE = re.compile(r"\{\{\$(\w+)\}\}")
+_AGENT_TYPE = re.compile(r"^[a-zA-Z0-9_]+$")
+
+
+def _hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A validated prompt template for a single agent."""
+
+    agent_type: str
+    content: str
+    content_hash: str
+    variables: FrozenSet[str]
+    mtime: float
+
+    def render(
+        self, source: str, target: str, num_candidates: Optional[int] = None
+    ) -> str:
+        """Substitute the template variables with the given values."""
+        values = {"source": source, "target": target}
+        if num_candidates is not None:
+            values["numCandidates"] = str(num_candidates)
+
+        def _substitute(match: re.Match) -> str:
+            # Leave unknown placeholders untouched so the kernel can still render them
+            return values.get(match.group(1), match.group(0))
+
+        return _TEMPLATE_VARIABLE.sub(_substitute, self.content)
+
+
+class PromptRegistry:
+    """Loads every agent prompt once and serves pre-rendered instructions."""
+
+    def __init__(self, prompt_dir: Path = PROMPT_DIR, hot_reload: bool = False):
+        """Initialize the registry.
+
+        Args:
+            prompt_dir: Directory holding one sub-directory per agent type.
+            hot_reload: Re-read prompt files whose modification time changed.
+        """
+        self.prompt_dir = Path(prompt_dir)
+        self.hot_reload = hot_reload
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._rendered: Dict[Tuple[str, str, str, Optional[int]], str] = {}
+
+    def load(self) -> None:
+        """Load and validate all prompt templates, replacing any loaded before."""
+        templates = {}
+        for prompt_file in sorted(self.prompt_dir.glob(f"*/{PROMPT_FILE_NAME}")):
+            template = self._read(prompt_file.parent.name, prompt_file)
+            templates[template.agent_type] = template
+        self._templates = templates
+        self._rendered.clear()
+        logger.info("Loaded %d prompt templates from %s", len(templates), self.prompt_dir)
+
+    def _read(self, agent_type: str, prompt_file: Path) -> PromptTemplate:
+        # utf-8-sig drops the byte order mark some prompt files are saved with
+        content = prompt_file.read_text(encoding="utf-8-sig")
+        if not content.strip():
+            raise ValueError(f"Prompt file for {agent_type} is empty.")
+
+        variables = frozenset(_TEMPLATE_VARIABLE.findall(content))
+        unknown = variables - KNOWN_VARIABLES
+        if unknown:
+            raise ValueError(
+                f"Prompt file for {agent_type} uses unknown variables: {sorted(unknown)}"
+            )
+
+        return PromptTemplate(
+            agent_type=agent_type,
+            content=content,
+            content_hash=_hash(content),
+            variables=variables,
+            mtime=prompt_file.stat().st_mtime,
+        )
+
+    def _reload_if_changed(self, agent_type: str) -> None:
+        prompt_file = self.prompt_dir / agent_type / PROMPT_FILE_NAME
+        template = self._templates.get(agent_type)
+        try:
+            mtime = prompt_file.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if template is None or mtime != template.mtime:
+            logger.info("Reloading prompt template for %s", agent_type)
+            self._templates[agent_type] = self._read(agent_type, prompt_file)
+            self._rendered = {
+                key: value
+                for key, value in self._rendered.items()
+                if key[0] != agent_type
+            }
+
+    def get(self, agent_type: str) -> PromptTemplate:
+        """Get the template for the given agent type."""
+        if not _AGENT_TYPE.match(agent_type):
+            raise ValueError("Invalid agent type")
+        if self.hot_reload:
+            self._reload_if_changed(agent_type)
+        template = self._templates.get(agent_type)
+        if template is None:
+            raise FileNotFoundError(f"Prompt file for {agent_type} not found.")
+        return template
+
+    def content_hash(self, agent_type: str) -> str:
+        """Get the hash of the raw template for the given agent type."""
+        return self.get(agent_type).content_hash
+
+    def render(
+        self,
+        agent_type: str,
+        source: str,
+        target: str,
+        num_candidates: Optional[int] = None,
+    ) -> str:
+        """Get the instructions for an agent with the template variables filled in."""
+        template = self.get(agent_type)
+        key = (agent_type, source, target, num_candidates)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = template.render(source, target, num_candidates)
+            self._rendered[key] = rendered
+        return rendered
+
+    def rendered_hash(
+        self,
+        agent_type: str,
+        source: str,
+        target: str,
+        num_candidates: Optional[int] = None,
+    ) -> str:
+        """Get the hash of the rendered instructions, usable as an agent-reuse key."""
+        return _hash(self.render(agent_type, source, target, num_candidates))
+
+    def prerender(
+        self,
+        dialect_pairs: Iterable[Tuple[str, str]],
+        num_candidates: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Render every template for each dialect pair ahead of agent setup.
+
+        Args:
+            dialect_pairs: Iterable of (source, target) dialect names.
+            num_candidates: Optional number of candidates keyed by agent type,
+                defaults to DEFAULT_NUM_CANDIDATES.
+        """
+        num_candidates = num_candidates or {}
+        for source, target in dialect_pairs:
+            for agent_type, template in self._templates.items():
+                candidates = (
+                    num_candidates.get(agent_type, DEFAULT_NUM_CANDIDATES)
+                    if "numCandidates" in template.variables
+                    else None
+                )
+                self.render(agent_type, source, target, candidates)
+
+    @property
+    def agent_types(self) -> Tuple[str, ...]:
+        """Agent types with a loaded prompt template."""
+        return tuple(self._templates)
+
+
+prompt_registry = PromptRegistry(
+    hot_reload=os.getenv("PROMPT_HOT_RELOAD", "false").lower() == "true"
+)
+prompt_registry.load()
+prompt_registry.prerender(DIALECT_PAIRS)
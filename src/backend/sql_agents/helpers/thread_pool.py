@@ -0,0 +1,179 @@
+"""Pool of pre-created Azure AI agent threads.
+
+Creating a thread per agent when a file starts, and deleting it when the file is
+done, puts two remote calls per agent on the critical path of every file. The pool
+keeps threads created ahead of time and hands them out on acquire. Released threads
+are deleted by a background worker, which also tops the pool back up, so neither
+call is awaited by the conversion. Threads are leased to one conversation at a time;
+leases held longer than the leak timeout are logged and counted as leaked. A leaked
+thread may still be in use, so it is not deleted and keeps its lease slot until it
+is released or the pool is closed.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# Idle threads kept ready
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "10"))
+# Maximum threads leased at once, acquire waits beyond this
+THREAD_POOL_MAX_LEASED = int(os.getenv("THREAD_POOL_MAX_LEASED", "100"))
+# Seconds after which a lease is considered leaked
+THREAD_POOL_LEAK_TIMEOUT = float(os.getenv("THREAD_POOL_LEAK_TIMEOUT", "3600"))
+
+
+class AgentThreadPool:
+    """Hands out pre-created threads and recycles released ones off the critical path."""
+
+    def __init__(
+        self,
+        client: Any,
+        size: int = THREAD_POOL_SIZE,
+        max_leased: int = THREAD_POOL_MAX_LEASED,
+        leak_timeout: float = THREAD_POOL_LEAK_TIMEOUT,
+        leak_check_interval: float = 60.0,
+    ):
+        """Initialize the pool.
+
+        Args:
+            client: The AIProjectClient used to create and delete threads.
+            size: Number of idle threads kept ready.
+            max_leased: Maximum number of threads leased at once.
+            leak_timeout: Seconds after which a lease is reported as leaked.
+            leak_check_interval: Seconds between leak checks when the pool is quiet.
+        """
+        self.client = client
+        self.size = size
+        self.max_leased = max_leased
+        self.leak_timeout = leak_timeout
+        self.leak_check_interval = leak_check_interval
+        self.created = 0
+        self.deleted = 0
+        self.leaked = 0
+        self._idle: Deque[str] = deque()
+        self._leased: Dict[str, float] = {}
+        self._leaked: Set[str] = set()
+        self._capacity = asyncio.Semaphore(max_leased)
+        self._recycle: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self) -> None:
+        """Start the background worker, which fills the pool."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            self._recycle.put_nowait(None)
+
+    async def acquire(self) -> str:
+        """Lease a thread, waiting while the maximum number of threads are leased."""
+        if self._closed:
+            raise RuntimeError("Thread pool is closed")
+        await self._capacity.acquire()
+        try:
+            thread_id = self._idle.popleft() if self._idle else await self._create_thread()
+        except Exception:
+            self._capacity.release()
+            raise
+        self._leased[thread_id] = time.monotonic()
+        if len(self._idle) < self.size:
+            # Wake the worker to replace the thread taken from the pool
+            self._recycle.put_nowait(None)
+        return thread_id
+
+    def release(self, thread_id: str) -> None:
+        """Return a leased thread; it is deleted in the background."""
+        if self._leased.pop(thread_id, None) is None:
+            logger.debug("Thread %s was not leased from the pool", thread_id)
+            return
+        self._leaked.discard(thread_id)
+        self._capacity.release()
+        self._recycle.put_nowait(thread_id)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters describing the pool."""
+        return {
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "pending_delete": self._recycle.qsize(),
+            "created": self.created,
+            "deleted": self.deleted,
+            "leaked": self.leaked,
+        }
+
+    async def _create_thread(self) -> str:
+        thread = await self.client.agents.threads.create()
+        self.created += 1
+        return thread.id
+
+    async def _delete_thread(self, thread_id: str) -> None:
+        try:
+            await self.client.agents.threads.delete(thread_id)
+            self.deleted += 1
+        except Exception as exc:
+            logger.error("Error deleting thread %s: %s", thread_id, exc)
+
+    def _report_leaks(self) -> None:
+        now = time.monotonic()
+        for thread_id, leased_at in self._leased.items():
+            if thread_id not in self._leaked and now - leased_at > self.leak_timeout:
+                # The holder may still be using the thread, so it is only reported;
+                # the lease keeps counting against max_leased until released
+                logger.warning(
+                    "Thread %s leased for %.0fs without release, possibly leaked",
+                    thread_id,
+                    now - leased_at,
+                )
+                self.leaked += 1
+                self._leaked.add(thread_id)
+
+    async def _fill(self) -> None:
+        while not self._closed and len(self._idle) < self.size:
+            try:
+                self._idle.append(await self._create_thread())
+            except Exception as exc:
+                logger.error("Error pre-creating thread: %s", exc)
+                return
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                thread_id = await asyncio.wait_for(
+                    self._recycle.get(), timeout=self.leak_check_interval
+                )
+            except asyncio.TimeoutError:
+                thread_id = None
+            if thread_id is not None:
+                await self._delete_thread(thread_id)
+            self._report_leaks()
+            await self._fill()
+
+    async def close(self) -> None:
+        """Stop the worker and delete every thread the pool still knows about."""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._leased:
+            logger.warning("Closing thread pool with %d leased threads", len(self._leased))
+        pending = list(self._idle) + list(self._leased)
+        while not self._recycle.empty():
+            thread_id = self._recycle.get_nowait()
+            if thread_id is not None:
+                pending.append(thread_id)
+        self._idle.clear()
+        self._leased.clear()
+        self._leaked.clear()
+        await asyncio.gather(*(self._delete_thread(thread_id) for thread_id in pending))
+        logger.info("Thread pool closed: %s", self.stats)
@@ -0,0 +1,218 @@
+"""Record and replay of agent transcripts.
+
+With ``AGENT_TRANSCRIPT_MODE=record`` every message the agents produce for a file
+is written, with the time the turn took, to a gzipped JSON lines file under
+``AGENT_TRANSCRIPT_DIR``. With ``AGENT_TRANSCRIPT_MODE=replay`` the CommsManager
+plays the recorded messages back instead of invoking the agents, so a batch can be
+converted without any model calls. ``AGENT_REPLAY_TIME_SCALE`` scales the recorded
+turn latencies: 1.0 replays at recorded speed, 0 replays as fast as possible.
+
+Transcripts are keyed by a hash of the source script, so re-uploading the same
+files replays them regardless of their new batch and file ids.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import AsyncIterable, List, Optional, Tuple
+
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+TRANSCRIPT_MODE = os.getenv("AGENT_TRANSCRIPT_MODE", "off").lower()
+TRANSCRIPT_DIR = Path(os.getenv("AGENT_TRANSCRIPT_DIR", "transcripts"))
+REPLAY_TIME_SCALE = float(os.getenv("AGENT_REPLAY_TIME_SCALE", "1.0"))
+
+TRANSCRIPT_VERSION = 1
+
+
+def transcript_path(source_script: str, directory: Path = TRANSCRIPT_DIR) -> Path:
+    """Get the transcript file for a source script."""
+    digest = hashlib.sha256(source_script.encode("utf-8")).hexdigest()
+    return Path(directory) / f"{digest[:32]}.jsonl.gz"
+
+
+@dataclass
+class TranscriptMessage:
+    """An agent message and the seconds the turn producing it took."""
+
+    name: Optional[str]
+    role: str
+    content: Optional[str]
+    elapsed: float
+
+    def to_message(self) -> ChatMessageContent:
+        """Convert back to the chat message the agent produced."""
+        return ChatMessageContent(
+            role=AuthorRole(self.role), name=self.name, content=self.content or ""
+        )
+
+
+@dataclass
+class TranscriptInvoke:
+    """The messages of one CommsManager.async_invoke call and how it ended."""
+
+    messages: List[TranscriptMessage] = field(default_factory=list)
+    is_complete: bool = False
+    error: Optional[str] = None
+
+
+class TranscriptRecorder:
+    """Collects the agent messages of one file and writes them on save."""
+
+    def __init__(self, source_script: str, path: Optional[Path] = None):
+        self.path = path or transcript_path(source_script)
+        self.invokes: List[TranscriptInvoke] = []
+
+    def start_invoke(self) -> None:
+        """Start recording a new async_invoke call."""
+        self.invokes.append(TranscriptInvoke())
+
+    def record(self, message: ChatMessageContent, elapsed: float) -> None:
+        """Record a message yielded by the agents."""
+        role = message.role.value if isinstance(message.role, AuthorRole) else message.role
+        self.invokes[-1].messages.append(
+            TranscriptMessage(message.name, role, message.content, round(elapsed, 4))
+        )
+
+    def discard_attempt(self) -> None:
+        """Drop the messages of a failed attempt whose history is rolled back for a retry."""
+        self.invokes[-1].messages.clear()
+
+    def end_invoke(self, is_complete: bool, error: Optional[BaseException] = None) -> None:
+        """Record how the current async_invoke call ended."""
+        self.invokes[-1].is_complete = is_complete
+        if error is not None:
+            self.invokes[-1].error = f"{type(error).__name__}: {error}"
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as out:
+            out.write(json.dumps({"version": TRANSCRIPT_VERSION}) + "\n")
+            for invoke in self.invokes:
+                out.write(json.dumps(asdict(invoke), separators=(",", ":")) + "\n")
+
+    async def save(self) -> None:
+        """Write the transcript without blocking the event loop."""
+        await asyncio.to_thread(self._write)
+        logger.info("Recorded %d agent invocations to %s", len(self.invokes), self.path)
+
+
+class TranscriptReplayer:
+    """Plays a recorded transcript back through a group chat."""
+
+    def __init__(self, path: Path, time_scale: float = REPLAY_TIME_SCALE):
+        """Initialize the replayer.
+
+        Args:
+            path: The transcript file, read on the first replay.
+            time_scale: Factor applied to the recorded turn latencies, 0 for none.
+        """
+        self.path = Path(path)
+        self.time_scale = time_scale
+        self.invokes: Optional[List[TranscriptInvoke]] = None
+
+    def _read(self) -> List[TranscriptInvoke]:
+        with gzip.open(self.path, "rt", encoding="utf-8") as source:
+            header = json.loads(source.readline())
+            if header.get("version") != TRANSCRIPT_VERSION:
+                raise ValueError(f"Unsupported transcript version in {self.path}")
+            invokes = []
+            for line in source:
+                data = json.loads(line)
+                data["messages"] = [TranscriptMessage(**msg) for msg in data["messages"]]
+                invokes.append(TranscriptInvoke(**data))
+        return invokes
+
+    async def replay(self, group_chat) -> AsyncIterable[ChatMessageContent]:
+        """Yield the messages of the next recorded invoke call, as the agents did.
+
+        The messages are added to the chat history and the chat completion state is
+        restored, so the orchestration loop behaves as it did when recording.
+        """
+        if self.invokes is None:
+            if not self.path.exists():
+                raise FileNotFoundError(f"No recorded transcript at {self.path}")
+            self.invokes = await asyncio.to_thread(self._read)
+        if not self.invokes:
+            raise RuntimeError(f"Transcript {self.path} has no more recorded turns")
+
+        invoke = self.invokes.pop(0)
+        for recorded in invoke.messages:
+            if self.time_scale > 0 and recorded.elapsed > 0:
+                await asyncio.sleep(recorded.elapsed * self.time_scale)
+            message = recorded.to_message()
+            group_chat.history.add_message(message)
+            yield message
+        if invoke.error is not None:
+            raise RuntimeError(f"Replayed failure: {invoke.error}")
+        group_chat.is_complete = invoke.is_complete
+
+
+def open_transcript(
+    source_script: str,
+) -> Tuple[Optional[TranscriptRecorder], Optional[TranscriptReplayer]]:
+    """Get the recorder or replayer for a file according to AGENT_TRANSCRIPT_MODE."""
+    if TRANSCRIPT_MODE == "record":
+        return TranscriptRecorder(source_script), None
+    if TRANSCRIPT_MODE == "replay":
+        return None, TranscriptReplayer(transcript_path(source_script))
+    return None, None
+
+
+# Replay every transcript in a directory and report the orchestration throughput.
+# Usage: python -m sql_agents.helpers.transcript [directory] [time_scale]
+async def main(directory: Path, time_scale: float):
+    from semantic_kernel.agents import ChatCompletionAgent
+
+    from sql_agents.helpers.comms_manager import CommsManager
+    from sql_agents.helpers.models import AgentType
+
+    agents = {
+        agent_type: ChatCompletionAgent(name=agent_type.value, instructions="replay")
+        for agent_type in (
+            AgentType.MIGRATOR,
+            AgentType.PICKER,
+            AgentType.SYNTAX_CHECKER,
+            AgentType.FIXER,
+            AgentType.SEMANTIC_VERIFIER,
+        )
+    }
+    messages = 0
+    files = sorted(Path(directory).glob("*.jsonl.gz"))
+    started = time.perf_counter()
+    for path in files:
+        comms_manager = CommsManager(
+            agents, replay=TranscriptReplayer(path, time_scale), max_retries=1
+        )
+        while True:
+            try:
+                async for _ in comms_manager.async_invoke():
+                    messages += 1
+            except RuntimeError:
+                break
+            if comms_manager.group_chat.is_complete:
+                break
+    elapsed = time.perf_counter() - started
+    print(
+        f"Replayed {len(files)} transcripts, {messages} messages in {elapsed:.3f}s "
+        f"({messages / elapsed if elapsed else 0:.1f} messages/s)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            Path(sys.argv[1]) if len(sys.argv) > 1 else TRANSCRIPT_DIR,
+            float(sys.argv[2]) if len(sys.argv) > 2 else 0.0,
+        )
+    )
@@ -53,6 +53,12 @@ async def process_batch_async(
         await batch_service.update_batch(batch_id, ProcessStatus.FAILED)
         return
 
+    # The results of an earlier run are replaced
+    try:
+        await batch_service.invalidate_result_archive(batch_id)
+    except Exception as exc:
+        logger.error("Error deleting result archive", batch_id=batch_id, error=str(exc))
+
     # Get the global SQL agents instance
     sql_agents = get_sql_agents()
     if not sql_agents:
@@ -143,6 +149,15 @@ async def process_batch_async(
     except Exception as exc:
         await batch_service.update_batch(batch_id, ProcessStatus.FAILED)
         logger.error("Error updating final batch status", batch_id=batch_id, error=str(exc))
+    try:
+        await batch_service.flush_logs()
+    except Exception as exc:
+        logger.error("Error writing batch logs", batch_id=batch_id, error=str(exc))
+    try:
+        await batch_service.build_result_archive(batch_id)
+    except Exception as exc:
+        # Built on the first download instead
+        logger.error("Error building result archive", batch_id=batch_id, error=str(exc))
     logger.info("Batch processing complete", batch_id=batch_id)
 
 
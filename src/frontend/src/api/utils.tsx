@@ -244,20 +244,28 @@ export interface BatchSummary {
     file_logs: any[];
     content?: string;
     translated_content?: string;
+    translated_path?: string;
   }[];
 }
+// Count a file's logs of a type, or use the counter kept on the file when the
+// batch summary was fetched without logs
+const logTypeCounter = (file, logType, counterField) => {
+  if (!file?.logs) {
+    return file?.[counterField] || 0;
+  }
+  return filesLogsBuilder(file).filter(log => log.logType === logType).length;
+};
+
 export const filesErrorCounter = (files) => {
   return files.reduce((count, file) => {
-    const logs = filesLogsBuilder(file);
-    const errorCount = logs.filter(log => log.logType === "error").length;
+    const errorCount = logTypeCounter(file, "error", "error_count");
     return count + errorCount;
   }, 0);
 };
 
 export const filesFinalErrorCounter = (files) => {
   return files.reduce((count, file) => {
-    const logs = filesLogsBuilder(file);
-    const errorCount = logs.filter(log => log.logType === "error").length;
+    const errorCount = logTypeCounter(file, "error", "error_count");
     if (file.status !== "completed") { // unfinished or failed file without error entry
       return count + (errorCount > 0 ? errorCount : 1);
     }
@@ -273,14 +281,11 @@ export const hasFiles = (responseData) => {
 };
 
 export const fileErrorCounter = (file) => {
-  const logs = filesLogsBuilder(file);
-  return logs.filter(log => log.logType === "error").length;
+  return logTypeCounter(file, "error", "error_count");
 };
 
 export const fileWarningCounter = (file) => {
-  const logs = filesLogsBuilder(file);
-  const value = logs.filter(log => log.logType === "warning").length
-  return value;
+  return logTypeCounter(file, "warning", "syntax_count");
 };
 
 export const determineFileStatus = (file) => {
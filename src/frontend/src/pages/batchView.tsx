@@ -91,7 +91,7 @@ const BatchStoryPage = () => {
         setDataLoaded(false);
         const apiUrl = getApiUrl();
 
-        const response = await fetch(`${apiUrl}/batch-summary/${batchId}`, { headers: headerBuilder({}) });
+        const response = await fetch(`${apiUrl}/batch-summary/${batchId}?include_logs=true`, { headers: headerBuilder({}) });
 
         if (!response.ok) {
           throw new Error(`Failed to fetch batch data: ${response.statusText}`);
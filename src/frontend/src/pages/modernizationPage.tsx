@@ -403,6 +403,7 @@ const fetchBatchSummary = async (batchId: string): Promise<any> => {
         warning_count: fileWarningCounter(file),
         error_count: fileErrorCounter(file),
         translated_content: file.translated_content,
+        translated_path: file.translated_path,
         file_logs: filesLogsBuilder(file),
 
       }))
@@ -820,7 +821,7 @@ const ModernizationPage = () => {
         const hasUsableFile = latestBatch.files.some(file =>
           file.status?.toLowerCase() === "completed" &&
           file.file_result !== "error" &&
-          !!file.translated_content?.trim()
+          (!!file.translated_content?.trim() || !!file.translated_path)
         );
   
         setIsZipButtonDisabled(!hasUsableFile);
@@ -1,10 +1,14 @@
 """Tests for API routes module."""
 # pylint: disable=redefined-outer-name,unused-argument
 
+import io
 import uuid
+import zipfile
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from backend.api.api_routes import (
+    complete_uploads,
+    create_upload_urls,
     delete_all_details,
     delete_batch_details,
     delete_file_details,
@@ -17,6 +21,7 @@ from backend.api.api_routes import (
     router,
     start_processing,
     upload_file,
+    upload_files,
 )
 
 from fastapi import FastAPI, HTTPException
@@ -41,13 +46,17 @@ def mock_batch_service():
         service.is_valid_uuid = MagicMock(return_value=True)
         service.get_batch = AsyncMock()
         service.get_batch_summary = AsyncMock()
-        service.get_batch_for_zip = AsyncMock()
+        service.get_batch_files_for_zip = AsyncMock()
+        # No stored archive unless a test provides one
+        service.find_result_archive = AsyncMock(return_value=None)
+        service.build_result_archive_later = MagicMock()
         service.upload_file_to_batch = AsyncMock()
         service.get_file_report = AsyncMock()
         service.delete_batch_and_files = AsyncMock()
         service.delete_file = AsyncMock()
         service.delete_all_from_storage_cosmos = AsyncMock()
         service.get_batch_history = AsyncMock()
+        service.get_batch_history_page = AsyncMock()
         mock.return_value = service
         yield service
 
@@ -155,44 +164,147 @@ class TestStartProcessing:
             assert "batch_id" not in event_data
 
 
+def translated_files(entries):
+    """Stand-in for BatchService.iter_translated_files yielding the given entries."""
+
+    async def iterate(files_meta):
+        for index, (file_name, content) in enumerate(entries):
+            yield index, file_name, content
+    return iterate
+
+
+def owned_batch(files):
+    """A batch of the user, as returned by BatchService.get_batch."""
+    return {"batch": {"user_id": "user"}, "files": files}
+
+
+async def read_zip(response):
+    data = b"".join([chunk async for chunk in response.body_iterator])
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name).decode() for name in archive.namelist()}
+
+
 class TestDownloadFiles:
     """Tests for download_files endpoint."""
 
     @pytest.mark.asyncio
-    async def test_download_files_success(self, mock_batch_service, mock_track_event):
+    async def test_download_files_success(self, mock_batch_service, mock_auth_user, mock_track_event):
         """Test successful file download."""
         batch_id = str(uuid.uuid4())
-        mock_batch_service.get_batch_for_zip.return_value = [
+        mock_batch_service.get_batch.return_value = owned_batch([{"file_id": "f1"}, {"file_id": "f2"}])
+        mock_batch_service.iter_translated_files = translated_files([
             ("file1.sql", "SELECT * FROM test"),
             ("file2", "INSERT INTO test VALUES (1)")
-        ]
+        ])
 
-        response = await download_files(batch_id)
+        response = await download_files(MagicMock(), batch_id)
 
         assert response.media_type == "application/zip"
         assert "Content-Disposition" in response.headers
+        # Streamed with chunked transfer encoding
+        assert "content-length" not in response.headers
+        assert await read_zip(response) == {
+            "file1.sql": "SELECT * FROM test",
+            "file2.sql": "INSERT INTO test VALUES (1)",
+        }
 
     @pytest.mark.asyncio
-    async def test_download_files_not_found(self, mock_batch_service, mock_track_event):
+    async def test_download_files_not_found(self, mock_batch_service, mock_auth_user, mock_track_event):
         """Test download when batch not found."""
         batch_id = str(uuid.uuid4())
-        mock_batch_service.get_batch_for_zip.return_value = None
+        mock_batch_service.get_batch.return_value = owned_batch([])
 
         with pytest.raises(HTTPException) as exc_info:
-            await download_files(batch_id)
+            await download_files(MagicMock(), batch_id)
         assert exc_info.value.status_code == 404
 
     @pytest.mark.asyncio
-    async def test_download_files_empty_content(self, mock_batch_service, mock_track_event):
+    async def test_download_files_other_users_batch(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test another user's batch is neither served from its archive nor streamed."""
+        batch_id = str(uuid.uuid4())
+        user_id = mock_auth_user.return_value.user_principal_id
+        mock_batch_service.get_batch.return_value = None
+        mock_batch_service.iter_translated_files = MagicMock()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await download_files(MagicMock(), batch_id)
+
+        assert exc_info.value.status_code == 404
+        mock_batch_service.get_batch.assert_awaited_once_with(batch_id, user_id)
+        mock_batch_service.find_result_archive.assert_not_awaited()
+        mock_batch_service.build_result_archive_later.assert_not_called()
+        mock_batch_service.iter_translated_files.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_download_files_empty_content(self, mock_batch_service, mock_auth_user, mock_track_event):
         """Test download with empty file content."""
         batch_id = str(uuid.uuid4())
-        mock_batch_service.get_batch_for_zip.return_value = [
+        mock_batch_service.get_batch.return_value = owned_batch([{"file_id": "f1"}, {"file_id": "f2"}])
+        mock_batch_service.iter_translated_files = translated_files([
             ("file1.sql", None),
             ("file2.sql", "SELECT * FROM test")
-        ]
+        ])
 
-        response = await download_files(batch_id)
+        response = await download_files(MagicMock(), batch_id)
         assert response.media_type == "application/zip"
+        assert list(await read_zip(response)) == ["file2.sql"]
+
+    @pytest.mark.asyncio
+    async def test_download_files_stored_archive(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test a finished batch is served from its stored archive."""
+        batch_id = str(uuid.uuid4())
+        mock_batch_service.get_batch.return_value = owned_batch([{"file_id": "f1"}])
+        mock_batch_service.find_result_archive.return_value = {"path": f"user/{batch_id}/results/b1.zip", "sha256": "abc"}
+
+        async def stream(blob_path):
+            yield b"PK"
+
+        mock_batch_service.stream_result_archive = stream
+        mock_request = MagicMock()
+        mock_request.headers = {}
+
+        response = await download_files(mock_request, batch_id)
+
+        assert response.headers["etag"] == '"abc"'
+        assert b"".join([chunk async for chunk in response.body_iterator]) == b"PK"
+        mock_batch_service.build_result_archive_later.assert_not_called()
+
+        # Unchanged since the client's copy
+        mock_request.headers = {"if-none-match": '"abc"'}
+        response = await download_files(mock_request, batch_id)
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_download_files_builds_missing_archive(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test the archive of a finished batch is built in the background on its first download."""
+        batch_id = str(uuid.uuid4())
+        user_id = mock_auth_user.return_value.user_principal_id
+        files = [{"file_id": "f1"}]
+        mock_batch_service.get_batch.return_value = owned_batch(files)
+        mock_batch_service.iter_translated_files = translated_files([("file1.sql", "SELECT 1")])
+        mock_batch_service.stream_result_archive = MagicMock()
+        mock_request = MagicMock()
+        mock_request.headers = {}
+
+        response = await download_files(mock_request, batch_id)
+
+        # Streamed without waiting for the build
+        assert "etag" not in response.headers
+        assert list(await read_zip(response)) == ["file1.sql"]
+        mock_batch_service.stream_result_archive.assert_not_called()
+        mock_batch_service.build_result_archive_later.assert_called_once_with(
+            batch_id, user_id, batch={"user_id": "user"}, files_meta=files
+        )
+
+    @pytest.mark.asyncio
+    async def test_download_files_user_not_authenticated(self, mock_batch_service, mock_track_event):
+        """Test download when user not authenticated."""
+        with patch("backend.api.api_routes.get_authenticated_user") as mock_auth:
+            mock_auth.return_value.user_principal_id = None
+
+            with pytest.raises(HTTPException) as exc_info:
+                await download_files(MagicMock(), str(uuid.uuid4()))
+            assert exc_info.value.status_code == 401
 
 
 class TestGetBatchStatus:
@@ -219,6 +331,16 @@ class TestGetBatchStatus:
             await get_batch_status(mock_request, "invalid-uuid")
         assert exc_info.value.status_code == 400
 
+    @pytest.mark.asyncio
+    async def test_get_batch_status_invalid_page_size(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test batch status with a page size out of range."""
+        mock_request = MagicMock()
+        mock_batch_service.get_batch.side_effect = ValueError("Page size must be between 1 and 100.")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_batch_status(mock_request, str(uuid.uuid4()), page_size=500)
+        assert exc_info.value.status_code == 400
+
     @pytest.mark.asyncio
     async def test_get_batch_status_not_found(self, mock_batch_service, mock_auth_user, mock_track_event):
         """Test batch status when not found."""
@@ -257,6 +379,7 @@ class TestGetBatchSummary:
         result = await get_batch_summary(mock_request, batch_id)
 
         assert result["total_files"] == 5
+        assert mock_batch_service.get_batch_summary.await_args.kwargs == {"include_logs": False}
 
     @pytest.mark.asyncio
     async def test_get_batch_summary_not_found(self, mock_batch_service, mock_auth_user, mock_track_event):
@@ -310,6 +433,94 @@ class TestUploadFile:
             assert exc_info.value.status_code == 401
 
 
+class TestUploadFiles:
+    """Tests for upload_files endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_upload_files_success(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test uploading many files at once."""
+        batch_id = str(uuid.uuid4())
+        files = [MagicMock(), MagicMock()]
+        mock_batch_service.upload_files_to_batch.return_value = {
+            "batch": {"batch_id": batch_id}, "files": [{"file_id": "f1"}], "failed": ["b.sql"],
+        }
+
+        result = await upload_files(MagicMock(), files, batch_id)
+
+        assert result["failed"] == ["b.sql"]
+        user_id = mock_auth_user.return_value.user_principal_id
+        mock_batch_service.upload_files_to_batch.assert_awaited_once_with(batch_id, user_id, files)
+
+    @pytest.mark.asyncio
+    async def test_upload_files_keeps_client_errors(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test an upload rejected by the service keeps its status code."""
+        mock_batch_service.upload_files_to_batch.side_effect = HTTPException(status_code=413, detail="Too large")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await upload_files(MagicMock(), [MagicMock()], str(uuid.uuid4()))
+        assert exc_info.value.status_code == 413
+
+
+class TestDirectUploads:
+    """Tests for create_upload_urls and complete_uploads endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_create_upload_urls_success(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test upload URLs are issued for the files."""
+        batch_id = str(uuid.uuid4())
+        mock_request = MagicMock()
+        mock_request.json = AsyncMock(return_value={"batch_id": batch_id, "file_names": ["a.sql"]})
+        mock_batch_service.create_upload_urls.return_value = [{"file_id": "f1", "upload_url": "https://url"}]
+
+        result = await create_upload_urls(mock_request)
+
+        assert result == [{"file_id": "f1", "upload_url": "https://url"}]
+        user_id = mock_auth_user.return_value.user_principal_id
+        mock_batch_service.create_upload_urls.assert_awaited_once_with(batch_id, user_id, ["a.sql"])
+
+    @pytest.mark.asyncio
+    async def test_create_upload_urls_invalid_names(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test upload URLs with file names that are not a list of names."""
+        mock_request = MagicMock()
+        mock_request.json = AsyncMock(return_value={"batch_id": str(uuid.uuid4()), "file_names": "a.sql"})
+
+        with pytest.raises(HTTPException) as exc_info:
+            await create_upload_urls(mock_request)
+        assert exc_info.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_complete_uploads_success(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test completed uploads are added to the batch."""
+        batch_id = str(uuid.uuid4())
+        files = [{"file_id": str(uuid.uuid4()), "file_name": "a.sql"}]
+        mock_request = MagicMock()
+        mock_request.json = AsyncMock(return_value={"batch_id": batch_id, "files": files})
+        mock_batch_service.complete_uploads.return_value = {"batch": {}, "files": [{"file_id": "f1"}], "failed": []}
+
+        result = await complete_uploads(mock_request)
+
+        assert result["files"] == [{"file_id": "f1"}]
+        user_id = mock_auth_user.return_value.user_principal_id
+        mock_batch_service.complete_uploads.assert_awaited_once_with(batch_id, user_id, files)
+
+    @pytest.mark.asyncio
+    async def test_complete_uploads_errors(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test completing uploads with an invalid file id, or for a missing batch."""
+        batch_id = str(uuid.uuid4())
+        mock_request = MagicMock()
+        mock_request.json = AsyncMock(return_value={"batch_id": batch_id, "files": [{"file_id": "x", "file_name": "a.sql"}]})
+        mock_batch_service.is_valid_uuid.side_effect = lambda value: value != "x"
+        with pytest.raises(HTTPException) as exc_info:
+            await complete_uploads(mock_request)
+        assert exc_info.value.status_code == 400
+
+        mock_request.json = AsyncMock(return_value={"batch_id": batch_id, "files": []})
+        mock_batch_service.complete_uploads.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            await complete_uploads(mock_request)
+        assert exc_info.value.status_code == 404
+
+
 class TestGetFileDetails:
     """Tests for get_file_details endpoint."""
 
@@ -344,6 +555,19 @@ class TestGetFileDetails:
             await get_file_details(mock_request, "invalid-id")
         assert exc_info.value.status_code == 400
 
+    @pytest.mark.asyncio
+    async def test_get_file_details_paged(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test file details with a page of logs."""
+        file_id = str(uuid.uuid4())
+        mock_request = MagicMock()
+        mock_batch_service.get_file_report.return_value = {"logs": [], "continuation_token": None}
+
+        await get_file_details(mock_request, file_id, page_size=10)
+
+        mock_batch_service.get_file_report.assert_awaited_once_with(
+            file_id, page_size=10, continuation_token=None
+        )
+
 
 class TestDeleteBatchDetails:
     """Tests for delete_batch_details endpoint."""
@@ -451,3 +675,28 @@ class TestListBatchHistory:
         result = await list_batch_history(mock_request)
 
         assert result.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_list_batch_history_continuation(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test batch history pages with a continuation token."""
+        mock_request = MagicMock()
+        page = {"batches": [{"batch_id": "test"}], "continuation_token": "next"}
+        mock_batch_service.get_batch_history_page.return_value = page
+
+        result = await list_batch_history(mock_request, page_size=1, continuation_token="token")
+
+        assert result == page
+        mock_batch_service.get_batch_history_page.assert_awaited_once_with(
+            mock_auth_user.return_value.user_principal_id, page_size=1, continuation_token="token"
+        )
+        mock_batch_service.get_batch_history.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_list_batch_history_invalid_token(self, mock_batch_service, mock_auth_user, mock_track_event):
+        """Test batch history with an invalid continuation token."""
+        mock_request = MagicMock()
+        mock_batch_service.get_batch_history_page.side_effect = ValueError("Invalid continuation token.")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await list_batch_history(mock_request, continuation_token="bad")
+        assert exc_info.value.status_code == 400
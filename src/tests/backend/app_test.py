@@ -1,7 +1,10 @@
 # pylint: disable=redefined-outer-name
 """Tests for the FastAPI application."""
 
-from backend.app import create_app
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend import app as app_module
+from backend.app import create_app, lifespan
 
 from fastapi import FastAPI
 
@@ -39,3 +42,24 @@ async def test_backend_routes_exist(app: FastAPI):
     paths = app.openapi().get("paths", {})
     backend_paths = [p for p in paths if p.startswith("/api")]
     assert backend_paths, "No backend routes found under /api prefix"
+
+
+@pytest.mark.asyncio
+async def test_shutdown_flushes_logs_when_agent_cleanup_fails(app: FastAPI):
+    """Buffered logs are written and storage closed even if agent cleanup raises."""
+    batch_service = MagicMock()
+    batch_service.return_value.initialize_database = AsyncMock()
+    batch_service.return_value.resume_deletes = AsyncMock()
+    batch_service.cancel_archive_builds = AsyncMock()
+    batch_service.wait_for_deletes = AsyncMock(side_effect=Exception("delete failed"))
+    with patch.object(app_module, "get_azure_credential", side_effect=Exception("no credential")), \
+         patch.object(app_module, "BatchService", batch_service), \
+         patch.object(app_module.DatabaseFactory, "close_log_buffer", AsyncMock()) as close_log_buffer, \
+         patch.object(app_module.BlobStorageFactory, "close_storage", AsyncMock()) as close_storage:
+        async with lifespan(app):
+            app_module.sql_agents = MagicMock()
+            app_module.sql_agents.delete_agents = AsyncMock(side_effect=Exception("cleanup failed"))
+        app_module.sql_agents = None
+
+    close_log_buffer.assert_awaited_once()
+    close_storage.assert_awaited_once()
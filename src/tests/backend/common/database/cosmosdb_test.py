@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 # Add backend directory to sys.path
@@ -10,16 +11,25 @@ from unittest import mock  # noqa: E402
 from unittest.mock import AsyncMock  # noqa: E402
 from uuid import uuid4  # noqa: E402
 
+from azure.core import MatchConditions  # noqa: E402
 from azure.cosmos.aio import CosmosClient  # noqa: E402
-from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError  # noqa: E402
+from azure.cosmos.exceptions import (  # noqa: E402
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
 
 from common.database.cosmosdb import (  # noqa: E402
     CosmosDBClient,
 )
+from common.database.database_base import FileLogWriteError  # noqa: E402
 from common.models.api import (  # noqa: E402
     AgentType,
     AuthorRole,
     BatchRecord,
+    BatchSummaryView,
+    FileLog,
     FileRecord,
     LogType,
     ProcessStatus,
@@ -319,6 +329,34 @@ async def test_add_file(cosmos_db_client, mocker):
     mock_file_container.create_item.assert_called_once_with(body=file_record.dict())
 
 
+@pytest.mark.asyncio
+async def test_add_files(cosmos_db_client, mocker):
+    batch_id = uuid4()
+    files = [(uuid4(), f"q{i}.sql", f"path/q{i}.sql") for i in range(3)]
+    mock_file_container = mock.MagicMock()
+    mock_file_container.upsert_item = AsyncMock(return_value=None)
+    mock_file_container.execute_item_batch = AsyncMock(return_value=None)
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    # Files partitioned by file id are written one item per partition
+    file_records = await cosmos_db_client.add_files(batch_id, files)
+    assert [(r.file_id, r.original_name, r.blob_path) for r in file_records] == files
+    assert all(r.status == ProcessStatus.READY_TO_PROCESS for r in file_records)
+    # Distinct creation times, in the order given, to page without ties
+    created = [r.created_at for r in file_records]
+    assert created == sorted(set(created))
+    assert mock_file_container.upsert_item.await_count == 3
+    mock_file_container.execute_item_batch.assert_not_called()
+
+    # Files of a batch sharing a partition are written as one transactional batch
+    cosmos_db_client.file_partition_key = "batch_id"
+    await cosmos_db_client.add_files(batch_id, files)
+    mock_file_container.execute_item_batch.assert_awaited_once()
+    kwargs = mock_file_container.execute_item_batch.await_args.kwargs
+    assert kwargs["partition_key"] == str(batch_id)
+    assert [op[0] for op in kwargs["batch_operations"]] == ["upsert"] * 3
+
+
 @pytest.mark.asyncio
 async def test_add_file_exception(cosmos_db_client, mocker):
     batch_id = uuid4()
@@ -376,6 +414,144 @@ async def test_update_file(cosmos_db_client, mocker):
     mock_file_container.replace_item.assert_called_once_with(item=str(file_id), body=file_record.dict())
 
 
+def stored_file(**changes):
+    """A file document as read from the container, with an ETag."""
+    record = FileRecord(
+        file_id=uuid4(),
+        batch_id=uuid4(),
+        original_name="file.txt",
+        blob_path="/path/to/storage",
+        translated_path="",
+        status=ProcessStatus.READY_TO_PROCESS,
+        error_count=0,
+        syntax_count=0,
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc)
+    )
+    return {**record.dict(), "_etag": "1", **changes}
+
+
+@pytest.mark.asyncio
+async def test_update_file_retries_after_concurrent_change(cosmos_db_client, mocker):
+    document = stored_file()
+    file_record = FileRecord.fromdb(document)
+    file_record.status = ProcessStatus.COMPLETED
+    bodies = []
+
+    async def replace_item(item, body, **kwargs):
+        bodies.append((body, kwargs))
+        if len(bodies) == 1:
+            raise CosmosAccessConditionFailedError(message="Precondition failed")
+        return {**body, "_etag": "3"}
+
+    mock_file_container = mock.MagicMock()
+    mock_file_container.replace_item = AsyncMock(side_effect=replace_item)
+    # Another writer added to the counts in between
+    mock_file_container.read_item = AsyncMock(return_value={**document, "error_count": 4, "_etag": "2"})
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    await cosmos_db_client.update_file(file_record)
+
+    assert bodies[0][1] == {"etag": "1", "match_condition": MatchConditions.IfNotModified}
+    retried, conditions = bodies[1]
+    assert conditions["etag"] == "2"
+    assert retried["status"] == ProcessStatus.COMPLETED.value
+    assert retried["error_count"] == 4
+    assert "_etag" not in retried
+    mock_file_container.read_item.assert_called_once_with(item=document["id"], partition_key=document["id"])
+    assert file_record.etag == "3"
+
+
+@pytest.mark.asyncio
+async def test_update_batch_gives_up_after_retries(cosmos_db_client, mocker):
+    batch = {
+        "id": "b1",
+        "batch_id": str(uuid4()),
+        "user_id": "user",
+        "file_count": 0,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "status": ProcessStatus.READY_TO_PROCESS.value,
+        "_etag": "1",
+    }
+    batch_record = BatchRecord.fromdb(batch)
+    batch_record.status = ProcessStatus.COMPLETED
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.replace_item = AsyncMock(
+        side_effect=CosmosAccessConditionFailedError(message="Precondition failed")
+    )
+    mock_batch_container.read_item = AsyncMock(return_value=batch)
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    with pytest.raises(CosmosAccessConditionFailedError):
+        await cosmos_db_client.update_batch(batch_record)
+
+    assert mock_batch_container.replace_item.await_count == CosmosDBClient.MAX_CONFLICT_RETRIES
+
+
+@pytest.mark.asyncio
+async def test_patch_file_sets_and_increments(cosmos_db_client, mocker):
+    document = stored_file()
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock(return_value={**document, "_etag": "2"})
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    patched = await cosmos_db_client.patch_file(
+        document["file_id"],
+        fields={"status": ProcessStatus.COMPLETED.value},
+        increments={"error_count": 2, "syntax_count": 0},
+        etag="1",
+    )
+
+    assert patched["_etag"] == "2"
+    mock_file_container.patch_item.assert_called_once_with(
+        item=document["file_id"],
+        partition_key=document["file_id"],
+        patch_operations=[
+            {"op": "set", "path": "/status", "value": ProcessStatus.COMPLETED.value},
+            {"op": "incr", "path": "/error_count", "value": 2},
+        ],
+        etag="1",
+        match_condition=MatchConditions.IfNotModified,
+    )
+    # The patched document is kept in the cache
+    assert (await cosmos_db_client.get_file(document["file_id"]))["_etag"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_patch_batch_not_found(cosmos_db_client, mocker):
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.patch_item = AsyncMock(side_effect=CosmosResourceNotFoundError(message="Not found"))
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    assert await cosmos_db_client.patch_batch("b1", {"status": "completed"}) is None
+
+
+@pytest.mark.asyncio
+async def test_get_files_logs_queries_chunks_of_files(cosmos_db_client, mocker):
+    mocker.patch.object(CosmosDBClient, "MAX_QUERY_FILE_IDS", 2)
+    file_ids = ["f1", "f2", "f3"]
+
+    def query_items(query, parameters):
+        chunk = parameters[0]["value"]
+
+        async def items():
+            for file_id in chunk:
+                yield {"file_id": file_id, "log_id": f"{file_id}-log"}
+        return items()
+
+    mock_log_container = mock.MagicMock()
+    mock_log_container.query_items = mock.MagicMock(side_effect=query_items)
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    logs = await cosmos_db_client.get_files_logs(file_ids + ["f1"], fields=("log_id",))
+
+    assert logs == {file_id: [{"file_id": file_id, "log_id": f"{file_id}-log"}] for file_id in file_ids}
+    calls = mock_log_container.query_items.call_args_list
+    assert [call.kwargs["parameters"][0]["value"] for call in calls] == [["f1", "f2"], ["f3"]]
+    assert calls[0].kwargs["query"].startswith("SELECT c.log_id, c.file_id FROM c WHERE ARRAY_CONTAINS")
+
+
 @pytest.mark.asyncio
 async def test_update_file_exception(cosmos_db_client, mocker):
     # Create a sample FileRecord
@@ -498,7 +674,10 @@ async def test_get_batch(cosmos_db_client, mocker):
     assert batch["user_id"] == user_id
 
     mock_batch_container.query_items.assert_called_once_with(
-        query="SELECT * FROM c WHERE c.batch_id = @batch_id and c.user_id = @user_id",
+        query=(
+            "SELECT * FROM c WHERE c.batch_id = @batch_id and c.user_id = @user_id "
+            "and NOT IS_DEFINED(c.deleted_at)"
+        ),
         parameters=[
             {"name": "@batch_id", "value": batch_id},
             {"name": "@user_id", "value": user_id},
@@ -990,7 +1169,11 @@ async def test_delete_batch(cosmos_db_client, mocker):
     # Call the delete_batch method
     await cosmos_db_client.delete_batch(user_id, batch_id)
 
-    mock_batch_container.delete_item.assert_called_once()
+    # The batch record and its summary document
+    assert mock_batch_container.delete_item.await_args_list == [
+        mock.call(batch_id, partition_key=batch_id),
+        mock.call(f"{batch_id}:summary", partition_key=batch_id),
+    ]
 
 
 @pytest.mark.asyncio
@@ -1044,6 +1227,10 @@ async def test_delete_file(cosmos_db_client, mocker):
 
     # Mock the delete_logs method (since it's called in delete_file)
     mocker.patch.object(cosmos_db_client, 'delete_logs', return_value=None)
+    mocker.patch.object(
+        cosmos_db_client, 'get_file', AsyncMock(return_value={"file_id": file_id, "batch_id": "b1"})
+    )
+    mocker.patch.object(cosmos_db_client, '_summarize', AsyncMock())
 
     # Call the delete_file method
     await cosmos_db_client.delete_file(user_id, file_id)
@@ -1051,6 +1238,8 @@ async def test_delete_file(cosmos_db_client, mocker):
     cosmos_db_client.delete_logs.assert_called_once_with(file_id)
 
     mock_file_container.delete_item.assert_called_once_with(file_id, partition_key=file_id)
+    # The file's row is removed from the summary of its batch
+    cosmos_db_client._summarize.assert_awaited_once_with("b1", removed=[file_id])
 
 
 @pytest.mark.asyncio
@@ -1106,6 +1295,125 @@ async def test_add_file_log(cosmos_db_client, mocker):
     mock_log_container.create_item.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_add_file_logs(cosmos_db_client, mocker):
+    file_id = uuid4()
+    logs = [
+        FileLog(uuid4(), file_id, f"log {i}", "", LogType.INFO, AgentType.MIGRATOR,
+                AuthorRole.ASSISTANT, datetime.now(timezone.utc))
+        for i in range(3)
+    ]
+    mock_log_container = mock.MagicMock()
+    mock_log_container.upsert_item = AsyncMock(return_value=None)
+    mock_log_container.execute_item_batch = AsyncMock(return_value=None)
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    # Logs partitioned by log id are written one item per partition
+    await cosmos_db_client.add_file_logs(logs)
+    assert mock_log_container.upsert_item.await_count == 3
+    mock_log_container.execute_item_batch.assert_not_called()
+
+    # Logs sharing a partition are written as one transactional batch
+    cosmos_db_client.log_partition_key = "file_id"
+    await cosmos_db_client.add_file_logs(logs)
+    mock_log_container.execute_item_batch.assert_awaited_once()
+    kwargs = mock_log_container.execute_item_batch.await_args.kwargs
+    assert kwargs["partition_key"] == str(file_id)
+    assert [op[0] for op in kwargs["batch_operations"]] == ["upsert"] * 3
+
+
+@pytest.mark.asyncio
+async def test_add_file_logs_increments_counts(cosmos_db_client, mocker):
+    file_id = uuid4()
+    logs = [
+        FileLog(uuid4(), file_id, "log", "", log_type, AgentType.MIGRATOR,
+                AuthorRole.ASSISTANT, datetime.now(timezone.utc))
+        for log_type in (LogType.ERROR, LogType.WARNING, LogType.WARNING, LogType.INFO)
+    ]
+    mock_log_container = mock.MagicMock()
+    mock_log_container.upsert_item = AsyncMock(return_value=None)
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock(return_value=None)
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    await cosmos_db_client.add_file_logs(logs)
+
+    mock_file_container.patch_item.assert_awaited_once_with(
+        item=str(file_id),
+        partition_key=str(file_id),
+        patch_operations=[
+            {"op": "incr", "path": "/error_count", "value": 1},
+            {"op": "incr", "path": "/syntax_count", "value": 2},
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_file_log_increment_failure_is_logged(cosmos_db_client, mocker):
+    mock_log_container = mock.MagicMock()
+    mock_log_container.create_item = AsyncMock(return_value=None)
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock(side_effect=CosmosResourceNotFoundError())
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    await cosmos_db_client.add_file_log(
+        uuid4(), "failed", "", LogType.ERROR, AgentType.ALL, AuthorRole.ASSISTANT
+    )
+
+    mock_log_container.create_item.assert_awaited_once()
+    mock_file_container.patch_item.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_file_log_counts(cosmos_db_client, mocker):
+    counts = iter([[3], [5]])
+
+    def query_items(query, parameters):
+        async def gen():
+            for value in next(counts):
+                yield value
+        return gen()
+
+    mock_log_container = mock.MagicMock()
+    mock_log_container.query_items = mock.MagicMock(side_effect=query_items)
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    assert await cosmos_db_client.get_file_log_counts("file_1") == (3, 5)
+    first_params = mock_log_container.query_items.call_args_list[0].kwargs["parameters"]
+    assert {"name": "@log_type", "value": LogType.ERROR.value} in first_params
+
+
+@pytest.mark.asyncio
+async def test_set_file_counts(cosmos_db_client, mocker):
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock(return_value=None)
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    await cosmos_db_client.set_file_counts("file_1", 1, 2)
+
+    operations = mock_file_container.patch_item.await_args.kwargs["patch_operations"]
+    assert operations == [
+        {"op": "set", "path": "/error_count", "value": 1},
+        {"op": "set", "path": "/syntax_count", "value": 2},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_add_file_logs_failure(cosmos_db_client, mocker):
+    logs = [
+        FileLog(uuid4(), uuid4(), "log", "", LogType.INFO, AgentType.MIGRATOR,
+                AuthorRole.ASSISTANT, datetime.now(timezone.utc))
+    ]
+    mock_log_container = mock.MagicMock()
+    mock_log_container.upsert_item = AsyncMock(side_effect=Exception("Cosmos DB error"))
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    with pytest.raises(Exception, match="Cosmos DB error"):
+        await cosmos_db_client.add_file_logs(logs)
+
+
 @pytest.mark.asyncio
 async def test_update_batch_entry(cosmos_db_client, mocker):
     batch_id = "batch_123"
@@ -1126,20 +1434,29 @@ async def test_update_batch_entry(cosmos_db_client, mocker):
         "updated_at": "2025-04-07T00:00:00Z"
     })
 
-    # Mock the replace_item method
-    mock_batch_container.replace_item = AsyncMock(return_value=None)
+    # The patch returns the updated document
+    async def patch_item(item, partition_key, patch_operations):
+        batch = {"batch_id": batch_id, "user_id": user_id}
+        batch.update({op["path"][1:]: op["value"] for op in patch_operations})
+        return batch
+
+    mock_batch_container.patch_item = AsyncMock(side_effect=patch_item)
+    mock_batch_container.replace_item = AsyncMock()
 
     # Call the method
     updated_batch = await cosmos_db_client.update_batch_entry(batch_id, user_id, status, file_count)
 
-    # Assert that replace_item was called with the correct arguments
-    mock_batch_container.replace_item.assert_called_once_with(item=batch_id, body={
-        "batch_id": batch_id,
-        "status": status.value,
-        "user_id": user_id,
-        "file_count": file_count,
-        "updated_at": updated_batch["updated_at"]
-    })
+    # A single partial update, no replace of the whole document
+    mock_batch_container.replace_item.assert_not_called()
+    mock_batch_container.patch_item.assert_called_once_with(
+        item=batch_id,
+        partition_key=batch_id,
+        patch_operations=[
+            {"op": "set", "path": "/status", "value": status.value},
+            {"op": "set", "path": "/updated_at", "value": updated_batch["updated_at"]},
+            {"op": "set", "path": "/file_count", "value": file_count},
+        ],
+    )
 
     # Assert the returned batch matches expected values
     assert updated_batch["batch_id"] == batch_id
@@ -1198,3 +1515,569 @@ async def test_get_batch_history(cosmos_db_client, mocker):
     assert batches[0]["batch_id"] == expected_batches[0]["batch_id"]
 
     mock_batch_container.query_items.assert_called_once()
+
+
+@pytest.fixture
+def by_parent_client():
+    return CosmosDBClient(
+        endpoint=endpoint,
+        credential=credential,
+        database_name=database_name,
+        batch_container=batch_container,
+        file_container=file_container,
+        log_container=log_container,
+        layout="by_parent",
+    )
+
+
+def query_results(*results):
+    """Build a query_items side effect returning each list of items in turn."""
+    pending = list(results)
+
+    def query_items(*args, **kwargs):
+        items = pending.pop(0)
+
+        async def gen():
+            for item in items:
+                yield item
+        return gen()
+
+    return query_items
+
+
+@pytest.mark.asyncio
+async def test_by_parent_batch_files_single_partition(by_parent_client, mocker):
+    mock_file_container = mock.MagicMock()
+    mock_file_container.query_items = mock.MagicMock(
+        side_effect=query_results([{"file_id": "f1", "batch_id": "b1"}])
+    )
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+
+    files = await by_parent_client.get_batch_files("b1")
+
+    assert files == [{"file_id": "f1", "batch_id": "b1"}]
+    assert mock_file_container.query_items.call_args.kwargs["partition_key"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_by_parent_get_file_uses_known_batch(by_parent_client, mocker):
+    mock_file_container = mock.MagicMock()
+    mock_file_container.query_items = mock.MagicMock(
+        side_effect=query_results(
+            [{"file_id": "f1", "batch_id": "b1"}],
+            [{"file_id": "f1", "batch_id": "b1"}],
+        )
+    )
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+
+    # The first read fans out, later reads go to the file's batch partition
+    await by_parent_client.get_file("f1")
+    assert "partition_key" not in mock_file_container.query_items.call_args.kwargs
+    by_parent_client.file_cache.clear()
+    await by_parent_client.get_file("f1")
+    assert mock_file_container.query_items.call_args.kwargs["partition_key"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_by_parent_logs_partitioned_by_file(by_parent_client, mocker):
+    mock_log_container = mock.MagicMock()
+    mock_log_container.query_items = mock.MagicMock(
+        side_effect=query_results([{"id": "l1"}], [{"id": "l1"}, {"id": "l2"}])
+    )
+    mock_log_container.execute_item_batch = AsyncMock()
+    mocker.patch.object(by_parent_client, 'log_container', mock_log_container)
+
+    await by_parent_client.get_file_logs("f1")
+    assert mock_log_container.query_items.call_args.kwargs["partition_key"] == "f1"
+
+    # The logs of a file share a partition and are deleted in one transactional batch
+    await by_parent_client.delete_logs("f1")
+    mock_log_container.execute_item_batch.assert_awaited_once_with(
+        batch_operations=[("delete", ("l1",)), ("delete", ("l2",))], partition_key="f1"
+    )
+
+
+@pytest.mark.asyncio
+async def test_by_parent_file_logs_batch_and_increment(by_parent_client, mocker):
+    file_id = uuid4()
+    logs = [
+        FileLog(uuid4(), file_id, "log", "", LogType.ERROR, AgentType.MIGRATOR,
+                AuthorRole.ASSISTANT, datetime.now(timezone.utc))
+        for _ in range(2)
+    ]
+    mock_log_container = mock.MagicMock()
+    mock_log_container.execute_item_batch = AsyncMock()
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock()
+    mocker.patch.object(by_parent_client, 'log_container', mock_log_container)
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+    by_parent_client._remember_file({"file_id": str(file_id), "batch_id": "b1"})
+
+    await by_parent_client.add_file_logs(logs)
+
+    assert mock_log_container.execute_item_batch.await_args.kwargs["partition_key"] == str(file_id)
+    assert mock_file_container.patch_item.await_args.kwargs["partition_key"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_by_parent_file_logs_partial_failure_is_retried(by_parent_client, mocker):
+    failing, working = uuid4(), uuid4()
+    logs = [
+        FileLog(uuid4(), file_id, "log", "", LogType.ERROR, AgentType.MIGRATOR,
+                AuthorRole.ASSISTANT, datetime.now(timezone.utc))
+        for file_id in (failing, failing, working, working)
+    ]
+    mock_log_container = mock.MagicMock()
+    unavailable = {str(failing)}
+
+    async def execute_item_batch(batch_operations, partition_key):
+        if partition_key in unavailable:
+            raise Exception("Request timeout")
+
+    mock_log_container.execute_item_batch = AsyncMock(side_effect=execute_item_batch)
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock()
+    mocker.patch.object(by_parent_client, 'log_container', mock_log_container)
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+    for file_id in (failing, working):
+        by_parent_client._remember_file({"file_id": str(file_id), "batch_id": "b1"})
+
+    with pytest.raises(FileLogWriteError) as error:
+        await by_parent_client.add_file_logs(logs)
+
+    # Only the partition that failed is given back, and only the other is counted
+    assert error.value.unwritten == logs[:2]
+    assert [call.kwargs["item"] for call in mock_file_container.patch_item.await_args_list] == [str(working)]
+
+    # The retry writes the rest, idempotently, and counts it once
+    unavailable.clear()
+    await by_parent_client.add_file_logs(error.value.unwritten)
+    assert [call.kwargs["item"] for call in mock_file_container.patch_item.await_args_list] == [str(working), str(failing)]
+    operations = mock_log_container.execute_item_batch.await_args.kwargs["batch_operations"]
+    assert [op[0] for op in operations] == ["upsert", "upsert"]
+
+
+@pytest.mark.asyncio
+async def test_by_parent_delete_logs_falls_back_when_batch_fails(by_parent_client, mocker):
+    mock_log_container = mock.MagicMock()
+    mock_log_container.query_items = mock.MagicMock(
+        side_effect=query_results([{"id": "l1"}, {"id": "l2"}])
+    )
+    mock_log_container.execute_item_batch = AsyncMock(
+        side_effect=CosmosBatchOperationError(
+            error_index=0, headers={}, status_code=404, message="gone", operation_responses=[]
+        )
+    )
+    mock_log_container.delete_item = AsyncMock(
+        side_effect=[CosmosResourceNotFoundError(message="gone"), None]
+    )
+    mocker.patch.object(by_parent_client, 'log_container', mock_log_container)
+
+    await by_parent_client.delete_logs("f1")
+
+    mock_log_container.delete_item.assert_any_await("l2", partition_key="f1")
+    assert mock_log_container.delete_item.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_files_reports_progress(cosmos_db_client, mocker):
+    file_ids = [str(uuid4()) for _ in range(3)]
+    mock_file_container = mock.MagicMock()
+    mock_file_container.delete_item = AsyncMock()
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+    mocker.patch.object(cosmos_db_client, 'delete_logs', AsyncMock())
+    progress = mock.MagicMock()
+
+    await cosmos_db_client.delete_files("user", file_ids, progress=progress)
+
+    assert cosmos_db_client.delete_logs.await_count == 3
+    assert [c.args for c in progress.call_args_list] == [(1, 3), (2, 3), (3, 3)]
+    for file_id in file_ids:
+        mock_file_container.delete_item.assert_any_await(file_id, partition_key=file_id)
+
+
+@pytest.mark.asyncio
+async def test_delete_files_bounds_concurrent_lookups(cosmos_db_client, mocker):
+    file_ids = [str(uuid4()) for _ in range(cosmos_db_client.MAX_CONCURRENT_DELETES * 3)]
+    mock_file_container = mock.MagicMock()
+    mock_file_container.delete_item = AsyncMock()
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+    running = peak = 0
+
+    async def track(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+
+    mocker.patch.object(cosmos_db_client, '_file_partition', AsyncMock(side_effect=track))
+    mocker.patch.object(cosmos_db_client, 'delete_logs', AsyncMock(side_effect=track))
+
+    await cosmos_db_client.delete_files("user", file_ids)
+
+    assert cosmos_db_client.delete_logs.await_count == len(file_ids)
+    assert 1 < peak <= cosmos_db_client.MAX_CONCURRENT_DELETES
+
+
+@pytest.mark.asyncio
+async def test_by_parent_delete_files_batches_records(by_parent_client, mocker):
+    mock_file_container = mock.MagicMock()
+    mock_file_container.execute_item_batch = AsyncMock()
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+    mocker.patch.object(by_parent_client, 'delete_logs', AsyncMock())
+    for file_id in ("f1", "f2"):
+        by_parent_client._remember_file({"file_id": file_id, "batch_id": "b1"})
+
+    await by_parent_client.delete_files("user", ["f1", "f2"])
+
+    mock_file_container.execute_item_batch.assert_awaited_once_with(
+        batch_operations=[("delete", ("f1",)), ("delete", ("f2",))], partition_key="b1"
+    )
+    assert not by_parent_client._file_batches
+
+
+@pytest.mark.asyncio
+async def test_expire_batch(cosmos_db_client, mocker):
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.patch_item = AsyncMock()
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    await cosmos_db_client.expire_batch("user", "b1", 60)
+
+    # The batch record, marked deleted, and its summary document
+    assert mock_batch_container.patch_item.await_args_list == [
+        mock.call(
+            item="b1",
+            partition_key="b1",
+            patch_operations=[
+                {"op": "set", "path": "/ttl", "value": 60},
+                {"op": "set", "path": "/deleted_at", "value": mock.ANY},
+            ],
+        ),
+        mock.call(
+            item="b1:summary",
+            partition_key="b1",
+            patch_operations=[{"op": "set", "path": "/ttl", "value": 60}],
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_deleted_batches(cosmos_db_client, mocker):
+    batch = {"batch_id": "b1", "user_id": "user", "deleted_at": "2024-01-01T00:00:00"}
+
+    async def items():
+        yield batch
+
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.query_items = mock.MagicMock(return_value=items())
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    assert await cosmos_db_client.get_deleted_batches() == [batch]
+    assert "IS_DEFINED(c.deleted_at)" in mock_batch_container.query_items.call_args.kwargs["query"]
+
+
+@pytest.mark.asyncio
+async def test_user_reads_exclude_soft_deleted_batches(cosmos_db_client, mocker):
+    async def no_items(*args, **kwargs):
+        return
+        yield
+
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.query_items = mock.MagicMock(side_effect=no_items)
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    await cosmos_db_client.get_user_batches("user")
+    await cosmos_db_client.get_batch_history("user")
+    await cosmos_db_client.get_batch_history_page("user", 10)
+
+    for call in mock_batch_container.query_items.call_args_list:
+        assert "NOT IS_DEFINED(c.deleted_at)" in call.kwargs["query"]
+
+    # A cached batch soft deleted since is not returned either
+    cosmos_db_client.batch_cache.put("b1", {"batch_id": "b1", "user_id": "user", "deleted_at": "now"})
+    assert await cosmos_db_client.get_batch("user", "b1") is None
+
+
+class PagedContainer:
+    """Container answering the TOP/boundary queries of _query_page from a list."""
+
+    def __init__(self, items, order_by, descending):
+        self.items = sorted(items, key=lambda item: item[order_by], reverse=descending)
+        self.order_by = order_by
+        self.descending = descending
+        self.queries = []
+
+    def query_items(self, query, parameters, **kwargs):
+        self.queries.append((query, parameters, kwargs))
+        values = {p["name"]: p["value"] for p in parameters}
+        items = self.items
+        if "@boundary" in values:
+            boundary = values["@boundary"]
+            items = [
+                item for item in items
+                if (item[self.order_by] <= boundary if self.descending else item[self.order_by] >= boundary)
+            ]
+
+        async def gen():
+            for item in items[:values["@top"]]:
+                yield item
+        return gen()
+
+
+async def read_all_pages(read_page, page_size):
+    pages = []
+    token = None
+    while True:
+        items, token = await read_page(page_size, token)
+        pages.append([item["id"] for item in items])
+        if token is None:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_batch_history_pages_with_ties(cosmos_db_client, mocker):
+    # Five batches updated at the same time must not be skipped or repeated
+    items = [{"id": f"b{i}", "updated_at": "2024-01-01" if i < 5 else f"2024-01-0{i - 3}"} for i in range(8)]
+    container = PagedContainer(items, "updated_at", descending=True)
+    mocker.patch.object(cosmos_db_client, 'batch_container', container)
+
+    pages = await read_all_pages(
+        lambda size, token: cosmos_db_client.get_batch_history_page("user", size, token), 2
+    )
+
+    flattened = [item_id for page in pages for item_id in page]
+    assert sorted(flattened) == sorted(item["id"] for item in items)
+    assert all(len(page) <= 2 for page in pages)
+    assert "SELECT TOP @top" in container.queries[0][0]
+    assert "OFFSET" not in container.queries[-1][0]
+
+
+@pytest.mark.asyncio
+async def test_by_parent_batch_files_page_single_partition(by_parent_client, mocker):
+    items = [{"id": f"f{i}", "file_id": f"f{i}", "batch_id": "b1", "created_at": f"2024-01-0{i + 1}"} for i in range(3)]
+    container = PagedContainer(items, "created_at", descending=False)
+    mocker.patch.object(by_parent_client, 'file_container', container)
+
+    files, token = await by_parent_client.get_batch_files_page("b1", 2)
+    assert [f["id"] for f in files] == ["f0", "f1"]
+    files, token = await by_parent_client.get_batch_files_page("b1", 2, token)
+    assert [f["id"] for f in files] == ["f2"]
+    assert token is None
+    assert all(kwargs == {"partition_key": "b1"} for _, _, kwargs in container.queries)
+
+
+@pytest.mark.asyncio
+async def test_file_logs_page_rejects_bad_input(cosmos_db_client, mocker):
+    mocker.patch.object(cosmos_db_client, 'log_container', PagedContainer([], "timestamp", True))
+
+    with pytest.raises(ValueError, match="Invalid continuation token"):
+        await cosmos_db_client.get_file_logs_page("f1", 10, "not a token")
+    with pytest.raises(ValueError, match="Page size"):
+        await cosmos_db_client.get_file_logs_page("f1", CosmosDBClient.MAX_PAGE_SIZE + 1)
+
+
+@pytest.mark.asyncio
+async def test_get_file_logs_projection(cosmos_db_client, mocker):
+    mock_log_container = mock.MagicMock()
+    mock_log_container.query_items = mock.MagicMock(side_effect=query_results([{"log_id": "l1"}]))
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    await cosmos_db_client.get_file_logs("f1", fields=["log_id", "description"])
+
+    query = mock_log_container.query_items.call_args.kwargs["query"]
+    assert query.startswith("SELECT c.log_id, c.description FROM c")
+    assert "last_candidate" not in query
+
+
+@pytest.mark.asyncio
+async def test_get_file_projection_keeps_partition_fields(by_parent_client, mocker):
+    mock_file_container = mock.MagicMock()
+    mock_file_container.query_items = mock.MagicMock(
+        side_effect=query_results([{"file_id": "f1", "batch_id": "b1", "error_count": 1}])
+    )
+    mocker.patch.object(by_parent_client, 'file_container', mock_file_container)
+
+    await by_parent_client.get_file("f1", fields=["error_count"])
+
+    query = mock_file_container.query_items.call_args.kwargs["query"]
+    assert query.startswith("SELECT c.error_count, c.file_id, c.batch_id FROM c")
+    assert by_parent_client._file_batches["f1"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_projection_rejects_invalid_field(cosmos_db_client, mocker):
+    mocker.patch.object(cosmos_db_client, 'log_container', mock.MagicMock())
+
+    with pytest.raises(ValueError, match="Invalid field name"):
+        await cosmos_db_client.get_file_logs("f1", fields=["id FROM c --"])
+
+
+@pytest.mark.asyncio
+async def test_get_final_candidate(cosmos_db_client, mocker):
+    mock_log_container = mock.MagicMock()
+    entry = {"last_candidate": "", "candidate_hash": "abc"}
+    mock_log_container.query_items = mock.MagicMock(side_effect=query_results([entry], []))
+    mocker.patch.object(cosmos_db_client, 'log_container', mock_log_container)
+
+    assert await cosmos_db_client.get_final_candidate("f1") == entry
+    assert "TOP 1 c.last_candidate, c.candidate_hash" in mock_log_container.query_items.call_args.kwargs["query"]
+    assert await cosmos_db_client.get_final_candidate("f1") is None
+
+
+@pytest.mark.asyncio
+async def test_batch_reads_served_from_cache(cosmos_db_client, mocker):
+    batch = {"id": "b1", "batch_id": "b1", "user_id": "user", "_etag": "1"}
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.query_items = mock.MagicMock(side_effect=query_results([batch]))
+    mock_batch_container.patch_item = AsyncMock(return_value={**batch, "status": "completed", "_etag": "2"})
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+
+    assert await cosmos_db_client.get_batch("user", "b1") == batch
+    assert await cosmos_db_client.get_batch_from_id("b1") == batch
+    assert await cosmos_db_client.get_batch("other", "b1") is None
+
+    # Updates write through to the cache
+    await cosmos_db_client.update_batch_entry("b1", "user", ProcessStatus.COMPLETED, 1, existing_batch=dict(batch))
+    assert (await cosmos_db_client.get_batch_from_id("b1"))["_etag"] == "2"
+
+    mock_batch_container.query_items.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stale_file_revalidated_by_etag(cosmos_db_client, mocker):
+    file_id = str(uuid4())
+    mock_file_container = mock.MagicMock()
+    mock_file_container.read_item = AsyncMock(side_effect=[{}, {"file_id": file_id, "_etag": "2"}])
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+    cosmos_db_client.file_cache.put(file_id, {"file_id": file_id, "_etag": "1"})
+    cosmos_db_client.file_cache.ttl = 0.000001
+
+    # Not modified, the cached copy is kept
+    assert (await cosmos_db_client.get_file(file_id))["_etag"] == "1"
+    # Modified, the new document replaces it
+    assert (await cosmos_db_client.get_file(file_id))["_etag"] == "2"
+
+    assert mock_file_container.read_item.await_args.kwargs["etag"] == "1"
+    assert mock_file_container.read_item.await_args.kwargs["match_condition"] == MatchConditions.IfModified
+
+
+@pytest.mark.asyncio
+async def test_file_counts_kept_in_cache(cosmos_db_client, mocker):
+    file_id = str(uuid4())
+    mock_file_container = mock.MagicMock()
+    mock_file_container.patch_item = AsyncMock(
+        return_value={"file_id": file_id, "error_count": 3, "syntax_count": 1, "_etag": "2"}
+    )
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+
+    await cosmos_db_client._increment_file_counts({file_id: (3, 1)})
+    counts = await cosmos_db_client.get_file(file_id, fields=["error_count", "syntax_count"])
+
+    assert counts == {"error_count": 3, "syntax_count": 1, "file_id": file_id, "batch_id": None}
+    mock_file_container.query_items.assert_not_called()
+
+
+def summary_containers(cosmos_db_client, mocker, summary):
+    """Batch and file containers for a file update applied to a stored summary."""
+    mock_batch_container = mock.MagicMock()
+    mock_batch_container.read_item = AsyncMock(return_value=summary)
+    mock_batch_container.replace_item = AsyncMock(
+        side_effect=lambda item, body, **kwargs: {**body, "_etag": "new"}
+    )
+    mock_batch_container.delete_item = AsyncMock()
+    mock_file_container = mock.MagicMock()
+    mocker.patch.object(cosmos_db_client, 'batch_container', mock_batch_container)
+    mocker.patch.object(cosmos_db_client, 'file_container', mock_file_container)
+    return mock_batch_container, mock_file_container
+
+
+@pytest.mark.asyncio
+async def test_file_change_updates_batch_summary(cosmos_db_client, mocker):
+    document = stored_file()
+    batch_id = document["batch_id"]
+    summary = {**BatchSummaryView.apply(None, batch_id, [document]), "_etag": "1", "_rid": "r"}
+    mock_batch_container, mock_file_container = summary_containers(cosmos_db_client, mocker, summary)
+    mock_file_container.patch_item = AsyncMock(
+        return_value={**document, "status": ProcessStatus.IN_PROGRESS.value, "_etag": "2"}
+    )
+
+    await cosmos_db_client.patch_file(
+        document["file_id"], fields={"status": ProcessStatus.IN_PROGRESS.value}
+    )
+
+    # A point read of the summary and a replace of that version
+    mock_batch_container.read_item.assert_awaited_once_with(
+        item=f"{batch_id}:summary", partition_key=batch_id
+    )
+    kwargs = mock_batch_container.replace_item.await_args.kwargs
+    assert kwargs["etag"] == "1"
+    assert kwargs["match_condition"] == MatchConditions.IfNotModified
+    assert "_rid" not in kwargs["body"]
+    row = kwargs["body"]["files"][document["file_id"]]
+    assert row["status"] == ProcessStatus.IN_PROGRESS.value
+    assert row["started_at"]
+    # The next summary read is answered by the cache
+    assert (await cosmos_db_client.get_batch_summary(batch_id))["_etag"] == "new"
+    mock_batch_container.read_item.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_batch_summary_update_retries_after_concurrent_change(cosmos_db_client, mocker):
+    document = stored_file()
+    batch_id = document["batch_id"]
+    summary = {**BatchSummaryView.apply(None, batch_id, [document]), "_etag": "1"}
+    mock_batch_container, _ = summary_containers(cosmos_db_client, mocker, summary)
+    mock_batch_container.read_item.side_effect = [summary, {**summary, "_etag": "3"}]
+    mock_batch_container.replace_item.side_effect = [
+        CosmosAccessConditionFailedError(message="Precondition failed"),
+        {**summary, "_etag": "4"},
+    ]
+
+    await cosmos_db_client._summarize(batch_id, [document])
+
+    assert mock_batch_container.replace_item.await_args_list[1].kwargs["etag"] == "3"
+    mock_batch_container.delete_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_missing_batch_summary_is_built_from_files(cosmos_db_client, mocker):
+    document = stored_file()
+    batch_id = document["batch_id"]
+    mock_batch_container, _ = summary_containers(cosmos_db_client, mocker, None)
+    mock_batch_container.read_item.side_effect = CosmosResourceNotFoundError(message="Not found")
+    mock_batch_container.create_item = AsyncMock(
+        side_effect=lambda body: {**body, "_etag": "1"}
+    )
+    mocker.patch.object(cosmos_db_client, 'get_batch_from_id', AsyncMock(return_value={"id": batch_id}))
+    mocker.patch.object(cosmos_db_client, 'get_batch_files', AsyncMock(return_value=[document]))
+
+    summary = await cosmos_db_client.get_batch_summary(batch_id)
+
+    cosmos_db_client.get_batch_files.assert_awaited_once_with(batch_id, fields=BatchSummaryView.FIELDS)
+    assert summary["id"] == f"{batch_id}:summary"
+    assert list(summary["files"]) == [document["file_id"]]
+    assert "user_id" not in summary
+
+    # None for a batch that does not exist
+    cosmos_db_client.summary_cache.clear()
+    cosmos_db_client.get_batch_from_id.return_value = None
+    assert await cosmos_db_client.get_batch_summary(batch_id) is None
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_summary_update_drops_it(cosmos_db_client, mocker):
+    document = stored_file()
+    batch_id = document["batch_id"]
+    summary = {**BatchSummaryView.apply(None, batch_id, [document]), "_etag": "1"}
+    mock_batch_container, _ = summary_containers(cosmos_db_client, mocker, summary)
+    mock_batch_container.replace_item.side_effect = Exception("Unavailable")
+
+    # Not raised, as the file is already written
+    await cosmos_db_client._summarize(batch_id, [document])
+
+    # Dropped, so the next read builds it again
+    mock_batch_container.delete_item.assert_awaited_once_with(
+        f"{batch_id}:summary", partition_key=batch_id
+    )
@@ -16,6 +16,9 @@ def patch_config(monkeypatch):
         self.cosmosdb_batch_container = "dummy_batch"
         self.cosmosdb_file_container = "dummy_file"
         self.cosmosdb_log_container = "dummy_log"
+        self.cosmosdb_layout = "by_id"
+        self.database_backend = "cosmosdb"
+        self.sqlite_database_path = ":memory:"
         self.get_azure_credentials = lambda: "dummy_credential"
 
     monkeypatch.setattr(Config, "__init__", dummy_init)  # Replace the init method
@@ -26,13 +29,14 @@ def patch_cosmosdb_client(monkeypatch):
     """Patch CosmosDBClient to use a dummy implementation."""
 
     class DummyCosmosDBClient:
-        def __init__(self, endpoint, credential, database_name, batch_container, file_container, log_container):
+        def __init__(self, endpoint, credential, database_name, batch_container, file_container, log_container, layout):
             self.endpoint = endpoint
             self.credential = credential
             self.database_name = database_name
             self.batch_container = batch_container
             self.file_container = file_container
             self.log_container = log_container
+            self.layout = layout
 
         async def initialize_cosmos(self):
             pass
@@ -67,6 +71,30 @@ async def test_get_database():
     assert db_instance.log_container == "dummy_log"
 
 
+@pytest.mark.asyncio
+async def test_get_database_sqlite(monkeypatch):
+    """Test the SQLite database is selected by configuration."""
+    from common.config.config import Config
+    from common.database.database_factory import DatabaseFactory
+    from common.database.sqlitedb import SQLiteDBClient
+
+    init = Config.__init__
+
+    def sqlite_init(self):
+        init(self)
+        self.database_backend = "sqlite"
+
+    monkeypatch.setattr(Config, "__init__", sqlite_init)
+    monkeypatch.setattr(DatabaseFactory, "_instance", None)
+
+    db_instance = await DatabaseFactory.get_database()
+    try:
+        assert isinstance(db_instance, SQLiteDBClient)
+        assert await db_instance.get_user_batches("user") == []
+    finally:
+        await db_instance.close()
+
+
 @pytest.mark.asyncio
 async def test_main_function():
     """Test the main function in database factory."""
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from common.database.document_cache import DocumentCache
+
+
+def test_get_put_and_copy():
+    cache = DocumentCache("test", max_size=10, ttl=30)
+    assert cache.get("a") == (None, False)
+
+    cache.put("a", {"id": "a", "status": "ready"})
+    document, fresh = cache.get("a")
+    document["status"] = "changed"
+
+    assert fresh
+    assert cache.get("a")[0]["status"] == "ready"
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 1
+
+
+def test_least_recently_used_evicted():
+    cache = DocumentCache("test", max_size=2, ttl=30)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    cache.put("c", {"id": "c"})
+
+    assert cache.get("b")[0] is None
+    assert cache.get("a")[0] is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_stale_after_ttl_until_touched():
+    cache = DocumentCache("test", max_size=10, ttl=30)
+    with patch("common.database.document_cache.time.monotonic", return_value=100):
+        cache.put("a", {"id": "a"})
+    with patch("common.database.document_cache.time.monotonic", return_value=131):
+        assert cache.get("a")[1] is False
+        cache.touch("a")
+        assert cache.get("a")[1] is True
+    assert cache.stats["revalidations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = DocumentCache("test", max_size=0, ttl=30)
+    cache.put("a", {"id": "a"})
+    cache.put("b", None)
+
+    assert cache.stats["size"] == 0
+
+
+def test_zero_ttl_revalidates_every_read():
+    cache = DocumentCache("test", max_size=10, ttl=0)
+    cache.put("a", {"id": "a"})
+    cache.touch("a")
+
+    assert cache.get("a") == ({"id": "a"}, False)
+    assert cache.stats["revalidations"] == 1
@@ -0,0 +1,227 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from common.database.database_base import FileLogWriteError
+from common.database.log_buffer import FileLogBuffer
+from common.models.api import AgentType, AuthorRole, LogType
+
+import pytest
+
+
+def make_buffer(**kwargs):
+    database = MagicMock()
+    database.add_file_logs = AsyncMock()
+    return FileLogBuffer(database, **kwargs), database
+
+
+async def add_logs(buffer, file_id, count):
+    for i in range(count):
+        await buffer.add(
+            file_id, f"log {i}", "", LogType.INFO, AgentType.MIGRATOR, AuthorRole.ASSISTANT
+        )
+
+
+def written(database):
+    return [log for call in database.add_file_logs.await_args_list for log in call.args[0]]
+
+
+@pytest.mark.asyncio
+async def test_add_does_not_write():
+    buffer, database = make_buffer(flush_interval=60)
+    await add_logs(buffer, str(uuid4()), 3)
+
+    database.add_file_logs.assert_not_awaited()
+    assert buffer.pending_count == 3
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_file_logs_in_order():
+    buffer, database = make_buffer(flush_interval=60)
+    file_id = str(uuid4())
+    other_id = str(uuid4())
+    await add_logs(buffer, file_id, 3)
+    await add_logs(buffer, other_id, 1)
+
+    await buffer.flush(file_id)
+
+    logs = written(database)
+    assert [log.description for log in logs] == ["log 0", "log 1", "log 2"]
+    assert all(str(log.file_id) == file_id for log in logs)
+    assert logs[0].timestamp <= logs[2].timestamp
+    assert buffer.pending_count == 1
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_in_background():
+    buffer, database = make_buffer(max_batch_size=2, flush_interval=60)
+    await add_logs(buffer, str(uuid4()), 2)
+
+    await asyncio.sleep(0)
+
+    database.add_file_logs.assert_awaited_once()
+    assert buffer.pending_count == 0
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_flush_splits_into_batches():
+    buffer, database = make_buffer(max_batch_size=10, flush_interval=60)
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 5)
+    buffer.max_batch_size = 2
+
+    await buffer.flush(file_id)
+
+    assert [len(call.args[0]) for call in database.add_file_logs.await_args_list] == [2, 2, 1]
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_periodic_flush():
+    buffer, database = make_buffer(flush_interval=0.01)
+    await add_logs(buffer, str(uuid4()), 1)
+
+    await asyncio.sleep(0.05)
+
+    database.add_file_logs.assert_awaited_once()
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_flushes_own_file_when_full():
+    buffer, database = make_buffer(flush_interval=60, max_pending=3)
+    file_id = str(uuid4())
+    await add_logs(buffer, str(uuid4()), 2)
+    await add_logs(buffer, file_id, 1)
+    database.add_file_logs.assert_not_awaited()
+
+    await add_logs(buffer, file_id, 1)
+
+    database.add_file_logs.assert_awaited_once()
+    assert [str(log.file_id) for log in written(database)] == [file_id]
+    assert buffer.pending_count == 3
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_applies_to_pending_entries_of_all_files():
+    buffer, database = make_buffer(flush_interval=60, max_pending=3)
+    for _ in range(3):
+        await add_logs(buffer, str(uuid4()), 1)
+    database.add_file_logs.assert_not_awaited()
+
+    # A new file has nothing pending of its own, so every file is flushed
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 1)
+
+    assert database.add_file_logs.await_count == 3
+    assert buffer.pending_count == 1
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_backpressure_does_not_raise_failures():
+    buffer, database = make_buffer(flush_interval=60, max_pending=1)
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 1)
+    database.add_file_logs.side_effect = RuntimeError("unavailable")
+
+    await add_logs(buffer, file_id, 1)
+
+    assert buffer.pending_count == 2
+    database.add_file_logs.side_effect = None
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_entries_dropped_after_max_retries():
+    buffer, database = make_buffer(flush_interval=60, max_retries=2)
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 2)
+    database.add_file_logs.side_effect = RuntimeError("unavailable")
+
+    with pytest.raises(RuntimeError):
+        await buffer.flush(file_id)
+    assert buffer.pending_count == 2
+    with pytest.raises(RuntimeError):
+        await buffer.flush(file_id)
+
+    assert buffer.pending_count == 0
+    assert buffer.dropped_count == 2
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_keeps_entries():
+    buffer, database = make_buffer(flush_interval=60)
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 2)
+    database.add_file_logs.side_effect = [RuntimeError("unavailable"), None]
+
+    with pytest.raises(RuntimeError):
+        await buffer.flush(file_id)
+    assert buffer.pending_count == 2
+
+    await buffer.flush(file_id)
+    assert len(database.add_file_logs.await_args_list[-1].args[0]) == 2
+    assert buffer.pending_count == 0
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_partly_written_entries_are_not_retried():
+    buffer, database = make_buffer(flush_interval=60)
+    file_id = str(uuid4())
+    await add_logs(buffer, file_id, 3)
+
+    async def write_first(entries):
+        if len(entries) == 3:
+            raise FileLogWriteError(entries[1:], RuntimeError("unavailable"))
+
+    database.add_file_logs.side_effect = write_first
+
+    with pytest.raises(FileLogWriteError):
+        await buffer.flush(file_id)
+    assert buffer.pending_count == 2
+
+    await buffer.flush(file_id)
+    retried = database.add_file_logs.await_args_list[-1].args[0]
+    assert [log.description for log in retried] == ["log 1", "log 2"]
+    assert buffer.pending_count == 0
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_write_stores_candidates():
+    buffer, database = make_buffer(flush_interval=60)
+    buffer.candidate_store = MagicMock()
+    buffer.candidate_store.put = AsyncMock(side_effect=["hash", None])
+    file_id = str(uuid4())
+    for candidate in ("large candidate", "small"):
+        await buffer.add(
+            file_id, "log", candidate, LogType.INFO, AgentType.MIGRATOR, AuthorRole.ASSISTANT
+        )
+    buffer.candidate_store.put.assert_not_awaited()
+
+    await buffer.flush(file_id)
+
+    assert [(log.last_candidate, log.candidate_hash) for log in written(database)] == [
+        ("", "hash"),
+        ("small", None),
+    ]
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_everything():
+    buffer, database = make_buffer(flush_interval=60)
+    await add_logs(buffer, str(uuid4()), 2)
+    await add_logs(buffer, str(uuid4()), 1)
+
+    await buffer.close()
+
+    assert len(written(database)) == 3
+    assert buffer.pending_count == 0
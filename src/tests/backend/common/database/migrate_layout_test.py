@@ -0,0 +1,233 @@
+from unittest.mock import MagicMock
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from common.database.cosmosdb import CosmosDBClient
+from common.database.migrate_layout import (
+    copy_container,
+    migrate_layout,
+    prune_container,
+    verify_container,
+)
+
+import pytest
+
+
+class FakeContainer:
+    """In-memory container supporting the queries used by the migration."""
+
+    def __init__(self, container_id, documents=None, now=1000):
+        self.id = container_id
+        self.documents = {doc["id"]: doc for doc in documents or []}
+        self.writes = []
+        self.deletes = []
+        # _ts given to the documents written
+        self.now = now
+
+    def query_items(self, query, parameters=None):
+        async def gen():
+            if query == "SELECT VALUE c.id FROM c":
+                for document_id in list(self.documents):
+                    yield document_id
+                return
+            if query.startswith("SELECT c.id, c."):
+                field = query.split("c.")[2].split(" ")[0]
+                for document in list(self.documents.values()):
+                    yield {"id": document["id"], field: document.get(field)}
+                return
+            since = parameters[0]["value"]
+            for document in list(self.documents.values()):
+                if document["_ts"] >= since:
+                    yield document
+        return gen()
+
+    async def read_item(self, item, partition_key):
+        if item not in self.documents:
+            raise CosmosResourceNotFoundError(message="not found")
+        return self.documents[item]
+
+    async def create_item(self, body):
+        if body["id"] in self.documents:
+            raise CosmosResourceExistsError(message="exists")
+        self._write(body)
+
+    async def replace_item(self, item, body, etag=None, match_condition=None):
+        if etag is not None and self.documents[item].get("_etag") != etag:
+            raise CosmosAccessConditionFailedError(message="precondition failed")
+        self._write(body)
+
+    def _write(self, body):
+        self.writes.append(body)
+        self.documents[body["id"]] = {**body, "_ts": self.now, "_etag": str(len(self.writes))}
+
+    async def delete_item(self, item, partition_key):
+        self.deletes.append((item, partition_key))
+        del self.documents[item]
+
+
+def make_documents(count, ts=100):
+    return [{"id": f"d{i}", "file_id": f"f{i}", "_ts": ts, "_etag": "x"} for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_copy_container_copies_documents_without_system_properties():
+    source = FakeContainer("src", make_documents(3))
+    target = FakeContainer("dst")
+
+    await copy_container(source, target, "log")
+
+    assert set(target.documents) == {"d0", "d1", "d2"}
+    assert all("_etag" not in body and "_ts" not in body for body in target.writes)
+    # The documents of the newest second read again are already up to date
+    assert len(target.writes) == 3
+
+
+@pytest.mark.asyncio
+async def test_copy_container_catches_up_with_writes():
+    source = FakeContainer("src", make_documents(2, ts=100))
+    target = FakeContainer("dst")
+    original_query = source.query_items
+    passes = []
+
+    def query_items(query, parameters=None):
+        passes.append(parameters[0]["value"])
+        if len(passes) == 2:
+            # A document written after the first pass
+            source.documents["late"] = {"id": "late", "_ts": 105}
+        return original_query(query, parameters)
+
+    source.query_items = query_items
+
+    await copy_container(source, target, "log")
+
+    assert "late" in target.documents
+    assert passes == [0, 100, 105]
+
+
+@pytest.mark.asyncio
+async def test_copy_container_updates_target_older_than_source():
+    source = FakeContainer("src", [{"id": "d0", "file_id": "f0", "status": "done", "_ts": 300}])
+    target = FakeContainer(
+        "dst", [{"id": "d0", "file_id": "f0", "status": "ready", "_ts": 200, "_etag": "e"}]
+    )
+
+    assert await copy_container(source, target, "log") == 1
+
+    assert target.documents["d0"]["status"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_copy_container_keeps_target_newer_than_source():
+    # Written by the application to the by_parent container after it switched
+    newer = {
+        "id": "d0",
+        "batch_id": "b1",
+        "status": "completed",
+        "translated_path": "b1/d0.sql",
+        "_ts": 500,
+        "_etag": "e",
+    }
+    source = FakeContainer(
+        "src", [{"id": "d0", "batch_id": "b1", "status": "in_progress", "_ts": 400}]
+    )
+    target = FakeContainer("dst", [dict(newer)])
+
+    assert await copy_container(source, target, "file") == 0
+
+    assert target.writes == []
+    assert target.documents["d0"] == newer
+
+
+@pytest.mark.asyncio
+async def test_copy_container_yields_to_concurrent_write():
+    source = FakeContainer("src", [{"id": "d0", "batch_id": "b1", "_ts": 400}])
+    target = FakeContainer("dst", [{"id": "d0", "batch_id": "b1", "_ts": 300, "_etag": "e"}])
+    original_read = target.read_item
+
+    async def read_item(item, partition_key):
+        current = dict(await original_read(item, partition_key))
+        # The application updates the document between the read and the write
+        target.documents[item] = {**current, "status": "completed", "_ts": 500, "_etag": "f"}
+        return current
+
+    target.read_item = read_item
+
+    assert await copy_container(source, target, "file") == 0
+
+    assert target.documents["d0"]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_verify_container_reports_missing():
+    source = FakeContainer("src", make_documents(3))
+    target = FakeContainer("dst", make_documents(2))
+
+    result = await verify_container(source, target)
+
+    assert result["missing"] == 1
+    assert result["missing_ids"] == ["d2"]
+    assert not result["passed"]
+
+
+@pytest.mark.asyncio
+async def test_verify_container_reports_extra():
+    source = FakeContainer("src", make_documents(2))
+    target = FakeContainer("dst", make_documents(3))
+
+    result = await verify_container(source, target)
+
+    assert (result["source"], result["target"]) == (2, 3)
+    assert result["missing"] == 0
+    assert result["extra"] == 1
+    assert result["extra_ids"] == ["d2"]
+    assert not result["passed"]
+
+    target.documents.pop("d2")
+    assert (await verify_container(source, target))["passed"]
+
+
+@pytest.mark.asyncio
+async def test_prune_container_deletes_documents_gone_from_source():
+    source = FakeContainer("src", make_documents(2))
+    target = FakeContainer("dst", [{**doc, "batch_id": "b1"} for doc in make_documents(3)])
+
+    assert await prune_container(source, target, "file") == 1
+
+    # Addressed by the target's partition key
+    assert target.deletes == [("d2", "b1")]
+    assert set(target.documents) == {"d0", "d1"}
+
+
+@pytest.mark.asyncio
+async def test_migrate_layout():
+    database = CosmosDBClient("endpoint", "credential", "db", "batch", "file", "log")
+    database.file_container = FakeContainer("file", make_documents(2))
+    database.log_container = FakeContainer("log", make_documents(4))
+    targets = {"file_v2": FakeContainer("file_v2"), "log_v2": FakeContainer("log_v2")}
+    database.client = MagicMock()
+    database.client.get_database_client.return_value.get_container_client.side_effect = targets.get
+
+    # A log deleted from the source after an earlier copy
+    targets["log_v2"].documents["gone"] = {"id": "gone", "file_id": "f9", "_ts": 0}
+
+    results = await migrate_layout(database, "file_v2", "log_v2", prune=True)
+
+    assert [(r["container"], r["target"], r["missing"], r["passed"]) for r in results] == [
+        ("file_v2", 2, 0, True),
+        ("log_v2", 4, 0, True),
+    ]
+    assert targets["log_v2"].deletes == [("gone", "f9")]
+
+
+@pytest.mark.asyncio
+async def test_migrate_layout_requires_by_id_source():
+    database = CosmosDBClient(
+        "endpoint", "credential", "db", "batch", "file", "log", layout="by_parent"
+    )
+
+    with pytest.raises(ValueError):
+        await migrate_layout(database, "file_v2", "log_v2")
@@ -0,0 +1,60 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from common.database.reconcile_counts import reconcile_counts
+
+import pytest
+
+
+def make_database(files, counts):
+    def query_items(query, parameters):
+        async def gen():
+            for file in files:
+                if not parameters or file["batch_id"] == parameters[0]["value"]:
+                    yield file
+        return gen()
+
+    database = MagicMock()
+    database.file_container.query_items = MagicMock(side_effect=query_items)
+    database.get_file_log_counts = AsyncMock(side_effect=lambda file_id: counts[file_id])
+    database.set_file_counts = AsyncMock()
+    return database
+
+
+FILES = [
+    {"file_id": "f1", "batch_id": "b1", "error_count": 1, "syntax_count": 0},
+    {"file_id": "f2", "batch_id": "b1", "error_count": 0, "syntax_count": 0},
+    {"file_id": "f3", "batch_id": "b2", "error_count": 0, "syntax_count": 0},
+]
+COUNTS = {"f1": (1, 0), "f2": (2, 1), "f3": (0, 4)}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_mismatched_files():
+    database = make_database(FILES, COUNTS)
+
+    stats = await reconcile_counts(database)
+
+    assert stats == {"checked": 3, "mismatched": 2}
+    database.set_file_counts.assert_any_await("f2", 2, 1)
+    database.set_file_counts.assert_any_await("f3", 0, 4)
+    assert database.set_file_counts.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_reconcile_dry_run():
+    database = make_database(FILES, COUNTS)
+
+    stats = await reconcile_counts(database, dry_run=True)
+
+    assert stats["mismatched"] == 2
+    database.set_file_counts.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_limited_to_batches():
+    database = make_database(FILES, COUNTS)
+
+    stats = await reconcile_counts(database, ["b2"])
+
+    assert stats == {"checked": 1, "mismatched": 1}
+    database.set_file_counts.assert_awaited_once_with("f3", 0, 4)
@@ -0,0 +1,314 @@
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
+
+from common.database import sqlitedb
+from common.database.sqlitedb import SQLiteDBClient
+from common.models.api import (
+    AgentType,
+    AuthorRole,
+    BatchRecord,
+    FileLog,
+    FileRecord,
+    LogType,
+    ProcessStatus,
+)
+
+import pytest
+
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def database():
+    client = SQLiteDBClient(":memory:")
+    await client.initialize_cosmos()
+    yield client
+    await client.close()
+
+
+async def add_batch_with_file(database, user_id="user"):
+    batch_id = uuid4()
+    file_id = uuid4()
+    await database.create_batch(user_id, batch_id)
+    await database.add_file(batch_id, file_id, "query.sql", f"{user_id}/{batch_id}/{file_id}/query.sql")
+    return str(batch_id), str(file_id)
+
+
+def make_log(file_id, log_type, candidate="", agent_type=AgentType.ALL):
+    return FileLog(
+        log_id=uuid4(),
+        file_id=file_id,
+        description="log",
+        last_candidate=candidate,
+        log_type=log_type,
+        agent_type=agent_type,
+        author_role=AuthorRole.ASSISTANT,
+        timestamp=datetime.now(timezone.utc),
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_and_get_batch(database):
+    batch_id = uuid4()
+    await database.create_batch("user", batch_id)
+
+    batch = await database.get_batch("user", str(batch_id))
+    assert batch["status"] == ProcessStatus.READY_TO_PROCESS.value
+    assert batch["_etag"]
+    assert await database.get_batch("other", str(batch_id)) is None
+
+    # Creating it again returns the existing batch, unless it is another user's
+    existing = await database.create_batch("user", batch_id)
+    assert existing.etag == batch["_etag"]
+    with pytest.raises(PermissionError):
+        await database.create_batch("other", batch_id)
+
+
+@pytest.mark.asyncio
+async def test_logs_update_file_counts(database):
+    _, file_id = await add_batch_with_file(database)
+
+    await database.add_file_logs(
+        [
+            make_log(file_id, LogType.ERROR),
+            make_log(file_id, LogType.ERROR),
+            make_log(file_id, LogType.WARNING),
+            make_log(file_id, LogType.SUCCESS, candidate="SELECT 1"),
+        ]
+    )
+    await database.add_file_log(
+        file_id, "done", "", LogType.SUCCESS, AgentType.ALL, AuthorRole.ASSISTANT
+    )
+
+    file = await database.get_file(file_id, fields=("error_count", "syntax_count"))
+    assert (file["error_count"], file["syntax_count"]) == (2, 1)
+    assert set(file) == {"file_id", "batch_id", "error_count", "syntax_count"}
+    assert await database.get_file_log_counts(file_id) == (2, 1)
+    assert len(await database.get_file_logs(file_id)) == 5
+    # The newest success with a candidate
+    assert (await database.get_final_candidate(file_id))["last_candidate"] == "SELECT 1"
+
+
+@pytest.mark.asyncio
+async def test_add_files(database):
+    batch_id = uuid4()
+    await database.create_batch("user", batch_id)
+    files = [(uuid4(), f"q{i}.sql", f"path/q{i}.sql") for i in range(3)]
+
+    file_records = await database.add_files(batch_id, files)
+
+    assert [record.original_name for record in file_records] == ["q0.sql", "q1.sql", "q2.sql"]
+    stored = await database.get_batch_files(str(batch_id))
+    assert sorted(file["file_id"] for file in stored) == sorted(str(file_id) for file_id, _, _ in files)
+
+    # Pages follow the order the files were given in
+    page, _ = await database.get_batch_files_page(str(batch_id), 2)
+    assert [file["original_name"] for file in page] == ["q0.sql", "q1.sql"]
+
+
+@pytest.mark.asyncio
+async def test_batch_summary_follows_file_changes(database):
+    batch_id, file_id = await add_batch_with_file(database)
+    other = uuid4()
+    await database.add_files(batch_id, [(other, "other.sql", "path")])
+
+    await database.patch_file(file_id, fields={"status": ProcessStatus.IN_PROGRESS.value})
+    await database.add_file_logs([make_log(file_id, LogType.ERROR)])
+    await database.patch_file(
+        file_id, fields={"status": ProcessStatus.COMPLETED.value, "file_result": "error"}
+    )
+    await database.delete_file("user", str(other))
+
+    summary = await database.get_batch_summary(batch_id)
+    assert list(summary["files"]) == [file_id]
+    assert summary["files"][file_id]["error_count"] == 1
+    assert summary["files"][file_id]["started_at"]
+    assert summary["counts"]["status"] == {"completed": 1}
+    assert summary["counts"]["file_result"] == {"error": 1}
+    assert summary["timings"]["completed_at"] == summary["files"][file_id]["completed_at"]
+
+    await database.delete_batch("user", batch_id)
+    assert await database.get_batch_summary(batch_id) is None
+
+
+@pytest.mark.asyncio
+async def test_missing_batch_summary_is_built_from_files(database):
+    batch_id, file_id = await add_batch_with_file(database)
+    await database._transaction(lambda connection: connection.execute("DELETE FROM summaries"))
+
+    summary = await database.get_batch_summary(batch_id)
+
+    assert list(summary["files"]) == [file_id]
+    assert summary["counts"]["status"] == {ProcessStatus.READY_TO_PROCESS.value: 1}
+
+
+@pytest.mark.asyncio
+async def test_update_file_keeps_concurrent_changes(database):
+    _, file_id = await add_batch_with_file(database)
+    file_record = FileRecord.fromdb(await database.get_file(file_id))
+
+    # Another writer updates the counters after the record was read
+    await database.patch_file(file_id, increments={"error_count": 3})
+    file_record.status = ProcessStatus.COMPLETED
+    await database.update_file(file_record)
+
+    file = await database.get_file(file_id)
+    assert file["status"] == ProcessStatus.COMPLETED.value
+    assert file["error_count"] == 3
+    assert file_record.etag == file["_etag"]
+
+
+@pytest.mark.asyncio
+async def test_patch_with_stale_etag_fails(database):
+    batch_id, _ = await add_batch_with_file(database)
+    batch = await database.get_batch_from_id(batch_id)
+    await database.patch_batch(batch_id, {"status": ProcessStatus.IN_PROGRESS.value})
+
+    with pytest.raises(CosmosAccessConditionFailedError):
+        await database.patch_batch(batch_id, {"status": ProcessStatus.FAILED.value}, etag=batch["_etag"])
+
+    record = BatchRecord.fromdb(await database.get_batch_from_id(batch_id))
+    assert record.status == ProcessStatus.IN_PROGRESS
+    assert await database.patch_batch(str(uuid4()), {"status": "failed"}) is None
+
+
+@pytest.mark.asyncio
+async def test_batch_history_pages(database):
+    batch_ids = []
+    for _ in range(5):
+        batch_id, _ = await add_batch_with_file(database)
+        # Equal update times are ordered by id
+        await database.patch_batch(
+            batch_id, {"status": ProcessStatus.COMPLETED.value, "updated_at": "2025-01-01T00:00:00"}
+        )
+        batch_ids.append(batch_id)
+    await add_batch_with_file(database)  # Never processed, not in the history
+
+    seen = []
+    token = None
+    while True:
+        page, token = await database.get_batch_history_page(
+            "user", 2, token, fields=("batch_id",)
+        )
+        seen += [batch["batch_id"] for batch in page]
+        if token is None:
+            break
+
+    assert sorted(seen) == sorted(batch_ids)
+    assert len(seen) == len(set(seen))
+    history = await database.get_batch_history("user", limit=2, offset=1)
+    assert [batch["batch_id"] for batch in history] == seen[1:3]
+
+    with pytest.raises(ValueError):
+        await database.get_batch_history_page("user", 2, "not a token")
+    with pytest.raises(ValueError):
+        await database.get_batch_history_page("user", 0)
+
+
+@pytest.mark.asyncio
+async def test_page_queries_use_indexes(database):
+    plans = [
+        " ".join(row["detail"] for row in await database._query(f"EXPLAIN QUERY PLAN {sql}", params))
+        for sql, params in (
+            ("SELECT * FROM batches WHERE user_id = ? ORDER BY updated_at", ("user",)),
+            ("SELECT * FROM files WHERE batch_id = ? ORDER BY created_at", ("batch",)),
+            ("SELECT * FROM logs WHERE file_id = ? ORDER BY timestamp DESC", ("file",)),
+        )
+    ]
+
+    assert all("USING INDEX" in plan and "TEMP B-TREE" not in plan for plan in plans)
+
+
+@pytest.mark.asyncio
+async def test_batch_files_and_logs_pages(database):
+    batch_id, file_id = await add_batch_with_file(database)
+    await database.add_file(batch_id, uuid4(), "second.sql", "path")
+    await database.add_file_logs([make_log(file_id, LogType.INFO) for _ in range(3)])
+
+    files, token = await database.get_batch_files_page(batch_id, 1)
+    assert files[0]["file_id"] == file_id
+    files, token = await database.get_batch_files_page(batch_id, 1, token)
+    assert files[0]["original_name"] == "second.sql"
+    assert token is None
+
+    logs, token = await database.get_file_logs_page(file_id, 2)
+    more, token = await database.get_file_logs_page(file_id, 2, token)
+    assert len(logs) == 2 and len(more) == 1 and token is None
+
+
+@pytest.mark.asyncio
+async def test_delete_files_reports_progress(database):
+    batch_id, file_id = await add_batch_with_file(database)
+    other = uuid4()
+    await database.add_file(batch_id, other, "other.sql", "path")
+    await database.add_file_logs([make_log(file_id, LogType.ERROR)])
+    progress = []
+
+    await database.delete_files("user", [file_id, str(other)], progress=lambda done, total: progress.append((done, total)))
+
+    assert progress == [(2, 2)]
+    assert await database.get_batch_files(batch_id) == []
+    assert await database.get_file_logs(file_id) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_all_removes_only_the_users_data(database):
+    await add_batch_with_file(database, "user")
+    kept_batch, kept_file = await add_batch_with_file(database, "other")
+
+    await database.delete_all("user")
+
+    assert await database.get_user_batches("user") == []
+    assert await database.get_batch("other", kept_batch) is not None
+    assert await database.get_file(kept_file) is not None
+
+
+@pytest.mark.asyncio
+async def test_expired_batch_is_not_returned(database, monkeypatch):
+    batch_id, _ = await add_batch_with_file(database)
+    await database.expire_batch("user", batch_id, 60)
+    assert await database.get_batch_from_id(batch_id) is not None
+    assert [batch["batch_id"] for batch in await database.get_deleted_batches()] == [batch_id]
+
+    later = time.time() + 120
+    monkeypatch.setattr(sqlitedb, "time", type("Clock", (), {"time": staticmethod(lambda: later)}))
+
+    assert await database.get_batch_from_id(batch_id) is None
+    assert await database.get_user_batches("user") == []
+    assert await database.get_deleted_batches() == []
+
+
+@pytest.mark.asyncio
+async def test_soft_deleted_batch_is_hidden_from_its_user(database):
+    batch_id, _ = await add_batch_with_file(database)
+    kept_id, _ = await add_batch_with_file(database)
+    for key in (batch_id, kept_id):
+        await database.patch_batch(key, {"status": ProcessStatus.COMPLETED.value})
+
+    await database.expire_batch("user", batch_id, 60)
+
+    assert await database.get_batch("user", batch_id) is None
+    assert [batch["batch_id"] for batch in await database.get_user_batches("user")] == [kept_id]
+    assert [batch["batch_id"] for batch in await database.get_batch_history("user")] == [kept_id]
+    page, _ = await database.get_batch_history_page("user", 10)
+    assert [batch["batch_id"] for batch in page] == [kept_id]
+    # Still found by the background deletion
+    assert await database.get_batch_from_id(batch_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_get_files_logs_groups_by_file(database, monkeypatch):
+    monkeypatch.setattr(SQLiteDBClient, "QUERY_CHUNK_SIZE", 1)
+    batch_id, file_id = await add_batch_with_file(database)
+    other = str(uuid4())
+    await database.add_file(batch_id, other, "other.sql", "path")
+    await database.add_file_logs([make_log(file_id, LogType.INFO), make_log(file_id, LogType.ERROR)])
+
+    logs = await database.get_files_logs([file_id, other], fields=("log_type",))
+
+    assert [log["log_type"] for log in logs[file_id]] == [LogType.ERROR.value, LogType.INFO.value]
+    assert set(logs[file_id][0]) == {"file_id", "log_type"}
+    assert logs[other] == []
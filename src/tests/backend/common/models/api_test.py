@@ -1,7 +1,22 @@
 from datetime import datetime
 from uuid import uuid4
 
-from backend.common.models.api import AgentType, BatchRecord, FileLog, FileProcessUpdate, FileProcessUpdateJSONEncoder, FileRecord, FileResult, ProcessStatus, QueueBatch, TranslateType
+from backend.common.models.api import (
+    AgentType,
+    BatchRecord,
+    BatchSummaryView,
+    FileCountsView,
+    FileLog,
+    FileProcessUpdate,
+    FileProcessUpdateJSONEncoder,
+    FileRecord,
+    FileResult,
+    FileStatusView,
+    LogEntryView,
+    ProcessStatus,
+    QueueBatch,
+    TranslateType,
+)
 
 import pytest
 
@@ -121,3 +136,70 @@ def test_batchrecord_fromdb_and_dict(uuid_pair, common_datetime):
     assert record.from_language == TranslateType.INFORMIX
     assert record.to_language == TranslateType.TSQL
     assert record.dict()["status"] == "completed"
+
+
+def test_views_read_only_their_fields(uuid_pair):
+    _, file_id = uuid_pair
+    counts = FileCountsView.fromdb({"file_id": file_id, "error_count": 2, "syntax_count": None})
+    assert counts.dict() == {"file_id": file_id, "error_count": 2, "syntax_count": 0}
+
+    assert "last_candidate" not in LogEntryView.FIELDS
+    assert "blob_path" not in FileStatusView.FIELDS
+
+
+def test_batch_summary_view_counts():
+    rows = [
+        {"status": "completed", "file_result": "success", "error_count": 0, "syntax_count": 2, "updated_at": "2025-01-01T00:00:02"},
+        {"status": "completed", "file_result": "error", "error_count": 3, "syntax_count": 0, "updated_at": "2025-01-01T00:00:03"},
+        {"status": "in_process", "file_result": None, "error_count": None, "syntax_count": 1, "updated_at": "2025-01-01T00:00:01"},
+    ]
+
+    counts = BatchSummaryView.counts(rows)
+
+    assert counts == {
+        "file_count": 3,
+        "status": {"completed": 2, "in_process": 1},
+        "file_result": {"success": 1, "error": 1},
+        "error_count": 3,
+        "syntax_count": 3,
+        "updated_at": "2025-01-01T00:00:03",
+    }
+    assert BatchSummaryView.counts([])["updated_at"] is None
+
+
+def test_batch_summary_view_times_files():
+    file = {"file_id": "f1", "status": "ready_to_process", "created_at": "2025-01-01T00:00:00"}
+    summary = BatchSummaryView.apply(None, "b1", [file], now="2025-01-01T00:00:00+00:00")
+    assert summary["id"] == BatchSummaryView.document_id("b1") == "b1:summary"
+    assert summary["timings"] == {"started_at": None, "completed_at": None, "average_file_seconds": None}
+
+    file["status"] = "in_process"
+    summary = BatchSummaryView.apply(summary, "b1", [file], now="2025-01-01T00:00:10+00:00")
+    # Another update while in process keeps the start
+    summary = BatchSummaryView.apply(summary, "b1", [file], now="2025-01-01T00:00:15+00:00")
+    file["status"] = "completed"
+    summary = BatchSummaryView.apply(summary, "b1", [file], now="2025-01-01T00:00:40+00:00")
+
+    assert summary["files"]["f1"]["started_at"] == "2025-01-01T00:00:10+00:00"
+    assert summary["timings"] == {
+        "started_at": "2025-01-01T00:00:10+00:00",
+        "completed_at": "2025-01-01T00:00:40+00:00",
+        "average_file_seconds": 30.0,
+    }
+    assert summary["counts"]["status"] == {"completed": 1}
+
+
+def test_batch_summary_view_removes_and_orders_rows():
+    files = [
+        {"file_id": "f2", "status": "completed", "created_at": "2025-01-01T00:00:02"},
+        {"file_id": "f1", "status": "in_process", "created_at": "2025-01-01T00:00:01"},
+        {"file_id": "f3", "status": "completed", "created_at": "2025-01-01T00:00:03"},
+    ]
+    summary = BatchSummaryView.apply(None, "b1", files)
+
+    summary = BatchSummaryView.apply(summary, "b1", removed=["f3"])
+
+    assert [row["file_id"] for row in BatchSummaryView.rows(summary)] == ["f1", "f2"]
+    assert summary["counts"]["file_count"] == 2
+    # A file still in process leaves the batch without a completion time
+    assert summary["timings"]["completed_at"] is None
@@ -1,9 +1,24 @@
+import asyncio
+import zipfile
+from datetime import datetime, timezone
 from io import BytesIO
 from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
-from common.models.api import AgentType, AuthorRole, BatchRecord, FileResult, LogType, ProcessStatus
+from common.models.api import (
+    AgentType,
+    AuthorRole,
+    BatchHistoryView,
+    BatchRecord,
+    BatchSummaryView,
+    FileCountsView,
+    FileRecord,
+    FileResult,
+    LogType,
+    ProcessStatus,
+)
 from common.services.batch_service import BatchService
+from common.storage.candidate_store import CandidateStore
 
 from fastapi import HTTPException, UploadFile
 
@@ -118,6 +133,73 @@ async def test_get_file_translated_success(mock_get_storage, service):
     assert result == "translated"
 
 
+@pytest.mark.asyncio
+@patch("common.services.batch_service.BlobStorageFactory.get_storage", new_callable=AsyncMock)
+async def test_get_file_translated_from_final_candidate(mock_get_storage, service):
+    file = {"file_id": "file1", "translated_path": ""}
+    service.database = AsyncMock()
+    service.database.get_final_candidate.return_value = {"last_candidate": "candidate", "candidate_hash": None}
+    result = await service.get_file_translated(file)
+    assert result == "candidate"
+    service.database.get_final_candidate.assert_awaited_once_with("file1")
+
+
+@pytest.mark.asyncio
+@patch("common.services.batch_service.BlobStorageFactory.get_storage", new_callable=AsyncMock)
+async def test_get_file_translated_resolves_candidate_reference(mock_get_storage, service, monkeypatch):
+    monkeypatch.setattr(BatchService, "_candidate_store", None)
+    file = {"file_id": "file1", "translated_path": ""}
+    service.database = AsyncMock()
+    service.database.get_final_candidate.return_value = {"last_candidate": "", "candidate_hash": "abc"}
+    service.database.get_file.return_value = {"file_id": "file1", "batch_id": "b1"}
+    service.database.get_batch_from_id.return_value = {"batch_id": "b1", "user_id": "u1"}
+    mock_get_storage.return_value.get_file.return_value = "stored candidate"
+
+    result = await service.get_file_translated(file)
+
+    assert result == "stored candidate"
+    mock_get_storage.return_value.get_file.assert_awaited_once_with("u1/b1/file1/candidates/abc.sql")
+
+
+@pytest.mark.asyncio
+@patch("common.services.batch_service.BlobStorageFactory.get_storage", new_callable=AsyncMock)
+async def test_create_file_log_stores_large_candidate_once(mock_get_storage, service, monkeypatch):
+    monkeypatch.setattr(BatchService, "_candidate_store", None)
+    file_id = str(uuid4())
+    service.database = AsyncMock()
+    service.database.get_file.return_value = {"file_id": file_id, "batch_id": "b1"}
+    service.database.get_batch_from_id.return_value = {"batch_id": "b1", "user_id": "u1"}
+    candidate = "SELECT * FROM orders;\n" * 50
+
+    for _ in range(3):
+        await service.create_file_log(
+            file_id, "turn", candidate, LogType.INFO, AgentType.MIGRATOR, AuthorRole.ASSISTANT
+        )
+
+    mock_get_storage.return_value.upload_file.assert_awaited_once()
+    for call in service.database.add_file_log.await_args_list:
+        assert call.args[2] == ""
+        assert call.kwargs["candidate_hash"] == CandidateStore.candidate_hash(candidate)
+
+
+@pytest.mark.asyncio
+@patch("common.services.batch_service.BlobStorageFactory.get_storage", new_callable=AsyncMock)
+async def test_create_file_log_buffered_defers_candidate_store(mock_get_storage, service, monkeypatch):
+    monkeypatch.setattr(BatchService, "_candidate_store", None)
+    file_id = str(uuid4())
+    service.database = AsyncMock()
+    service.log_buffer = AsyncMock()
+    candidate = "SELECT * FROM orders;\n" * 50
+
+    await service.create_file_log(
+        file_id, "turn", candidate, LogType.INFO, AgentType.MIGRATOR, AuthorRole.ASSISTANT
+    )
+
+    mock_get_storage.return_value.upload_file.assert_not_awaited()
+    assert service.log_buffer.add.await_args.args[2] == candidate
+    assert service.log_buffer.candidate_store is BatchService._candidate_store
+
+
 @pytest.mark.asyncio
 @patch("common.services.batch_service.BlobStorageFactory.get_storage", new_callable=AsyncMock)
 async def test_get_file_translated_error(mock_get_storage, service):
@@ -143,6 +225,181 @@ async def test_get_batch_for_zip(service):
     assert result[0][1] == "file-content"
 
 
+@pytest.mark.asyncio
+async def test_iter_translated_files_bounds_downloads(service, monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_CONCURRENT_BLOB_READS", 2)
+    files_meta = [{"original_name": f"q{i}.sql", "translated_path": f"p{i}"} for i in range(5)]
+    started = []
+    failed = []
+
+    async def download(file_meta):
+        started.append(file_meta["original_name"])
+        await asyncio.sleep(0.01 if file_meta["original_name"] == "q0.sql" else 0)
+        if file_meta["original_name"] == "q3.sql":
+            failed.append(file_meta["original_name"])
+            raise IOError("Boom")
+        return f"content of {file_meta['original_name']}"
+
+    service.get_file_translated = download
+    results = []
+    async for entry in service.iter_translated_files(files_meta):
+        # Downloads start only as others are consumed or fail, two at a time
+        assert len(started) <= len(results) + len(failed) + 2
+        results.append(entry)
+
+    # Yielded as they complete, the failed file skipped
+    assert results[0] == (1, "rslt_q1.sql", "content of q1.sql")
+    assert sorted(index for index, _, _ in results) == [0, 1, 2, 4]
+
+
+@pytest.mark.asyncio
+async def test_iter_translated_files_in_order(service, monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_CONCURRENT_BLOB_READS", 2)
+    files_meta = [{"original_name": f"q{i}.sql", "translated_path": f"p{i}"} for i in range(4)]
+
+    async def download(file_meta):
+        await asyncio.sleep(0.01 if file_meta["original_name"] == "q0.sql" else 0)
+        if file_meta["original_name"] == "q2.sql":
+            raise IOError("Boom")
+        return "SELECT 1"
+
+    service.get_file_translated = download
+
+    results = [entry async for entry in service.iter_translated_files(files_meta, ordered=True)]
+
+    assert [index for index, _, _ in results] == [0, 1, 3]
+
+
+def finished_batch(status=ProcessStatus.COMPLETED, etag="etag1"):
+    return {"batch_id": "batch1", "user_id": "user1", "status": status.value, "_etag": etag}
+
+
+@pytest.mark.asyncio
+async def test_build_result_archive_skips_unfinished_batch(service):
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = finished_batch(ProcessStatus.IN_PROGRESS)
+    service.get_result_archive = AsyncMock()
+
+    assert await service.build_result_archive("batch1", "user1") is None
+    service.get_result_archive.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_build_result_archive_stores_archive(service):
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = finished_batch()
+    service.database.get_batch_from_id.return_value = finished_batch()
+    service.database.get_batch_files.return_value = [
+        {"original_name": "a.sql", "translated_path": "pa"},
+        {"original_name": "b.sql", "translated_path": "pb"},
+    ]
+
+    async def download(file_meta):
+        # The first file finishes downloading last
+        await asyncio.sleep(0.01 if file_meta["translated_path"] == "pa" else 0)
+        return f"SELECT '{file_meta['translated_path']}'"
+
+    service.get_file_translated = download
+    uploaded = []
+
+    async def store(user_id, batch_id, chunks):
+        uploaded.extend([chunk async for chunk in chunks])
+        return {"path": "user1/batch1/results/b1.zip", "sha256": "abc", "size": 1}
+
+    archive = AsyncMock()
+    archive.store.side_effect = store
+    service.get_result_archive = AsyncMock(return_value=archive)
+
+    stored = await service.build_result_archive("batch1", "user1")
+
+    assert stored["path"] == "user1/batch1/results/b1.zip"
+    assert archive.store.await_args.args[:2] == ("user1", "batch1")
+    # Stored as chunks, in the order of the batch's files
+    assert len(uploaded) > 1
+    with zipfile.ZipFile(BytesIO(b"".join(uploaded))) as zipped:
+        assert zipped.namelist() == ["rslt_a.sql", "rslt_b.sql"]
+    archive.invalidate.assert_not_awaited()
+
+    # A batch and files read by the caller are not read again
+    service.database.get_batch.reset_mock()
+    service.database.get_batch_files.reset_mock()
+    await service.build_result_archive(
+        "batch1", "user1", batch=finished_batch(), files_meta=[{"original_name": "a.sql", "translated_path": "pa"}]
+    )
+    service.database.get_batch.assert_not_awaited()
+    service.database.get_batch_files.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_build_result_archive_discards_archive_of_changed_batch(service):
+    service.database = AsyncMock()
+    service.database.get_batch_from_id.side_effect = [
+        finished_batch(),
+        finished_batch(ProcessStatus.IN_PROGRESS, etag="etag2"),
+    ]
+    service.database.get_batch_files.return_value = [{"original_name": "a.sql", "translated_path": "pa"}]
+    service.get_file_translated = AsyncMock(return_value="SELECT 1")
+    archive = AsyncMock()
+    service.get_result_archive = AsyncMock(return_value=archive)
+
+    # Built at the end of processing, without a user
+    assert await service.build_result_archive("batch1") is None
+    archive.invalidate.assert_awaited_once_with("user1", "batch1")
+
+
+@pytest.mark.asyncio
+async def test_build_result_archive_later_runs_one_build_per_batch(service):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def build(batch_id, user_id, batch=None, files_meta=None):
+        started.set()
+        await release.wait()
+
+    service.build_result_archive = AsyncMock(side_effect=build)
+
+    service.build_result_archive_later("batch1", "user1", batch=finished_batch(), files_meta=[])
+    await started.wait()
+    # A second download while the first build runs does not start another
+    service.build_result_archive_later("batch1", "user1", batch=finished_batch(), files_meta=[])
+    release.set()
+    await asyncio.gather(*BatchService._archive_builds.values())
+
+    service.build_result_archive.assert_awaited_once_with(
+        "batch1", "user1", batch=finished_batch(), files_meta=[]
+    )
+    assert not BatchService._archive_builds
+
+
+@pytest.mark.asyncio
+async def test_cancel_archive_builds(service):
+    async def build(*args, **kwargs):
+        await asyncio.sleep(60)
+
+    service.build_result_archive = AsyncMock(side_effect=build)
+
+    service.build_result_archive_later("batch1", "user1")
+    await asyncio.sleep(0)
+    await BatchService.cancel_archive_builds()
+
+    assert not BatchService._archive_builds
+
+
+@pytest.mark.asyncio
+async def test_invalidate_result_archive_looks_up_owner(service):
+    service.database = AsyncMock()
+    service.database.get_batch_from_id.return_value = finished_batch()
+    archive = AsyncMock()
+    service.get_result_archive = AsyncMock(return_value=archive)
+
+    await service.invalidate_result_archive("batch1")
+    archive.invalidate.assert_awaited_once_with("user1", "batch1")
+
+    service.database.get_batch_from_id.return_value = None
+    await service.invalidate_result_archive("batch2")
+    assert archive.invalidate.await_count == 1
+
+
 @pytest.mark.asyncio
 @patch("common.models.api.BatchRecord.fromdb")
 async def test_get_batch_summary_success(mock_batch_fromdb, service):
@@ -151,17 +408,123 @@ async def test_get_batch_summary_success(mock_batch_fromdb, service):
     mock_batch_record = MagicMock(dict=lambda: {"batch_id": "batch1"})
     mock_batch_fromdb.return_value = mock_batch_record
     service.database.get_batch.return_value = mock_batch
-    service.database.get_batch_files.return_value = [
-        {"file_id": "file1", "translated_path": "path1"},
-        {"file_id": "file2", "translated_path": None},
-    ]
-    service.database.get_file_logs.return_value = ["log1"]
+    service.database.get_batch_summary.return_value = BatchSummaryView.apply(
+        None,
+        "batch1",
+        [
+            {"file_id": "file1", "translated_path": "path1", "created_at": "2025-01-01T00:00:01"},
+            {"file_id": "file2", "translated_path": None, "created_at": "2025-01-01T00:00:02"},
+        ],
+    )
+    service.database.get_files_logs.return_value = {"file1": ["log1"], "file2": []}
     service.get_file_translated = AsyncMock(return_value="translated")
-    result = await service.get_batch_summary("batch1", "user1")
+    result = await service.get_batch_summary("batch1", "user1", include_logs=True)
     assert "files" in result
     assert "batch" in result
     assert result["files"][0]["logs"] == ["log1"]
     assert result["files"][0]["translated_content"] == "translated"
+    # The logs of all the files in one call
+    service.database.get_files_logs.assert_awaited_once()
+    assert service.database.get_files_logs.await_args.args[0] == ["file1", "file2"]
+    service.database.get_file_logs.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_batch_summary_downloads_translations_concurrently(service, monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_CONCURRENT_BLOB_READS", 3)
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = {
+        "batch_id": str(uuid4()),
+        "user_id": "user1",
+        "file_count": 8,
+        "created_at": "2025-01-01T00:00:00",
+        "updated_at": "2025-01-01T00:00:00",
+        "status": "completed",
+    }
+    service.database.get_batch_summary.return_value = BatchSummaryView.apply(
+        None,
+        "batch1",
+        [summary_row(f"f{i}", "completed", f"2025-01-01T00:00:0{i}") for i in range(8)],
+    )
+    service.database.get_files_logs.return_value = {}
+    running = 0
+    most = 0
+
+    async def download(file):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if file["file_id"] == "f5":
+            raise IOError("Boom")
+        return f"translated {file['file_id']}"
+
+    service.get_file_translated = download
+    result = await service.get_batch_summary("batch1", "user1", include_logs=True)
+
+    assert most == 3
+    assert result["files"][0]["translated_content"] == "translated f0"
+    assert result["files"][5]["translated_content"] == ""
+    assert all(file["logs"] == [] for file in result["files"])
+
+
+def summary_row(file_id, status, created_at, file_result=None):
+    return {
+        "file_id": file_id,
+        "batch_id": "batch1",
+        "original_name": f"{file_id}.sql",
+        "translated_path": "",
+        "status": status,
+        "file_result": file_result,
+        "error_count": 1 if file_result == "error" else 0,
+        "syntax_count": 0,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_batch_summary_reads_file_rows(service):
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = {
+        "batch_id": str(uuid4()),
+        "user_id": "user1",
+        "file_count": 2,
+        "created_at": "2025-01-01T00:00:00",
+        "updated_at": "2025-01-01T00:00:00",
+        "status": "in_process",
+    }
+    service.database.get_batch_summary.return_value = BatchSummaryView.apply(
+        None,
+        "batch1",
+        [
+            summary_row("f2", "in_process", "2025-01-01T00:00:02"),
+            summary_row("f1", "completed", "2025-01-01T00:00:01", "error"),
+        ],
+    )
+
+    result = await service.get_batch_summary("batch1", "user1")
+
+    # One read of the summary document, no file query, log or blob reads
+    service.database.get_batch_summary.assert_awaited_once_with("batch1")
+    service.database.get_batch_files.assert_not_called()
+    service.database.get_file_logs.assert_not_called()
+    service.database.get_files_logs.assert_not_called()
+    assert [file["file_id"] for file in result["files"]] == ["f1", "f2"]
+    assert "logs" not in result["files"][0]
+    assert result["summary"]["status"] == {"completed": 1, "in_process": 1}
+    assert result["summary"]["file_result"] == {"error": 1}
+    assert result["summary"]["error_count"] == 1
+    assert result["summary"]["timings"]["completed_at"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_batch_summary_not_found(service):
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = None
+
+    assert await service.get_batch_summary("batch1", "user1") is None
 
 
 @pytest.mark.asyncio
@@ -211,6 +574,7 @@ async def test_delete_file_success():
     mock_file.translated_path = "some/path/file_translated.pdf"
     with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
         mock_storage.return_value.delete_file.return_value = True
+        mock_storage.return_value.delete_files.return_value = []
         service.database.get_file.return_value = mock_file
         service.database.get_batch.return_value = {"id": str(batch_id)}
         service.database.get_batch_files.return_value = [1, 2]
@@ -241,12 +605,244 @@ async def test_upload_file_to_batch_dict_batch():
         service.database.create_batch.return_value = {}
         service.database.get_batch_files.return_value = ["file1", "file2"]
         service.database.get_file.return_value = {"filename": file.filename}
+        service.database.add_file.return_value = {"file_id": file_id, "batch_id": batch_id}
         service.database.update_batch_entry.return_value = {"batch_id": batch_id, "file_count": 2}
         result = await service.upload_file_to_batch(batch_id, "user1", file)
         assert "batch" in result
         assert "file" in result
 
 
+@pytest.mark.asyncio
+async def test_upload_file_to_batch_streams_chunks(monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.UPLOAD_CHUNK_SIZE", 4)
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = {"batch_id": "b1", "user_id": "user1"}
+    service.database.add_file.return_value = {"file_id": "f1"}
+    file = UploadFile(filename="query.sql", file=BytesIO(b"SELECT 1;"))
+    received = []
+
+    async def upload_file(file_content, **kwargs):
+        received.extend([chunk async for chunk in file_content])
+
+    storage = AsyncMock()
+    storage.upload_file.side_effect = upload_file
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        await service.upload_file_to_batch(str(uuid4()), "user1", file)
+
+    assert received == [b"SELE", b"CT 1", b";"]
+
+
+@pytest.mark.asyncio
+async def test_upload_file_to_batch_rejects_large_file(monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_UPLOAD_SIZE", 4)
+    service = BatchService()
+    service.database = AsyncMock()
+    storage = AsyncMock()
+
+    async def upload_file(file_content, **kwargs):
+        return [chunk async for chunk in file_content]
+
+    storage.upload_file.side_effect = upload_file
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        # Known from the request
+        file = UploadFile(filename="query.sql", file=BytesIO(b"SELECT 1;"), size=9)
+        with pytest.raises(HTTPException) as exc_info:
+            await service.upload_file_to_batch(str(uuid4()), "user1", file)
+        assert exc_info.value.status_code == 413
+        service.database.get_batch.assert_not_awaited()
+
+        # Found while reading
+        file = UploadFile(filename="query.sql", file=BytesIO(b"SELECT 1;"))
+        with pytest.raises(HTTPException) as exc_info:
+            await service.upload_file_to_batch(str(uuid4()), "user1", file)
+        assert exc_info.value.status_code == 413
+    service.database.add_file.assert_not_awaited()
+
+
+def zip_upload(filename, entries):
+    data = BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    data.seek(0)
+    return UploadFile(filename=filename, file=data)
+
+
+@pytest.mark.asyncio
+async def test_upload_files_to_batch_expands_archives():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = {"batch_id": "b1", "user_id": "user1"}
+    service.database.add_files.side_effect = lambda batch_id, files: [
+        FileRecord(file_id, batch_id, name, path, "", ProcessStatus.READY_TO_PROCESS, 0, 0,
+                   datetime.now(timezone.utc), datetime.now(timezone.utc))
+        for file_id, name, path in files
+    ]
+    service.database.get_batch_files.return_value = [{"file_id": "f"}] * 4
+    service.database.update_batch_entry.return_value = {"batch_id": "b1", "file_count": 4}
+    uploaded = {}
+
+    async def upload_file(file_content, blob_path, **kwargs):
+        content = b"".join([chunk async for chunk in file_content])
+        if content == b"broken":
+            raise IOError("unavailable")
+        uploaded[blob_path.rsplit("/", 1)[-1]] = content
+
+    storage = AsyncMock()
+    storage.upload_file.side_effect = upload_file
+    files = [
+        UploadFile(filename="a.sql", file=BytesIO(b"SELECT 1;")),
+        zip_upload("repo.zip", {
+            "src/b.sql": "SELECT 2;",
+            "src/c.sql": "SELECT 3;",
+            "src/bad.sql": "broken",
+            "src/": "",
+            "__MACOSX/src/._b.sql": "",
+        }),
+    ]
+    batch_id = str(uuid4())
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        result = await service.upload_files_to_batch(batch_id, "user1", files)
+
+    assert uploaded == {"a.sql": b"SELECT 1;", "b.sql": b"SELECT 2;", "c.sql": b"SELECT 3;"}
+    assert result["failed"] == ["bad.sql"]
+    assert sorted(file["original_name"] for file in result["files"]) == ["a.sql", "b.sql", "c.sql"]
+    # Bookkeeping in bulk: one insert, one log write, one count
+    service.database.add_files.assert_awaited_once()
+    service.database.add_file_log.assert_not_awaited()
+    assert len(service.database.add_file_logs.await_args.args[0]) == 3
+    service.database.get_batch_files.assert_awaited_once()
+    assert service.database.update_batch_entry.await_args.args[3] == 4
+
+
+@pytest.mark.asyncio
+async def test_upload_files_to_batch_rejects_invalid_uploads(monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_UPLOAD_FILES", 1)
+    service = BatchService()
+    service.database = AsyncMock()
+
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock()):
+        for files in (
+            [UploadFile(filename="repo.zip", file=BytesIO(b"not a zip"))],
+            [zip_upload("repo.zip", {"a.sql": "SELECT 1;", "b.sql": "SELECT 2;"})],
+            [zip_upload("empty.zip", {})],
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await service.upload_files_to_batch(str(uuid4()), "user1", files)
+            assert exc_info.value.status_code == 400
+    service.database.get_batch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_upload_urls():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = None
+    storage = AsyncMock()
+    storage.get_upload_url.side_effect = lambda blob_path, expires_in: f"https://storage/{blob_path}?sas"
+    batch_id = str(uuid4())
+
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        uploads = await service.create_upload_urls(batch_id, "user1", ["a.sql", "my query.sql"])
+
+        assert [upload["file_name"] for upload in uploads] == ["a.sql", "my query.sql"]
+        # Scoped to the user's batch and the new file
+        upload = uploads[1]
+        assert upload["upload_url"] == f"https://storage/user1/{batch_id}/{upload['file_id']}/my_query.sql?sas"
+        service.database.create_batch.assert_awaited_once()
+
+        storage.get_upload_url.side_effect = None
+        storage.get_upload_url.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            await service.create_upload_urls(batch_id, "user1", ["a.sql"])
+        assert exc_info.value.status_code == 501
+
+
+@pytest.mark.asyncio
+async def test_complete_uploads(monkeypatch):
+    monkeypatch.setattr("common.services.batch_service.MAX_UPLOAD_SIZE", 100)
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    service.database.get_batch.return_value = {"batch_id": batch_id, "user_id": "user1"}
+    registered, uploaded, missing, large, foreign = (str(uuid4()) for _ in range(5))
+    owners = {registered: batch_id, foreign: str(uuid4())}
+    service.database.get_file.side_effect = lambda file_id, fields=None: (
+        {"batch_id": owners[file_id]} if file_id in owners else None
+    )
+    service.database.add_files.side_effect = lambda batch_id, files: [
+        FileRecord(file_id, batch_id, name, path, "", ProcessStatus.READY_TO_PROCESS, 0, 0,
+                   datetime.now(timezone.utc), datetime.now(timezone.utc))
+        for file_id, name, path in files
+    ]
+    service.database.get_batch_files.return_value = [{"file_id": registered}, {"file_id": uploaded}]
+    sizes = {uploaded: 10, large: 1000, foreign: 10}
+
+    async def list_files(prefix):
+        file_id = prefix.split("/")[2]
+        if file_id not in sizes:
+            return []
+        blobs = [{"name": f"{prefix}{file_id}.sql", "size": sizes[file_id]}]
+        if file_id == uploaded:
+            # Uploaded under the same file_id with another name
+            blobs.append({"name": f"{prefix}other.sql", "size": 10})
+        return blobs
+
+    storage = AsyncMock()
+    storage.list_files.side_effect = list_files
+    storage.delete_files.return_value = []
+    uploads = [
+        {"file_id": file_id, "file_name": f"{file_id}.sql"}
+        for file_id in (registered, uploaded, missing, large, foreign)
+    ]
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        result = await service.complete_uploads(batch_id, "user1", uploads)
+
+    assert [file["file_id"] for file in result["files"]] == [uploaded]
+    assert result["files"][0]["blob_path"] == f"user1/{batch_id}/{uploaded}/{uploaded}.sql"
+    assert result["failed"] == [f"{missing}.sql", f"{large}.sql", f"{foreign}.sql"]
+    deleted = sorted(path for call in storage.delete_files.await_args_list for path in call.args[0])
+    assert deleted == sorted([
+        f"user1/{batch_id}/{uploaded}/other.sql",
+        f"user1/{batch_id}/{large}/{large}.sql",
+        f"user1/{batch_id}/{foreign}/{foreign}.sql",
+    ])
+    storage.delete_file.assert_not_called()
+    assert service.database.update_batch_entry.await_args.args[3] == 2
+
+    service.database.get_batch.return_value = None
+    assert await service.complete_uploads(batch_id, "user1", uploads) is None
+
+
+@pytest.mark.asyncio
+async def test_complete_uploads_adds_repeated_file_once():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    file_id = str(uuid4())
+    service.database.get_batch.return_value = {"batch_id": batch_id, "user_id": "user1"}
+    service.database.get_file.return_value = None
+    service.database.add_files.side_effect = lambda batch_id, files: [
+        FileRecord(file_id, batch_id, name, path, "", ProcessStatus.READY_TO_PROCESS, 0, 0,
+                   datetime.now(timezone.utc), datetime.now(timezone.utc))
+        for file_id, name, path in files
+    ]
+    service.database.get_batch_files.return_value = [{"file_id": file_id}]
+    storage = AsyncMock()
+    storage.list_files.side_effect = lambda prefix: [{"name": f"{prefix}a.sql", "size": 10}]
+    uploads = [
+        {"file_id": file_id, "file_name": "a.sql"},
+        {"file_id": file_id.upper(), "file_name": "a.sql"},
+    ]
+    with patch("common.services.batch_service.BlobStorageFactory.get_storage", AsyncMock(return_value=storage)):
+        result = await service.complete_uploads(batch_id, "user1", uploads)
+
+    assert [file["file_id"] for file in result["files"]] == [file_id]
+    assert len(service.database.add_files.await_args.args[1]) == 1
+    service.database.get_file.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_upload_file_to_batch_invalid_storage():
     service = BatchService()
@@ -436,17 +1032,21 @@ async def test_update_file_success():
     service = BatchService()
     service.database = AsyncMock()
     file_id = str(uuid4())
-    mock_file = {"file_id": file_id}
+    mock_file = {"file_id": file_id, "batch_id": "batch1", "status": ProcessStatus.COMPLETED.value}
     mock_record = MagicMock()
-    mock_record.error_count = 0
-    mock_record.syntax_count = 0
 
-    service.database.get_file.return_value = mock_file
+    service.database.patch_file.return_value = mock_file
     with patch("common.models.api.FileRecord.fromdb", return_value=mock_record):
-        await service.update_file(file_id, ProcessStatus.COMPLETED, FileResult.SUCCESS, 1, 2)
-        assert mock_record.error_count == 1
-        assert mock_record.syntax_count == 2
-        service.database.update_file.assert_called_once()
+        result = await service.update_file(file_id, ProcessStatus.COMPLETED, FileResult.SUCCESS, 1, 2)
+        assert result is mock_record
+
+    # Status and counts change in one partial update, without reading the file
+    service.database.get_file.assert_not_called()
+    service.database.update_file.assert_not_called()
+    kwargs = service.database.patch_file.call_args.kwargs
+    assert kwargs["fields"]["status"] == ProcessStatus.COMPLETED.value
+    assert kwargs["fields"]["file_result"] == FileResult.SUCCESS.value
+    assert kwargs["increments"] == {"error_count": 1, "syntax_count": 2}
 
 
 @pytest.mark.asyncio
@@ -474,17 +1074,52 @@ async def test_create_file_log():
     service.database.add_file_log.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_create_file_log_buffered():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.log_buffer = AsyncMock()
+    file_id = str(uuid4())
+    await service.create_file_log(
+        file_id=file_id,
+        description="test log",
+        last_candidate="candidate",
+        log_type=LogType.SUCCESS,
+        agent_type=AgentType.HUMAN,
+        author_role=AuthorRole.USER
+    )
+    service.log_buffer.add.assert_awaited_once()
+    service.database.add_file_log.assert_not_called()
+
+    service.database.get_file.return_value = None
+    await service.get_file_counts(file_id)
+    service.log_buffer.flush.assert_awaited_once_with(file_id)
+
+
 @pytest.mark.asyncio
 async def test_update_batch_success():
     service = BatchService()
     service.database = AsyncMock()
     batch_id = str(uuid4())
-    mock_batch = {"batch_id": batch_id}
-    mock_batch_record = MagicMock()
-    service.database.get_batch_from_id.return_value = mock_batch
-    with patch("common.models.api.BatchRecord.fromdb", return_value=mock_batch_record):
-        await service.update_batch(batch_id, ProcessStatus.COMPLETED)
-        service.database.update_batch.assert_called_once_with(mock_batch_record)
+    service.database.patch_batch.return_value = {"batch_id": batch_id}
+    await service.update_batch(batch_id, ProcessStatus.COMPLETED)
+
+    service.database.get_batch_from_id.assert_not_called()
+    service.database.update_batch.assert_not_called()
+    args = service.database.patch_batch.call_args.args
+    assert args[0] == batch_id
+    assert args[1]["status"] == ProcessStatus.COMPLETED.value
+    assert "updated_at" in args[1]
+
+
+@pytest.mark.asyncio
+async def test_update_batch_not_found():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.patch_batch.return_value = None
+    with pytest.raises(HTTPException) as exc:
+        await service.update_batch("invalid_id", ProcessStatus.COMPLETED)
+    assert exc.value.status_code == 404
 
 
 @pytest.mark.asyncio
@@ -503,10 +1138,148 @@ async def test_delete_batch_and_files_success():
     with patch("common.models.api.FileRecord.fromdb", return_value=mock_file), \
          patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
         mock_storage.return_value.delete_file.return_value = True
+        mock_storage.return_value.delete_files.return_value = []
         result = await service.delete_batch_and_files(batch_id, user_id)
         assert result["message"] == "Files deleted successfully"
 
 
+@pytest.mark.asyncio
+async def test_delete_batch_and_files_deletes_every_blob_of_the_batch():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    files = [{"file_id": str(uuid4())} for _ in range(2)]
+    service.database.get_batch.return_value = {"batch_id": batch_id}
+    service.database.get_batch_files.return_value = files
+    blobs = [
+        f"user/{batch_id}/{files[0]['file_id']}/a.sql",
+        f"user/{batch_id}/{files[0]['file_id']}/candidates/abc.sql",
+        f"user/{batch_id}/{files[1]['file_id']}/b.sql",
+        # Uploaded with a URL but never added to the batch
+        f"user/{batch_id}/{uuid4()}/c.sql",
+        f"user/{batch_id}/results/archive.zip",
+    ]
+
+    with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.list_files.side_effect = lambda prefix: (
+            [{"name": name} for name in blobs] if prefix == f"user/{batch_id}/" else []
+        )
+        mock_storage.return_value.delete_files.return_value = []
+        await service.delete_batch_and_files(batch_id, "user", soft_delete_ttl=0)
+
+    mock_storage.return_value.delete_file.assert_not_called()
+    deleted = mock_storage.return_value.delete_files.await_args_list[0].args[0]
+    assert sorted(deleted) == sorted(blobs)
+    assert service.database.delete_files.await_args.args[1] == [f["file_id"] for f in files]
+    service.database.delete_batch.assert_awaited_once_with("user", batch_id)
+
+
+@pytest.mark.asyncio
+async def test_delete_batch_and_files_without_files():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    service.database.get_batch.return_value = {"batch_id": batch_id}
+    service.database.get_batch_files.return_value = []
+
+    with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.list_files.return_value = [{"name": f"user/{batch_id}/f1/a.sql"}]
+        mock_storage.return_value.delete_files.return_value = []
+        result = await service.delete_batch_and_files(batch_id, "user", soft_delete_ttl=0)
+
+    assert result["message"] == "Files deleted successfully"
+    assert mock_storage.return_value.delete_files.await_args_list[0].args[0] == [f"user/{batch_id}/f1/a.sql"]
+    service.database.delete_batch.assert_awaited_once_with("user", batch_id)
+
+
+@pytest.mark.asyncio
+async def test_delete_batch_and_files_soft_delete():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    files = [{"file_id": str(uuid4()), "blob_path": "blob/0", "translated_path": ""}]
+    service.database.get_batch.return_value = {"batch_id": batch_id}
+    service.database.get_batch_files.return_value = files
+
+    with patch("common.models.api.FileRecord.fromdb", side_effect=lambda f: MagicMock(**f)), \
+         patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.delete_file.return_value = True
+        mock_storage.return_value.delete_files.return_value = []
+        result = await service.delete_batch_and_files(batch_id, "user", soft_delete_ttl=60)
+
+        assert result["message"] == "Files scheduled for deletion"
+        service.database.expire_batch.assert_awaited_once_with("user", batch_id, 60)
+        service.database.delete_batch.assert_not_awaited()
+
+        await BatchService.wait_for_deletes()
+
+    service.database.delete_files.assert_awaited_once()
+    service.database.delete_batch.assert_awaited_once_with("user", batch_id)
+
+
+@pytest.mark.asyncio
+async def test_delete_batch_and_files_skips_soft_deleted_batch():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    service.database.get_batch.return_value = {"batch_id": batch_id, "deleted_at": "now"}
+
+    with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock):
+        result = await service.delete_batch_and_files(batch_id, "user", soft_delete_ttl=60)
+
+    assert result["message"] == "Batch not found"
+    service.database.expire_batch.assert_not_awaited()
+    assert not BatchService._pending_deletes
+
+
+@pytest.mark.asyncio
+async def test_resume_deletes_purges_soft_deleted_batches():
+    service = BatchService()
+    service.database = AsyncMock()
+    batch_id = str(uuid4())
+    files = [{"file_id": str(uuid4()), "blob_path": "blob/0", "translated_path": ""}]
+    service.database.get_deleted_batches.return_value = [{"batch_id": batch_id, "user_id": "user"}]
+    service.database.get_batch_files.return_value = files
+
+    with patch("common.models.api.FileRecord.fromdb", side_effect=lambda f: MagicMock(**f)), \
+         patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.delete_files.return_value = []
+        assert await service.resume_deletes() == 1
+        await BatchService.wait_for_deletes()
+
+    service.database.get_batch_files.assert_awaited_once_with(batch_id)
+    service.database.delete_files.assert_awaited_once()
+    service.database.delete_batch.assert_awaited_once_with("user", batch_id)
+
+
+@pytest.mark.asyncio
+async def test_get_batch_paged():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.get_batch.return_value = {"batch_id": "b1"}
+    service.database.get_batch_files_page.return_value = ([{"file_id": "f1"}], "next")
+
+    result = await service.get_batch("b1", "user", continuation_token="token")
+
+    assert result == {"batch": {"batch_id": "b1"}, "files": [{"file_id": "f1"}], "continuation_token": "next"}
+    service.database.get_batch_files_page.assert_awaited_once_with("b1", 20, "token")
+    service.database.get_batch_files.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_batch_history_page():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.database.get_batch_history_page.return_value = ([{"batch_id": "b1"}], None)
+
+    result = await service.get_batch_history_page("user", page_size=5)
+
+    assert result == {"batches": [{"batch_id": "b1"}], "continuation_token": None}
+    service.database.get_batch_history_page.assert_awaited_once_with(
+        "user", 5, None, fields=BatchHistoryView.FIELDS
+    )
+
+
 @pytest.mark.asyncio
 async def test_batch_files_final_update():
     service = BatchService()
@@ -532,20 +1305,91 @@ async def test_delete_all_from_storage_cosmos_success():
     user_id = "user123"
     file_id = str(uuid4())
     batch_id = str(uuid4())
-    mock_file = {
-        "translated_path": "translated/path"
-    }
 
     service.get_all_batches = AsyncMock(return_value=[{"batch_id": batch_id}])
-    service.database.get_file.return_value = mock_file
-    service.database.list_files = AsyncMock(return_value=[{"name": f"user/{batch_id}/{file_id}/file.txt"}])
+    service.database.get_batch_files.return_value = [{"file_id": file_id}]
 
     with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
-        mock_storage.return_value.list_files.return_value = [{"name": f"user/{batch_id}/{file_id}/file.txt"}]
-        mock_storage.return_value.delete_file.return_value = True
+        mock_storage.return_value.list_files.return_value = [{"name": f"{user_id}/{batch_id}/{file_id}/file.txt"}]
+        mock_storage.return_value.delete_files.return_value = []
         result = await service.delete_all_from_storage_cosmos(user_id)
         assert result["message"] == "All user data deleted successfully"
 
+        # Only the user's blobs are listed, and deleted in bulk
+        mock_storage.return_value.list_files.assert_awaited_once_with(f"{user_id}/")
+        assert mock_storage.return_value.delete_files.await_args.args[0] == [f"{user_id}/{batch_id}/{file_id}/file.txt"]
+        mock_storage.return_value.delete_file.assert_not_called()
+    # Database entries come from the user's batches, reading only their ids
+    service.get_all_batches.assert_awaited_once_with(user_id, fields=("batch_id",))
+    service.database.get_batch_files.assert_awaited_once_with(batch_id, fields=("file_id",))
+    assert service.database.delete_files.await_args.args[:2] == (user_id, [file_id])
+    service.database.delete_batch.assert_awaited_once_with(user_id, batch_id)
+    service.database.get_file.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_delete_all_from_storage_cosmos_keeps_records_when_blobs_remain():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.get_all_batches = AsyncMock(return_value=[{"batch_id": "b1"}])
+
+    with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.list_files.return_value = [{"name": "user123/b1/f1/file.txt"}]
+        mock_storage.return_value.delete_files.return_value = ["user123/b1/f1/file.txt"]
+        with pytest.raises(RuntimeError):
+            await service.delete_all_from_storage_cosmos("user123")
+
+    service.database.delete_files.assert_not_called()
+    service.database.delete_batch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_delete_all_from_storage_cosmos_batch_delete_fails():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.get_all_batches = AsyncMock(return_value=[{"batch_id": "b1"}, {"batch_id": "b2"}])
+    service.database.get_batch_files.return_value = []
+    service.database.delete_batch.side_effect = [None, Exception("unavailable")]
+
+    with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.list_files.return_value = []
+        mock_storage.return_value.delete_files.return_value = []
+        with pytest.raises(RuntimeError):
+            await service.delete_all_from_storage_cosmos("user123")
+
+    assert service.database.delete_batch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_all_from_storage_cosmos_bounds_concurrent_batches():
+    service = BatchService()
+    service.database = AsyncMock()
+    service.get_all_batches = AsyncMock(
+        return_value=[{"batch_id": f"b{i}"} for i in range(10)]
+    )
+    running = peak = 0
+
+    async def track(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        return []
+
+    service.database.get_batch_files.side_effect = track
+    service.database.delete_batch.side_effect = track
+
+    with patch("common.services.batch_service.MAX_CONCURRENT_BATCH_DELETES", 3), \
+         patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
+        mock_storage.return_value.list_files.return_value = []
+        mock_storage.return_value.delete_files.return_value = []
+        await service.delete_all_from_storage_cosmos("user123")
+
+    assert service.database.get_batch_files.await_count == 10
+    assert service.database.delete_batch.await_count == 10
+    assert peak == 3
+
 
 @pytest.mark.asyncio
 async def test_create_candidate_success():
@@ -589,15 +1433,28 @@ async def test_batch_files_final_update_success_path():
 
 
 @pytest.mark.asyncio
-async def test_get_file_counts_logs_none():
+async def test_get_file_counts_file_none():
     service = BatchService()
     service.database = AsyncMock()
-    service.database.get_file_logs.return_value = None
+    service.database.get_file.return_value = None
     error_count, syntax_count = await service.get_file_counts("file_id")
     assert error_count == 0
     assert syntax_count == 0
 
 
+@pytest.mark.asyncio
+async def test_get_file_counts_reads_counters():
+    service = BatchService()
+    service.database = AsyncMock()
+    file_id = str(uuid4())
+    service.database.get_file.return_value = {"file_id": file_id, "error_count": 2, "syntax_count": 3}
+    error_count, syntax_count = await service.get_file_counts(file_id)
+    assert (error_count, syntax_count) == (2, 3)
+    service.database.get_file_logs.assert_not_called()
+    # Only the counters are read
+    service.database.get_file.assert_awaited_once_with(file_id, fields=FileCountsView.FIELDS)
+
+
 @pytest.mark.asyncio
 async def test_create_candidate_upload_error():
     service = BatchService()
@@ -643,6 +1500,7 @@ async def test_delete_file_logs_exception():
     mock_file.translated_path = "translated"
     with patch("common.storage.blob_factory.BlobStorageFactory.get_storage", new_callable=AsyncMock) as mock_storage:
         mock_storage.return_value.delete_file.return_value = True
+        mock_storage.return_value.delete_files.return_value = []
         service.database.get_file.return_value = mock_file
         service.database.get_batch.return_value = {"id": str(batch_id)}
         service.database.get_batch_files.return_value = [1, 2]
@@ -681,6 +1539,7 @@ async def test_upload_file_to_batch_batchrecord():
         service.database.get_batch.side_effect = [mock_batch_record]
         service.database.get_batch_files.return_value = ["file1", "file2"]
         service.database.get_file.return_value = {"file_id": file_id}
+        service.database.add_file.return_value = {"file_id": file_id, "batch_id": batch_id}
         service.database.update_batch_entry.return_value = mock_batch_record
 
         result = await service.upload_file_to_batch(batch_id, "user1", file)
@@ -744,10 +1603,13 @@ async def test_get_batch_summary_log_exception(mock_batch_fromdb):
     mock_batch_fromdb.return_value = mock_batch_record
 
     service.database.get_batch.return_value = mock_batch
-    service.database.get_batch_files.return_value = [{"file_id": "file1", "translated_path": None}]
-    service.database.get_file_logs.side_effect = Exception("DB log fail")
+    service.database.get_batch_summary.return_value = BatchSummaryView.apply(
+        None, "batch1", [{"file_id": "file1", "translated_path": None}]
+    )
+    service.database.get_files_logs.side_effect = Exception("DB log fail")
+    service.get_file_translated = AsyncMock(return_value="")
 
-    result = await service.get_batch_summary("batch1", "user1")
+    result = await service.get_batch_summary("batch1", "user1", include_logs=True)
     assert result["files"][0]["logs"] == []
 
 
@@ -755,7 +1617,7 @@ async def test_get_batch_summary_log_exception(mock_batch_fromdb):
 async def test_update_file_not_found():
     service = BatchService()
     service.database = AsyncMock()
-    service.database.get_file.return_value = None
+    service.database.patch_file.return_value = None
     with pytest.raises(HTTPException) as exc:
         await service.update_file("invalid_id", ProcessStatus.COMPLETED, FileResult.SUCCESS, 0, 0)
     assert exc.value.status_code == 404
@@ -1,8 +1,13 @@
+import base64
 import json
 from io import BytesIO
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import parse_qs, urlparse
 
+from azure.storage.blob import UserDelegationKey
 
+
+from common.storage import blob_azure
 from common.storage.blob_azure import AzureBlobStorage
 
 
@@ -16,6 +21,11 @@ def mock_blob_service():
         mock_service_instance = MagicMock()
         mock_container_client = MagicMock()
         mock_blob_client = MagicMock()
+        mock_blob_client.upload_blob = AsyncMock()
+        mock_blob_client.get_blob_properties = AsyncMock()
+        mock_blob_client.download_blob = AsyncMock()
+        mock_blob_client.delete_blob = AsyncMock()
+        mock_service_instance.close = AsyncMock()
 
         # Set up mock methods
         mock_service.return_value = mock_service_instance
@@ -28,31 +38,45 @@ def mock_blob_service():
 @pytest.fixture
 def blob_storage(mock_blob_service):
     """Fixture to initialize AzureBlobStorage with mocked dependencies"""
-    return AzureBlobStorage(account_name="test_account", container_name="test_container")
+    return AzureBlobStorage(account_name="test_account", container_name="test_container", credential=AsyncMock())
 
 
 @pytest.mark.asyncio
 async def test_upload_file(blob_storage, mock_blob_service):
     """Test uploading a file"""
     _, _, mock_blob_client = mock_blob_service
-    mock_blob_client.upload_blob.return_value = MagicMock()
-    mock_blob_client.get_blob_properties.return_value = MagicMock(
-        size=1024,
-        content_settings=MagicMock(content_type="text/plain"),
-        creation_time="2024-03-15T12:00:00Z",
-        etag="dummy_etag",
-    )
+    mock_blob_client.upload_blob.return_value = {
+        "last_modified": "2024-03-15T12:00:00Z",
+        "etag": "dummy_etag",
+    }
 
     file_content = BytesIO(b"dummy data")
 
-    result = await blob_storage.upload_file(file_content, "test_blob.txt", "text/plain")
+    result = await blob_storage.upload_file(file_content, "test_blob.txt", "text/plain", length=10)
 
     assert result["path"] == "test_blob.txt"
-    assert result["size"] == 1024
+    assert result["size"] == 10
     assert result["content_type"] == "text/plain"
     assert result["created_at"] == "2024-03-15T12:00:00Z"
     assert result["etag"] == "dummy_etag"
     assert "url" in result
+    # The details come from the upload response, without another request
+    mock_blob_client.get_blob_properties.assert_not_awaited()
+    kwargs = mock_blob_client.upload_blob.await_args.kwargs
+    assert kwargs["content_settings"].content_type == "text/plain"
+    assert kwargs["length"] == 10
+
+
+@pytest.mark.asyncio
+async def test_upload_file_text(blob_storage, mock_blob_service):
+    """Test uploading text, sent as UTF-8 with its size"""
+    _, _, mock_blob_client = mock_blob_service
+    mock_blob_client.upload_blob.return_value = {"etag": "dummy_etag"}
+
+    result = await blob_storage.upload_file("SELECT 'é'", "test_blob.sql")
+
+    assert result["size"] == len("SELECT 'é'".encode("utf-8"))
+    assert mock_blob_client.upload_blob.await_args.args[0] == "SELECT 'é'".encode("utf-8")
 
 
 @pytest.mark.asyncio
@@ -69,7 +93,7 @@ async def test_upload_file_exception(blob_storage, mock_blob_service):
 async def test_get_file(blob_storage, mock_blob_service):
     """Test downloading a file"""
     _, _, mock_blob_client = mock_blob_service
-    mock_blob_client.download_blob.return_value.readall.return_value = b"dummy data"
+    mock_blob_client.download_blob.return_value.readall = AsyncMock(return_value=b"dummy data")
 
     result = await blob_storage.get_file("test_blob.txt")
 
@@ -86,6 +110,92 @@ async def test_get_file_exception(blob_storage, mock_blob_service):
         await blob_storage.get_file("test_blob.txt")
 
 
+@pytest.mark.asyncio
+async def test_stream_file(blob_storage, mock_blob_service):
+    """Test downloading a file in chunks"""
+    _, _, mock_blob_client = mock_blob_service
+
+    async def chunks():
+        yield b"dummy "
+        yield b"data"
+
+    mock_blob_client.download_blob.return_value.chunks = chunks
+
+    chunks = [chunk async for chunk in blob_storage.stream_file("test_blob.txt")]
+
+    assert chunks == [b"dummy ", b"data"]
+
+
+def delegation_key():
+    key = UserDelegationKey()
+    key.signed_oid = "oid"
+    key.signed_tid = "tid"
+    key.signed_start = "2024-03-15T00:00:00Z"
+    key.signed_expiry = "2024-03-16T00:00:00Z"
+    key.signed_service = "b"
+    key.signed_version = "2023-11-03"
+    key.value = base64.b64encode(b"secret").decode()
+    return key
+
+
+@pytest.mark.asyncio
+async def test_get_upload_url(blob_storage, mock_blob_service):
+    """Test upload URLs are signed with one user delegation key"""
+    service_client, _, mock_blob_client = mock_blob_service
+    service_client.get_user_delegation_key = AsyncMock(return_value=delegation_key())
+    mock_blob_client.url = "https://test_account.blob.core.windows.net/test_container/u/b/f/q.sql"
+
+    url = await blob_storage.get_upload_url("u/b/f/q.sql", 900)
+    await blob_storage.get_upload_url("u/b/g/q.sql", 900)
+
+    query = parse_qs(urlparse(url).query)
+    assert url.startswith(mock_blob_client.url + "?")
+    # Only creating the one blob, which cannot be replaced once it exists
+    assert query["sp"] == ["c"]
+    assert query["sr"] == ["b"]
+    assert query["skoid"] == ["oid"]
+    service_client.get_user_delegation_key.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_upload_url_with_account_key(mock_blob_service):
+    """Test upload URLs are signed with the account key when there is one, as for Azurite"""
+    service_client, _, mock_blob_client = mock_blob_service
+    service_client.get_user_delegation_key = AsyncMock()
+    key = base64.b64encode(b"key").decode()
+    storage = AzureBlobStorage(
+        account_name="devstoreaccount1",
+        container_name="test_container",
+        account_url="http://127.0.0.1:10000/devstoreaccount1",
+        account_key=key,
+    )
+    mock_blob_client.url = "http://127.0.0.1:10000/devstoreaccount1/test_container/u/b/f/q.sql"
+
+    url = await storage.get_upload_url("u/b/f/q.sql", 900)
+
+    query = parse_qs(urlparse(url).query)
+    assert query["sp"] == ["c"]
+    assert "skoid" not in query
+    service_client.get_user_delegation_key.assert_not_awaited()
+    blob_azure.BlobServiceClient.assert_called_with(
+        account_url="http://127.0.0.1:10000/devstoreaccount1",
+        credential={"account_name": "devstoreaccount1", "account_key": key},
+        max_single_put_size=blob_azure.MAX_SINGLE_PUT_SIZE,
+        max_block_size=blob_azure.MAX_BLOCK_SIZE,
+    )
+
+
+@pytest.mark.asyncio
+async def test_set_metadata(blob_storage, mock_blob_service):
+    """Test replacing the metadata of a blob"""
+    _, _, mock_blob_client = mock_blob_service
+    mock_blob_client.set_blob_metadata = AsyncMock()
+
+    await blob_storage.set_metadata("test_blob.zip", {"sha256": "abc"})
+
+    mock_blob_client.set_blob_metadata.assert_awaited_once_with({"sha256": "abc"})
+
+
 @pytest.mark.asyncio
 async def test_delete_file(blob_storage, mock_blob_service):
     """Test deleting a file"""
@@ -108,6 +218,43 @@ async def test_delete_file_exception(blob_storage, mock_blob_service):
     assert result is False
 
 
+def batch_responses(*status_codes):
+    """The async iterator of responses returned by a batch delete"""
+    async def responses():
+        for status_code in status_codes:
+            yield MagicMock(status_code=status_code)
+
+    return responses()
+
+
+@pytest.mark.asyncio
+async def test_delete_files_in_batches(blob_storage, mock_blob_service, monkeypatch):
+    """Test that blobs are deleted in batch requests, counting missing blobs as deleted"""
+    monkeypatch.setattr(blob_azure, "DELETE_BATCH_SIZE", 2)
+    _, mock_container_client, mock_blob_client = mock_blob_service
+    mock_container_client.delete_blobs = AsyncMock(
+        side_effect=[batch_responses(202, 404), batch_responses(403)]
+    )
+
+    failed = await blob_storage.delete_files(["a", "b", "c"], max_concurrency=1)
+
+    assert failed == ["c"]
+    assert [call.args for call in mock_container_client.delete_blobs.await_args_list] == [("a", "b"), ("c",)]
+    mock_blob_client.delete_blob.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_delete_files_without_batch_support(blob_storage, mock_blob_service):
+    """Test that blobs are deleted one at a time when batch requests are refused"""
+    _, mock_container_client, mock_blob_client = mock_blob_service
+    mock_container_client.delete_blobs = AsyncMock(side_effect=Exception("Batch not supported"))
+
+    failed = await blob_storage.delete_files(["a", "b"])
+
+    assert failed == []
+    assert mock_blob_client.delete_blob.await_count == 2
+
+
 @pytest.mark.asyncio
 async def test_list_files(blob_storage, mock_blob_service):
     """Test listing files in a container"""
@@ -182,7 +329,9 @@ async def test_close(blob_storage, mock_blob_service):
 
     await blob_storage.close()
 
-    service_client.close.assert_called_once()
+    service_client.close.assert_awaited_once()
+    # The credential's own connections are closed too
+    blob_storage.credential.close.assert_awaited_once()
 
 
 @pytest.mark.asyncio
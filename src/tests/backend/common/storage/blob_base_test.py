@@ -29,6 +29,15 @@ class MockBlobStorage(BlobStorageBase):
     async def get_file(self, blob_path: str) -> BinaryIO:
         return BytesIO(b"mock data")
 
+    async def stream_file(self, blob_path: str):
+        yield b"mock data"
+
+    async def get_upload_url(self, blob_path: str, expires_in: int) -> Optional[str]:
+        return f"https://mockstorage.com/{blob_path}?sas"
+
+    async def set_metadata(self, blob_path: str, metadata: Dict[str, str]) -> None:
+        pass
+
     async def delete_file(self, blob_path: str) -> bool:
         return True
 
@@ -38,6 +47,9 @@ class MockBlobStorage(BlobStorageBase):
             {"name": "file2.jpg", "size": 200, "content_type": "image/jpeg"},
         ]
 
+    async def close(self) -> None:
+        pass
+
 
 @pytest.fixture
 def mock_blob_storage():
@@ -74,6 +86,19 @@ async def test_delete_file(mock_blob_storage):
     assert result is True
 
 
+@pytest.mark.asyncio
+async def test_delete_files_returns_failures(mock_blob_storage):
+    """Test the default delete_files, deleting one file at a time"""
+    async def delete_file(blob_path):
+        return blob_path != "missing.txt"
+
+    mock_blob_storage.delete_file = delete_file
+
+    failed = await mock_blob_storage.delete_files(["a.txt", "missing.txt", "b.txt"], max_concurrency=2)
+
+    assert failed == ["missing.txt"]
+
+
 @pytest.mark.asyncio
 async def test_list_files(mock_blob_storage):
     """Test list_files method"""
@@ -1,12 +1,20 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 
 from common.storage.blob_factory import BlobStorageFactory
+from common.storage.blob_local import LocalBlobStorage
 
 
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def mock_credential():
+    """Patch the async credential given to the storage"""
+    with patch("common.storage.blob_factory.get_azure_credential_async", new_callable=AsyncMock) as mock:
+        yield mock
+
+
 @pytest.mark.asyncio
 async def test_get_storage_logs_on_init():
     """Test that logger logs on initialization"""
@@ -33,7 +41,8 @@ async def test_get_storage_logs_on_init():
 async def test_close_storage_resets_instance():
     """Test that close_storage resets the singleton instance"""
     # Setup instance first
-    mock_storage_instance = MagicMock()
+    BlobStorageFactory._instance = None
+    mock_storage_instance = AsyncMock()
 
     with patch("common.storage.blob_factory.AzureBlobStorage", return_value=mock_storage_instance), \
          patch("common.storage.blob_factory.Config") as mock_config:
@@ -49,6 +58,7 @@ async def test_close_storage_resets_instance():
         await BlobStorageFactory.close_storage()
 
         assert BlobStorageFactory._instance is None
+        mock_storage_instance.close.assert_awaited_once()
 
 
 @pytest.mark.asyncio
@@ -60,7 +70,7 @@ async def test_get_storage_after_close_reinitializes():
     with patch("common.storage.blob_factory.AzureBlobStorage") as mock_storage, \
          patch("common.storage.blob_factory.Config") as mock_config:
 
-        mock_storage.side_effect = [MagicMock(name="instance1"), MagicMock(name="instance2")]
+        mock_storage.side_effect = [AsyncMock(name="instance1"), AsyncMock(name="instance2")]
 
         mock_config_instance = MagicMock()
         mock_config_instance.azure_blob_account_name = "account"
@@ -76,3 +86,48 @@ async def test_get_storage_after_close_reinitializes():
 
         assert instance1 is not instance2
         assert mock_storage.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_storage_local_backend(tmp_path, mock_credential):
+    """Test that the local backend is used when configured"""
+    BlobStorageFactory._instance = None
+
+    with patch("common.storage.blob_factory.Config") as mock_config:
+        mock_config.return_value.storage_backend = "local"
+        mock_config.return_value.local_storage_path = str(tmp_path)
+
+        instance = await BlobStorageFactory.get_storage()
+
+        assert isinstance(instance, LocalBlobStorage)
+        assert (tmp_path / "blobs").is_dir()
+        mock_credential.assert_not_awaited()
+
+        await BlobStorageFactory.close_storage()
+
+
+@pytest.mark.asyncio
+async def test_get_storage_with_endpoint_and_account_key(mock_credential):
+    """Test that an emulator endpoint and account key are passed instead of an Entra credential"""
+    BlobStorageFactory._instance = None
+
+    with patch("common.storage.blob_factory.AzureBlobStorage") as mock_storage, \
+         patch("common.storage.blob_factory.Config") as mock_config:
+        mock_config.return_value.storage_backend = "azure"
+        mock_config.return_value.azure_blob_account_name = "devstoreaccount1"
+        mock_config.return_value.azure_blob_container_name = "container"
+        mock_config.return_value.azure_blob_endpoint = "http://127.0.0.1:10000/devstoreaccount1"
+        mock_config.return_value.azure_blob_account_key = "key"
+
+        await BlobStorageFactory.get_storage()
+
+        mock_storage.assert_called_once_with(
+            account_name="devstoreaccount1",
+            container_name="container",
+            credential=None,
+            account_url="http://127.0.0.1:10000/devstoreaccount1",
+            account_key="key",
+        )
+        mock_credential.assert_not_awaited()
+
+    BlobStorageFactory._instance = None
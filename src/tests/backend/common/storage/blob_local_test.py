@@ -0,0 +1,122 @@
+from io import BytesIO
+
+from common.storage import blob_local
+from common.storage.blob_local import LocalBlobStorage
+
+import pytest
+
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def storage(tmp_path):
+    local = LocalBlobStorage(str(tmp_path))
+    yield local
+    await local.close()
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_upload_and_get_file(storage):
+    result = await storage.upload_file(
+        "﻿SELECT 1;", "u1/b1/f1/query.sql", "text/plain", {"file_id": "f1"}
+    )
+
+    assert result["size"] == len("﻿SELECT 1;".encode("utf-8"))
+    assert result["etag"]
+    # Read as text without the byte order mark, as from Azure
+    assert await storage.get_file("u1/b1/f1/query.sql") == "SELECT 1;"
+    blobs = await storage.list_files("u1/b1/")
+    assert blobs[0]["name"] == "u1/b1/f1/query.sql"
+    assert blobs[0]["content_type"] == "text/plain"
+    assert blobs[0]["metadata"] == {"file_id": "f1"}
+    assert blobs[0]["created_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_upload_streams_replace_blob(storage):
+    await storage.upload_file(BytesIO(b"old"), "u1/b1/f1/query.sql")
+    first = (await storage.list_files("u1/"))[0]["etag"]
+
+    await storage.upload_file(chunks(b"SELECT ", b"2;"), "u1/b1/f1/query.sql")
+
+    assert await storage.get_file("u1/b1/f1/query.sql") == "SELECT 2;"
+    blobs = await storage.list_files("u1/")
+    assert len(blobs) == 1 and blobs[0]["etag"] != first
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_keeps_previous_blob(storage):
+    await storage.upload_file(b"SELECT 1;", "u1/b1/f1/query.sql")
+
+    async def failing():
+        yield b"partial"
+        raise IOError("client went away")
+
+    with pytest.raises(IOError):
+        await storage.upload_file(failing(), "u1/b1/f1/query.sql")
+
+    assert await storage.get_file("u1/b1/f1/query.sql") == "SELECT 1;"
+    assert [blob["name"] for blob in await storage.list_files()] == ["u1/b1/f1/query.sql"]
+
+
+@pytest.mark.asyncio
+async def test_stream_large_file_through_memory_map(storage, monkeypatch):
+    monkeypatch.setattr(blob_local, "MMAP_THRESHOLD", 8)
+    monkeypatch.setattr(blob_local, "CHUNK_SIZE", 4)
+    await storage.upload_file(b"0123456789", "u1/b1/results/a.zip")
+
+    streamed = [chunk async for chunk in storage.stream_file("u1/b1/results/a.zip")]
+
+    assert streamed == [b"0123", b"4567", b"89"]
+    assert await storage.get_file("u1/b1/results/a.zip") == "0123456789"
+
+
+@pytest.mark.asyncio
+async def test_list_files_matches_prefix(storage):
+    for path in ("u1/b1/f1/a.sql", "u1/b12/f2/b.sql", "u2/b3/f3/c.sql"):
+        await storage.upload_file(b"SELECT 1;", path)
+
+    assert [blob["name"] for blob in await storage.list_files("u1/b1")] == ["u1/b1/f1/a.sql", "u1/b12/f2/b.sql"]
+    assert [blob["name"] for blob in await storage.list_files("u1/b1/")] == ["u1/b1/f1/a.sql"]
+    assert len(await storage.list_files()) == 3
+    assert await storage.list_files("u9/") == []
+
+
+@pytest.mark.asyncio
+async def test_delete_file(storage, tmp_path):
+    await storage.upload_file(b"SELECT 1;", "u1/b1/f1/a.sql")
+
+    assert await storage.delete_file("u1/b1/f1/a.sql")
+    assert not await storage.delete_file("u1/b1/f1/a.sql")
+    assert await storage.list_files() == []
+    # Emptied folders are removed
+    assert list((tmp_path / "blobs").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_paths_outside_root_are_refused(storage):
+    with pytest.raises(ValueError):
+        await storage.upload_file(b"x", "../outside.sql")
+    with pytest.raises(ValueError):
+        await storage.get_file("u1/../../outside.sql")
+    assert await storage.get_upload_url("u1/b1/f1/a.sql", 900) is None
+
+
+@pytest.mark.asyncio
+async def test_set_metadata(storage):
+    await storage.upload_file(b"PK", "u1/b1/results/a.zip", "application/zip", {"batch_id": "b1"})
+    etag = (await storage.list_files("u1/"))[0]["etag"]
+
+    await storage.set_metadata("u1/b1/results/a.zip", {"batch_id": "b1", "sha256": "abc"})
+
+    blob = (await storage.list_files("u1/"))[0]
+    assert blob["metadata"] == {"batch_id": "b1", "sha256": "abc"}
+    assert blob["content_type"] == "application/zip"
+    assert blob["etag"] != etag
+    with pytest.raises(FileNotFoundError):
+        await storage.set_metadata("u1/b1/results/missing.zip", {})
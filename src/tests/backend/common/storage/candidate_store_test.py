@@ -0,0 +1,58 @@
+from unittest.mock import AsyncMock
+
+from common.storage.candidate_store import CandidateStore
+
+import pytest
+
+
+@pytest.fixture
+def store():
+    storage = AsyncMock()
+    database = AsyncMock()
+    database.get_file.return_value = {"file_id": "f1", "batch_id": "b1"}
+    database.get_batch_from_id.return_value = {"batch_id": "b1", "user_id": "u1"}
+    return CandidateStore(storage, database, min_size=10)
+
+
+@pytest.mark.asyncio
+async def test_put_stores_each_candidate_once(store):
+    candidate = "SELECT * FROM orders"
+
+    first = await store.put("f1", candidate)
+    second = await store.put("f1", candidate)
+
+    assert first == second == CandidateStore.candidate_hash(candidate)
+    store.storage.upload_file.assert_awaited_once()
+    kwargs = store.storage.upload_file.await_args.kwargs
+    assert kwargs["blob_path"] == f"u1/b1/f1/candidates/{first}.sql"
+    assert kwargs["metadata"] == {"batch_id": "b1", "user_id": "u1", "file_id": "f1"}
+    # The owner of the file is looked up once
+    store.database.get_file.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_put_keeps_small_candidates_inline(store):
+    assert await store.put("f1", "SELECT 1") is None
+    assert await store.put("f1", "SELECT 1", force=True) is not None
+
+
+@pytest.mark.asyncio
+async def test_put_failure_keeps_candidate_inline(store):
+    store.storage.upload_file.side_effect = IOError("unavailable")
+    assert await store.put("f1", "SELECT * FROM orders") is None
+
+    store.database.get_file.return_value = None
+    assert await store.put("f2", "SELECT * FROM orders") is None
+
+
+@pytest.mark.asyncio
+async def test_get_and_list_paths(store):
+    store.storage.get_file.return_value = "SELECT * FROM orders"
+    store.storage.list_files.return_value = [
+        {"name": "u1/b1/f1/query.sql"},
+        {"name": "u1/b1/f1/candidates/abc.sql"},
+    ]
+
+    assert await store.get("f1", "abc") == "SELECT * FROM orders"
+    store.storage.get_file.assert_awaited_once_with("u1/b1/f1/candidates/abc.sql")
+    assert await store.list_paths("u1/b1/") == ["u1/b1/f1/candidates/abc.sql"]
@@ -0,0 +1,100 @@
+import hashlib
+from unittest.mock import AsyncMock
+
+from common.storage.result_archive import ResultArchive
+
+import pytest
+
+
+@pytest.fixture
+def archive():
+    storage = AsyncMock()
+    storage.list_files.return_value = []
+    return ResultArchive(storage)
+
+
+@pytest.mark.asyncio
+async def test_find_returns_newest_archive(archive):
+    archive.storage.list_files.return_value = [
+        {"name": "u1/b1/results/old.zip", "created_at": "2025-01-01T00:00:00", "metadata": {"sha256": "h1"}},
+        {"name": "u1/b1/results/new.zip", "created_at": "2025-01-02T00:00:00", "metadata": {"sha256": "h2"}},
+        # Still being stored
+        {"name": "u1/b1/results/partial.zip", "created_at": "2025-01-03T00:00:00", "metadata": {}},
+        {"name": "u1/b1/results/notes.txt", "created_at": "2025-01-03T00:00:00", "metadata": {"sha256": "h3"}},
+    ]
+
+    assert await archive.find("u1", "b1") == {"path": "u1/b1/results/new.zip", "sha256": "h2"}
+    archive.storage.list_files.assert_awaited_once_with("u1/b1/results/")
+
+
+@pytest.mark.asyncio
+async def test_find_without_archive(archive):
+    assert await archive.find("u1", "b1") is None
+
+    archive.storage.list_files.side_effect = IOError("unavailable")
+    assert await archive.find("u1", "b1") is None
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_store_streams_and_replaces_previous_archive(archive):
+    uploaded = []
+
+    async def upload_file(file_content, blob_path, content_type, metadata):
+        uploaded.extend([chunk async for chunk in file_content])
+
+    archive.storage.upload_file.side_effect = upload_file
+    archive.storage.list_files.return_value = [{"name": "u1/b1/results/old.zip"}]
+
+    stored = await archive.store("u1", "b1", chunks(b"PK", b" archive"))
+
+    digest = hashlib.sha256(b"PK archive").hexdigest()
+    assert uploaded == [b"PK", b" archive"]
+    assert stored["sha256"] == digest and stored["size"] == len(b"PK archive")
+    assert stored["path"].startswith("u1/b1/results/") and stored["path"].endswith(".zip")
+    assert archive.storage.upload_file.await_args.kwargs["content_type"] == "application/zip"
+    # Marked complete with its hash once uploaded
+    archive.storage.set_metadata.assert_awaited_once_with(
+        stored["path"], {"batch_id": "b1", "user_id": "u1", "sha256": digest}
+    )
+    archive.storage.delete_file.assert_awaited_once_with("u1/b1/results/old.zip")
+
+
+@pytest.mark.asyncio
+async def test_store_failure_deletes_partial_archive(archive):
+    async def failing():
+        yield b"PK"
+        raise IOError("download failed")
+
+    async def upload_file(file_content, blob_path, content_type, metadata):
+        async for _ in file_content:
+            pass
+
+    archive.storage.upload_file.side_effect = upload_file
+
+    with pytest.raises(IOError):
+        await archive.store("u1", "b1", failing())
+
+    blob_path = archive.storage.upload_file.await_args.kwargs["blob_path"]
+    archive.storage.delete_file.assert_awaited_once_with(blob_path)
+    archive.storage.set_metadata.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_deletes_every_archive(archive):
+    archive.storage.list_files.return_value = [
+        {"name": "u1/b1/results/a.zip"},
+        {"name": "u1/b1/results/b.zip"},
+    ]
+
+    await archive.invalidate("u1", "b1")
+
+    assert archive.storage.delete_file.await_count == 2
+
+    # Failures are logged, not raised
+    archive.storage.list_files.side_effect = IOError("unavailable")
+    await archive.invalidate("u1", "b1")
@@ -0,0 +1,56 @@
+"""Tests for the streamed ZIP archives."""
+
+import io
+import os
+import zipfile
+
+from common.storage.zip_stream import CHUNK_SIZE, entry_name, zip_stream
+
+import pytest
+
+
+async def entries_of(*entries):
+    for entry in entries:
+        yield entry
+
+
+def test_entry_name():
+    assert entry_name("rslt_query.sql") == "rslt_query.sql"
+    assert entry_name("rslt_dir/query") == "rslt_dir_query.sql"
+    assert entry_name("rslt_a\\b.sql") == "rslt_a_b.sql"
+
+
+@pytest.mark.asyncio
+async def test_zip_stream_round_trip():
+    large = os.urandom(3 * CHUNK_SIZE).hex()
+    chunks = [
+        chunk
+        async for chunk in zip_stream(
+            entries_of(("one.sql", "SELECT 1"), ("empty.sql", ""), ("two", large))
+        )
+    ]
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["one.sql", "two.sql"]
+        assert archive.read("one.sql") == b"SELECT 1"
+        assert archive.read("two.sql").decode() == large
+    assert all(chunks)
+
+
+@pytest.mark.asyncio
+async def test_zip_stream_yields_before_the_entries_are_all_read():
+    consumed = []
+
+    async def entries():
+        for name in ("one.sql", "two.sql"):
+            consumed.append(name)
+            yield name, os.urandom(2 * CHUNK_SIZE).hex()
+
+    stream = zip_stream(entries())
+    first = await stream.__anext__()
+
+    # The first entry's bytes are sent before the second entry is requested
+    assert first.startswith(b"PK\x03\x04")
+    assert consumed == ["one.sql"]
+    await stream.aclose()
@@ -3,6 +3,7 @@
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from backend.sql_agents.agents.agent_base import BaseSQLAgent
+from backend.sql_agents.agents.migrator.response import MigratorResponse
 from backend.sql_agents.helpers.models import AgentType
 
 import pytest
@@ -36,6 +37,14 @@ class MinimalConcreteAgent(BaseSQLAgent):
         return MagicMock
 
 
+class SchemaAgent(BaseSQLAgent):
+    """Concrete implementation of BaseSQLAgent with a response schema."""
+
+    @property
+    def response_object(self):
+        return MigratorResponse
+
+
 class TestBaseSQLAgent:
     """Tests for BaseSQLAgent class."""
 
@@ -167,10 +176,36 @@ class TestBaseSQLAgent:
             config=mock_config
         )
 
-        with patch("sql_agents.agents.agent_base.get_prompt", side_effect=FileNotFoundError()):
+        with patch(
+            "sql_agents.agents.agent_base.prompt_registry.render",
+            side_effect=FileNotFoundError(),
+        ):
             with pytest.raises(ValueError, match="Prompt file.*not found"):
                 await agent.setup()
 
+    @pytest.mark.asyncio
+    async def test_setup_logs_prompt_hash(self, caplog):
+        """Test setup records the hash of the rendered prompt."""
+        mock_config = MagicMock()
+        mock_config.model_type.get = MagicMock(return_value="gpt-4")
+        mock_config.agent_backend = {}
+        mock_config.ai_project_client.agents.create_agent = AsyncMock()
+
+        agent = SchemaAgent(
+            agent_type=AgentType.MIGRATOR,
+            config=mock_config
+        )
+
+        with patch(
+            "backend.sql_agents.agents.agent_base.prompt_registry.render", return_value="prompt"
+        ), patch(
+            "backend.sql_agents.agents.agent_base.prompt_registry.rendered_hash", return_value="abc123"
+        ), patch("backend.sql_agents.agents.agent_base.AzureAIAgent"), caplog.at_level("INFO"):
+            await agent.setup()
+
+        assert agent.prompt_hash == "abc123"
+        assert "with prompt abc123" in caplog.text
+
     @pytest.mark.asyncio
     async def test_get_agent_when_already_initialized(self):
         """Test get_agent returns existing agent if initialized."""
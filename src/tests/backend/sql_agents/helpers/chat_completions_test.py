@@ -0,0 +1,141 @@
+"""Tests for sql_agents/helpers/chat_completions.py module."""
+
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from openai import AsyncOpenAI
+
+import pytest
+
+from sql_agents.agents.fixer.agent import FixerAgent
+from sql_agents.agents.fixer.response import FixerResponse
+from sql_agents.helpers import chat_completions
+from sql_agents.helpers.models import AgentBackend, AgentType
+
+ENDPOINT = "http://localhost:9999/v1"
+
+
+class ChatCompletionsStub:
+    """OpenAI-compatible chat completions endpoint answering with a fixed JSON body."""
+
+    def __init__(self, content):
+        self.content = content
+        self.requests = []
+        self.authorization = None
+
+    def handler(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        self.authorization = request.headers.get("authorization")
+        return httpx.Response(
+            200,
+            json={
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": json.dumps(self.content)},
+                    }
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            },
+        )
+
+    def http_client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+    def client(self):
+        return AsyncOpenAI(base_url=ENDPOINT, api_key="stub", http_client=self.http_client())
+
+
+def make_config(api_key="key", credential=None):
+    config = MagicMock()
+    config.chat_completions_endpoint = ENDPOINT
+    config.chat_completions_api_key = api_key
+    config.credential = credential
+    config.sql_from = "informix"
+    config.sql_to = "tsql"
+    config.model_type = {AgentType.FIXER: "gpt-4o-mini"}
+    config.agent_backend = {AgentType.FIXER: AgentBackend.CHAT_COMPLETIONS}
+    return config
+
+
+@pytest.fixture(autouse=True)
+def clear_clients():
+    chat_completions._clients.clear()
+    yield
+    chat_completions._clients.clear()
+
+
+class TestGetChatClient:
+    """Tests for get_chat_client function."""
+
+    def test_requires_endpoint(self):
+        """An endpoint must be configured."""
+        config = make_config()
+        config.chat_completions_endpoint = None
+        with pytest.raises(ValueError, match="CHAT_COMPLETIONS_ENDPOINT"):
+            chat_completions.get_chat_client(config)
+
+    def test_requires_key_or_credential(self):
+        """Either an API key or a credential must be configured."""
+        with pytest.raises(ValueError, match="API_KEY"):
+            chat_completions.get_chat_client(make_config(api_key=None))
+
+    def test_client_is_shared_per_endpoint(self):
+        """The same client and connection pool is reused for an endpoint."""
+        config = make_config()
+        assert chat_completions.get_chat_client(config) is chat_completions.get_chat_client(config)
+
+    @pytest.mark.asyncio
+    async def test_credential_token_used_as_api_key(self):
+        """Without an API key the Entra token of the credential is used."""
+        stub = ChatCompletionsStub({})
+        credential = MagicMock()
+        credential.get_token = AsyncMock(return_value=MagicMock(token="entra-token"))
+        client = chat_completions.get_chat_client(
+            make_config(api_key=None, credential=credential), stub.http_client()
+        )
+
+        await client.chat.completions.create(model="gpt-4o-mini", messages=[])
+
+        credential.get_token.assert_awaited_once_with(chat_completions.COGNITIVE_SERVICES_SCOPE)
+        assert stub.authorization == "Bearer entra-token"
+        assert chat_completions._clients == {}
+
+    @pytest.mark.asyncio
+    async def test_close_chat_clients(self):
+        """Closing removes the shared clients."""
+        chat_completions.get_chat_client(make_config())
+        await chat_completions.close_chat_clients()
+        assert chat_completions._clients == {}
+
+
+class TestChatCompletionsAgent:
+    """Tests for agents on the chat completions backend against a local stub."""
+
+    @pytest.mark.asyncio
+    async def test_fixer_agent_round_trip(self):
+        """The agent sends a JSON schema response format and keeps history locally."""
+        stub = ChatCompletionsStub(
+            {"thought": "t", "fixed_query": "SELECT 1", "summary": "fixed"}
+        )
+        chat_completions._clients[ENDPOINT] = stub.client()
+        config = make_config()
+
+        agent = await FixerAgent(AgentType.FIXER, config).setup()
+        response = await agent.get_response(messages="SELECT 1 FROM")
+
+        assert FixerResponse.model_validate_json(str(response.content)).fixed_query == "SELECT 1"
+        assert len(stub.requests) == 1
+        request = stub.requests[0]
+        assert request["model"] == "gpt-4o-mini"
+        assert request["response_format"]["type"] == "json_schema"
+        assert "{{$target}}" not in request["messages"][0]["content"]
+        config.ai_project_client.agents.create_agent.assert_not_called()
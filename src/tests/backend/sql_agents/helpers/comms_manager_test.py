@@ -180,3 +180,41 @@ class TestApprovalTerminationStrategy:
         result = await strategy.should_agent_terminate(mock_agent, history)
 
         assert result is False
+
+
+class TestRoutedSelection:
+    """Tests for routing the selected agent to another deployment."""
+
+    @pytest.mark.asyncio
+    async def test_select_agent_uses_routed_deployment(self):
+        """The agent defined on the routed deployment takes the turn."""
+        strategy = CommsManager.SelectionStrategy()
+        strategy.routing = MagicMock()
+        strategy.routing.select.return_value = "gpt-4o-mini"
+
+        default_picker = MagicMock()
+        default_picker.name = AgentType.PICKER.value
+        default_picker.definition.model = "gpt-4o"
+        small_picker = MagicMock()
+        small_picker.name = AgentType.PICKER.value
+        small_picker.definition.model = "gpt-4o-mini"
+
+        history = [MockChatMessageContent(AgentType.MIGRATOR.value)]
+        result = await strategy.select_agent([default_picker, small_picker], history)
+
+        assert result is small_picker
+        strategy.routing.select.assert_called_once()
+        assert strategy.routing.select.call_args[0][0].value == AgentType.PICKER.value
+
+    @pytest.mark.asyncio
+    async def test_select_agent_without_routed_deployment(self):
+        """Agents without an alternative deployment are returned unchanged."""
+        strategy = CommsManager.SelectionStrategy()
+        strategy.routing = MagicMock()
+        strategy.routing.select.return_value = None
+
+        picker = MagicMock()
+        picker.name = AgentType.PICKER.value
+
+        history = [MockChatMessageContent(AgentType.MIGRATOR.value)]
+        assert await strategy.select_agent([picker], history) is picker
@@ -0,0 +1,105 @@
+"""Tests for sql_agents/helpers/model_router.py module."""
+
+from sql_agents.helpers.model_router import (
+    ModelRouter,
+    script_complexity,
+    script_lines,
+)
+from sql_agents.helpers.models import AgentType
+
+
+def make_router(**kwargs):
+    return ModelRouter(
+        model_type={
+            AgentType.MIGRATOR: "gpt-4o",
+            AgentType.FIXER: "gpt-4o",
+            AgentType.SYNTAX_CHECKER: "gpt-4o",
+        },
+        small_model_type={
+            AgentType.MIGRATOR: "gpt-4o-mini",
+            AgentType.FIXER: "gpt-4o-mini",
+            AgentType.SYNTAX_CHECKER: None,
+        },
+        **kwargs,
+    )
+
+
+class TestHeuristics:
+    """Tests for the script size and complexity heuristics."""
+
+    def test_script_lines_ignores_blank_lines(self):
+        """Only non-empty lines are counted."""
+        assert script_lines("SELECT 1;\n\n  \nSELECT 2;") == 2
+
+    def test_script_complexity(self):
+        """Procedural constructs raise the complexity score."""
+        simple = "SELECT * FROM t"
+        procedure = "CREATE PROCEDURE p() FOREACH SELECT a FROM t JOIN u END FOREACH"
+        assert script_complexity(simple) == 0
+        assert script_complexity(procedure) > script_complexity(simple)
+
+
+class TestModelRouter:
+    """Tests for ModelRouter and RoutingSession."""
+
+    def test_disabled_without_small_deployments(self):
+        """Routing is a no-op when no small deployment is configured."""
+        router = ModelRouter({AgentType.MIGRATOR: "gpt-4o"}, {AgentType.MIGRATOR: None})
+        session = router.start_session("SELECT 1")
+        assert not session.enabled
+        assert session.select(AgentType.MIGRATOR) is None
+
+    def test_small_input_uses_small_deployment(self):
+        """Simple scripts go to the cheap deployment and the decision is recorded."""
+        session = make_router().start_session("SELECT * FROM t")
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o-mini"
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o-mini"
+
+        decisions = session.drain_decisions()
+        assert len(decisions) == 1
+        assert decisions[0].agent_type == AgentType.MIGRATOR
+        assert session.drain_decisions() == []
+
+    def test_unrouted_agent_keeps_default(self):
+        """Agents without a small deployment are not routed."""
+        session = make_router().start_session("SELECT * FROM t")
+        assert session.select(AgentType.SYNTAX_CHECKER) is None
+
+    def test_large_input_uses_default_deployment(self):
+        """Scripts above the size threshold go to the default deployment."""
+        session = make_router(max_small_lines=2).start_session("SELECT 1;\nSELECT 2;\nSELECT 3;")
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o"
+        assert "input too large" in session.drain_decisions()[0].reason
+
+    def test_throttled_small_deployment_is_avoided(self):
+        """A recently throttled cheap deployment is skipped."""
+        router = make_router()
+        router.record_throttle("gpt-4o-mini")
+        session = router.start_session("SELECT * FROM t")
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o"
+
+    def test_slow_small_deployment_is_avoided(self):
+        """A cheap deployment above the latency budget is skipped."""
+        router = make_router(latency_budget=5.0)
+        router.record_latency("gpt-4o-mini", 20.0)
+        session = router.start_session("SELECT * FROM t")
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o"
+
+    def test_escalate_after_failure(self):
+        """Escalation moves small-deployment agents to the default once."""
+        session = make_router().start_session("SELECT * FROM t")
+        session.select(AgentType.MIGRATOR)
+
+        assert session.escalate("parse error") is True
+        assert session.select(AgentType.MIGRATOR) == "gpt-4o"
+        assert session.escalate("parse error") is False
+
+    def test_fixer_loop_escalates(self):
+        """Repeated fixer turns on the small deployment escalate the fixer."""
+        session = make_router().start_session("SELECT * FROM t")
+        for _ in range(2):
+            session.select(AgentType.FIXER)
+            session.record_turn(AgentType.FIXER.value, 1.0)
+
+        assert session.select(AgentType.FIXER) == "gpt-4o"
+        assert session.router.stats["gpt-4o-mini"].latency == 1.0
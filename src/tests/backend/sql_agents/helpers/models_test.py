@@ -0,0 +1,21 @@
+"""Tests for sql_agents/helpers/models.py module."""
+
+import pytest
+
+from sql_agents.helpers.models import AgentBackend
+
+
+def test_agent_backend_is_case_insensitive():
+    assert AgentBackend("CHAT_COMPLETIONS") is AgentBackend.CHAT_COMPLETIONS
+    assert AgentBackend(" Azure_AI_Agent ") is AgentBackend.AZURE_AI_AGENT
+
+
+def test_agent_backend_unset_defaults_to_agents_service():
+    assert AgentBackend("") is AgentBackend.AZURE_AI_AGENT
+
+
+def test_agent_backend_rejects_unknown_values():
+    with pytest.raises(ValueError):
+        AgentBackend("chat_completion")
+    with pytest.raises(ValueError):
+        AgentBackend(None)
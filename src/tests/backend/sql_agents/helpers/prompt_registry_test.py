@@ -0,0 +1,111 @@
+"""Tests for sql_agents/helpers/prompt_registry.py module."""
+
+import os
+
+from backend.sql_agents.helpers.prompt_registry import (
+    PromptRegistry,
+    prompt_registry,
+)
+
+import pytest
+
+
+def write_prompt(root, agent_type, content):
+    agent_dir = root / agent_type
+    agent_dir.mkdir(exist_ok=True)
+    prompt_file = agent_dir / "prompt.txt"
+    prompt_file.write_text(content, encoding="utf-8")
+    return prompt_file
+
+
+class TestPromptRegistry:
+    """Tests for PromptRegistry class."""
+
+    def test_default_registry_loads_all_agents(self):
+        """The module registry loads prompts independent of the working directory."""
+        assert set(prompt_registry.agent_types) >= {
+            "fixer",
+            "migrator",
+            "picker",
+            "semantic_verifier",
+            "syntax_checker",
+        }
+
+    def test_render_substitutes_variables(self):
+        """Rendered prompts have no template variables left."""
+        rendered = prompt_registry.render("migrator", "informix", "tsql", 3)
+        assert "{{$" not in rendered
+        assert "informix" in rendered
+        assert not rendered.startswith("\ufeff")
+
+    def test_render_is_memoized(self, tmp_path):
+        """Rendering twice for the same dialect pair returns the cached string."""
+        write_prompt(tmp_path, "fixer", "Fix {{$target}} queries.")
+        registry = PromptRegistry(tmp_path)
+        registry.load()
+
+        first = registry.render("fixer", "informix", "tsql")
+        assert first == "Fix tsql queries."
+        assert registry.render("fixer", "informix", "tsql") is first
+
+    def test_prerender_uses_candidate_counts(self, tmp_path):
+        """Prerender fills numCandidates only for templates that use it."""
+        write_prompt(tmp_path, "migrator", "Make {{$numCandidates}} {{$target}} queries.")
+        registry = PromptRegistry(tmp_path)
+        registry.load()
+        registry.prerender([("informix", "tsql")], {"migrator": 5})
+
+        assert registry._rendered[("migrator", "informix", "tsql", 5)] == "Make 5 tsql queries."
+
+    def test_hashes(self, tmp_path):
+        """Content and rendered hashes are stable and differ per dialect pair."""
+        write_prompt(tmp_path, "fixer", "Fix {{$target}} queries.")
+        registry = PromptRegistry(tmp_path)
+        registry.load()
+
+        assert registry.content_hash("fixer") == registry.content_hash("fixer")
+        assert registry.rendered_hash("fixer", "informix", "tsql") != registry.rendered_hash(
+            "fixer", "informix", "pgsql"
+        )
+
+    def test_unknown_variable_rejected(self, tmp_path):
+        """Templates with variables the agents do not supply fail validation."""
+        write_prompt(tmp_path, "fixer", "Fix {{$dialect}} queries.")
+        registry = PromptRegistry(tmp_path)
+        with pytest.raises(ValueError, match="unknown variables"):
+            registry.load()
+
+    def test_empty_prompt_rejected(self, tmp_path):
+        """Empty templates fail validation."""
+        write_prompt(tmp_path, "fixer", "   ")
+        registry = PromptRegistry(tmp_path)
+        with pytest.raises(ValueError, match="is empty"):
+            registry.load()
+
+    def test_missing_prompt(self, tmp_path):
+        """Unknown agent types raise FileNotFoundError."""
+        registry = PromptRegistry(tmp_path)
+        registry.load()
+        with pytest.raises(FileNotFoundError):
+            registry.get("nonexistent")
+
+    def test_invalid_agent_type(self):
+        """Agent types with path characters are rejected."""
+        with pytest.raises(ValueError, match="Invalid agent type"):
+            prompt_registry.get("../malicious/path")
+
+    def test_hot_reload(self, tmp_path):
+        """Edited prompt files are picked up only when hot reload is enabled."""
+        prompt_file = write_prompt(tmp_path, "fixer", "Fix {{$target}} queries.")
+        static = PromptRegistry(tmp_path)
+        static.load()
+        reloading = PromptRegistry(tmp_path, hot_reload=True)
+        reloading.load()
+        reloading.render("fixer", "informix", "tsql")
+
+        prompt_file.write_text("Repair {{$target}} queries.", encoding="utf-8")
+        mtime = prompt_file.stat().st_mtime + 10
+        os.utime(prompt_file, (mtime, mtime))
+
+        assert static.render("fixer", "informix", "tsql") == "Fix tsql queries."
+        assert reloading.render("fixer", "informix", "tsql") == "Repair tsql queries."
@@ -0,0 +1,203 @@
+"""Tests for sql_agents/helpers/transcript.py module."""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from semantic_kernel.agents import ChatCompletionAgent
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+from semantic_kernel.exceptions import AgentInvokeException
+
+from sql_agents.helpers.comms_manager import CommsManager
+from sql_agents.helpers.models import AgentType
+from sql_agents.helpers.transcript import (
+    TranscriptRecorder,
+    TranscriptReplayer,
+    main,
+    transcript_path,
+)
+
+
+def make_agents():
+    return {
+        agent_type: ChatCompletionAgent(name=agent_type.value, instructions="test")
+        for agent_type in (
+            AgentType.MIGRATOR,
+            AgentType.PICKER,
+            AgentType.SYNTAX_CHECKER,
+            AgentType.FIXER,
+            AgentType.SEMANTIC_VERIFIER,
+        )
+    }
+
+
+def record_transcript(path, error=None):
+    recorder = TranscriptRecorder("SELECT 1", path=path)
+    recorder.start_invoke()
+    recorder.record(
+        ChatMessageContent(role=AuthorRole.ASSISTANT, name="migrator", content='{"a": 1}'),
+        2.0,
+    )
+    recorder.record(
+        ChatMessageContent(role=AuthorRole.ASSISTANT, name="picker", content='{"b": 2}'),
+        0.5,
+    )
+    recorder.end_invoke(False, error)
+    if error is None:
+        recorder.start_invoke()
+        recorder.record(
+            ChatMessageContent(
+                role=AuthorRole.ASSISTANT, name="semantic_verifier", content="{}"
+            ),
+            1.0,
+        )
+        recorder.end_invoke(True)
+    recorder._write()
+    return recorder
+
+
+class TestTranscriptPath:
+    """Tests for locating transcripts."""
+
+    def test_path_depends_on_source_only(self, tmp_path):
+        """The same script maps to the same file and different scripts do not."""
+        assert transcript_path("SELECT 1", tmp_path) == transcript_path("SELECT 1", tmp_path)
+        assert transcript_path("SELECT 1", tmp_path) != transcript_path("SELECT 2", tmp_path)
+        assert transcript_path("SELECT 1", tmp_path).name.endswith(".jsonl.gz")
+
+
+class TestReplay:
+    """Tests for replaying transcripts through the CommsManager."""
+
+    @pytest.mark.asyncio
+    async def test_replay_round_trip(self, tmp_path):
+        """Recorded messages come back in order, per invoke, with completion state."""
+        path = tmp_path / "t.jsonl.gz"
+        record_transcript(path)
+        comms_manager = CommsManager(
+            make_agents(), replay=TranscriptReplayer(path, time_scale=0)
+        )
+
+        first = [msg async for msg in comms_manager.async_invoke()]
+        assert [msg.name for msg in first] == ["migrator", "picker"]
+        assert first[0].content == '{"a": 1}'
+        assert first[0].role == AuthorRole.ASSISTANT
+        assert not comms_manager.group_chat.is_complete
+        assert len(comms_manager.group_chat.history) == 2
+
+        second = [msg async for msg in comms_manager.async_invoke()]
+        assert [msg.name for msg in second] == ["semantic_verifier"]
+        assert comms_manager.group_chat.is_complete
+
+    @pytest.mark.asyncio
+    async def test_time_scaling(self, tmp_path):
+        """Recorded latencies are scaled, and skipped entirely at zero."""
+        path = tmp_path / "t.jsonl.gz"
+        record_transcript(path)
+
+        with patch(
+            "sql_agents.helpers.transcript.asyncio.sleep", new_callable=AsyncMock
+        ) as mock_sleep:
+            replayer = TranscriptReplayer(path, time_scale=0.5)
+            [msg async for msg in CommsManager(make_agents(), replay=replayer).async_invoke()]
+            assert [call.args[0] for call in mock_sleep.await_args_list] == [1.0, 0.25]
+
+            mock_sleep.reset_mock()
+            replayer = TranscriptReplayer(path, time_scale=0)
+            [msg async for msg in CommsManager(make_agents(), replay=replayer).async_invoke()]
+            mock_sleep.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_replay_recorded_failure(self, tmp_path):
+        """A recorded failure is raised again after its messages are replayed."""
+        path = tmp_path / "t.jsonl.gz"
+        record_transcript(path, error=ValueError("bad json"))
+        comms_manager = CommsManager(
+            make_agents(), replay=TranscriptReplayer(path, time_scale=0)
+        )
+
+        names = []
+        with pytest.raises(RuntimeError, match="ValueError: bad json"):
+            async for msg in comms_manager.async_invoke():
+                names.append(msg.name)
+        assert names == ["migrator", "picker"]
+
+    @pytest.mark.asyncio
+    async def test_missing_transcript(self, tmp_path):
+        """Replaying a script that was never recorded fails instead of calling models."""
+        comms_manager = CommsManager(
+            make_agents(), replay=TranscriptReplayer(tmp_path / "missing.jsonl.gz")
+        )
+        with pytest.raises(FileNotFoundError):
+            [msg async for msg in comms_manager.async_invoke()]
+
+    @pytest.mark.asyncio
+    async def test_main_reports_throughput(self, tmp_path, capsys):
+        """The replay benchmark replays every transcript in the directory."""
+        record_transcript(tmp_path / "a.jsonl.gz")
+        record_transcript(tmp_path / "b.jsonl.gz")
+
+        await main(tmp_path, 0.0)
+
+        assert "Replayed 2 transcripts, 6 messages" in capsys.readouterr().out
+
+
+class TestRecording:
+    """Tests for recording through the CommsManager."""
+
+    @pytest.mark.asyncio
+    async def test_records_yielded_messages(self, tmp_path):
+        """Messages yielded by the group chat are recorded with completion state."""
+        recorder = TranscriptRecorder("SELECT 1", path=tmp_path / "t.jsonl.gz")
+        comms_manager = CommsManager(make_agents(), recorder=recorder)
+
+        async def invoke():
+            yield ChatMessageContent(role=AuthorRole.ASSISTANT, name="migrator", content="{}")
+
+        with patch.object(type(comms_manager.group_chat), "invoke", lambda self: invoke()):
+            [msg async for msg in comms_manager.async_invoke()]
+
+        assert len(recorder.invokes) == 1
+        assert recorder.invokes[0].messages[0].name == "migrator"
+        assert recorder.invokes[0].messages[0].role == "assistant"
+        assert recorder.invokes[0].is_complete is False
+
+        await recorder.save()
+        replayed = TranscriptReplayer(recorder.path, time_scale=0)
+        messages = [
+            msg async for msg in CommsManager(make_agents(), replay=replayed).async_invoke()
+        ]
+        assert [msg.name for msg in messages] == ["migrator"]
+
+    @pytest.mark.asyncio
+    async def test_retry_after_partial_yield_records_only_the_retry(self, tmp_path):
+        """Messages of an attempt rolled back for a retry are not replayed."""
+        recorder = TranscriptRecorder("SELECT 1", path=tmp_path / "t.jsonl.gz")
+        comms_manager = CommsManager(make_agents(), recorder=recorder, initial_delay=0)
+        attempts = []
+
+        async def invoke():
+            # Adds each message to the history as the group chat does
+            attempts.append(len(attempts))
+            name = "migrator" if len(attempts) == 1 else "picker"
+            message = ChatMessageContent(role=AuthorRole.ASSISTANT, name=name, content="{}")
+            comms_manager.group_chat.history.add_message(message)
+            yield message
+            if len(attempts) == 1:
+                raise AgentInvokeException("Rate limit is exceeded")
+
+        with patch.object(type(comms_manager.group_chat), "invoke", lambda self: invoke()):
+            [msg async for msg in comms_manager.async_invoke()]
+        recorded_history = [msg.name for msg in comms_manager.group_chat.history]
+
+        assert len(attempts) == 2
+        assert recorded_history == ["picker"]
+        assert [msg.name for msg in recorder.invokes[0].messages] == ["picker"]
+
+        await recorder.save()
+        replay_manager = CommsManager(
+            make_agents(), replay=TranscriptReplayer(recorder.path, time_scale=0)
+        )
+        messages = [msg async for msg in replay_manager.async_invoke()]
+        assert [msg.name for msg in messages] == ["picker"]
+        assert [msg.name for msg in replay_manager.group_chat.history] == recorded_history
@@ -1,56 +1,6 @@
 """Tests for sql_agents/helpers/utils.py module."""
 
-from unittest.mock import mock_open, patch
-
-from backend.sql_agents.helpers.utils import get_prompt, is_text
-
-import pytest
-
-
-class TestGetPrompt:
-    """Tests for get_prompt function."""
-
-    def test_get_prompt_success(self):
-        """Test successful prompt retrieval."""
-        expected_content = "This is a test prompt for the agent."
-
-        with patch("builtins.open", mock_open(read_data=expected_content)):
-            result = get_prompt("migrator")
-            assert result == expected_content
-
-    def test_get_prompt_invalid_agent_type(self):
-        """Test with invalid agent type containing special characters."""
-        with pytest.raises(ValueError, match="Invalid agent type"):
-            get_prompt("../malicious/path")
-
-    def test_get_prompt_invalid_agent_type_special_chars(self):
-        """Test with agent type containing special characters."""
-        with pytest.raises(ValueError, match="Invalid agent type"):
-            get_prompt("agent;drop table")
-
-    def test_get_prompt_invalid_agent_type_spaces(self):
-        """Test with agent type containing spaces."""
-        with pytest.raises(ValueError, match="Invalid agent type"):
-            get_prompt("agent name")
-
-    def test_get_prompt_valid_agent_types(self):
-        """Test with various valid agent type formats."""
-        with patch("builtins.open", mock_open(read_data="content")):
-            # Should not raise for valid patterns
-            result = get_prompt("migrator")
-            assert result == "content"
-
-            result = get_prompt("syntax_checker")
-            assert result == "content"
-
-            result = get_prompt("Agent123")
-            assert result == "content"
-
-    def test_get_prompt_file_not_found(self):
-        """Test when prompt file doesn't exist."""
-        with patch("builtins.open", side_effect=FileNotFoundError("File not found")):
-            with pytest.raises(FileNotFoundError):
-                get_prompt("nonexistent")
+from backend.sql_agents.helpers.utils import is_text
 
 
 class TestIsText: